@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException
 from app.services.ai_service import AIService
+from app.conversation_window import ConversationWindow
 from app.models import GeneralQuery, TroubleshootRequest, ChatResponse
+from app.pipelineserver.pipeline_app.config import settings
 from app.pipelineserver.pipeline_app.services.llm_client import get_llm_client, LLMServiceProtocol
 
 router = APIRouter(
@@ -8,20 +10,32 @@ router = APIRouter(
     tags=["v1"],
 )
 
+# Chat sessions keyed by session_id, stored in SQLite and shared by all worker processes
+conversation_window = ConversationWindow.from_settings(settings)
+
 def get_ai_service(llm_client: LLMServiceProtocol = Depends(get_llm_client)) -> AIService:
     """Dependency to create and return an AIService instance."""
-    return AIService(llm_client=llm_client)
+    return AIService(llm_client=llm_client, conversations=conversation_window)
+
+def _prompt_tokens(ai_service: AIService) -> int | None:
+    """Final prompt size of the last query, if the service reported one."""
+    tokens = getattr(ai_service, "last_prompt_tokens", None)
+    return tokens if isinstance(tokens, int) else None
 
 @router.post("/support", response_model=ChatResponse)
 async def troubleshoot_pipeline(request: TroubleshootRequest, ai_service: AIService = Depends(get_ai_service)):
     if not request.prompt:
         raise HTTPException(status_code=400, detail="Prompt cannot be empty")
     response_text = await ai_service.query(request.prompt, context=request.model_dump())
-    return ChatResponse(response=response_text)
+    return ChatResponse(
+        response=response_text, prompt_tokens=_prompt_tokens(ai_service), session_id=request.session_id
+    )
 
 @router.post("/chat/azom", response_model=ChatResponse)
 async def general_query(request: GeneralQuery, ai_service: AIService = Depends(get_ai_service)):
     if not request.prompt:
         raise HTTPException(status_code=400, detail="Prompt cannot be empty")
     response_text = await ai_service.query(request.prompt, context=request.model_dump())
-    return ChatResponse(response=response_text)
+    return ChatResponse(
+        response=response_text, prompt_tokens=_prompt_tokens(ai_service), session_id=request.session_id
+    )
@@ -0,0 +1,300 @@
+"""Sessionsmedveten chatt: serversidig historik med kontextfönsterhantering.
+
+Varje `session_id` får ett eget tillstånd med de senaste turerna (användarfråga
++ svar) ordagrant och en löpande sammanfattning av äldre turer. När fler än
+`recent_turns` turer finns viks den äldsta in i sammanfattningen – inkrementellt,
+så att varje tur bara sammanfattas en gång och sammanfattningen har ett fast
+tak (`summary_max_chars`).
+
+`build_messages` passar in systemprompt, sammanfattning, historik, RAG-kontext
+och användarfrågan i modellens budget via `PromptBudget`: RAG-kontext trimmas
+först, därefter de äldsta turerna och sist sammanfattningen. En följdfråga
+kostar därmed en begränsad promptstorlek i stället för att växa linjärt med
+konversationens längd.
+
+Tillståndet sparas i tabellen `chat_sessions` i pipeline-serverns
+`SessionStore` (SQLite, samma fil som användarhistoriken) när fönstret byggs
+med `from_settings` eller får `store`/`store_factory`. Då delar alla
+arbetsprocesser sessionerna och de överlever en omstart. Utan lager hålls
+tillståndet i minnet per process. I båda fallen gäller LRU-tak
+(`max_sessions`) och TTL; i SQLite räknas de från senast sparade tur.
+Anropen mot lagret är blockerande och görs från asynkron kod via
+`asyncio.to_thread`.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from app.prompt_budget import PromptBudget
+
+if TYPE_CHECKING:
+    from app.pipelineserver.pipeline_app.services.session_store import SessionStore
+
+__all__ = ["ConversationWindow", "Turn", "summarize_turns"]
+
+# Tecken per fråga/svar i den extraktiva sammanfattningen
+_SUMMARY_SNIPPET_CHARS = 160
+
+
+@dataclass
+class Turn:
+    """En tur i konversationen: användarens fråga och assistentens svar."""
+
+    user: str
+    assistant: str
+
+
+@dataclass
+class _Session:
+    turns: Deque[Turn] = field(default_factory=deque)
+    summary: str = ""
+    summarized_turns: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+
+    @classmethod
+    def from_state(cls, state: Optional[Dict[str, Any]]) -> "_Session":
+        """Återskapar en session från sitt lagrade tillstånd (tom om None)."""
+        if not state:
+            return cls()
+        return cls(
+            turns=deque(Turn(user, assistant) for user, assistant in state.get("turns", [])),
+            summary=state.get("summary", ""),
+            summarized_turns=state.get("summarized_turns", 0),
+        )
+
+    def to_state(self) -> Dict[str, Any]:
+        return {
+            "turns": [[t.user, t.assistant] for t in self.turns],
+            "summary": self.summary,
+            "summarized_turns": self.summarized_turns,
+        }
+
+
+def _snippet(text: str, limit: int = _SUMMARY_SNIPPET_CHARS) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[: limit - 1].rstrip() + "…"
+
+
+def summarize_turns(previous: str, turns: Sequence[Turn], max_chars: int = 1200) -> str:
+    """
+    Viker in turer i en tidigare sammanfattning (extraktivt, utan LLM-anrop).
+
+    Varje tur blir en rad med förkortad fråga och svar. Blir sammanfattningen
+    längre än `max_chars` tas de äldsta raderna bort, så storleken är begränsad
+    oavsett hur många turer som vikts in.
+    """
+    lines = [line for line in previous.splitlines() if line]
+    lines.extend(f"- Fråga: {_snippet(t.user)} | Svar: {_snippet(t.assistant)}" for t in turns)
+    while lines and sum(len(line) + 1 for line in lines) > max_chars:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class ConversationWindow:
+    """Historik per session och kontextfönster som ryms i modellens tokenbudget."""
+
+    def __init__(
+        self,
+        recent_turns: int = 6,
+        summary_max_chars: int = 1200,
+        max_turn_chars: int = 4000,
+        max_sessions: int = 1000,
+        ttl_seconds: Optional[float] = 3600.0,
+        summarize: Callable[[str, Sequence[Turn], int], str] = summarize_turns,
+        store: Optional["SessionStore"] = None,
+        store_factory: Optional[Callable[[], "SessionStore"]] = None,
+    ):
+        """
+        Args:
+            recent_turns: Antal senaste turer som skickas ordagrant
+            summary_max_chars: Tak för den löpande sammanfattningen av äldre turer
+            max_turn_chars: Tak per lagrad fråga/svar (längre text kortas)
+            max_sessions: Max antal sessioner i minnet; den minst nyligen använda tas bort
+            ttl_seconds: Inaktiva sessioner glöms efter så många sekunder (None = aldrig)
+            summarize: Funktion (tidigare sammanfattning, turer, max_chars) -> sammanfattning
+            store: `SessionStore` som sessionerna sparas i (None = i minnet)
+            store_factory: Öppnar `store` vid första användningen, dvs. i den tråd
+                som först anropar fönstret (SQLite-uppsättningen hamnar då inte
+                på event-loopen)
+        """
+        self.recent_turns = max(0, recent_turns)
+        self.summary_max_chars = summary_max_chars
+        self.max_turn_chars = max_turn_chars
+        self.max_sessions = max(1, max_sessions)
+        self.ttl_seconds = ttl_seconds
+        self.summarize = summarize
+        self._store = store
+        self._store_factory = store_factory
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings: Any) -> "ConversationWindow":
+        """Bygg ett kontextfönster från pipeline-serverns `Settings`, med sessionerna i SQLite."""
+        from app.pipelineserver.pipeline_app.services.memory_service import default_store_path
+        from app.pipelineserver.pipeline_app.services.session_store import SessionStore
+
+        return cls(
+            recent_turns=settings.CHAT_SESSION_RECENT_TURNS,
+            summary_max_chars=settings.CHAT_SESSION_SUMMARY_CHARS,
+            max_sessions=settings.CHAT_SESSION_MAX_SESSIONS,
+            ttl_seconds=settings.CHAT_SESSION_TTL_SECONDS,
+            store_factory=lambda: SessionStore(default_store_path(), busy_timeout_ms=settings.SQLITE_BUSY_TIMEOUT_MS),
+        )
+
+    @property
+    def store(self) -> Optional["SessionStore"]:
+        """Lagret för sessionerna, eller None om de hålls i minnet."""
+        if self._store is None and self._store_factory is not None:
+            with self._lock:
+                if self._store is None:
+                    self._store = self._store_factory()
+        return self._store
+
+    def __len__(self) -> int:
+        store = self.store
+        if store is not None:
+            return store.count_chat_sessions()
+        return len(self._sessions)
+
+    def _get(self, session_id: str, create: bool = False) -> Optional[_Session]:
+        now = time.monotonic()
+        session = self._sessions.get(session_id)
+        if session is not None and self.ttl_seconds is not None and now - session.last_used > self.ttl_seconds:
+            del self._sessions[session_id]
+            session = None
+        if session is None:
+            if not create:
+                return None
+            session = self._sessions[session_id] = _Session()
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        self._sessions.move_to_end(session_id)
+        session.last_used = now
+        return session
+
+    # --- Tillstånd -------------------------------------------------------
+
+    def _load(self, session_id: str) -> Optional[_Session]:
+        state = self.store.get_chat_session(session_id, self.ttl_seconds)
+        return None if state is None else _Session.from_state(state)
+
+    def _fold(self, session: _Session, turn: Turn) -> _Session:
+        session.turns.append(turn)
+        overflow: List[Turn] = []
+        while len(session.turns) > self.recent_turns:
+            overflow.append(session.turns.popleft())
+        if overflow:
+            session.summary = self.summarize(session.summary, overflow, self.summary_max_chars)
+            session.summarized_turns += len(overflow)
+        return session
+
+    def history(self, session_id: str) -> Tuple[str, List[Turn]]:
+        """Sammanfattning och ordagranna turer för sessionen (tomma för okänd session)."""
+        if self.store is not None:
+            session = self._load(session_id)
+            return ("", []) if session is None else (session.summary, list(session.turns))
+        with self._lock:
+            session = self._get(session_id)
+            if session is None:
+                return "", []
+            return session.summary, list(session.turns)
+
+    def record(self, session_id: str, user: str, assistant: str) -> None:
+        """Sparar en tur och viker in turer utanför `recent_turns` i sammanfattningen."""
+        turn = Turn(user=user[: self.max_turn_chars], assistant=(assistant or "")[: self.max_turn_chars])
+        if self.store is not None:
+            self.store.update_chat_session(
+                session_id,
+                lambda state: self._fold(_Session.from_state(state), turn).to_state(),
+                ttl_seconds=self.ttl_seconds,
+                max_sessions=self.max_sessions,
+            )
+            return
+        with self._lock:
+            self._fold(self._get(session_id, create=True), turn)
+
+    def clear(self, session_id: str) -> bool:
+        """Glömmer en session; True om den fanns."""
+        if self.store is not None:
+            return self.store.delete_chat_session(session_id)
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def stats(self, session_id: str) -> Dict[str, Any]:
+        """Antal ordagranna och sammanfattade turer i sessionen."""
+        if self.store is not None:
+            return self._stats(session_id, self._load(session_id))
+        with self._lock:
+            return self._stats(session_id, self._sessions.get(session_id))
+
+    @staticmethod
+    def _stats(session_id: str, session: Optional[_Session]) -> Dict[str, Any]:
+        if session is None:
+            return {"session_id": session_id, "turns": 0, "summarized_turns": 0}
+        return {
+            "session_id": session_id,
+            "turns": len(session.turns),
+            "summarized_turns": session.summarized_turns,
+        }
+
+    # --- Prompt ----------------------------------------------------------
+
+    def build_messages(
+        self,
+        session_id: Optional[str],
+        budget: PromptBudget,
+        user: str,
+        system: Optional[str] = None,
+        context_items: Sequence[str] = (),
+        context_header: str = "Relevant kontext:",
+    ) -> Tuple[List[Dict[str, str]], Dict[str, Any]]:
+        """
+        Bygger chattmeddelanden med sessionens historik inom `budget`.
+
+        Args:
+            session_id: Sessionen (None ger samma prompt som utan historik)
+            budget: Modellens promptbudget
+            user: Aktuell användarfråga
+            system: Systemprompt (None = ingen systemprompt utöver sammanfattningen)
+            context_items: RAG-kontext, trimmas först
+            context_header: Rubrik före RAG-kontexten i systemmeddelandet
+
+        Returns:
+            Tupel med (meddelanden, rapport från `PromptBudget.fit` kompletterad med
+            `context_items` (antal behållna) och `history_turns`)
+        """
+        summary, turns = self.history(session_id) if session_id else ("", [])
+        # Nyaste turen först, så att budgeten trimmar de äldsta turerna först
+        newest_first = list(reversed(turns))
+        sections, report = budget.fit([
+            {"name": "system", "content": system or "", "priority": 100, "required": True},
+            {"name": "summary", "content": summary, "priority": 30},
+            {"name": "history", "items": [f"{t.user}\n{t.assistant}" for t in newest_first], "priority": 20},
+            {"name": "rag_context", "items": list(context_items), "priority": 10},
+            {"name": "user", "content": user, "priority": 1000, "required": True},
+        ])
+        kept = {section["name"]: section for section in sections}
+        history = newest_first[: len(kept["history"]["items"])] if "history" in kept else []
+        rag_items = kept["rag_context"]["items"] if "rag_context" in kept else []
+
+        system_content = system or ""
+        if "summary" in kept:
+            system_content += f"\n\nSammanfattning av tidigare konversation:\n{kept['summary']['content']}"
+        if rag_items:
+            system_content += f"\n\n{context_header}\n" + "\n".join(rag_items)
+
+        messages: List[Dict[str, str]] = []
+        if system_content.strip():
+            messages.append({"role": "system", "content": system_content.strip()})
+        for turn in reversed(history):
+            messages.append({"role": "user", "content": turn.user})
+            messages.append({"role": "assistant", "content": turn.assistant})
+        messages.append({"role": "user", "content": user})
+
+        report = dict(report, context_items=len(rag_items), history_turns=len(history))
+        return messages, report
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import time
+from contextvars import ContextVar, Token
+from typing import List, Optional
+
+# Request-wide deadline shared by all stages (RAG, safety, LLM, memory).
+# ModeMiddleware creates one per request; stages read it via `current_deadline()`
+# and degrade or skip work when the remaining budget is nearly used up.
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a stage cannot start because the request deadline has passed."""
+
+
+class Deadline:
+    """Absolute point in time (monotonic clock) by which a request must finish."""
+
+    def __init__(
+        self,
+        seconds: float,
+        min_stage_seconds: float = 1.0,
+        max_stage_seconds: Optional[float] = None,
+        generation_reserve_seconds: float = 0.0,
+    ) -> None:
+        self.budget_seconds = max(0.0, float(seconds))
+        self.min_stage_seconds = min_stage_seconds
+        self.max_stage_seconds = max_stage_seconds
+        self.generation_reserve_seconds = generation_reserve_seconds
+        self.expires_at = time.monotonic() + self.budget_seconds
+        self.degraded: List[str] = []
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline (never negative)."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+    def nearly_expired(self, min_seconds: Optional[float] = None) -> bool:
+        """True when less than `min_seconds` (default `min_stage_seconds`) remain.
+
+        Callers should skip optional work when this returns True.
+        """
+        threshold = self.min_stage_seconds if min_seconds is None else min_seconds
+        return self.remaining() < threshold
+
+    def stage_timeout(self, stage_seconds: Optional[float] = None) -> float:
+        """Timeout for one stage that runs before answer generation.
+
+        The stage gets at most its own budget (`stage_seconds`, default
+        `max_stage_seconds`) and never eats into the time reserved for
+        generation, so one slow stage cannot use up the whole request.
+        Returns 0.0 when the stage should be skipped.
+        """
+        limit = self.remaining() - self.generation_reserve_seconds
+        budget = self.max_stage_seconds if stage_seconds is None else stage_seconds
+        if budget is not None:
+            limit = min(limit, budget)
+        return max(0.0, limit)
+
+    def mark_degraded(self, stage: str) -> None:
+        """Record that `stage` was skipped or shortened, so the response is partial."""
+        if stage not in self.degraded:
+            self.degraded.append(stage)
+
+    @property
+    def partial(self) -> bool:
+        return bool(self.degraded)
+
+
+_current: ContextVar[Optional[Deadline]] = ContextVar("azom_request_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """Deadline for the request being handled, or None outside a request."""
+    return _current.get()
+
+
+def set_deadline(deadline: Optional[Deadline]) -> Token:
+    return _current.set(deadline)
+
+
+def reset_deadline(token: Token) -> None:
+    _current.reset(token)
+
+
+def remaining_seconds(default: Optional[float] = None) -> Optional[float]:
+    """Remaining budget of the current deadline, or `default` if none is set."""
+    deadline = _current.get()
+    return deadline.remaining() if deadline is not None else default
+
+
+def mark_degraded(stage: str) -> None:
+    """Mark `stage` as degraded on the current deadline (no-op without one)."""
+    deadline = _current.get()
+    if deadline is not None:
+        deadline.mark_degraded(stage)
@@ -33,3 +33,68 @@ def payload_cap_bytes(mode: Mode | None) -> int:
     """Optional payload cap for requests; not yet enforced in endpoints."""
     m = mode or Mode.FULL
     return 8_000 if m == Mode.LIGHT else 32_000
+
+
+# Stop sequences shared by all modes: keep the model from inventing the next
+# user turn, which otherwise burns output tokens until max_tokens is hit.
+_DEFAULT_STOP_SEQUENCES = ["\nAnvändare:", "\nUser:"]
+
+
+def max_output_tokens(mode: Mode | None) -> int:
+    """Hard cap on generated tokens per LLM call (short answers in Light)."""
+    m = mode or Mode.FULL
+    return 256 if m == Mode.LIGHT else 1024
+
+
+def sampling_temperature(mode: Mode | None) -> float:
+    """Sampling temperature per mode (more deterministic in Light)."""
+    m = mode or Mode.FULL
+    return 0.2 if m == Mode.LIGHT else 0.3
+
+
+def stop_sequences(mode: Mode | None) -> list[str]:
+    """Stop sequences sent with every chat completion."""
+    return list(_DEFAULT_STOP_SEQUENCES)
+
+
+def generation_budget(mode: Mode | None) -> dict:
+    """Keyword arguments for `LLMServiceProtocol.chat` bounding generation for current mode."""
+    return {
+        "max_tokens": max_output_tokens(mode),
+        "temperature": sampling_temperature(mode),
+        "stop": stop_sequences(mode),
+    }
+
+
+def request_deadline_seconds(mode: Mode | None) -> float:
+    """Total time budget for one request across RAG, safety, LLM and memory."""
+    m = mode or Mode.FULL
+    return 10.0 if m == Mode.LIGHT else 60.0
+
+
+def stage_min_seconds(mode: Mode | None) -> float:
+    """Optional stages are skipped when less than this much budget remains."""
+    m = mode or Mode.FULL
+    return 1.0 if m == Mode.LIGHT else 2.0
+
+
+def stage_max_seconds(mode: Mode | None) -> float:
+    """Upper bound for a single pre-generation stage (RAG, safety check)."""
+    m = mode or Mode.FULL
+    return 2.0 if m == Mode.LIGHT else 10.0
+
+
+def generation_reserve_seconds(mode: Mode | None) -> float:
+    """Part of the request deadline that earlier stages must leave for generation."""
+    m = mode or Mode.FULL
+    return 5.0 if m == Mode.LIGHT else 30.0
+
+
+# Long-running endpoints that manage their own time limits (batches, background
+# jobs); they get no request-wide deadline.
+_DEADLINE_EXEMPT_PREFIXES = ("/chat/batch", "/jobs")
+
+
+def deadline_exempt(path: str) -> bool:
+    """Whether requests to `path` run without a request-wide deadline."""
+    return any(path == p or path.startswith(p + "/") for p in _DEADLINE_EXEMPT_PREFIXES)
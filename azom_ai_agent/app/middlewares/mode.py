@@ -6,6 +6,14 @@ from fastapi import Request, Response
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.types import ASGIApp
 
+from app.core.deadline import Deadline, reset_deadline, set_deadline
+from app.core.feature_flags import (
+    deadline_exempt,
+    generation_reserve_seconds,
+    request_deadline_seconds,
+    stage_max_seconds,
+    stage_min_seconds,
+)
 from app.core.modes import Mode
 
 
@@ -14,6 +22,12 @@ class ModeMiddleware(BaseHTTPMiddleware):
 
     Reads mode from header `X-AZOM-Mode` or query param `mode`.
     Defaults to FULL and echoes selected mode in `X-AZOM-Mode` response header.
+
+    Also creates the request-wide deadline (see `app.core.deadline`) from the
+    mode budget, optionally shortened by the client via `X-AZOM-Deadline-Ms`.
+    Stages that were skipped to meet the deadline are listed in the
+    `X-AZOM-Partial` response header. Long-running endpoints such as
+    `/chat/batch` and `/jobs` (see `deadline_exempt`) get no deadline.
     """
 
     def __init__(self, app: ASGIApp) -> None:
@@ -28,14 +42,43 @@ class ModeMiddleware(BaseHTTPMiddleware):
         # Attach to request state for downstream handlers
         request.state.mode = mode
 
+        deadline = None
+        if not deadline_exempt(request.url.path):
+            deadline = Deadline(
+                _deadline_seconds(mode, request.headers.get("X-AZOM-Deadline-Ms")),
+                min_stage_seconds=stage_min_seconds(mode),
+                max_stage_seconds=stage_max_seconds(mode),
+                generation_reserve_seconds=generation_reserve_seconds(mode),
+            )
+        request.state.deadline = deadline
+        token = set_deadline(deadline)
+
         # Continue pipeline
-        response = await call_next(request)
+        try:
+            response = await call_next(request)
+        finally:
+            reset_deadline(token)
 
         # Echo for clients/observability
         response.headers["X-AZOM-Mode"] = mode.value.upper()
+        if deadline is not None and deadline.partial:
+            response.headers["X-AZOM-Partial"] = ",".join(deadline.degraded)
         return response
 
 
+def _deadline_seconds(mode: Mode, header_ms: str | None) -> float:
+    """Mode budget, or the client's shorter deadline if one was requested."""
+    budget = request_deadline_seconds(mode)
+    if header_ms:
+        try:
+            requested = int(header_ms) / 1000
+        except ValueError:
+            return budget
+        if requested > 0:
+            return min(budget, requested)
+    return budget
+
+
 def get_request_mode(request: Request) -> Mode:
     """FastAPI dependency/helper to access current request mode."""
     mode = getattr(request.state, "mode", None)
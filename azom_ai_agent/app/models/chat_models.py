@@ -13,3 +13,5 @@ class TroubleshootRequest(BaseModel):
 
 class ChatResponse(BaseModel):
     response: str
+    prompt_tokens: Optional[int] = None
+    session_id: Optional[str] = None
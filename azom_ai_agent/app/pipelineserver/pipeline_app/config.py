@@ -38,6 +38,107 @@ class Settings(BaseSettings):
     OPENAI_BASE_URL: Optional[str] = None
     LLM_BACKEND: Optional[str] = "openwebui"
 
+    # Model cascade: simple lookups go to a small model, complex queries to the large one.
+    # The cascade is inactive unless CASCADE_SMALL_MODEL is set.
+    CASCADE_ENABLED: bool = True
+    CASCADE_SMALL_MODEL: Optional[str] = None
+    CASCADE_LARGE_MODEL: Optional[str] = None  # None = backend default (TARGET_MODEL)
+    CASCADE_MAX_SIMPLE_WORDS: int = 25
+    CASCADE_MIN_RAG_CONFIDENCE: float = 0.6
+    CASCADE_ESCALATE: bool = True
+    CASCADE_SMALL_COST_PER_1K: float = 0.0  # estimated cost per 1k tokens, for savings reporting
+    CASCADE_LARGE_COST_PER_1K: float = 0.0
+
+    # Product catalog backend: "json" (products.json in memory) or "sqlite" (indexed DB tables)
+    CATALOG_BACKEND: str = "json"
+    # How often (seconds) the product catalog checks products.json for changes
+    CATALOG_RELOAD_CHECK_SECONDS: float = 2.0
+
+    # SQLite FTS5 full-text search for FAQ, troubleshooting and the RAG keyword fallback
+    FULLTEXT_SEARCH_ENABLED: bool = True
+
+    # Database: None = SQLite file (in-memory when TESTING=true). Postgres URLs use asyncpg
+    # for the async engine, SQLite URLs use aiosqlite.
+    DATABASE_URL: Optional[str] = None
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_SIZE_KB: int = 20000
+    SQLITE_MMAP_SIZE_BYTES: int = 268435456
+
+    # Conversation history store (SQLite, append-only); None = data/user_history.db
+    MEMORY_STORE_PATH: Optional[str] = None
+    # Write-behind buffering of memory writes: flushed in batches of MEMORY_FLUSH_BATCH or
+    # after MEMORY_FLUSH_INTERVAL_SECONDS; entries beyond MEMORY_QUEUE_MAX are dropped
+    MEMORY_WRITE_BEHIND: bool = True
+    MEMORY_FLUSH_BATCH: int = 100
+    MEMORY_FLUSH_INTERVAL_SECONDS: float = 0.5
+    MEMORY_QUEUE_MAX: int = 10000
+    # History retention: entries beyond the newest MEMORY_MAX_ENTRIES_PER_USER or older than
+    # MEMORY_TTL_DAYS are rolled into one summary record per user by a background compactor
+    MEMORY_MAX_ENTRIES_PER_USER: Optional[int] = 200
+    MEMORY_TTL_DAYS: Optional[float] = 90.0
+    MEMORY_COMPACT_INTERVAL_SECONDS: float = 300.0  # <= 0 disables the background compactor
+    MEMORY_RECENT_ENTRIES: int = 10
+
+    # Prompt token budget; None = derive from the model's context window
+    PROMPT_TOKEN_BUDGET: Optional[int] = None
+
+    # Per-stage timeouts for the installation orchestrator (capped by the request deadline)
+    ORCHESTRATION_PRODUCT_TIMEOUT_SECONDS: float = 5.0
+    ORCHESTRATION_RAG_TIMEOUT_SECONDS: float = 5.0
+    ORCHESTRATION_MEMORY_TIMEOUT_SECONDS: float = 1.0
+    ORCHESTRATION_SAFETY_TIMEOUT_SECONDS: float = 2.0
+
+    # /pipeline/install result cache: keyed on canonical inputs plus a stamp of the data files,
+    # emptied automatically when any data/*.json file changes
+    INSTALL_CACHE_ENABLED: bool = True
+    INSTALL_CACHE_MAX_ENTRIES: int = 1024
+    INSTALL_CACHE_TTL_SECONDS: Optional[float] = 3600.0
+    # Precomputed install guides per canonical car model (tools/precompute_install_guides.py);
+    # None = data/install_guides.db. INSTALL_GUIDES_REFRESH_SECONDS > 0 rebuilds changed guides
+    # in the background whenever the data files change.
+    INSTALL_GUIDES_ENABLED: bool = True
+    INSTALL_GUIDE_STORE_PATH: Optional[str] = None
+    INSTALL_GUIDES_CONCURRENCY: int = 4
+    INSTALL_GUIDES_REFRESH_SECONDS: float = 0.0
+
+    # Multi-turn chat sessions (keyed by session_id): the newest CHAT_SESSION_RECENT_TURNS turns
+    # are sent verbatim, older turns are folded into a summary capped at CHAT_SESSION_SUMMARY_CHARS.
+    # Session state is kept in the chat_sessions table of the MEMORY_STORE_PATH SQLite file
+    CHAT_SESSION_RECENT_TURNS: int = 6
+    CHAT_SESSION_SUMMARY_CHARS: int = 1200
+    CHAT_SESSION_MAX_SESSIONS: int = 1000
+    CHAT_SESSION_TTL_SECONDS: Optional[float] = 3600.0
+
+    # Asynchronous jobs (/jobs): a local worker pool with job state in SQLite
+    # (None = data/jobs.db); finished jobs older than JOB_RETENTION_DAYS are purged at startup
+    JOBS_ENABLED: bool = True
+    JOB_WORKERS: int = 2
+    JOB_STORE_PATH: Optional[str] = None
+    JOB_TIMEOUT_SECONDS: Optional[float] = 3600.0
+    JOB_WEBHOOK_TIMEOUT_SECONDS: float = 10.0
+    # Hosts a job webhook_url may point to (http/https only); empty = webhooks are rejected
+    JOB_WEBHOOK_ALLOWED_HOSTS: List[str] = Field(default_factory=list)
+    JOB_RETENTION_DAYS: Optional[float] = 7.0
+
+    # Local pre-classifier in front of the LLM safety check: inputs scored below SAFE_BELOW or
+    # above UNSAFE_ABOVE are decided locally, the rest go to the LLM. AUDIT_RATE of the safe
+    # decisions still go to the LLM to measure agreement. MODEL_PATH is a JSON file from
+    # scripts/train_safety_classifier.py (None = built-in seed examples).
+    SAFETY_PRECLASSIFIER_ENABLED: bool = True
+    SAFETY_PRECLASSIFIER_MODEL_PATH: Optional[str] = None
+    SAFETY_PRECLASSIFIER_SAFE_BELOW: float = 0.25
+    SAFETY_PRECLASSIFIER_UNSAFE_ABOVE: float = 0.9
+    SAFETY_PRECLASSIFIER_AUDIT_RATE: float = 0.05
+    SAFETY_PRECLASSIFIER_ONLINE_LEARNING: bool = True
+
+    # /chat/batch limits
+    BATCH_CONCURRENCY: int = 4  # default parallel LLM calls per batch
+    BATCH_MAX_CONCURRENCY: int = 16
+    BATCH_MAX_ITEMS: int = 1000
+
     # CORS (accepts env PIPELINE_CORS_ORIGINS or CORS_ORIGINS)
     CORS_ORIGINS: List[str] = Field(
         default_factory=lambda: ["*"],
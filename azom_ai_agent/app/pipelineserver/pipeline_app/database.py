@@ -1,32 +1,181 @@
-"""Database configuration and models for the pipeline server."""
+"""Database configuration and models for the pipeline server.
+
+Two engines share the same URL:
+
+* a sync engine (`engine`, `SessionLocal`, `get_db`) for scripts and code that
+  runs in worker threads, and
+* an async engine (`get_async_engine`, `get_async_db`) using aiosqlite, or
+  asyncpg for the Postgres profile, so endpoints can query without blocking the
+  event loop.
+
+SQLite connections run in WAL mode with tuned pragmas. File-based databases use a
+connection pool sized from settings. Tables are no longer created on import;
+call `init_db()` / `await init_async_db()` explicitly (the pipeline server does
+this in its startup hook). Both also run `upgrade_schema`, which brings
+databases created by earlier versions up to the current models: there is no
+Alembic environment, so added columns, indexes and link tables are applied
+there, idempotently and with dialect-neutral DDL.
+"""
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
+from typing import AsyncIterator
+
+from sqlalchemy import bindparam, create_engine, event, inspect, select, update
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 
+from .config import settings
 from .models.database_models import Base
 
 # Create SQLAlchemy engine and session
 # Use in-memory SQLite for tests, file-based for development
 TESTING = os.environ.get('TESTING', 'false').lower() == 'true'
 
-if TESTING:
+if settings.DATABASE_URL:
+    SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
+elif TESTING:
     SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
 else:
     SQLALCHEMY_DATABASE_URL = "sqlite:///./azom_pipelines.db"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# Async drivers per sync URL scheme
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+
+def async_database_url(url: str) -> str:
+    """Maps a sync database URL to its async driver (aiosqlite/asyncpg)."""
+    scheme, sep, rest = url.partition("://")
+    if "+" in scheme:
+        scheme = scheme.split("+", 1)[0]
+    return f"{_ASYNC_DRIVERS.get(scheme, scheme)}{sep}{rest}"
+
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def _is_memory(url: str) -> bool:
+    return _is_sqlite(url) and (":memory:" in url or url.rstrip("/").endswith("sqlite:"))
+
+
+def _engine_kwargs(url: str) -> dict:
+    """Pool and connect arguments for `url`; in-memory SQLite shares a single connection."""
+    kwargs: dict = {}
+    if _is_sqlite(url):
+        kwargs["connect_args"] = {"check_same_thread": False}
+    if _is_memory(url):
+        # One shared connection, so sessions in worker threads see the same in-memory database
+        kwargs["poolclass"] = StaticPool
+        return kwargs
+    kwargs.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_pre_ping=not _is_sqlite(url),
+    )
+    return kwargs
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """WAL journaling and tuned pragmas for every new SQLite connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE_BYTES)}")
+    finally:
+        cursor.close()
+
+
+def make_engine(url: str):
+    """Sync engine for `url` with pool settings and SQLite pragmas applied."""
+    sync_engine = create_engine(url, **_engine_kwargs(url))
+    if _is_sqlite(url):
+        event.listen(sync_engine, "connect", _set_sqlite_pragmas)
+    return sync_engine
+
+
+def make_async_engine(url: str):
+    """Async engine for `url` (sync URLs are mapped to aiosqlite/asyncpg)."""
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = async_database_url(url)
+    async_engine = create_async_engine(url, **_engine_kwargs(url))
+    if _is_sqlite(url):
+        event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return async_engine
+
+
+engine = make_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-# Create tables
-def init_db():
-    """Initialize the database by creating all tables."""
-    Base.metadata.create_all(bind=engine)
+# Columns added to existing tables after their first release; create_all() only
+# creates missing tables, so these are added with ALTER TABLE by upgrade_schema().
+_ADDED_COLUMNS = {
+    "products": ("normalized_name", "vendor", "tags", "barcode", "extra", "content_hash"),
+    "faqs": ("content_hash",),
+}
+
+
+def upgrade_schema(connection) -> list:
+    """Create missing tables, columns and indexes and backfill derived data.
+
+    Safe to run on every startup. Returns the schema changes that were applied.
+    """
+    from .models.database_models import Product, ProductTag
+    from .services.catalog_import import tag_keys
+    from .services.product_catalog import normalize_key
+
+    inspector = inspect(connection)
+    had_tag_table = inspector.has_table(ProductTag.__tablename__)
+    Base.metadata.create_all(bind=connection)
+    applied = [] if had_tag_table else [ProductTag.__tablename__]
+
+    preparer = connection.dialect.identifier_preparer
+    for table_name, columns in _ADDED_COLUMNS.items():
+        table = Base.metadata.tables[table_name]
+        existing = {column["name"] for column in inspector.get_columns(table_name)}
+        for name in columns:
+            if name in existing:
+                continue
+            column_type = table.c[name].type.compile(dialect=connection.dialect)
+            connection.exec_driver_sql(
+                f"ALTER TABLE {preparer.quote(table_name)} ADD COLUMN {preparer.quote(name)} {column_type}"
+            )
+            applied.append(f"{table_name}.{name}")
+        for index in table.indexes:
+            index.create(bind=connection, checkfirst=True)
 
-# Initialize the database
-init_db()
+    # Derived data for rows written before the columns/link table existed
+    if "products.normalized_name" in applied:
+        rows = connection.execute(select(Product.id, Product.name)).all()
+        if rows:
+            connection.execute(
+                update(Product).where(Product.id == bindparam("pid")).values(normalized_name=bindparam("key")),
+                [{"pid": pid, "key": normalize_key(name)} for pid, name in rows],
+            )
+    if not had_tag_table:
+        tag_rows = [
+            {"product_id": pid, "tag": tag}
+            for pid, tags in connection.execute(select(Product.id, Product.tags))
+            for tag in tag_keys(tags or [])
+        ]
+        if tag_rows:
+            connection.execute(ProductTag.__table__.insert(), tag_rows)
+    return applied
+
+
+def init_db():
+    """Initialize the database: create all tables and upgrade older schemas."""
+    with engine.begin() as connection:
+        upgrade_schema(connection)
 
 def get_db():
     """Dependency for getting database session."""
@@ -35,3 +184,47 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+_async_engine = None
+_async_sessionmaker = None
+
+
+def get_async_engine():
+    """Lazily created async engine (requires aiosqlite or asyncpg)."""
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = make_async_engine(SQLALCHEMY_DATABASE_URL)
+    return _async_engine
+
+
+def get_async_sessionmaker():
+    """Session factory bound to the async engine."""
+    global _async_sessionmaker
+    if _async_sessionmaker is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        _async_sessionmaker = async_sessionmaker(get_async_engine(), expire_on_commit=False)
+    return _async_sessionmaker
+
+
+async def get_async_db() -> AsyncIterator["AsyncSession"]:  # noqa: F821
+    """Dependency for getting an async database session."""
+    async with get_async_sessionmaker()() as session:
+        yield session
+
+
+async def init_async_db() -> None:
+    """Creates all tables and upgrades older schemas through the async engine."""
+    async with get_async_engine().begin() as conn:
+        await conn.run_sync(upgrade_schema)
+
+
+async def dispose_engines() -> None:
+    """Closes pooled connections of both engines (called on shutdown)."""
+    global _async_engine, _async_sessionmaker
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+        _async_sessionmaker = None
+    engine.dispose()
@@ -1,25 +1,79 @@
 from app.logger import get_logger, init_logging
-from fastapi import FastAPI, Request, HTTPException, Response, Depends
+from fastapi import FastAPI, Request, HTTPException, Response, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from app.middleware import RequestLoggingMiddleware
 from app.exceptions import add_exception_handlers
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-from sqlalchemy.orm import Session
+import asyncio
+import json
+import httpx
+from contextlib import asynccontextmanager
+import os
+import secrets
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import func, select
 from .config import settings
-from .database import get_db
+from .database import get_async_db, init_db, init_async_db, dispose_engines
+from .models.database_models import Product
 from .pipelines.azom_installation_pipeline import AZOMInstallationPipeline
 from .pipelines.support_pipeline import SupportPipeline
-from .services.llm_client import get_llm_client, LLMServiceProtocol
+from .services.llm_client import get_llm_client, LLMServiceProtocol, OpenAIClient
 from .services.rag_service import RAGService
+from .services.azom_knowledge_service import AZOMKnowledgeService
+from .services.model_router import ModelRouter
+from .services.memory_service import MemoryService, flush_memory_writes, memory_write_stats
+from .services.safety_service import get_safety_service
+from .services.job_queue import JobQueue, JobStore
+from .services.result_cache import cache_status
+from app.config import get_current_config
+from app.prompt_budget import PromptBudget
+from app.conversation_window import ConversationWindow
 from app.core.modes import Mode
-from app.core.feature_flags import rag_enabled, payload_cap_bytes
+from app.core.deadline import DeadlineExceeded, current_deadline
+from app.core.feature_flags import rag_enabled, payload_cap_bytes, generation_budget
 from app.middlewares import ModeMiddleware
 
 init_logging()  # root logging
 logger = get_logger(__name__)
 
-app = FastAPI(title=settings.PROJECT_NAME, version=settings.VERSION)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create tables and start background work (job workers, history compaction, guide rebuilds) on startup; flush memory writes and release connections on shutdown."""
+    init_db()
+    try:
+        await init_async_db()
+    except ImportError as exc:  # async driver (aiosqlite/asyncpg) not installed
+        logger.warning("Async database engine unavailable: %s", exc)
+    # History store setup and the one-time JSON import run in a worker thread, not per request
+    await memory_service.open_store()
+    compactor = None
+    if settings.MEMORY_COMPACT_INTERVAL_SECONDS > 0:
+        compactor = memory_service.compactor()
+        compactor.start()
+    global job_queue
+    if settings.JOBS_ENABLED:
+        job_queue = build_job_queue()
+        await job_queue.start()
+    guide_builder = None
+    if settings.INSTALL_GUIDES_REFRESH_SECONDS > 0 and pipeline.guide_store is not None:
+        guide_builder = pipeline.guide_builder()
+        guide_builder.start()
+    yield
+    if guide_builder is not None:
+        await guide_builder.stop()
+    if compactor is not None:
+        await compactor.stop()
+    if job_queue is not None:
+        await job_queue.stop()
+    await flush_memory_writes()
+    await dispose_engines()
+
+
+app = FastAPI(title=settings.PROJECT_NAME, version=settings.VERSION, lifespan=lifespan)
 
 # Add middleware & exception handlers
 app.add_middleware(ModeMiddleware)
@@ -40,6 +94,12 @@ if settings.CORS_ORIGINS:
 pipeline = AZOMInstallationPipeline()
 support_pipeline = SupportPipeline()
 rag_service = RAGService()
+knowledge_service = AZOMKnowledgeService()
+memory_service = MemoryService()
+safety_service = get_safety_service()
+model_router = ModelRouter.from_settings(settings, safety_service=safety_service)
+conversation_window = ConversationWindow.from_settings(settings)
+job_queue: Optional[JobQueue] = None
 
 
 class PipelineInstallRequest(BaseModel):
@@ -47,19 +107,48 @@ class PipelineInstallRequest(BaseModel):
     car_model: str = None
     user_experience: str = None
 
+class PipelineStreamRequest(PipelineInstallRequest):
+    narrative: bool = False
+
 class SupportRequest(BaseModel):
     question: str
 
 class ChatRequest(BaseModel):
     message: str
     car_model: str | None = None
+    session_id: str | None = None
+
+class BatchChatRequest(BaseModel):
+    requests: List[List[Dict[str, str]]]
+    model: Optional[str] = None
+    concurrency: Optional[int] = None
+    provider_batch: bool = False
+
+def _mark_partial(payload: dict) -> dict:
+    """Flag responses where stages were skipped to meet the request deadline."""
+    deadline = current_deadline()
+    if deadline is not None and deadline.partial:
+        payload["partial"] = True
+        payload["degraded_stages"] = list(deadline.degraded)
+    return payload
 
 @app.get("/health")
 def health_check():
     return {"status": "healthy"}
 
+
+@app.get("/health/db")
+async def database_health(db=Depends(get_async_db)):
+    """Database reachability and catalog size, queried through the async engine."""
+    try:
+        products = await db.scalar(select(func.count(Product.id)))
+    except Exception as e:
+        logger.warning("Database health check failed: %s", e)
+        return JSONResponse(status_code=503, content={"status": "unavailable", "detail": str(e)})
+    return {"status": "healthy", "products": products or 0}
+
 @app.post("/pipeline/install")
-async def install_pipeline(request: PipelineInstallRequest):
+async def install_pipeline(request: PipelineInstallRequest, response: Response):
     """ Kör installations-pipelinen och returnerar rekommendationer. """
     try:
         # Validera indata
@@ -75,7 +164,8 @@ async def install_pipeline(request: PipelineInstallRequest):
             car_model=request.car_model,
             user_experience=request.user_experience or "nybörjare"
         )
-        return {"result": result}
+        response.headers["X-Cache"] = cache_status() or "BYPASS"
+        return _mark_partial({"result": result})
         
     except HTTPException:
         # Skicka vidare HTTP-undantag oförändrade
@@ -93,6 +183,109 @@ async def install_pipeline(request: PipelineInstallRequest):
             detail="Ett internt fel inträffade. Vänligen försök igen senare."
         )
 
+@app.post("/pipeline/install/stream")
+async def install_pipeline_stream(
+    request: PipelineStreamRequest,
+    http_request: Request,
+    llm_client: LLMServiceProtocol = Depends(get_llm_client),
+):
+    """Stream the installation pipeline as NDJSON events as each part becomes available.
+
+    Lines are `{"event": "product" | "warnings" | "steps" | "narrative" | "done" | "error", ...}`.
+    The product card comes first; `narrative` (an LLM-written summary) is only sent when
+    requested, and `done` carries timings and the answer's `source`. Failures after the stream
+    has started are reported as a final `error` line.
+    """
+    if not request.user_input or not request.user_input.strip():
+        raise HTTPException(status_code=400, detail="Ange en beskrivning av ditt ärende")
+    if not request.car_model or not request.car_model.strip():
+        raise HTTPException(status_code=400, detail="Ange bilmodell")
+    req_mode = getattr(getattr(http_request, "state", None), "mode", None)
+    budget = generation_budget(req_mode if isinstance(req_mode, Mode) else None)
+
+    async def _narrative(product: dict, steps: List[str]) -> dict:
+        messages = [
+            {"role": "system", "content": "Du är AZOM Installations-Expert. Sammanfatta installationen kort och pedagogiskt på svenska."},
+            {
+                "role": "user",
+                "content": f"Bil: {request.car_model}\nProdukt: {product.get('name')}\nFråga: {request.user_input}\n"
+                + "Steg:\n" + "\n".join(f"- {step}" for step in steps),
+            },
+        ]
+        try:
+            return {"event": "narrative", "text": await llm_client.chat(messages, **budget)}
+        except Exception as e:
+            logger.warning("Narrative generation failed: %s", e)
+            return {"event": "narrative", "error": "LLM error"}
+
+    async def _stream():
+        product: dict = {}
+        steps: List[str] = []
+        try:
+            async for event in pipeline.stream_installation(
+                user_input=request.user_input,
+                car_model=request.car_model,
+                user_experience=request.user_experience or "nybörjare",
+            ):
+                if event["event"] == "product":
+                    product = event["recommended_product"]
+                elif event["event"] == "steps":
+                    steps = event["installation_steps"]
+                elif event["event"] == "done" and request.narrative:
+                    yield json.dumps(await _narrative(product, steps), ensure_ascii=False) + "\n"
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+        except ValueError as e:
+            yield json.dumps({"event": "error", "status": 400, "detail": str(e)}, ensure_ascii=False) + "\n"
+        except Exception:
+            logger.exception("Oväntat fel i installationspipelinen (stream)")
+            yield json.dumps({"event": "error", "status": 500, "detail": "Ett internt fel inträffade."}, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(_stream(), media_type="application/x-ndjson")
+
+@app.get("/products/compatible")
+async def compatible_products(
+    car_model: Optional[str] = None,
+    tag: List[str] = Query(default=[]),
+    vendor: List[str] = Query(default=[]),
+    min_price: Optional[float] = Query(default=None, ge=0),
+    max_price: Optional[float] = Query(default=None, ge=0),
+    prefer_vendor: Optional[str] = "azom",
+    limit: int = Query(default=20, ge=1, le=200),
+):
+    """Produkter kompatibla med en bilmodell, filtrerade på taggar, leverantör och pris.
+
+    Exempel: `/products/compatible?car_model=Volvo XC60&tag=premium&max_price=5000`
+    """
+    try:
+        return await knowledge_service.find_products(
+            car_model=car_model,
+            tags=tag,
+            vendors=vendor,
+            min_price=min_price,
+            max_price=max_price,
+            prefer_vendor=prefer_vendor,
+            limit=limit,
+        )
+    except Exception as e:
+        logger.exception("Fel vid produktsökning i kompatibilitetsmatrisen")
+        raise HTTPException(
+            status_code=500,
+            detail="Ett internt fel inträffade. Vänligen försök igen senare."
+        ) from e
+
+async def _record_turn(request: ChatRequest, reply: str) -> None:
+    """Store the completed turn in the request's chat session, if any."""
+    if request.session_id and isinstance(reply, str):
+        await asyncio.to_thread(conversation_window.record, request.session_id, request.message.strip(), reply)
+
+
+async def _session_fields(request: ChatRequest) -> Dict[str, object]:
+    """Session id and turn counts echoed in /chat/azom responses for session-aware clients."""
+    if not request.session_id:
+        return {}
+    return {"session": await asyncio.to_thread(conversation_window.stats, request.session_id)}
+
+
 @app.post("/chat/azom")
 async def chat_with_azom(request: ChatRequest, http_request: Request, llm_client: LLMServiceProtocol = Depends(get_llm_client)):
     """Free-form chat endpoint that augments user query with RAG context and calls local OpenWebUI/Ollama via LLMClient."""
@@ -167,28 +360,331 @@ async def chat_with_azom(request: ChatRequest, http_request: Request, llm_client
         )
     except Exception:
         pass
-    # Build context snippet only if we have items (i.e., not in LIGHT)
-    context_snippets = "\n".join([f"- {c['content']}" for c in context_items])
+    budget = generation_budget(req_mode if isinstance(req_mode, Mode) else None)
 
-    system_prompt = (
+    # Fit system prompt + session history + RAG snippets + user message into the model's
+    # context budget. RAG snippets are trimmed first, then the oldest session turns.
+    model_name = getattr(llm_client, "default_model", None)
+    prompt_budget = PromptBudget.for_model(
+        model_name if isinstance(model_name, str) else settings.TARGET_MODEL,
+        reserve_output_tokens=budget["max_tokens"],
+        max_prompt_tokens=settings.PROMPT_TOKEN_BUDGET,
+    )
+    base_prompt = (
         "Du är AZOM Installations-Expert, en hjälpsam AI som svarar på svenska. "
         "Använd installations- och felsökningskontexten nedan om relevant."
     )
-    if context_snippets:
-        system_prompt += f"\n\nRelevant kontext:\n{context_snippets}"
-
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": request.message.strip()},
-    ]
+    # Session state lives in SQLite, so the history lookup runs off the event loop
+    messages, prompt_report = await asyncio.to_thread(
+        conversation_window.build_messages,
+        request.session_id,
+        prompt_budget,
+        user=request.message.strip(),
+        system=base_prompt,
+        context_items=[f"- {c['content']}" for c in context_items],
+    )
+    context_items = context_items[: prompt_report["context_items"]]
+    prompt_tokens = prompt_budget.count_messages(messages)
     try:
-        assistant_reply = await llm_client.chat(messages)
-        return {"assistant": assistant_reply, "context_used": context_items}
+        logger.info(
+            "Final prompt size",
+            extra={
+                "prompt_tokens": prompt_tokens,
+                "budget_tokens": prompt_report["budget_tokens"],
+                "trimmed_sections": prompt_report["trimmed"],
+                "history_turns": prompt_report["history_turns"],
+            },
+        )
+    except Exception:
+        pass
+    try:
+        if model_router.enabled:
+            routed = await model_router.chat(
+                llm_client, messages, query=request.message, context_items=context_items, **budget
+            )
+            await _record_turn(request, routed["answer"])
+            return _mark_partial({
+                "assistant": routed["answer"],
+                "context_used": context_items,
+                "prompt_tokens": prompt_tokens,
+                "route": {k: routed[k] for k in ("route", "model", "escalated", "latency_ms")},
+                **(await _session_fields(request)),
+            })
+        assistant_reply = await llm_client.chat(messages, **budget)
+        await _record_turn(request, assistant_reply)
+        return _mark_partial({
+            "assistant": assistant_reply,
+            "context_used": context_items,
+            "prompt_tokens": prompt_tokens,
+            **(await _session_fields(request)),
+        })
+    except (DeadlineExceeded, httpx.TimeoutException) as e:
+        logger.warning("LLM chat exceeded request deadline")
+        raise HTTPException(status_code=504, detail="Request deadline exceeded") from e
     except Exception as e:
         logger.exception("LLM chat failed")
         raise HTTPException(status_code=500, detail="LLM error: " + str(e))
 
 
+@app.post("/chat/batch")
+async def chat_batch(request: BatchChatRequest, http_request: Request, llm_client: LLMServiceProtocol = Depends(get_llm_client)):
+    """Complete many message lists with bounded parallelism, streaming NDJSON results as they finish.
+
+    Each output line is `{"index": i, "assistant": "..."}` or `{"index": i, "error": "..."}`
+    where `index` refers to the position in `requests`; a failure of the whole batch ends
+    the stream with an `{"error": "..."}` line.
+
+    With `provider_batch` the requests are submitted to the OpenAI Batch API and the
+    response (202) carries the provider batch id; poll `GET /chat/batch/provider/{batch_id}`
+    for its status and results instead of keeping the connection open.
+    """
+    if not request.requests:
+        raise HTTPException(status_code=422, detail="requests must contain at least one message list")
+    if len(request.requests) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {settings.BATCH_MAX_ITEMS} requests")
+    if any(not messages for messages in request.requests):
+        raise HTTPException(status_code=422, detail="Every request needs at least one message")
+    if request.provider_batch and not isinstance(llm_client, OpenAIClient):
+        raise HTTPException(status_code=400, detail="Current LLM backend has no batch API")
+
+    req_mode = getattr(getattr(http_request, "state", None), "mode", None)
+    budget = generation_budget(req_mode if isinstance(req_mode, Mode) else None)
+    concurrency = min(request.concurrency or settings.BATCH_CONCURRENCY, settings.BATCH_MAX_CONCURRENCY)
+    logger.info(
+        "Batch chat started",
+        extra={"batch_size": len(request.requests), "concurrency": concurrency, "provider_batch": request.provider_batch},
+    )
+    if request.provider_batch:
+        try:
+            batch = await llm_client.submit_batch(request.requests, model=request.model, **budget)
+        except Exception as e:
+            logger.exception("Provider batch submission failed")
+            raise HTTPException(status_code=502, detail="Provider batch error: " + str(e)) from e
+        return JSONResponse(status_code=202, content=_provider_batch_links({
+            "batch_id": batch["id"],
+            "status": batch.get("status"),
+            "requests": len(request.requests),
+        }))
+
+    async def _stream():
+        try:
+            async for result in llm_client.chat_many(
+                request.requests, model=request.model, concurrency=concurrency, **budget
+            ):
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+        except Exception as e:
+            logger.exception("Batch chat failed")
+            yield json.dumps({"error": str(e)}, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(_stream(), media_type="application/x-ndjson")
+
+
+def _provider_batch_links(payload: dict) -> dict:
+    return {**payload, "links": {"self": f"/chat/batch/provider/{payload['batch_id']}"}}
+
+
+@app.get("/chat/batch/provider/{batch_id}")
+async def provider_batch_status(batch_id: str, http_request: Request, llm_client: LLMServiceProtocol = Depends(get_llm_client)):
+    """Status of an OpenAI batch submitted via `/chat/batch`; `results` (ordered by index) once completed."""
+    if not isinstance(llm_client, OpenAIClient):
+        raise HTTPException(status_code=400, detail="Current LLM backend has no batch API")
+    req_mode = getattr(getattr(http_request, "state", None), "mode", None)
+    max_tokens = generation_budget(req_mode if isinstance(req_mode, Mode) else None)["max_tokens"]
+    try:
+        batch = await llm_client.get_batch(batch_id)
+        payload = {"batch_id": batch_id, "status": batch.get("status"), "request_counts": batch.get("request_counts")}
+        if batch.get("status") == "completed" and batch.get("output_file_id"):
+            replies = await llm_client.batch_results(batch, max_tokens=max_tokens)
+            total = (batch.get("request_counts") or {}).get("total") or (max(replies) + 1 if replies else 0)
+            payload["results"] = [
+                {"index": index, **(replies.get(index) or {"error": "Missing result in batch output"})}
+                for index in range(total)
+            ]
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 404:
+            raise HTTPException(status_code=404, detail="Batch not found") from e
+        raise HTTPException(status_code=502, detail="Provider batch error: " + str(e)) from e
+    except Exception as e:
+        logger.exception("Provider batch lookup failed")
+        raise HTTPException(status_code=502, detail="Provider batch error: " + str(e)) from e
+    return _provider_batch_links(payload)
+
+
+class JobRequest(BaseModel):
+    kind: str
+    payload: Dict[str, Any]
+    webhook_url: Optional[str] = None
+
+
+async def _job_llm_client() -> LLMServiceProtocol:
+    """LLM client for background jobs (no request, so no LIGHT-mode override)."""
+    return await get_llm_client(get_current_config())
+
+
+async def _install_job(payload: dict) -> dict:
+    request = PipelineInstallRequest(**payload)
+    return await pipeline.run_installation(
+        user_input=request.user_input,
+        car_model=request.car_model,
+        user_experience=request.user_experience or "nybörjare",
+    )
+
+
+async def _chat_batch_job(payload: dict) -> List[dict]:
+    request = BatchChatRequest(**payload)
+    llm_client = await _job_llm_client()
+    concurrency = min(request.concurrency or settings.BATCH_CONCURRENCY, settings.BATCH_MAX_CONCURRENCY)
+    if request.provider_batch and not isinstance(llm_client, OpenAIClient):
+        # The backend was switched after the job was accepted
+        raise RuntimeError("Current LLM backend has no batch API")
+    extra = {"provider_batch": True} if request.provider_batch else {}
+    results = [
+        result async for result in llm_client.chat_many(
+            request.requests, model=request.model, concurrency=concurrency, **extra, **generation_budget(None)
+        )
+    ]
+    return sorted(results, key=lambda result: result["index"])
+
+
+# Job kinds: payload model (validated on submit) and handler
+_JOB_KINDS = {
+    "install": (PipelineInstallRequest, _install_job),
+    "chat_batch": (BatchChatRequest, _chat_batch_job),
+}
+
+
+def build_job_queue() -> JobQueue:
+    """Job queue with SQLite state and one handler per job kind."""
+    path = settings.JOB_STORE_PATH or os.path.join(os.path.dirname(__file__), '../data/jobs.db')
+    return JobQueue(
+        JobStore(path, busy_timeout_ms=settings.SQLITE_BUSY_TIMEOUT_MS),
+        handlers={kind: handler for kind, (_, handler) in _JOB_KINDS.items()},
+        concurrency=settings.JOB_WORKERS,
+        job_timeout=settings.JOB_TIMEOUT_SECONDS,
+        webhook_timeout=settings.JOB_WEBHOOK_TIMEOUT_SECONDS,
+        retention_days=settings.JOB_RETENTION_DAYS,
+    )
+
+
+def _require_jobs() -> JobQueue:
+    if job_queue is None:
+        raise HTTPException(status_code=503, detail="Job API is disabled")
+    return job_queue
+
+
+def _check_webhook_url(url: str) -> None:
+    """Only http(s) URLs to hosts in JOB_WEBHOOK_ALLOWED_HOSTS, so jobs cannot probe internal services."""
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise HTTPException(status_code=422, detail="webhook_url must be an http(s) URL")
+    allowed = {host.lower() for host in settings.JOB_WEBHOOK_ALLOWED_HOSTS}
+    if parts.hostname.lower() not in allowed:
+        raise HTTPException(status_code=422, detail=f"webhook_url host is not allowed: {parts.hostname}")
+
+
+def _job_links(job: dict) -> dict:
+    return {**job, "links": {"self": f"/jobs/{job['job_id']}"}}
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(request: JobRequest):
+    """Queue a long-running pipeline run and return its job id immediately.
+
+    `kind` is `install` (payload as `/pipeline/install`) or `chat_batch` (payload as
+    `/chat/batch`). Poll `GET /jobs/{job_id}`, or give `webhook_url` to receive the
+    finished job as a JSON POST (http(s) to a host in JOB_WEBHOOK_ALLOWED_HOSTS).
+    A `chat_batch` with `provider_batch` needs the OpenAI backend.
+    """
+    queue = _require_jobs()
+    if request.kind not in _JOB_KINDS:
+        raise HTTPException(status_code=422, detail=f"Unknown job kind: {request.kind}")
+    model = _JOB_KINDS[request.kind][0]
+    try:
+        payload = model(**request.payload).model_dump(exclude_none=True)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors()) from e
+    if payload.get("provider_batch") and not isinstance(await _job_llm_client(), OpenAIClient):
+        raise HTTPException(status_code=422, detail="Current LLM backend has no batch API")
+    if request.webhook_url:
+        _check_webhook_url(request.webhook_url)
+    job = await queue.submit(request.kind, payload, request.webhook_url)
+    return _job_links(job)
+
+
+@app.get("/jobs/stats")
+def job_stats():
+    """Worker count, running jobs and jobs per status."""
+    return _require_jobs().stats()
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status, timings and (when finished) result or error of a job."""
+    job = await _require_jobs().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_links(job)
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job; finished jobs are returned unchanged."""
+    job = await _require_jobs().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_links(job)
+
+
+@app.get("/chat/cascade/stats")
+def cascade_stats():
+    """Latency and estimated cost savings per model-cascade route."""
+    return model_router.stats()
+
+
+@app.get("/safety/stats")
+def safety_stats():
+    """Pre-classifier decisions, share of LLM moderation calls avoided and agreement with the LLM."""
+    return safety_service.stats()
+
+
+@app.get("/pipeline/cache/stats")
+def pipeline_cache_stats():
+    """Hit rate, coalesced requests and invalidations of the /pipeline/install result cache."""
+    return pipeline.result_cache.stats()
+
+@app.get("/pipeline/guides/stats")
+def pipeline_guides_stats():
+    """Number of precomputed install guides and whether they match the current data files."""
+    if pipeline.guide_store is None:
+        return {"enabled": False}
+    stats = pipeline.guide_store.stats()
+    return {"enabled": True, **stats, "current": stats["version"] == pipeline.data_version()}
+
+
+@app.get("/memory/stats")
+def memory_stats():
+    """Write-behind queue depth, written and dropped entries per history store."""
+    return memory_write_stats()
+
+
+_admin_auth = HTTPBasic()
+
+
+def require_admin(credentials: HTTPBasicCredentials = Depends(_admin_auth)) -> str:
+    """HTTP Basic check against ADMIN_USERNAME / ADMIN_PASSWORD for endpoints exposing user data."""
+    valid_user = secrets.compare_digest(credentials.username.encode(), settings.ADMIN_USERNAME.encode())
+    valid_password = secrets.compare_digest(credentials.password.encode(), settings.ADMIN_PASSWORD.encode())
+    if not (valid_user and valid_password):
+        raise HTTPException(status_code=401, detail="Invalid admin credentials", headers={"WWW-Authenticate": "Basic"})
+    return credentials.username
+
+
+@app.get("/memory/history/{user_id}", dependencies=[Depends(require_admin)])
+async def memory_history(user_id: str, limit: int = Query(None, ge=0, le=200)):
+    """Latest history entries for a user plus the summary of compacted older entries (admin only)."""
+    return await memory_service.get_recent(user_id, limit)
+
+
 @app.post("/api/v1/support")
 async def get_support(request: SupportRequest):
     """Get support for a specific question."""
@@ -1,4 +1,4 @@
 """Initialize models package."""
-from .database_models import Product, FAQ, TroubleshootingStep
+from .database_models import Product, ProductCarModel, ProductTag, FAQ, TroubleshootingStep
 
-__all__ = ['Product', 'FAQ', 'TroubleshootingStep']
+__all__ = ['Product', 'ProductCarModel', 'ProductTag', 'FAQ', 'TroubleshootingStep']
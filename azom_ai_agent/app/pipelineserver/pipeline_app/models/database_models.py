@@ -1,8 +1,8 @@
 """Database models for the pipeline server."""
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, Float, JSON, Boolean, DateTime
+from sqlalchemy import Column, Integer, String, Text, Float, JSON, Boolean, DateTime, ForeignKey, Index
 from sqlalchemy.sql import func
-from sqlalchemy.orm import declarative_base
+from sqlalchemy.orm import declarative_base, relationship
 
 Base = declarative_base()
 
@@ -11,14 +11,55 @@ class Product(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False, unique=True)
+    # Gemener/enkla mellanslag, för indexerat skiftlägesokänsligt uppslag
+    normalized_name = Column(String(255), index=True)
     description = Column(Text)
-    price = Column(Float)
+    price = Column(Float, index=True)
     category = Column(String(100))
     sku = Column(String(100), unique=True)
+    vendor = Column(String(100), index=True)
+    tags = Column(JSON, default=list)
+    barcode = Column(String(100))
+    # Övriga katalogfält (success_rate, installation_time, canbus_required)
+    extra = Column(JSON, default=dict)
+    # SHA-256 av importerade fält; oförändrade rader hoppas över vid omimport
+    content_hash = Column(String(64))
     stock_quantity = Column(Integer, default=0)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
-    
+
+    car_models = relationship(
+        "ProductCarModel",
+        back_populates="product",
+        cascade="all, delete-orphan",
+        lazy="selectin",
+        order_by="ProductCarModel.id",
+    )
+    tag_links = relationship(
+        "ProductTag",
+        back_populates="product",
+        cascade="all, delete-orphan",
+        lazy="selectin",
+    )
+
+    def to_catalog_dict(self):
+        """Produkten i samma format som `products.json`."""
+        extra = self.extra or {}
+        return {
+            "name": self.name,
+            "description": self.description or "",
+            "price_sek": self.price,
+            "vendor": self.vendor or "",
+            "product_type": self.category or "",
+            "tags": list(self.tags or []),
+            "sku": self.sku or "",
+            "barcode": self.barcode or "",
+            "compatible_models": [m.car_model_name for m in self.car_models],
+            "success_rate": extra.get("success_rate"),
+            "installation_time": extra.get("installation_time"),
+            "canbus_required": extra.get("canbus_required"),
+        }
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -32,6 +73,33 @@ class Product(Base):
             "updated_at": self.updated_at.isoformat() if self.updated_at else None
         }
 
+class ProductCarModel(Base):
+    """Kopplingstabell produkt – bilmodell, indexerad på kanoniskt modell-id."""
+    __tablename__ = "product_car_models"
+    __table_args__ = (
+        Index("ix_product_car_models_model_product", "car_model_id", "product_id", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False, index=True)
+    car_model_id = Column(String(255), nullable=False)
+    car_model_name = Column(String(255), nullable=False)
+
+    product = relationship("Product", back_populates="car_models")
+
+class ProductTag(Base):
+    """Kopplingstabell produkt – normaliserad tagg, för taggfilter utan JSON-funktioner."""
+    __tablename__ = "product_tags"
+    __table_args__ = (
+        Index("ix_product_tags_tag_product", "tag", "product_id", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False, index=True)
+    tag = Column(String(100), nullable=False)
+
+    product = relationship("Product", back_populates="tag_links")
+
 class FAQ(Base):
     __tablename__ = "faqs"
     
@@ -40,6 +108,7 @@ class FAQ(Base):
     answer = Column(Text, nullable=False)
     category = Column(String(100))
     is_active = Column(Boolean, default=True)
+    content_hash = Column(String(64))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -1,19 +1,176 @@
 # AZOM Installation Pipeline
 
+import os
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+from app.core.deadline import current_deadline
+
+from .base_pipeline import BasePipeline, Stage
+from ..config import settings
+from ..services.car_model_resolver import CarModelMatch, normalize_model
+from ..services.install_guides import PRECOMPUTED, GuideBuilder, GuideStore, is_generic_question
 from ..services.orchestration_service import AZOMOrchestrationService
+from ..services.result_cache import (
+    COALESCED,
+    HIT,
+    DataVersion,
+    ResultCache,
+    cache_status,
+    canonical_text,
+    set_cache_status,
+)
+
+_DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../data'))
+_BEGINNER = {"nybörjare", "beginner"}
+# Bara exakta träffar och alias får slå ihop cachenycklar; fuzzy-träffar kan vara fel modell
+_KEY_METHODS = {"exact", "compact", "alias"}
+_LIVE = "LIVE"
 
-class AZOMInstallationPipeline:
+class AZOMInstallationPipeline(BasePipeline):
     """Huvudpipeline för AZOM installation guidance med OpenAI API-kompatibilitet."""
-    def __init__(self):
+    def __init__(
+        self,
+        result_cache: Optional[ResultCache] = None,
+        guide_store: Optional[GuideStore] = None,
+        data_version: Optional[Callable[[], str]] = None,
+    ):
+        """
+        Args:
+            result_cache: Cache för live-orkestrerade svar (standard enligt `INSTALL_CACHE_*`)
+            guide_store: Förberäknade guider (standard enligt `INSTALL_GUIDES_*`, None om avstängt)
+            data_version: Stämpel över datafilerna (standard: `data/*.json`)
+        """
+        super().__init__()
         self.orchestration_service = AZOMOrchestrationService()
+        # Resultatet beror på datakatalogens JSON-filer (katalog, RAG- och vektorindex)
+        self._data_pattern = os.path.join(_DATA_DIR, "*.json")
+        self.data_version = data_version or DataVersion(self._data_pattern, settings.CATALOG_RELOAD_CHECK_SECONDS).stamp
+        if result_cache is None:
+            result_cache = ResultCache(
+                max_entries=settings.INSTALL_CACHE_MAX_ENTRIES,
+                ttl_seconds=settings.INSTALL_CACHE_TTL_SECONDS,
+                version=self.data_version,
+                enabled=settings.INSTALL_CACHE_ENABLED,
+            )
+        self.result_cache = result_cache
+        if guide_store is None and settings.INSTALL_GUIDES_ENABLED:
+            guide_store = GuideStore(
+                settings.INSTALL_GUIDE_STORE_PATH or os.path.join(_DATA_DIR, "install_guides.db"),
+                settings.CATALOG_RELOAD_CHECK_SECONDS,
+            )
+        self.guide_store = guide_store
 
-    async def run_installation(self, user_input: str, car_model: str = None, user_experience: str = None):
-        """Kör installationsflödet och returnerar rekommendation."""
+    def guide_builder(self) -> GuideBuilder:
+        """Inkrementell ombyggnad av guidelagret (offline-jobb eller bakgrundstask)."""
+        if self.guide_store is None:
+            raise RuntimeError("Installationsguider är avstängda (INSTALL_GUIDES_ENABLED)")
+        # RAG-källorna: alla datafiler utom produktkatalogen, som ingår per guide via produkten
+        sources = DataVersion(self._data_pattern, 0, exclude=("products.json",))
+        return GuideBuilder(
+            self.orchestration_service,
+            self.guide_store,
+            data_version=self.data_version,
+            sources_version=sources.stamp,
+            concurrency=settings.INSTALL_GUIDES_CONCURRENCY,
+            interval=settings.INSTALL_GUIDES_REFRESH_SECONDS,
+        )
+
+    def build_stages(self):
+        return [
+            Stage("validate", self._validate, inputs=("user_input", "car_model")),
+            Stage("orchestration", self._orchestrate,
+                  inputs=("user_input", "car_model", "user_experience", "validate")),
+        ]
+
+    @staticmethod
+    def _validate(user_input: str, car_model: str = None) -> bool:
         if not user_input or not user_input.strip():
             raise ValueError("User input cannot be empty")
-            
+
         if not car_model or not car_model.strip():
             raise ValueError("Car model is required")
-            
-        orchestration_result = await self.orchestration_service.orchestrate(user_input, car_model, user_experience)
-        return orchestration_result
+        return True
+
+    async def _orchestrate(self, user_input: str, car_model: str, user_experience: str, validate: bool):
+        return await self.orchestration_service.orchestrate(user_input, car_model, user_experience)
+
+    def _canonical_id(self, car_model: Optional[str]) -> Optional[str]:
+        match = self.orchestration_service.resolve_car_model(car_model)
+        if isinstance(match, CarModelMatch) and match.method in _KEY_METHODS:
+            return match.canonical_id
+        return None
+
+    def cache_key(self, user_input: str, car_model: str = None, user_experience: str = None) -> str:
+        """Nyckel av kanoniserade indata: bilmodell-id, normaliserad fråga och erfarenhetsnivå."""
+        model_key = self._canonical_id(car_model) or normalize_model(car_model)
+        experience = canonical_text(user_experience)
+        if experience in _BEGINNER:
+            experience = "nybörjare"
+        return "\x1f".join((model_key, canonical_text(user_input), experience))
+
+    def precomputed(self, user_input: str, car_model: str = None, user_experience: str = None):
+        """Svar från det förberäknade guidelagret, eller None (specifik fråga, okänd modell, inaktuellt lager)."""
+        if self.guide_store is None or not is_generic_question(user_input, car_model):
+            return None
+        canonical_id = self._canonical_id(car_model)
+        if canonical_id is None or self.guide_store.version != self.data_version():
+            return None
+        guide = self.guide_store.get(canonical_id)
+        if guide is None:
+            return None
+        return self.orchestration_service.compose(guide["product"], list(guide["installation_steps"]), user_experience)
+
+    async def run_installation(self, user_input: str, car_model: str = None, user_experience: str = None):
+        """Kör installationsflödet: förberäknad guide i O(1), annars live (cachat per kanoniska indata)."""
+        self._validate(user_input, car_model)
+        result = self.precomputed(user_input, car_model, user_experience)
+        if result is not None:
+            set_cache_status(PRECOMPUTED)
+            await self._remember(user_input, car_model, user_experience, result)
+            return result
+        deadline = current_deadline()
+
+        async def compute():
+            result = await self.execute(user_input=user_input, car_model=car_model, user_experience=user_experience)
+            return result["orchestration"]
+
+        def cacheable(result) -> bool:
+            # Partiella svar (steg som fallerat eller kortats av tidsbudgeten) cachas inte
+            return isinstance(result, dict) and not result.get("stage_errors") and not (deadline and deadline.partial)
+
+        result = await self.result_cache.get_or_compute(
+            self.cache_key(user_input, car_model, user_experience), compute, cacheable
+        )
+        if cache_status() in (HIT, COALESCED):
+            await self._remember(user_input, car_model, user_experience, result)
+        return result
+
+    async def stream_installation(
+        self, user_input: str, car_model: str = None, user_experience: str = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Installationsflödet som händelser (`product`, `warnings`, `steps`, `done`).
+
+        Förberäknade guider och cachade svar ges direkt; annars strömmas
+        orkestreringen så att produkten skickas innan RAG-sökningen är klar.
+        `done.source` anger varifrån svaret kom (`PRECOMPUTED`, `HIT`, `LIVE`).
+        """
+        self._validate(user_input, car_model)
+        result = self.precomputed(user_input, car_model, user_experience)
+        source = PRECOMPUTED
+        if result is None:
+            result = self.result_cache.peek(self.cache_key(user_input, car_model, user_experience))
+            source = HIT
+        if result is not None:
+            for event in self.orchestration_service.compose_events(result):
+                yield event
+            await self._remember(user_input, car_model, user_experience, result)
+            yield {"event": "done", "source": source}
+            return
+        async for event in self.orchestration_service.orchestrate_events(user_input, car_model, user_experience):
+            yield {**event, "source": _LIVE} if event["event"] == "done" else event
+
+    async def _remember(self, user_input: str, car_model: str, user_experience: str, result) -> None:
+        # Orkestreringen kördes inte för denna request – spara kontexten ändå
+        product = result.get("recommended_product") or {}
+        await self.orchestration_service.remember(user_input, car_model, user_experience, product.get("name"))
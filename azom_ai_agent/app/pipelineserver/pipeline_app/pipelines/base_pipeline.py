@@ -1,6 +1,247 @@
 # Base pipeline class
 
+"""Deklarativ DAG-motor för AZOM pipelines.
+
+En pipeline beskrivs som en lista `Stage`: varje steg anger vilka värden det
+läser (`inputs`) och under vilket namn resultatet sparas (`output`, standard
+stegets namn). `StageGraph` sorterar stegen topologiskt, startar varje steg
+så snart dess indata finns och kör därmed oberoende steg samtidigt.
+
+Per steg finns:
+
+- `timeout` – sekunder för asynkrona steg, begränsad av requestens deadline
+- `fallback` – värde (eller funktion av undantaget) som används om steget
+  misslyckas; felet registreras i `errors` och svaret markeras som partiellt.
+  Steg utan fallback är obligatoriska: felet avbryter körningen och kastas vidare.
+- `memoize` – resultatet cachas per indata (LRU per steg)
+
+Tiden per steg (ms) och totalt returneras i `PipelineResult.timings`, och
+`slowest` pekar ut flaskhalsen. Med `on_stage` anropas en callback så snart
+varje steg är klart, så att delresultat kan strömmas innan hela grafen körts.
+"""
+from __future__ import annotations
+
+import asyncio
+import inspect
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.core.deadline import mark_degraded, remaining_seconds
+from app.logger import get_logger
+
+__all__ = ["BasePipeline", "PipelineResult", "Stage", "StageGraph"]
+
+logger = get_logger(__name__)
+
+_NO_FALLBACK = object()
+
+
+@dataclass
+class Stage:
+    """Ett steg i en pipeline: `func(**inputs)` (synkron eller asynkron) -> `output`."""
+
+    name: str
+    func: Callable[..., Any]
+    inputs: Tuple[str, ...] = ()
+    output: Optional[str] = None
+    timeout: Optional[float] = None
+    fallback: Any = _NO_FALLBACK
+    memoize: bool = False
+
+    @property
+    def key(self) -> str:
+        """Namnet som resultatet sparas under."""
+        return self.output or self.name
+
+    @property
+    def required(self) -> bool:
+        return self.fallback is _NO_FALLBACK
+
+    def fallback_value(self, error: BaseException) -> Any:
+        return self.fallback(error) if callable(self.fallback) else self.fallback
+
+
+@dataclass
+class PipelineResult:
+    """Värden, tider (ms) och isolerade fel från en körning."""
+
+    values: Dict[str, Any]
+    timings: Dict[str, float] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+
+    def __getitem__(self, key: str) -> Any:
+        return self.values[key]
+
+    @property
+    def slowest(self) -> Optional[str]:
+        """Steget som tog längst tid (None om inga steg kördes)."""
+        stages = {name: ms for name, ms in self.timings.items() if name != "total"}
+        return max(stages, key=stages.get) if stages else None
+
+
+def _memo_key(args: Dict[str, Any]) -> str:
+    return json.dumps(args, sort_keys=True, ensure_ascii=False, default=repr)
+
+
+class StageGraph:
+    """Kör steg i beroendeordning; oberoende steg körs samtidigt."""
+
+    def __init__(self, stages: Sequence[Stage], memo_size: int = 256):
+        """
+        Args:
+            stages: Stegen; indata som inget steg producerar måste ges till `run`
+            memo_size: Max antal cachade resultat per memoiserat steg
+
+        Raises:
+            ValueError: Vid dubbla utdatanamn eller cykliska beroenden
+        """
+        self.memo_size = max(1, memo_size)
+        by_key: Dict[str, Stage] = {}
+        for stage in stages:
+            if stage.key in by_key:
+                raise ValueError(f"Dubbelt utdatanamn i pipeline: {stage.key}")
+            by_key[stage.key] = stage
+        self.external_inputs = frozenset(
+            name for stage in stages for name in stage.inputs if name not in by_key
+        )
+        self.stages = self._topological(by_key)
+        self._memo: Dict[str, "OrderedDict[str, Any]"] = {
+            stage.name: OrderedDict() for stage in self.stages if stage.memoize
+        }
+
+    @staticmethod
+    def _topological(by_key: Dict[str, Stage]) -> List[Stage]:
+        order: List[Stage] = []
+        state: Dict[str, int] = {}  # 1 = besöks, 2 = klar
+
+        def visit(key: str, path: Tuple[str, ...]) -> None:
+            if state.get(key) == 2:
+                return
+            if state.get(key) == 1:
+                raise ValueError(f"Cykliskt beroende i pipeline: {' -> '.join(path + (key,))}")
+            state[key] = 1
+            for name in by_key[key].inputs:
+                if name in by_key:
+                    visit(name, path + (key,))
+            state[key] = 2
+            order.append(by_key[key])
+
+        for key in by_key:
+            visit(key, ())
+        return order
+
+    def clear_memo(self) -> None:
+        """Tömmer alla stegcacher (t.ex. när underliggande data laddats om)."""
+        for memo in self._memo.values():
+            memo.clear()
+
+    async def run(self, on_stage: Optional[Callable[[str, Any], None]] = None, **inputs: Any) -> PipelineResult:
+        """
+        Kör alla steg och returnerar resultatet.
+
+        Args:
+            on_stage: Anropas med (utdatanamn, värde) när ett steg är klart (även med fallback)
+
+        Raises:
+            ValueError: Om externa indata saknas
+            Exception: Felet från ett obligatoriskt steg; övriga steg avbryts
+        """
+        missing = self.external_inputs - inputs.keys()
+        if missing:
+            raise ValueError(f"Indata saknas för pipeline: {', '.join(sorted(missing))}")
+        result = PipelineResult(values=dict(inputs))
+        started = time.perf_counter()
+        tasks: Dict[str, asyncio.Future] = {}
+        for stage in self.stages:
+            deps = [tasks[name] for name in stage.inputs if name in tasks]
+            tasks[stage.key] = asyncio.ensure_future(self._run_stage(stage, deps, result, on_stage))
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        finally:
+            result.timings["total"] = round((time.perf_counter() - started) * 1000, 2)
+        return result
+
+    @staticmethod
+    def _timeout(stage: Stage) -> Optional[float]:
+        remaining = remaining_seconds()
+        if remaining is None:
+            return stage.timeout
+        return remaining if stage.timeout is None else min(stage.timeout, remaining)
+
+    async def _run_stage(
+        self,
+        stage: Stage,
+        deps: List[asyncio.Future],
+        result: PipelineResult,
+        on_stage: Optional[Callable[[str, Any], None]] = None,
+    ) -> None:
+        if deps:
+            await asyncio.gather(*deps)
+        args = {name: result.values[name] for name in stage.inputs}
+        memo = self._memo.get(stage.name)
+        memo_key = _memo_key(args) if memo is not None else None
+        started = time.perf_counter()
+        try:
+            if memo is not None and memo_key in memo:
+                memo.move_to_end(memo_key)
+                value = memo[memo_key]
+            else:
+                value = stage.func(**args)
+                if inspect.isawaitable(value):
+                    value = await asyncio.wait_for(value, timeout=self._timeout(stage))
+                if memo is not None:
+                    memo[memo_key] = value
+                    while len(memo) > self.memo_size:
+                        memo.popitem(last=False)
+        except Exception as error:
+            if stage.required:
+                raise
+            reason = "timeout" if isinstance(error, asyncio.TimeoutError) else str(error) or type(error).__name__
+            result.errors[stage.name] = reason
+            mark_degraded(stage.name)
+            logger.warning("Pipelinesteg misslyckades, fallback används", extra={"stage": stage.name, "error": reason})
+            value = stage.fallback_value(error)
+        finally:
+            result.timings[stage.name] = round((time.perf_counter() - started) * 1000, 2)
+        result.values[stage.key] = value
+        if on_stage is not None:
+            on_stage(stage.key, value)
+
+
 class BasePipeline:
-    """Bas-pipeline för alla AZOM pipelines."""
-    def __init__(self):
-        pass
+    """Bas-pipeline för alla AZOM pipelines.
+
+    Underklasser beskriver sitt flöde i `build_stages()` och kör det med
+    `execute(**inputs)`. Grafen byggs vid första körningen, så stegen kan
+    använda attribut som sätts i underklassens `__init__`.
+    """
+    def __init__(self, stages: Optional[Sequence[Stage]] = None):
+        self._stages = list(stages) if stages is not None else None
+        self._graph: Optional[StageGraph] = None
+
+    def build_stages(self) -> List[Stage]:
+        """Pipelinens steg; överskrids av underklasser."""
+        return []
+
+    @property
+    def graph(self) -> StageGraph:
+        if self._graph is None:
+            self._graph = StageGraph(self._stages if self._stages is not None else self.build_stages())
+        return self._graph
+
+    async def execute(self, **inputs: Any) -> PipelineResult:
+        """Kör pipelinens steg och loggar tider per steg samt det långsammaste steget."""
+        result = await self.graph.run(**inputs)
+        logger.debug(
+            "Pipeline klar",
+            extra={"pipeline": type(self).__name__, "timings": result.timings, "slowest": result.slowest},
+        )
+        return result
@@ -1,9 +1,20 @@
 import os
 import json
 
-class SupportPipeline:
+from app.logger import get_logger
+
+from ..config import settings
+from .base_pipeline import BasePipeline, Stage
+from ..services.fulltext_search import FullTextIndex
+
+logger = get_logger(__name__)
+
+_NO_MATCH = "Din fråga matchade ingen FAQ. Kontakta support@azom.se."
+
+class SupportPipeline(BasePipeline):
     """Pipeline för support och FAQ."""
     def __init__(self, faq_path=None):
+        super().__init__()
         self.faq = []
         
         if faq_path:
@@ -33,18 +44,44 @@ class SupportPipeline:
                     except Exception as e:
                         print(f"Error loading {fname}: {e}")
 
+        # Exakta frågor slås upp i O(1); övriga via FTS5-index (rankad prefixsökning)
+        self._exact = {}
+        for f in self.faq:
+            self._exact.setdefault((f.get("question") or "").strip().lower(), f)
+        self.search_index = None
+        if settings.FULLTEXT_SEARCH_ENABLED:
+            self.search_index = FullTextIndex()
+            self.search_index.add_faq(self.faq)
+
+    def build_stages(self):
+        return [
+            Stage("exact", self._exact_match, inputs=("user_input",)),
+            # Sökningen beror bara på frågan (och FAQ:n som laddas en gång) – cachas per fråga
+            Stage("search", self._search, inputs=("user_input", "exact"), memoize=True),
+        ]
+
     async def run_support(self, user_input: str):
-        print(f"Debug - User input: {user_input}")
-        print(f"Debug - FAQ questions: {[f.get('question', '') for f in self.faq]}")
-        user_input_lower = user_input.lower()
-        
+        result = await self.execute(user_input=user_input)
+        match = result["exact"] or result["search"]
+        return {"answer": match.get("answer") if match else _NO_MATCH}
+
+    def _exact_match(self, user_input: str):
         # First try exact match
-        for f in self.faq:
-            question = f.get("question", "").lower()
-            if question == user_input_lower:
-                print(f"Debug - Exact match: {question}")
-                return {"answer": f.get("answer")}
-        
+        return self._exact.get(user_input.lower().strip())
+
+    def _search(self, user_input: str, exact):
+        if exact is not None:
+            return None
+        if self.search_index is not None:
+            # Alla sökbara ord måste matcha, annars blir nästan varje fråga en FAQ-träff
+            hits = self.search_index.search(user_input, kinds=["faq"], limit=1, match_all=True)
+            if hits:
+                logger.debug("FAQ-träff via fulltextsökning", extra={"question": hits[0]["title"]})
+                return hits[0]["payload"]
+            return None
+        return self._keyword_match(user_input.lower())
+
+    def _keyword_match(self, user_input_lower: str):
         # Then try partial match with keywords
         for f in self.faq:
             question = f.get("question", "").lower()
@@ -54,16 +91,16 @@ class SupportPipeline:
             question_keywords = [word for word in question.split() if len(word) > 3]
             if any(keyword in user_input_lower for keyword in question_keywords):
                 print(f"Debug - Keyword match: {question}")
-                return {"answer": f.get("answer")}
+                return f
                 
             # Also check if any significant word from the answer is in the user input
             answer_keywords = [word for word in answer.split() if len(word) > 3]
             if any(keyword in user_input_lower for keyword in answer_keywords):
                 print(f"Debug - Answer keyword match: {question}")
-                return {"answer": f.get("answer")}
+                return f
                 
         print("Debug - No match found")
-        return {"answer": "Din fråga matchade ingen FAQ. Kontakta support@azom.se."}
+        return None
 
     async def get_all_faq(self):
         # Returnera hela FAQ-listan
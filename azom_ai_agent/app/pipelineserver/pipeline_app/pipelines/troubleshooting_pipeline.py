@@ -1,10 +1,18 @@
 import os
 import json
+from pipeline_app.config import settings
+from pipeline_app.services.car_model_resolver import CarModelResolver, normalize_model
+from pipeline_app.services.fulltext_search import FullTextIndex, query_contains
 from pipeline_app.services.orchestration_service import AZOMOrchestrationService
+from pipeline_app.pipelines.base_pipeline import BasePipeline, Stage
 
-class TroubleshootingPipeline:
+# Max antal kandidater som hämtas via fulltextsökning per fråga
+_MAX_TEXT_MATCHES = 20
+
+class TroubleshootingPipeline(BasePipeline):
     """Pipeline för felsökning av installationer och produkter."""
     def __init__(self):
+        super().__init__()
         self.orchestration_service = AZOMOrchestrationService()
         # Ladda all felsökningsdata från troubleshooting.json och alla relevanta other_*.json
         data_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../data'))
@@ -23,17 +31,47 @@ class TroubleshootingPipeline:
                         self.troubleshooting_data += json.load(f)
                 except Exception:
                     pass
+        self._model_index = None
+
+    def _get_model_index(self):
+        """Sökindex över guiderna, byggs om när `troubleshooting_data` byts ut eller ändrar storlek.
+
+        Innehåller en resolver och guider per kanoniskt modell-id, så "V70 II" och
+        "Volvo V-70" hittar samma guide, samt ett FTS5-index över guidernas nyckelord.
+        """
+        data = self.troubleshooting_data
+        if self._model_index is None or self._model_index[0] is not data or self._model_index[1] != len(data):
+            resolver = CarModelResolver(item.get('model') for item in data if item.get('model'))
+            by_model = {}
+            for pos, item in enumerate(data):
+                model_id = resolver.canonical_id(item.get('model'))
+                if model_id:
+                    by_model.setdefault(model_id, []).append(pos)
+            search_index = None
+            if settings.FULLTEXT_SEARCH_ENABLED:
+                search_index = FullTextIndex()
+                search_index.add("troubleshooting", (
+                    {
+                        "title": item.get('model'),
+                        "keywords": item.get('issue_keywords', []),
+                        "body": item.get('steps', []),
+                        "payload": pos,
+                    }
+                    for pos, item in enumerate(data)
+                ))
+            self._model_index = (data, len(data), resolver, by_model, search_index)
+        return self._model_index[2:]
+
+    def build_stages(self):
+        return [
+            Stage("index", self._get_model_index),
+            Stage("model_id", self._resolve_model, inputs=("index", "car_model")),
+            Stage("matches", self._find_matches, inputs=("index", "model_id", "user_input", "car_model")),
+        ]
 
     async def run_troubleshooting(self, user_input: str, car_model: str = None):
         # Sök i all felsökningsdata
-        matches = []
-        query = (car_model or '') + ' ' + (user_input or '')
-        query = query.lower()
-        for item in self.troubleshooting_data:
-            model = (item.get('model') or '').lower()
-            keywords = [k.lower() for k in item.get('issue_keywords', [])]
-            if (car_model and car_model.lower() in model) or any(k in query for k in keywords):
-                matches.append(item)
+        matches = (await self.execute(user_input=user_input, car_model=car_model))["matches"]
         if not matches:
             return {"steps": ["Ingen felsökningsguide hittades för din fråga. Kontrollera stavning eller kontakta support."]}
         # Slå ihop och prioritera steg
@@ -43,3 +81,48 @@ class TroubleshootingPipeline:
         # Ta bort dubbletter och sortera
         all_steps = list(dict.fromkeys(all_steps))
         return {"steps": all_steps}
+
+    @staticmethod
+    def _resolve_model(index, car_model):
+        resolver = index[0]
+        return resolver.canonical_id(car_model) if car_model else None
+
+    def _find_matches(self, index, model_id, user_input, car_model):
+        resolver, by_model, search_index = index
+        if search_index is not None:
+            # Guider för bilmodellen först, sedan guider där ett helt nyckelord finns i frågan.
+            # Fulltextsökningen på nyckelorden ger kandidaterna; ett enstaka gemensamt ord räcker inte.
+            positions = list(by_model.get(model_id, [])) if model_id else self._prefix_positions(by_model, car_model)
+            for hit in search_index.search(user_input, columns=["keywords"], limit=_MAX_TEXT_MATCHES):
+                pos = hit["payload"]
+                keywords = self.troubleshooting_data[pos].get('issue_keywords', [])
+                if pos not in positions and any(query_contains(user_input, k) for k in keywords):
+                    positions.append(pos)
+            return [self.troubleshooting_data[pos] for pos in positions]
+        return self._match_substrings(user_input, car_model, model_id, resolver)
+
+    @staticmethod
+    def _prefix_positions(by_model, car_model):
+        """Guider vars modell börjar med `car_model`, för tvetydiga modeller som bara märket ("Volvo")."""
+        key = normalize_model(car_model)
+        if not key:
+            return []
+        return [pos for model_id, model_positions in by_model.items()
+                if model_id == key or model_id.startswith(key + " ")
+                for pos in model_positions]
+
+    def _match_substrings(self, user_input, car_model, model_id, resolver):
+        """Linjär delsträngsmatchning, används när fulltextsökning är avstängd."""
+        matches = []
+        query = (car_model or '') + ' ' + (user_input or '')
+        query = query.lower()
+        for item in self.troubleshooting_data:
+            model = (item.get('model') or '').lower()
+            keywords = [k.lower() for k in item.get('issue_keywords', [])]
+            same_model = car_model and (
+                (model_id is not None and model_id == resolver.canonical_id(item.get('model')))
+                or car_model.lower() in model
+            )
+            if same_model or any(k in query for k in keywords):
+                matches.append(item)
+        return matches
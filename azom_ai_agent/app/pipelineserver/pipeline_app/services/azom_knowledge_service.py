@@ -1,47 +1,116 @@
 # AZOM Knowledge Service
 
-import json
+import asyncio
 import os
+from typing import Any, Dict, List, Optional, Union
+
+from app.logger import get_logger
+
+from ..config import settings
+from .car_model_resolver import CarModelMatch
+from .catalog_repository import SQLCatalogRepository
+from .product_catalog import CatalogStore, ProductCatalog, get_catalog_store
+
+logger = get_logger(__name__)
 
 class AZOMKnowledgeService:
     """Service för hantering av AZOM:s kunskapsbas."""
-    def __init__(self):
+    def __init__(self, backend: Optional[str] = None, repository: Optional[SQLCatalogRepository] = None):
+        """
+        Args:
+            backend: "json" (products.json i minnet) eller "sqlite" (indexerad databas);
+                standard är `settings.CATALOG_BACKEND`
+            repository: Databasrepository för sqlite-backenden (skapas vid behov)
+        """
         self.products_path = os.path.join(os.path.dirname(__file__), '../../data/products.json')
+        self.backend = (backend or settings.CATALOG_BACKEND).lower()
+        self._repository = repository
+
+    @property
+    def _catalog_store(self) -> CatalogStore:
+        return get_catalog_store(self.products_path, settings.CATALOG_RELOAD_CHECK_SECONDS)
+
+    @property
+    def catalog(self) -> ProductCatalog:
+        """Delad, indexerad produktkatalog (laddas om automatiskt när filen ändras)."""
+        return self._catalog_store.catalog
+
+    async def _refresh_catalog(self) -> None:
+        # Filkontroll och eventuell omladdning i en tråd; uppslagen därefter sker i minnet
+        await self._catalog_store.get()
+
+    @property
+    def repository(self) -> SQLCatalogRepository:
+        """SQLite-backend för katalogen."""
+        if self._repository is None:
+            self._repository = SQLCatalogRepository(resolver_ttl=settings.CATALOG_RELOAD_CHECK_SECONDS)
+        return self._repository
+
+    @property
+    def _source(self) -> Union[ProductCatalog, SQLCatalogRepository]:
+        # Båda backends har find_by_name/find_by_car_model/resolve_car_model
+        return self.repository if self.backend == "sqlite" else self.catalog
+
+    def resolve_car_model(self, car_model: str = None) -> Optional[CarModelMatch]:
+        """Löser upp en bilmodell till katalogens kanoniska id (med konfidens)."""
+        return self._source.resolve_car_model(car_model)
+
+    def car_models(self) -> Dict[str, str]:
+        """Kanoniska bilmodeller i katalogen (id -> visningsnamn)."""
+        return self._source.car_models()
+
+    async def find_products(
+        self,
+        car_model: str = None,
+        tags: Optional[List[str]] = None,
+        vendors: Optional[List[str]] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        prefer_vendor: Optional[str] = "azom",
+        limit: Optional[int] = 20,
+    ) -> Dict[str, Any]:
+        """Produkter som matchar bilmodell, taggar, leverantör och prisintervall.
+
+        Svaret sorteras med `prefer_vendor` först och därefter på pris.
+        """
+        criteria = dict(
+            car_model=car_model,
+            tags=tags,
+            vendors=vendors,
+            min_price=min_price,
+            max_price=max_price,
+            prefer_vendor=prefer_vendor,
+            limit=limit,
+        )
+        if self.backend == "sqlite":
+            # Synkrona databasanrop körs i en tråd så att event-loopen inte blockeras
+            result = await asyncio.to_thread(self.repository.query, **criteria)
+        else:
+            await self._refresh_catalog()
+            result = self.catalog.matrix.query(**criteria)
+        result["products"] = [self._format_product(p) for p in result["products"]]
+        return result
 
     async def get_product_info(self, product_name: str = None, car_model: str = None):
-        print(f"AZOMKnowledgeService.get_product_info anropad med: product_name='{product_name}', car_model='{car_model}'")
-        try:
-            with open(self.products_path, encoding='utf-8') as f:
-                products = json.load(f)
-            print(f"Laddade {len(products)} produkter från {self.products_path}")
-            
-            # Sök på namn först
-            if product_name:
-                print(f"Söker produkt med namn: {product_name}")
-                for p in products:
-                    if p.get('name') and p['name'].lower() == product_name.lower():
-                        print(f"Hittad produkt på namn: {p['name']}")
-                        return self._format_product(p)
-            
-            # Annars sök på kompatibel bilmodell
-            if car_model:
-                print(f"Söker produkt för bilmodell: {car_model}")
-                car_model_lower = car_model.strip().lower()
-                for p in products:
-                    if p.get('compatible_models'):
-                        # Convert all compatible models to lowercase for case-insensitive comparison
-                        compatible_models_lower = [m.strip().lower() for m in p['compatible_models']]
-                        if car_model_lower in compatible_models_lower:
-                            print(f"Hittad produkt för bilmodell {car_model}: {p.get('name')}")
-                            return self._format_product(p)
-            
-            error_msg = f"Ingen produkt hittades för namn '{product_name}' eller bilmodell '{car_model}'"
-            print(error_msg)
-            raise ValueError(error_msg)
-            
-        except Exception as e:
-            print(f"Fel i get_product_info: {str(e)}")
-            raise
+        if self.backend == "sqlite":
+            product = await asyncio.to_thread(self._lookup, product_name, car_model)
+        else:
+            await self._refresh_catalog()
+            product = self._lookup(product_name, car_model)
+        if product is not None:
+            return self._format_product(product)
+
+        error_msg = f"Ingen produkt hittades för namn '{product_name}' eller bilmodell '{car_model}'"
+        logger.info(error_msg)
+        raise ValueError(error_msg)
+
+    def _lookup(self, product_name: Optional[str], car_model: Optional[str]) -> Optional[Dict[str, Any]]:
+        source = self._source
+        # Sök på namn först, annars på kompatibel bilmodell
+        product = source.find_by_name(product_name) if product_name else None
+        if product is None and car_model:
+            product = source.find_by_car_model(car_model)
+        return product
 
     def _format_product(self, p):
         # Returnera alla fält, hantera None snyggt
@@ -0,0 +1,234 @@
+# Car model resolver for AZOM Pipeline Server
+
+"""Fuzzy matchning av bilmodeller mot katalogens kanoniska modell-id:n.
+
+Användarinmatning som "V70 II", "volvo v70" och "Volvo V-70" ska alla ge
+samma kanoniska id. Uppslaget görs i tre steg, från billigast till dyrast:
+
+1. Alias-index (dict): normaliserat namn, namn utan märke, kompakt form utan
+   mellanslag, namn utan generationssuffix (II, MK2, gen 3) samt `CAR_ALIASES`.
+2. Trigram-index: kandidater som delar flest trigram med frågan.
+3. Begränsat editeringsavstånd (Levenshtein med tak) mot de bästa kandidaterna.
+   Taket skalar med frågans längd (en redigering per fyra tecken), och delar
+   flera modeller det minsta avståndet är frågan tvetydig och ger ingen träff.
+
+Kanoniskt id är det normaliserade fullständiga modellnamnet, t.ex. "volvo v70".
+"""
+from __future__ import annotations
+
+import re
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+__all__ = ["CarModelMatch", "CarModelResolver", "CAR_ALIASES", "normalize_model"]
+
+# Vanliga förkortningar/stavningar av märken, normaliserade till katalogens form
+CAR_ALIASES: Dict[str, str] = {
+    "vw": "volkswagen",
+    "folkvagn": "volkswagen",
+    "merc": "mercedes",
+    "mercedesbenz": "mercedes",
+    "mb": "mercedes",
+    "bimmer": "bmw",
+    "chevy": "chevrolet",
+}
+
+_GENERATION = re.compile(r"^(?:i{1,3}|iv|vi{0,3}|mk\d+|gen\d+|\d{4})$")
+_JOIN = re.compile(r"(?<=[a-z0-9])[-.](?=[a-z0-9])")
+_NON_ALNUM = re.compile(r"[^a-z0-9åäöéü]+")
+
+# Konfidens per matchningsmetod i alias-indexet
+_ALIAS_CONFIDENCE = {"exact": 1.0, "compact": 0.97, "alias": 0.95, "generation": 0.9, "model_only": 0.85}
+
+
+class CarModelMatch(NamedTuple):
+    """Resultat av en bilmodellupplösning."""
+
+    canonical_id: str
+    name: str
+    confidence: float
+    method: str
+
+
+@lru_cache(maxsize=65536)
+def normalize_model(value: Optional[str]) -> str:
+    """Gemener, bindestreck/punkter mellan tecken tas bort, övrigt blir mellanslag."""
+    if not value:
+        return ""
+    text = _JOIN.sub("", value.lower())
+    tokens = _NON_ALNUM.sub(" ", text).split()
+    return " ".join(CAR_ALIASES.get(t, t) for t in tokens)
+
+
+def _trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _bounded_levenshtein(a: str, b: str, max_distance: int) -> int:
+    """Levenshtein-avstånd, avbryts tidigt när det överstiger `max_distance`."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        best = i
+        for j, cb in enumerate(b, 1):
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            current.append(value)
+            best = min(best, value)
+        if best > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+class CarModelResolver:
+    """Löser upp fritext till kanoniska bilmodell-id:n via alias-, trigram- och editindex."""
+
+    def __init__(
+        self,
+        models: Iterable[str],
+        aliases: Optional[Dict[str, str]] = None,
+        min_confidence: float = 0.6,
+        max_candidates: int = 8,
+        max_edit_distance: int = 2,
+    ):
+        """
+        Args:
+            models: Modellnamn från katalogen (t.ex. `compatible_models`)
+            aliases: Extra alias (fritext -> modellnamn) utöver de genererade
+            min_confidence: Lägsta konfidens för att en fuzzy-träff ska returneras
+            max_candidates: Antal trigram-kandidater som jämförs med editeringsavstånd
+            max_edit_distance: Största tillåtna editeringsavstånd (korta frågor får färre)
+        """
+        self.min_confidence = min_confidence
+        self.max_candidates = max_candidates
+        self.max_edit_distance = max_edit_distance
+        self.names: Dict[str, str] = {}
+        self._aliases: Dict[str, tuple] = {}
+        self._trigram_index: Dict[str, List[str]] = defaultdict(list)
+        self._compact: Dict[str, str] = {}
+        self._memo: Dict[str, Optional[CarModelMatch]] = {}
+
+        for name in models:
+            canonical = normalize_model(name)
+            if not canonical or canonical in self.names:
+                continue
+            self.names[canonical] = name.strip()
+        makes = {c.split()[0] for c in self.names if len(c.split()) > 1}
+        model_only: Dict[str, Set[str]] = defaultdict(set)
+        for canonical in self.names:
+            compact = canonical.replace(" ", "")
+            self._compact[canonical] = compact
+            self._add_alias(canonical, canonical, "exact")
+            self._add_alias(compact, canonical, "compact")
+            tokens = canonical.split()
+            if len(tokens) > 1 and tokens[0] in makes:
+                model_only[" ".join(tokens[1:])].add(canonical)
+            for gram in _trigrams(compact):
+                self._trigram_index[gram].append(canonical)
+        # "v70" -> "volvo v70", men bara om modellnamnet är entydigt
+        for key, canonicals in model_only.items():
+            if len(canonicals) == 1:
+                canonical = next(iter(canonicals))
+                self._add_alias(key, canonical, "model_only")
+                self._add_alias(key.replace(" ", ""), canonical, "model_only")
+        for alias, target in (aliases or {}).items():
+            canonical = normalize_model(target)
+            if canonical in self.names:
+                self._add_alias(normalize_model(alias), canonical, "alias")
+
+    def _add_alias(self, key: str, canonical: str, method: str) -> None:
+        # Behåll den säkraste metoden om nyckeln redan finns
+        existing = self._aliases.get(key)
+        if existing is None or _ALIAS_CONFIDENCE[method] > _ALIAS_CONFIDENCE[existing[1]]:
+            self._aliases[key] = (canonical, method)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def resolve(self, text: Optional[str]) -> Optional[CarModelMatch]:
+        """Returnerar bästa kanoniska matchning för `text`, eller None."""
+        key = normalize_model(text)
+        if not key:
+            return None
+        if key in self._memo:
+            return self._memo[key]
+        match = self._resolve(key)
+        if len(self._memo) >= 4096:
+            self._memo.clear()
+        self._memo[key] = match
+        return match
+
+    def canonical_id(self, text: Optional[str]) -> Optional[str]:
+        """Kanoniskt id för `text`, eller None om ingen tillräckligt säker träff finns."""
+        match = self.resolve(text)
+        return match.canonical_id if match else None
+
+    def _lookup_alias(self, key: str) -> Optional[CarModelMatch]:
+        for candidate in (key, key.replace(" ", "")):
+            hit = self._aliases.get(candidate)
+            if hit:
+                canonical, method = hit
+                return CarModelMatch(canonical, self.names[canonical], _ALIAS_CONFIDENCE[method], method)
+        return None
+
+    def _resolve(self, key: str) -> Optional[CarModelMatch]:
+        match = self._lookup_alias(key)
+        if match:
+            return match
+        # Ta bort generationssuffix ("v70 ii", "golf mk7", "xc60 2018") och försök igen
+        tokens = key.split()
+        while len(tokens) > 1 and _GENERATION.match(tokens[-1]):
+            tokens.pop()
+            match = self._lookup_alias(" ".join(tokens))
+            if match:
+                confidence = min(match.confidence, _ALIAS_CONFIDENCE["generation"])
+                return match._replace(confidence=confidence, method="generation")
+        return self._fuzzy(key.replace(" ", ""))
+
+    def _fuzzy(self, compact: str) -> Optional[CarModelMatch]:
+        grams = _trigrams(compact)
+        counts: Dict[str, int] = defaultdict(int)
+        for gram in grams:
+            for canonical in self._trigram_index.get(gram, ()):
+                counts[canonical] += 1
+        if not counts:
+            return None
+        candidates = sorted(counts, key=counts.get, reverse=True)[: self.max_candidates]
+        max_distance = min(self.max_edit_distance, max(1, len(compact) // 4))
+        # Bästa (avstånd, konfidens) per kandidat över hela namnet och modelldelen
+        scored: Dict[str, tuple] = {}
+        for canonical in candidates:
+            target = self._compact[canonical]
+            # Jämför även mot modelldelen utan märke ("xc6o" mot "xc60")
+            forms = [target]
+            parts = canonical.split()
+            if len(parts) > 1:
+                forms.append("".join(parts[1:]))
+            for form in forms:
+                distance = _bounded_levenshtein(compact, form, max_distance)
+                if distance > max_distance:
+                    continue
+                confidence = round(1.0 - distance / max(len(compact), len(form)), 3)
+                if form is not target:
+                    confidence = round(confidence * _ALIAS_CONFIDENCE["model_only"], 3)
+                previous = scored.get(canonical)
+                if previous is None or (distance, -confidence) < (previous[0], -previous[1]):
+                    scored[canonical] = (distance, confidence)
+        if not scored:
+            return None
+        best_distance = min(distance for distance, _ in scored.values())
+        closest = [c for c, (distance, _) in scored.items() if distance == best_distance]
+        if len(closest) > 1:
+            # "audi" ligger lika nära "audi a4" som "audi a6" – gissa inte
+            return None
+        canonical = closest[0]
+        confidence = scored[canonical][1]
+        if confidence < self.min_confidence:
+            return None
+        return CarModelMatch(canonical, self.names[canonical], confidence, "fuzzy")
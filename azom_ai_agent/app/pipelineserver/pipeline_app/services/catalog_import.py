@@ -0,0 +1,263 @@
+# Bulk catalog import for AZOM Pipeline Server
+
+"""Inkrementell massimport av katalogdata till databasen.
+
+Raderna strömmas in (t.ex. direkt från en `csv.DictReader`) och varje rad får
+en innehållshash (SHA-256 över de importerade fälten). Befintliga rader läses
+en gång som ett index nyckel -> (id, hash), så att en omimport bara skriver
+rader som faktiskt ändrats. Nya och ändrade rader skrivs i batchar med
+executemany (`insert`/`update` med parameterlistor) inom en enda transaktion.
+
+En omimport av en oförändrad export kostar därför bara CSV-parsning och
+hashning, utan en enda skrivning.
+
+Produktnamn och SKU är unika i databasen. Rader som byter namn eller SKU (och
+nya rader vars namn eller SKU fortfarande hålls av en befintlig rad) skrivs
+därför först med ett tillfälligt namn och utan SKU och får sina riktiga
+värden i ett sista steg före commit – annars skulle t.ex. två produkter som
+byter namn med varandra bryta unikhetsvillkoret mitt i importen.
+"""
+from __future__ import annotations
+
+import hashlib
+import itertools
+import json
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.logger import get_logger
+
+from ..models.database_models import FAQ, Product, ProductCarModel, ProductTag
+from .car_model_resolver import normalize_model
+from .product_catalog import normalize_key
+
+__all__ = ["BulkCatalogImporter", "content_hash", "product_values", "tag_keys"]
+
+logger = get_logger(__name__)
+
+_EXTRA_FIELDS = ("success_rate", "installation_time", "canbus_required")
+
+# Tillfälligt namn för rader vars riktiga namn/SKU skrivs i sista steget
+_PENDING_NAME = "__catalog_import_pending_{}__"
+
+
+def content_hash(values: Dict[str, Any]) -> str:
+    """SHA-256 över en rad i kanonisk JSON-form (sorterade nycklar)."""
+    raw = json.dumps(values, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def tag_keys(tags: Iterable[str]) -> List[str]:
+    """Normaliserade, unika taggar för kopplingstabellen `product_tags`."""
+    return list(dict.fromkeys(key for key in (normalize_key(t) for t in tags) if key))
+
+
+def product_values(name: str, data: Dict[str, Any]) -> Tuple[Dict[str, Any], List[Tuple[str, str]]]:
+    """Kolumnvärden (inkl. `content_hash`) och bilmodellkopplingar (id, namn) för en produkt i katalogformat."""
+    links: Dict[str, str] = {}
+    for model in data.get("compatible_models") or []:
+        canonical = normalize_model(model)
+        if canonical:
+            links.setdefault(canonical, model.strip())
+    values = {
+        "name": name,
+        "normalized_name": normalize_key(name),
+        "description": data.get("description") or "",
+        "price": data.get("price_sek"),
+        "category": data.get("product_type"),
+        "sku": data.get("sku") or None,
+        "vendor": data.get("vendor"),
+        "tags": list(data.get("tags") or []),
+        "barcode": data.get("barcode"),
+        "extra": {k: data.get(k) for k in _EXTRA_FIELDS if data.get(k) is not None},
+    }
+    link_list = sorted(links.items())
+    values["content_hash"] = content_hash({**values, "car_models": link_list})
+    return values, link_list
+
+
+class BulkCatalogImporter:
+    """Skriver produkter och FAQ till databasen i batchar, bara ändrade rader."""
+
+    def __init__(self, session_factory: Optional[Callable[[], Session]] = None, batch_size: int = 2000):
+        """
+        Args:
+            session_factory: Fabrik för SQLAlchemy-sessioner (standard `database.SessionLocal`)
+            batch_size: Antal rader per executemany-anrop
+        """
+        if session_factory is None:
+            from ..database import SessionLocal
+            session_factory = SessionLocal
+        self._session_factory = session_factory
+        self.batch_size = max(1, batch_size)
+
+    @staticmethod
+    def _report(counts: Dict[str, int], started: float) -> Dict[str, Any]:
+        seconds = time.perf_counter() - started
+        rows = sum(counts.values())
+        return {
+            **counts,
+            "rows": rows,
+            "seconds": round(seconds, 3),
+            "rows_per_sec": round(rows / seconds, 1) if seconds > 0 else float(rows),
+        }
+
+    # --- Produkter ---------------------------------------------------------
+
+    def import_products(self, products: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Importerar produkter i katalogformat (som i `products.json`).
+
+        Produkter matchas på SKU, annars på namn. Rader utan namn och dubbletter
+        inom samma import räknas som `skipped`. Namn och SKU får bytas mellan
+        produkter i samma import.
+
+        Returns:
+            `inserted`, `updated`, `unchanged`, `skipped`, `rows`, `seconds` och `rows_per_sec`
+        """
+        started = time.perf_counter()
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0, "skipped": 0}
+        with self._session_factory() as session:
+            by_sku: Dict[str, Tuple[int, Optional[str]]] = {}
+            by_name: Dict[str, Tuple[int, Optional[str]]] = {}
+            keys: Dict[int, Tuple[str, Optional[str]]] = {}
+            for pid, sku, name, digest in session.execute(
+                select(Product.id, Product.sku, Product.name, Product.content_hash)
+            ):
+                if sku:
+                    by_sku[sku] = (pid, digest)
+                by_name[name] = (pid, digest)
+                keys[pid] = (name, sku)
+
+            seen_skus, seen_names, matched = set(), set(), set()
+            pending = itertools.count()
+            inserts: List[Tuple[Dict[str, Any], List[Tuple[str, str]], Optional[Dict[str, Any]]]] = []
+            updates: List[Tuple[Dict[str, Any], List[Tuple[str, str]], Optional[Dict[str, Any]]]] = []
+            renames: List[Dict[str, Any]] = []
+            for data in products:
+                name = (data.get("name") or "").strip()
+                sku = data.get("sku") or None
+                if not name or name in seen_names or (sku and sku in seen_skus):
+                    counts["skipped"] += 1
+                    continue
+                seen_names.add(name)
+                if sku:
+                    seen_skus.add(sku)
+
+                values, links = product_values(name, data)
+                existing = (by_sku.get(sku) if sku else None) or by_name.get(name)
+                if existing is not None and existing[0] in matched:
+                    # Produkten har redan matchats av en tidigare rad (via SKU resp. namn)
+                    existing = None
+                if existing is not None and existing[1] == values["content_hash"]:
+                    matched.add(existing[0])
+                    counts["unchanged"] += 1
+                    continue
+                if existing is None:
+                    held = name in by_name or (sku is not None and sku in by_sku)
+                else:
+                    matched.add(existing[0])
+                    held = keys[existing[0]] != (name, sku)
+                final = None
+                if held:
+                    # Namn/SKU kan hållas av en annan rad tills den skrivits: skriv dem sist
+                    final = {"name": name, "sku": sku}
+                    values = {**values, "name": _PENDING_NAME.format(next(pending)), "sku": None}
+                if existing is None:
+                    inserts.append((values, links, final))
+                    counts["inserted"] += 1
+                else:
+                    updates.append(({"id": existing[0], **values}, links, final))
+                    counts["updated"] += 1
+                if len(inserts) + len(updates) >= self.batch_size:
+                    self._flush_products(session, inserts, updates, renames)
+            self._flush_products(session, inserts, updates, renames)
+            if renames:
+                session.execute(update(Product), renames)
+            session.commit()
+        report = self._report(counts, started)
+        logger.info("Produktimport klar", extra=report)
+        return report
+
+    @staticmethod
+    def _flush_products(session: Session, inserts: List, updates: List, renames: List) -> None:
+        """Skriver väntande batchar, samlar slutliga namn/SKU i `renames` och tömmer listorna."""
+        written: List[Tuple[int, Dict[str, Any], List[Tuple[str, str]]]] = []
+        if updates:
+            # ORM-massuppdatering per primärnyckel (executemany)
+            session.execute(update(Product), [values for values, _, _ in updates])
+            ids = [values["id"] for values, _, _ in updates]
+            session.execute(delete(ProductCarModel).where(ProductCarModel.product_id.in_(ids)))
+            session.execute(delete(ProductTag).where(ProductTag.product_id.in_(ids)))
+            written.extend((values["id"], values, links) for values, links, _ in updates)
+            renames.extend({"id": values["id"], **final} for values, _, final in updates if final)
+        if inserts:
+            ids = session.scalars(
+                insert(Product).returning(Product.id, sort_by_parameter_order=True),
+                [values for values, _, _ in inserts],
+            ).all()
+            written.extend((pid, values, links) for pid, (values, links, _) in zip(ids, inserts, strict=True))
+            renames.extend({"id": pid, **final} for pid, (_, _, final) in zip(ids, inserts, strict=True) if final)
+        link_rows = [
+            {"product_id": pid, "car_model_id": cid, "car_model_name": label}
+            for pid, _, links in written for cid, label in links
+        ]
+        tag_rows = [{"product_id": pid, "tag": tag} for pid, values, _ in written for tag in tag_keys(values["tags"])]
+        if link_rows:
+            session.execute(insert(ProductCarModel), link_rows)
+        if tag_rows:
+            session.execute(insert(ProductTag), tag_rows)
+        inserts.clear()
+        updates.clear()
+
+    # --- FAQ ---------------------------------------------------------------
+
+    def import_faq(self, items: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """Importerar FAQ-poster (`question`, `answer`, valfri `category`), nyckel: frågan."""
+        started = time.perf_counter()
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0, "skipped": 0}
+        with self._session_factory() as session:
+            existing = {
+                question: (fid, digest)
+                for fid, question, digest in session.execute(select(FAQ.id, FAQ.question, FAQ.content_hash))
+            }
+            seen = set()
+            inserts: List[Dict[str, Any]] = []
+            updates: List[Dict[str, Any]] = []
+            for item in items:
+                question = (item.get("question") or "").strip()
+                answer = (item.get("answer") or "").strip()
+                if not question or not answer or question in seen:
+                    counts["skipped"] += 1
+                    continue
+                seen.add(question)
+                values = {"question": question, "answer": answer, "category": item.get("category")}
+                values["content_hash"] = content_hash(values)
+                current = existing.get(question)
+                if current is None:
+                    inserts.append(values)
+                    counts["inserted"] += 1
+                elif current[1] == values["content_hash"]:
+                    counts["unchanged"] += 1
+                else:
+                    updates.append({"id": current[0], **values})
+                    counts["updated"] += 1
+                if len(inserts) + len(updates) >= self.batch_size:
+                    self._flush_faq(session, inserts, updates)
+            self._flush_faq(session, inserts, updates)
+            session.commit()
+        report = self._report(counts, started)
+        logger.info("FAQ-import klar", extra=report)
+        return report
+
+    @staticmethod
+    def _flush_faq(session: Session, inserts: List, updates: List) -> None:
+        if updates:
+            session.execute(update(FAQ), updates)
+        if inserts:
+            session.execute(insert(FAQ), inserts)
+        inserts.clear()
+        updates.clear()
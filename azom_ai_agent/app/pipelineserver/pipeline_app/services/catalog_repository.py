@@ -0,0 +1,228 @@
+# SQLite catalog repository for AZOM Pipeline Server
+
+"""Produktkatalog i SQLite som alternativ backend till `products.json`.
+
+Uppslag görs som indexsökningar (normaliserat namn, SKU, kanoniskt
+bilmodell-id i kopplingstabellen `product_car_models`, normaliserad tagg i
+`product_tags`) i stället för att
+hela katalogen läses in, så minnesanvändningen är oberoende av katalogens
+storlek. Endast listan över distinkta bilmodeller hålls i minnet, för
+fuzzy-upplösning via `CarModelResolver`. Frågorna byggs med SQLAlchemy utan
+databasspecifika funktioner och fungerar därför även mot Postgres.
+"""
+from __future__ import annotations
+
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from app.logger import get_logger
+
+from ..models.database_models import Product, ProductCarModel, ProductTag
+from .car_model_resolver import CarModelMatch, CarModelResolver, normalize_model
+from .catalog_import import product_values, tag_keys
+from .product_catalog import normalize_key
+
+__all__ = ["SQLCatalogRepository"]
+
+logger = get_logger(__name__)
+
+class SQLCatalogRepository:
+    """Läser och skriver katalogen i databasens `products`/`product_car_models`."""
+
+    def __init__(self, session_factory: Optional[Callable[[], Session]] = None, resolver_ttl: float = 2.0):
+        """
+        Args:
+            session_factory: Fabrik för SQLAlchemy-sessioner (standard `database.SessionLocal`)
+            resolver_ttl: Hur ofta (sekunder) listan över bilmodeller kontrolleras för ändringar
+        """
+        if session_factory is None:
+            from ..database import SessionLocal
+            session_factory = SessionLocal
+        self._session_factory = session_factory
+        self._resolver_ttl = resolver_ttl
+        self._resolver: Optional[CarModelResolver] = None
+        self._resolver_stamp: Optional[tuple] = None
+        self._resolver_checked = 0.0
+
+    # --- Skrivning -------------------------------------------------------
+
+    def upsert_products(self, products: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Lägger till eller uppdaterar produkter (nyckel: SKU, annars namn).
+        Kolumnerna, inklusive `content_hash`, byggs som i `BulkCatalogImporter`
+        så att en senare massimport känner igen oförändrade rader.
+
+        Returns:
+            Antal `inserted`, `updated` och `skipped` (rader utan namn)
+        """
+        counts = {"inserted": 0, "updated": 0, "skipped": 0}
+        with self._session_factory() as session:
+            for data in products:
+                name = (data.get("name") or "").strip()
+                if not name:
+                    counts["skipped"] += 1
+                    continue
+                row = self._find_existing(session, data.get("sku"), name)
+                if row is None:
+                    row = Product(name=name)
+                    session.add(row)
+                    counts["inserted"] += 1
+                else:
+                    counts["updated"] += 1
+                self._apply(row, name, data)
+                # Flush per rad så att efterföljande uppslag på namn/SKU ser raden
+                session.flush()
+            session.commit()
+        self._resolver_checked = 0.0
+        return counts
+
+    @staticmethod
+    def _find_existing(session: Session, sku: Optional[str], name: str) -> Optional[Product]:
+        if sku:
+            row = session.scalars(select(Product).where(Product.sku == sku)).first()
+            if row is not None:
+                return row
+        return session.scalars(select(Product).where(Product.name == name)).first()
+
+    @staticmethod
+    def _apply(row: Product, name: str, data: Dict[str, Any]) -> None:
+        values, links = product_values(name, data)
+        for column, value in values.items():
+            setattr(row, column, value)
+        existing = {link.car_model_id: link for link in row.car_models}
+        row.car_models = [
+            existing.get(cid) or ProductCarModel(car_model_id=cid, car_model_name=label)
+            for cid, label in links
+        ]
+        existing_tags = {link.tag: link for link in row.tag_links}
+        row.tag_links = [existing_tags.get(tag) or ProductTag(tag=tag) for tag in tag_keys(values["tags"])]
+
+    # --- Läsning ---------------------------------------------------------
+
+    def count(self) -> int:
+        with self._session_factory() as session:
+            return session.scalar(select(func.count(Product.id))) or 0
+
+    def find_by_name(self, name: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Indexsökning på normaliserat produktnamn."""
+        key = normalize_key(name)
+        if not key:
+            return None
+        with self._session_factory() as session:
+            row = session.scalars(
+                select(Product).where(Product.normalized_name == key).order_by(Product.id).limit(1)
+            ).first()
+            return row.to_catalog_dict() if row else None
+
+    def find_by_sku(self, sku: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Indexsökning på SKU."""
+        if not sku:
+            return None
+        with self._session_factory() as session:
+            row = session.scalars(select(Product).where(Product.sku == sku)).first()
+            return row.to_catalog_dict() if row else None
+
+    def resolve_car_model(self, car_model: Optional[str]) -> Optional[CarModelMatch]:
+        """Kanoniskt bilmodell-id med konfidens för fritext, eller None."""
+        return self._get_resolver().resolve(car_model)
+
+    def car_models(self) -> Dict[str, str]:
+        """Alla kanoniska bilmodeller i databasen: id -> visningsnamn."""
+        return dict(self._get_resolver().names)
+
+    def find_by_car_model(self, car_model: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Första kompatibla produkt via kopplingstabellens index på bilmodell-id."""
+        if not car_model:
+            return None
+        with self._session_factory() as session:
+            row = self._first_for_model(session, normalize_model(car_model))
+            if row is None:
+                match = self.resolve_car_model(car_model)
+                if match is not None:
+                    row = self._first_for_model(session, match.canonical_id)
+            return row.to_catalog_dict() if row else None
+
+    @staticmethod
+    def _first_for_model(session: Session, car_model_id: str) -> Optional[Product]:
+        return session.scalars(
+            select(Product)
+            .join(ProductCarModel, ProductCarModel.product_id == Product.id)
+            .where(ProductCarModel.car_model_id == car_model_id)
+            .order_by(Product.id)
+            .limit(1)
+        ).first()
+
+    def query(
+        self,
+        car_model: Optional[str] = None,
+        tags: Optional[Iterable[str]] = None,
+        vendors: Optional[Iterable[str]] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        prefer_vendor: Optional[str] = "azom",
+        limit: Optional[int] = 20,
+    ) -> Dict[str, Any]:
+        """Flerkriteriefråga med samma semantik som `CompatibilityMatrix.query`."""
+        stmt = select(Product)
+        car_model_id = None
+        if car_model:
+            match = self.resolve_car_model(car_model)
+            car_model_id = match.canonical_id if match else None
+            if car_model_id is None:
+                return {"car_model_id": None, "total": 0, "products": []}
+            stmt = stmt.join(ProductCarModel, ProductCarModel.product_id == Product.id).where(
+                ProductCarModel.car_model_id == car_model_id
+            )
+        for tag in tags or ():
+            stmt = stmt.where(
+                select(ProductTag.id)
+                .where(ProductTag.product_id == Product.id, ProductTag.tag == normalize_key(tag))
+                .exists()
+            )
+        vendor_keys = [normalize_key(v) for v in vendors or ()]
+        if vendor_keys:
+            stmt = stmt.where(func.lower(Product.vendor).in_(vendor_keys))
+        if min_price is not None:
+            stmt = stmt.where(Product.price >= min_price)
+        if max_price is not None:
+            stmt = stmt.where(Product.price <= max_price)
+
+        preferred = normalize_key(prefer_vendor)
+        order = [Product.price.is_(None), Product.price, Product.id]
+        if preferred:
+            order.insert(0, case((func.lower(Product.vendor) == preferred, 0), else_=1))
+        with self._session_factory() as session:
+            total = session.scalar(select(func.count()).select_from(stmt.subquery())) or 0
+            page = stmt.order_by(*order)
+            if limit is not None:
+                page = page.limit(limit)
+            products = [row.to_catalog_dict() for row in session.scalars(page)]
+        return {"car_model_id": car_model_id, "total": total, "products": products}
+
+    def _get_resolver(self) -> CarModelResolver:
+        """Resolver över distinkta bilmodeller; byggs om när kopplingstabellen ändrats."""
+        now = time.monotonic()
+        if self._resolver is not None and now - self._resolver_checked < self._resolver_ttl:
+            return self._resolver
+        self._resolver_checked = now
+        with self._session_factory() as session:
+            stamp = session.execute(
+                select(func.count(ProductCarModel.id), func.max(ProductCarModel.id))
+            ).one()
+            if self._resolver is None or tuple(stamp) != self._resolver_stamp:
+                # Första visningsnamnet per modell-id (portabelt, utan icke-aggregerad GROUP BY-kolumn)
+                first_ids = select(func.min(ProductCarModel.id)).group_by(ProductCarModel.car_model_id)
+                names: List[str] = list(
+                    session.scalars(
+                        select(ProductCarModel.car_model_name)
+                        .where(ProductCarModel.id.in_(first_ids))
+                        .order_by(ProductCarModel.id)
+                    )
+                )
+                self._resolver = CarModelResolver(names)
+                self._resolver_stamp = tuple(stamp)
+                logger.info("Bilmodellindex byggt från databasen", extra={"models": len(names)})
+        return self._resolver
@@ -0,0 +1,169 @@
+# Compatibility matrix for AZOM Pipeline Server
+
+"""Förberäknad produkt × bilmodell-matris för flerkriteriefrågor.
+
+Produkterna sorteras en gång på pris och får en bitposition var (billigast
+först). Varje bilmodell, tagg och leverantör blir ett bitset (Python-int) över
+produkterna, och pris lagras kolumnärt i en sorterad `array`. En fråga som
+"kompatibel med Volvo XC60, tagg premium, under 5000 kr, AZOM först" blir då:
+
+    modell_bits & tagg_bits & prisprefix & leverantörsbits
+
+där bitoperationerna körs över maskinord i C. Prisfilter är ett prefix av
+bitpositioner (bisect), och eftersom bitordningen är prisordning kommer
+träffarna ut sorterade på pris utan extra sortering.
+"""
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from .car_model_resolver import CarModelResolver, normalize_model
+
+__all__ = ["CompatibilityMatrix"]
+
+_NO_PRICE = float("inf")
+
+
+def _norm(value: Optional[str]) -> str:
+    return " ".join((value or "").split()).lower()
+
+
+def _bits_from_positions(positions: Iterable[int], size: int) -> int:
+    """Bygger ett bitset i ett svep via bytearray (undviker O(n) storheltalsoperationer)."""
+    buffer = bytearray((size + 7) // 8)
+    for pos in positions:
+        buffer[pos >> 3] |= 1 << (pos & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def _iter_bits(bits: int) -> Iterator[int]:
+    """Bitpositioner i stigande ordning (64-bitarsord, nollord hoppas över)."""
+    if not bits:
+        return
+    size = (bits.bit_length() + 63) // 64 * 8
+    words = memoryview(bits.to_bytes(size, "little")).cast("Q")
+    for index, word in enumerate(words):
+        base = index * 64
+        while word:
+            low = word & -word
+            yield base + low.bit_length() - 1
+            word ^= low
+
+
+class CompatibilityMatrix:
+    """Bitset-index över produkter per bilmodell, tagg och leverantör, plus priskolumn."""
+
+    def __init__(self, products: Sequence[Dict[str, Any]], resolver: Optional[CarModelResolver] = None):
+        """
+        Args:
+            products: Produkter i katalogformat (`name`, `price_sek`, `vendor`, `tags`,
+                `compatible_models`)
+            resolver: Resolver för bilmodeller; byggs från produkterna om den saknas
+        """
+        def price_of(p: Dict[str, Any]) -> float:
+            price = p.get("price_sek")
+            return float(price) if isinstance(price, (int, float)) else _NO_PRICE
+
+        # Bitposition = prisrang, så att prisfilter blir ett prefix
+        order = sorted(range(len(products)), key=lambda i: price_of(products[i]))
+        self.products: List[Dict[str, Any]] = [products[i] for i in order]
+        self.prices = array("d", (price_of(p) for p in self.products))
+        self.resolver = resolver or CarModelResolver(
+            m for p in self.products for m in p.get("compatible_models") or []
+        )
+
+        model_positions: Dict[str, List[int]] = defaultdict(list)
+        tag_positions: Dict[str, List[int]] = defaultdict(list)
+        vendor_positions: Dict[str, List[int]] = defaultdict(list)
+        for pos, product in enumerate(self.products):
+            for model in product.get("compatible_models") or []:
+                key = normalize_model(model)
+                if key:
+                    model_positions[key].append(pos)
+            for tag in product.get("tags") or []:
+                tag_positions[_norm(tag)].append(pos)
+            vendor_positions[_norm(product.get("vendor"))].append(pos)
+        size = len(self.products)
+        self.model_bits = {k: _bits_from_positions(v, size) for k, v in model_positions.items()}
+        self.tag_bits = {k: _bits_from_positions(v, size) for k, v in tag_positions.items()}
+        self.vendor_bits = {k: _bits_from_positions(v, size) for k, v in vendor_positions.items()}
+        self.all_bits = (1 << len(self.products)) - 1
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    @property
+    def models(self) -> List[str]:
+        """Kanoniska bilmodell-id:n i matrisen."""
+        return list(self.model_bits)
+
+    def _price_mask(self, min_price: Optional[float], max_price: Optional[float]) -> int:
+        low = bisect_left(self.prices, min_price) if min_price is not None else 0
+        # Produkter utan pris ligger sist och matchar aldrig ett prisfilter
+        priced = bisect_left(self.prices, _NO_PRICE)
+        high = min(bisect_right(self.prices, max_price), priced) if max_price is not None else priced
+        if high <= low:
+            return 0
+        return ((1 << high) - 1) ^ ((1 << low) - 1)
+
+    def _any_of(self, index: Dict[str, int], keys: Iterable[str]) -> int:
+        bits = 0
+        for key in keys:
+            bits |= index.get(_norm(key), 0)
+        return bits
+
+    def query(
+        self,
+        car_model: Optional[str] = None,
+        tags: Optional[Iterable[str]] = None,
+        vendors: Optional[Iterable[str]] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        prefer_vendor: Optional[str] = "azom",
+        limit: Optional[int] = 20,
+    ) -> Dict[str, Any]:
+        """
+        Hämtar produkter som uppfyller alla angivna kriterier.
+
+        Args:
+            car_model: Bilmodell i fritext (löses upp till kanoniskt id)
+            tags: Taggar som alla måste finnas på produkten
+            vendors: Tillåtna leverantörer (någon av)
+            min_price: Lägsta pris i SEK
+            max_price: Högsta pris i SEK
+            prefer_vendor: Leverantör vars produkter sorteras först
+            limit: Max antal produkter i svaret (None = alla)
+
+        Returns:
+            Dictionary med `car_model_id`, `total` och `products` (prissorterade,
+            föredragen leverantör först)
+        """
+        bits = self.all_bits
+        car_model_id = None
+        if car_model:
+            match = self.resolver.resolve(car_model)
+            car_model_id = match.canonical_id if match else None
+            bits &= self.model_bits.get(car_model_id, 0) if car_model_id else 0
+        for tag in tags or ():
+            bits &= self.tag_bits.get(_norm(tag), 0)
+        if vendors:
+            bits &= self._any_of(self.vendor_bits, vendors)
+        if min_price is not None or max_price is not None:
+            bits &= self._price_mask(min_price, max_price)
+
+        total = bits.bit_count()
+        preferred = bits & self.vendor_bits.get(_norm(prefer_vendor), 0) if prefer_vendor else 0
+        positions: List[int] = []
+        for group in (preferred, bits & ~preferred):
+            for pos in _iter_bits(group):
+                if limit is not None and len(positions) >= limit:
+                    break
+                positions.append(pos)
+        return {
+            "car_model_id": car_model_id,
+            "total": total,
+            "products": [self.products[pos] for pos in positions],
+        }
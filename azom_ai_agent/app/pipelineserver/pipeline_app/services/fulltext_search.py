@@ -0,0 +1,255 @@
+# Full-text search for AZOM Pipeline Server
+
+"""Fulltextsökning med SQLite FTS5 över FAQ, produkter och felsökningsguider.
+
+Alla dokument lagras i en FTS5-tabell med kolumnerna `title`, `keywords` och
+`body`. Tokeniseraren är `unicode61` med `remove_diacritics 2`, vilket ger
+skiftlägesokänslig matchning av å/ä/ö och tål att användaren skriver "sakring"
+i stället för "säkring". Frågor delas upp i ord, svenska stoppord tas bort och
+varje ord söks som prefix av sin stam ("säkringen" söks som "säkring*" och
+matchar även "säkringsdosa"). Träffar rankas med BM25 där titel och nyckelord
+väger tyngre än brödtext.
+"""
+from __future__ import annotations
+
+import json
+import re
+import sqlite3
+import threading
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from app.logger import get_logger
+
+__all__ = ["FullTextIndex", "SWEDISH_STOPWORDS", "build_match_query", "query_contains"]
+
+logger = get_logger(__name__)
+
+# unicode61 hanterar å/ä/ö som bokstäver; remove_diacritics 2 viker även ä -> a
+SWEDISH_TOKENIZER = "unicode61 remove_diacritics 2"
+
+# BM25-vikter per kolumn (title, keywords, body)
+_BM25_WEIGHTS = (5.0, 3.0, 1.0)
+
+SWEDISH_STOPWORDS = frozenset(
+    """
+    och att det som en ett är av för på med till den har de inte om ett men var
+    jag du vi ni han hon min mitt mina din ditt dina sin sitt sina kan ska skulle
+    vad hur när var vilken vilket vilka där här så också eller från efter innan
+    mycket något några någon bara alla vara blir blev hade har får fick nu då
+    hej hallå tack undrar snälla vill
+    the a an is are of to in on for my it and or not no how what
+    """.split()
+)
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# Böjningsändelser som tas bort före prefixsökning, längsta först
+_SUFFIXES = ("arna", "erna", "orna", "ande", "ende", "are", "ens", "ets", "en", "et", "na", "ar", "er", "or", "n")
+_VOWELS = frozenset("aeiouyåäö")
+
+
+def _words(text: str) -> List[str]:
+    """Sökbara ord: gemener, utan stoppord och ord med ett tecken."""
+    return [w for w in _WORD.findall((text or "").lower()) if len(w) >= 2 and w not in SWEDISH_STOPWORDS]
+
+
+def _stem(word: str) -> str:
+    """Lätt stamning: en böjningsändelse tas bort ("garantin" -> "garanti", "strömmen" -> "ström")."""
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            stem = word[:-len(suffix)]
+            if len(stem) >= 5 and stem[-1] == stem[-2] and stem[-1] not in _VOWELS:
+                stem = stem[:-1]
+            return stem
+    return word
+
+
+def _fold(word: str) -> str:
+    """Tar bort diakritiska tecken som tokeniseraren (ä -> a)."""
+    return "".join(c for c in unicodedata.normalize("NFKD", word) if not unicodedata.combining(c))
+
+
+def build_match_query(text: str, prefix: bool = True, min_prefix_length: int = 3, match_all: bool = False) -> str:
+    """
+    Bygger ett FTS5 MATCH-uttryck av fritext.
+
+    Orden kombineras med OR (BM25 sköter rankningen), eller med AND om
+    `match_all` är satt. Stoppord och ord med ett tecken tas bort, och ord med
+    minst `min_prefix_length` tecken söks som prefix av sin stam.
+    Returnerar tom sträng om inget sökbart ord återstår.
+    """
+    terms: List[str] = []
+    for word in _words(text):
+        if prefix and len(word) >= min_prefix_length:
+            term = f'"{_stem(word)}"*'
+        else:
+            term = f'"{word}"'
+        if term not in terms:
+            terms.append(term)
+    return (" AND " if match_all else " OR ").join(terms)
+
+
+def query_contains(query: str, phrase: str) -> bool:
+    """
+    Om varje sökbart ord i `phrase` finns i `query`.
+
+    Ord jämförs som indexet gör: utan diakritiska tecken och med stammen som
+    prefix, så nyckelordet "säkring" finns i "sakringen har gått".
+    """
+    words = [_fold(w) for w in _words(query)]
+    needed = [_fold(_stem(w)) if len(w) >= 3 else _fold(w) for w in _words(phrase)]
+    return bool(needed) and all(
+        any(w.startswith(n) if len(n) >= 3 else w == n for w in words) for n in needed
+    )
+
+
+class FullTextIndex:
+    """FTS5-index över dokument av olika slag (`faq`, `product`, `troubleshooting`)."""
+
+    def __init__(self, path: str = ":memory:"):
+        """
+        Args:
+            path: SQLite-fil för indexet, eller ":memory:" för ett index i minnet
+        """
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS documents USING fts5("
+                "kind UNINDEXED, title, keywords, body, payload UNINDEXED, "
+                f"tokenize = '{SWEDISH_TOKENIZER}', prefix = '2 3')"
+            )
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM documents").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def clear(self, kind: Optional[str] = None) -> None:
+        """Tar bort alla dokument, eller bara de av typen `kind`."""
+        with self._lock:
+            if kind is None:
+                self._conn.execute("DELETE FROM documents")
+            else:
+                self._conn.execute("DELETE FROM documents WHERE kind = ?", (kind,))
+            self._conn.commit()
+
+    def add(self, kind: str, documents: Iterable[Dict[str, Any]]) -> int:
+        """
+        Indexerar dokument av typen `kind`.
+
+        Varje dokument är ett dictionary med `title`, `keywords` (str eller lista),
+        `body` (str eller lista) och valfri `payload` som returneras vid träff.
+
+        Returns:
+            Antal indexerade dokument
+        """
+        def as_text(value: Any) -> str:
+            if isinstance(value, (list, tuple)):
+                return " ".join(str(v) for v in value if v)
+            return str(value or "")
+
+        rows = [
+            (
+                kind,
+                as_text(doc.get("title")),
+                as_text(doc.get("keywords")),
+                as_text(doc.get("body")),
+                json.dumps(doc.get("payload"), ensure_ascii=False),
+            )
+            for doc in documents
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO documents (kind, title, keywords, body, payload) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+        return len(rows)
+
+    def add_faq(self, items: Iterable[Dict[str, Any]]) -> int:
+        """Indexerar FAQ-poster (`question`, `answer`)."""
+        return self.add("faq", (
+            {"title": item.get("question"), "body": item.get("answer"), "payload": item}
+            for item in items if item.get("question")
+        ))
+
+    def add_products(self, products: Iterable[Dict[str, Any]]) -> int:
+        """Indexerar produkter (namn, kompatibla modeller/taggar, beskrivning)."""
+        return self.add("product", (
+            {
+                "title": p.get("name"),
+                "keywords": list(p.get("compatible_models") or []) + list(p.get("tags") or []),
+                "body": p.get("description"),
+                "payload": p,
+            }
+            for p in products if p.get("name")
+        ))
+
+    def add_troubleshooting(self, guides: Iterable[Dict[str, Any]]) -> int:
+        """Indexerar felsökningsguider (modell, nyckelord, steg)."""
+        return self.add("troubleshooting", (
+            {
+                "title": g.get("model"),
+                "keywords": g.get("issue_keywords") or [],
+                "body": g.get("steps") or [],
+                "payload": g,
+            }
+            for g in guides
+        ))
+
+    def search(
+        self,
+        query: str,
+        kinds: Optional[Sequence[str]] = None,
+        limit: int = 5,
+        columns: Optional[Sequence[str]] = None,
+        match_all: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        Rankad fulltextsökning.
+
+        Args:
+            query: Fritext från användaren
+            kinds: Begränsa till dokumenttyper, t.ex. ["faq"]
+            limit: Max antal träffar
+            columns: Begränsa matchningen till kolumner, t.ex. ["keywords"]
+            match_all: Kräv att alla sökbara ord matchar (annars räcker ett)
+
+        Returns:
+            Lista med `kind`, `title`, `score` (högre är bättre) och `payload`
+        """
+        match = build_match_query(query, match_all=match_all)
+        if not match or limit <= 0:
+            return []
+        if columns:
+            match = "{" + " ".join(columns) + "} : (" + match + ")"
+        sql = (
+            "SELECT kind, title, payload, bm25(documents, 0, ?, ?, ?, 0) AS rank "
+            "FROM documents WHERE documents MATCH ?"
+        )
+        params: List[Any] = [*_BM25_WEIGHTS, match]
+        if kinds:
+            sql += f" AND kind IN ({','.join('?' * len(kinds))})"
+            params.extend(kinds)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            try:
+                rows = self._conn.execute(sql, params).fetchall()
+            except sqlite3.OperationalError as e:
+                # Bara fel i själva MATCH-uttrycket ger en tom träfflista
+                if not str(e).startswith("fts5:"):
+                    logger.error("Fulltextsökningen misslyckades", extra={"match": match, "error": str(e)})
+                    raise
+                logger.warning("Ogiltigt sökuttryck", extra={"match": match, "error": str(e)})
+                return []
+        return [
+            {"kind": kind, "title": title, "score": -rank, "payload": json.loads(payload)}
+            for kind, title, payload, rank in rows
+        ]
@@ -0,0 +1,131 @@
+# History compactor for AZOM Pipeline Server
+
+"""Retention och komprimering av konversationshistorik.
+
+Per användare behålls högst `max_entries` poster och inga poster äldre än
+`ttl_days`. Allt äldre rullas ihop till en enda sammanfattningspost (antal,
+tidsintervall, vanligaste bilmodeller och produkter samt de senaste frågorna),
+så att både lagring och hämtning per användare har konstant storlek oavsett
+hur gammalt kontot är.
+
+`HistoryCompactor` kör komprimeringen periodiskt i en bakgrundstask;
+`run_once()` kan också anropas direkt.
+"""
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from app.logger import get_logger
+
+from .session_store import SessionStore
+
+__all__ = ["HistoryCompactor", "summarize_entries"]
+
+logger = get_logger(__name__)
+
+# Storlekstak för sammanfattningen, så att den inte växer med kontots ålder
+_TOP_N = 10
+_RECENT_QUERIES = 5
+
+
+def _top(counts: Dict[str, int]) -> Dict[str, int]:
+    return dict(Counter(counts).most_common(_TOP_N))
+
+
+def summarize_entries(previous: Optional[Dict[str, Any]], entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Slår ihop komprimerade poster med en tidigare sammanfattning.
+
+    Sammanfattningen har fast maxstorlek: räknare begränsas till de vanligaste
+    värdena och bara de senaste frågorna sparas.
+    """
+    summary = dict(previous or {})
+    car_models = Counter(summary.get("car_models") or {})
+    products = Counter(summary.get("products") or {})
+    queries: List[str] = list(summary.get("recent_queries") or [])
+    timestamps = [e.get("timestamp") for e in entries if e.get("timestamp")]
+    for entry in entries:
+        if entry.get("car_model"):
+            car_models[str(entry["car_model"])] += 1
+        if entry.get("recommended_product"):
+            products[str(entry["recommended_product"])] += 1
+        query = entry.get("user_input") or entry.get("query") or entry.get("message")
+        if query:
+            queries.append(str(query)[:200])
+
+    first = [t for t in (summary.get("first_timestamp"), min(timestamps, default=None)) if t]
+    last = [t for t in (summary.get("last_timestamp"), max(timestamps, default=None)) if t]
+    return {
+        "entries": int(summary.get("entries") or 0) + len(entries),
+        "first_timestamp": min(first) if first else None,
+        "last_timestamp": max(last) if last else None,
+        "car_models": _top(car_models),
+        "products": _top(products),
+        "recent_queries": queries[-_RECENT_QUERIES:],
+    }
+
+
+class HistoryCompactor:
+    """Tillämpar retention (max antal, TTL) och rullar ihop gamla poster i bakgrunden."""
+
+    def __init__(
+        self,
+        store: SessionStore,
+        max_entries: Optional[int] = 200,
+        ttl_days: Optional[float] = None,
+        interval: float = 300.0,
+        summarize=summarize_entries,
+    ):
+        """
+        Args:
+            store: Historiklagret som komprimeras
+            max_entries: Antal senaste poster som behålls per användare (None = obegränsat)
+            ttl_days: Poster äldre än så rullas ihop (None = ingen TTL)
+            interval: Sekunder mellan körningar i bakgrunden
+            summarize: Funktion (tidigare sammanfattning, poster) -> sammanfattning
+        """
+        self.store = store
+        self.max_entries = max_entries
+        self.ttl_days = ttl_days
+        self.interval = interval
+        self.summarize = summarize
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.compacted = 0
+
+    def run_once(self) -> Dict[str, int]:
+        """En komprimeringsomgång (synkron)."""
+        older_than = None
+        if self.ttl_days:
+            older_than = (datetime.now() - timedelta(days=self.ttl_days)).isoformat()
+        result = self.store.compact(self.summarize, max_entries=self.max_entries, older_than=older_than)
+        self.runs += 1
+        self.compacted += result["entries"]
+        if result["entries"]:
+            logger.info("Historik komprimerad", extra=result)
+        return result
+
+    def start(self) -> None:
+        """Startar den periodiska komprimeringen i aktuell event-loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception:
+                logger.exception("Komprimering av historik misslyckades")
+            await asyncio.sleep(self.interval)
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,281 @@
+# Install guide store for AZOM Pipeline Server
+
+"""Förberäknade installationsguider per kanonisk bilmodell.
+
+Ett offline-jobb (`GuideBuilder.rebuild`, `tools/precompute_install_guides.py`)
+går igenom alla kanoniska bilmodeller i katalogen och sparar rekommenderad
+produkt och de bästa RAG-stegen i en kompakt SQLite-fil (`GuideStore`).
+Servern läser in filen i ett dict, så att `/pipeline/install` kan svara med
+ett O(1)-uppslag för generella installationsfrågor om kända modeller. Varningar
+och alternativ byggs vid uppslaget av samma `compose` som den live-orkestrerade
+vägen, så att erfarenhetsnivån fortfarande påverkar svaret.
+
+Ombyggnaden är inkrementell: varje guide har ett fingeravtryck av sin produkt
+och av RAG-källorna (alla datafiler utom produktkatalogen). Bara modeller vars
+fingeravtryck ändrats söks om; borttagna modeller tas bort. Guiderna används
+bara när lagrets dataversion matchar datakatalogen – annars svarar servern
+live tills nästa ombyggnad.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from app.logger import get_logger
+
+from .result_cache import canonical_text
+
+__all__ = ["GUIDE_QUERY", "PRECOMPUTED", "GuideBuilder", "GuideStore", "is_generic_question"]
+
+logger = get_logger(__name__)
+
+# Frågan som guiderna förberäknas för och cachestatusen för svar från lagret
+GUIDE_QUERY = "installation"
+PRECOMPUTED = "PRECOMPUTED"
+
+# Ord i generella installationsfrågor ("Hur installerar jag i min Volvo V70?")
+_GENERIC_WORDS = frozenset({
+    "hur", "gör", "jag", "man", "vi", "du", "kan", "ska", "i", "på", "till", "för", "min", "mitt",
+    "en", "ett", "av", "med", "bil", "bilen", "installera", "installerar", "installation",
+    "installationen", "installationsguide", "montera", "monterar", "montering", "monteringen",
+    "guide", "instruktion", "instruktioner", "steg", "install", "how", "to", "do", "my", "in", "a",
+})
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS guides ("
+    " canonical_id TEXT PRIMARY KEY,"
+    " name TEXT NOT NULL,"
+    " fingerprint TEXT NOT NULL,"
+    " guide TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+)
+
+
+def is_generic_question(user_input: Optional[str], car_model: Optional[str] = None) -> bool:
+    """True om frågan bara består av generella installationsord (och bilmodellen)."""
+    words = set(canonical_text(user_input).split()) - set(canonical_text(car_model).split())
+    return words <= _GENERIC_WORDS
+
+
+class GuideStore:
+    """Förberäknade guider i en SQLite-fil, inlästa i minnet för O(1)-uppslag."""
+
+    def __init__(self, path: str, check_interval: float = 2.0):
+        """
+        Args:
+            path: SQLite-fil för guiderna (skapas vid första skrivningen)
+            check_interval: Sekunder mellan kontroller om filen skrivits om
+        """
+        self.path = path
+        self.check_interval = check_interval
+        self._guides: Dict[str, Dict[str, Any]] = {}
+        self._version: Optional[str] = None
+        self._file_stamp: Optional[Tuple[int, int]] = None
+        self._last_check = float("-inf")
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5.0)
+        with conn:
+            for statement in _SCHEMA:
+                conn.execute(statement)
+        return conn
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _refresh(self) -> None:
+        if time.monotonic() - self._last_check < self.check_interval:
+            return
+        with self._lock:
+            self._last_check = time.monotonic()
+            stamp = self._stat()
+            if stamp == self._file_stamp:
+                return
+            guides: Dict[str, Dict[str, Any]] = {}
+            version = None
+            if stamp is not None:
+                conn = self._connect()
+                try:
+                    for canonical_id, name, fingerprint, guide in conn.execute(
+                        "SELECT canonical_id, name, fingerprint, guide FROM guides"
+                    ):
+                        guides[canonical_id] = {"name": name, "fingerprint": fingerprint, **json.loads(guide)}
+                    row = conn.execute("SELECT value FROM meta WHERE key = 'data_version'").fetchone()
+                    version = row[0] if row else None
+                finally:
+                    conn.close()
+                logger.info("Installationsguider inlästa", extra={"guides": len(guides), "version": version})
+            self._guides, self._version, self._file_stamp = guides, version, stamp
+
+    def __len__(self) -> int:
+        self._refresh()
+        return len(self._guides)
+
+    @property
+    def version(self) -> Optional[str]:
+        """Dataversionen som guiderna byggdes mot (None = inga guider)."""
+        self._refresh()
+        return self._version
+
+    def get(self, canonical_id: str) -> Optional[Dict[str, Any]]:
+        """Guiden (`name`, `product`, `installation_steps`) för ett kanoniskt bilmodell-id."""
+        self._refresh()
+        return self._guides.get(canonical_id)
+
+    def fingerprints(self) -> Dict[str, str]:
+        """Fingeravtryck per lagrad modell."""
+        self._refresh()
+        return {canonical_id: guide["fingerprint"] for canonical_id, guide in self._guides.items()}
+
+    def write(
+        self,
+        guides: Dict[str, Tuple[str, str, Dict[str, Any]]],
+        removed: Iterable[str],
+        version: str,
+    ) -> None:
+        """
+        Sparar nya/ändrade guider, tar bort inaktuella och sätter dataversionen – i en transaktion.
+
+        Args:
+            guides: canonical_id -> (namn, fingeravtryck, guide)
+            removed: Modeller som inte längre finns i katalogen
+            version: Dataversionen som guiderna nu motsvarar
+        """
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO guides (canonical_id, name, fingerprint, guide) VALUES (?, ?, ?, ?)",
+                    [
+                        (canonical_id, name, fingerprint, json.dumps(guide, ensure_ascii=False))
+                        for canonical_id, (name, fingerprint, guide) in guides.items()
+                    ],
+                )
+                conn.executemany("DELETE FROM guides WHERE canonical_id = ?", [(c,) for c in removed])
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('data_version', ?)", (version,))
+        finally:
+            conn.close()
+        self._last_check = float("-inf")
+        self._file_stamp = None
+
+    def stats(self) -> Dict[str, Any]:
+        self._refresh()
+        return {"guides": len(self._guides), "version": self._version, "path": self.path}
+
+
+class GuideBuilder:
+    """Bygger om `GuideStore` inkrementellt från katalogen och RAG-indexet."""
+
+    def __init__(
+        self,
+        orchestration: Any,
+        store: GuideStore,
+        data_version: Callable[[], str],
+        sources_version: Callable[[], str],
+        concurrency: int = 4,
+        interval: float = 0.0,
+    ):
+        """
+        Args:
+            orchestration: `AZOMOrchestrationService` (produkt, RAG-steg och katalogens modeller)
+            store: Lagret som skrivs
+            data_version: Stämpel över alla datafiler (guiderna används bara när den matchar)
+            sources_version: Stämpel över RAG-källorna (ingår i varje guides fingeravtryck)
+            concurrency: Antal modeller som söks samtidigt
+            interval: Sekunder mellan kontroller i bakgrunden (`start`)
+        """
+        self.orchestration = orchestration
+        self.store = store
+        self.data_version = data_version
+        self.sources_version = sources_version
+        self.concurrency = max(1, concurrency)
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+
+    @staticmethod
+    def fingerprint(product: Dict[str, Any], sources: str) -> str:
+        payload = json.dumps([product, sources, GUIDE_QUERY], sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+    async def rebuild(self, force: bool = False) -> Dict[str, Any]:
+        """
+        Bygger guider för nya och ändrade modeller.
+
+        Args:
+            force: Bygg om alla guider oavsett fingeravtryck
+
+        Returns:
+            Antal byggda, oförändrade, borttagna och överhoppade modeller samt tid i sekunder
+        """
+        started = time.perf_counter()
+        version = self.data_version()
+        sources = self.sources_version()
+        models = self.orchestration.knowledge_service.car_models()
+        known = self.store.fingerprints()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        updated: Dict[str, Tuple[str, str, Dict[str, Any]]] = {}
+        skipped = []
+
+        async def build(canonical_id: str, name: str) -> None:
+            async with semaphore:
+                try:
+                    product = await self.orchestration.guide_product(name)
+                except ValueError:
+                    skipped.append(canonical_id)  # Ingen produkt för modellen
+                    return
+                fingerprint = self.fingerprint(product, sources)
+                if not force and known.get(canonical_id) == fingerprint:
+                    return
+                steps = await self.orchestration.guide_steps(name, GUIDE_QUERY)
+                updated[canonical_id] = (name, fingerprint, {"product": product, "installation_steps": steps})
+
+        await asyncio.gather(*(build(canonical_id, name) for canonical_id, name in models.items()))
+        removed = (set(known) - set(models)) | (set(known) & set(skipped))
+        await asyncio.to_thread(self.store.write, updated, removed, version)
+        self.runs += 1
+        report = {
+            "built": len(updated),
+            "unchanged": len(models) - len(updated) - len(skipped),
+            "removed": len(removed),
+            "skipped": len(skipped),
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+        logger.info("Installationsguider byggda", extra=report)
+        return report
+
+    def start(self) -> None:
+        """Startar periodisk ombyggnad (när datafilerna ändrats) i aktuell event-loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if self.store.version != self.data_version():
+                    await self.rebuild()
+            except Exception:
+                logger.exception("Ombyggnad av installationsguider misslyckades")
+            await asyncio.sleep(self.interval)
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
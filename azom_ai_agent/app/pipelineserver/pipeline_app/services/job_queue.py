@@ -0,0 +1,321 @@
+# Job queue for AZOM Pipeline Server
+
+"""Asynkrona jobb för långa pipelinekörningar.
+
+`POST /jobs` sparar jobbet och svarar direkt med ett id; en lokal pool av
+arbetare (`concurrency` asyncio-tasks i serverprocessen) kör jobbet i
+bakgrunden. Klienten pollar `GET /jobs/{id}` eller anger en webhook som får
+jobbet som JSON när det är klart. Långa orkestreringar och batchar håller
+därmed varken en uvicorn-arbetare eller en HTTP-anslutning öppen.
+
+Jobbens tillstånd lagras i SQLite (`JobStore`), så att resultat finns kvar
+efter omstart. Jobb som var köade eller pågick när processen stannade köas om
+vid start. Varje jobb har tider (`queued_ms`, `run_ms`), en timeout och kan
+avbrytas med `DELETE /jobs/{id}`.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+import httpx
+
+from app.logger import get_logger
+
+__all__ = ["JobQueue", "JobStore", "QUEUED", "RUNNING", "SUCCEEDED", "FAILED", "CANCELLED"]
+
+logger = get_logger(__name__)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS jobs ("
+    " id TEXT PRIMARY KEY,"
+    " kind TEXT NOT NULL,"
+    " status TEXT NOT NULL,"
+    " payload TEXT NOT NULL,"
+    " result TEXT,"
+    " error TEXT,"
+    " webhook_url TEXT,"
+    " created_at REAL NOT NULL,"
+    " started_at REAL,"
+    " finished_at REAL)",
+    "CREATE INDEX IF NOT EXISTS ix_jobs_status_created ON jobs (status, created_at)",
+)
+
+
+def _iso(ts: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(ts).isoformat() if ts is not None else None
+
+
+class JobStore:
+    """Jobbtillstånd i en SQLite-fil (WAL), en anslutning per tråd."""
+
+    def __init__(self, path: str, busy_timeout_ms: int = 5000):
+        """
+        Args:
+            path: SQLite-fil för jobben
+            busy_timeout_ms: Hur länge en skrivare väntar på låset innan fel
+        """
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._conn()
+        with conn:
+            for statement in _SCHEMA:
+                conn.execute(statement)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        created, started, finished = row["created_at"], row["started_at"], row["finished_at"]
+        timings = {}
+        if started is not None:
+            timings["queued_ms"] = round((started - created) * 1000, 2)
+        if started is not None and finished is not None:
+            timings["run_ms"] = round((finished - started) * 1000, 2)
+        return {
+            "job_id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "result": json.loads(row["result"]) if row["result"] is not None else None,
+            "error": row["error"],
+            "created_at": _iso(created),
+            "started_at": _iso(started),
+            "finished_at": _iso(finished),
+            "timings": timings,
+        }
+
+    def create(self, kind: str, payload: Dict[str, Any], webhook_url: Optional[str] = None) -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, payload, webhook_url, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, json.dumps(payload, ensure_ascii=False), webhook_url, time.time()),
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Jobbets typ, indata och webhook (för arbetaren)."""
+        row = self._conn().execute(
+            "SELECT kind, status, payload, webhook_url FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"kind": row["kind"], "status": row["status"], "payload": json.loads(row["payload"]),
+                "webhook_url": row["webhook_url"]}
+
+    def mark_running(self, job_id: str) -> bool:
+        """Köat -> pågår; False om jobbet inte längre är köat (t.ex. avbrutet)."""
+        conn = self._conn()
+        with conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ? WHERE id = ? AND status = ?",
+                (RUNNING, time.time(), job_id, QUEUED),
+            )
+        return cursor.rowcount == 1
+
+    def finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ? AND status NOT IN (?, ?, ?)",
+                (status, json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+                 error, time.time(), job_id, *FINISHED),
+            )
+
+    def recover(self) -> List[str]:
+        """Köar om jobb som pågick när processen stannade; returnerar alla köade id:n i ordning."""
+        conn = self._conn()
+        with conn:
+            conn.execute("UPDATE jobs SET status = ?, started_at = NULL WHERE status = ?", (QUEUED, RUNNING))
+        rows = conn.execute("SELECT id FROM jobs WHERE status = ? ORDER BY created_at", (QUEUED,)).fetchall()
+        return [row["id"] for row in rows]
+
+    def purge(self, older_than_days: float) -> int:
+        """Tar bort avslutade jobb äldre än `older_than_days`."""
+        cutoff = (datetime.now() - timedelta(days=older_than_days)).timestamp()
+        conn = self._conn()
+        with conn:
+            cursor = conn.execute(
+                "DELETE FROM jobs WHERE finished_at < ? AND status IN (?, ?, ?)", (cutoff, *FINISHED)
+            )
+        return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._conn().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+
+Handler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+class JobQueue:
+    """Lokal arbetarpool som kör jobb från `JobStore`."""
+
+    def __init__(
+        self,
+        store: JobStore,
+        handlers: Optional[Dict[str, Handler]] = None,
+        concurrency: int = 2,
+        job_timeout: Optional[float] = 3600.0,
+        webhook_timeout: float = 10.0,
+        retention_days: Optional[float] = 7.0,
+    ):
+        """
+        Args:
+            store: Lagring av jobbtillstånd
+            handlers: Jobbtyp -> asynkron funktion (indata -> JSON-serialiserbart resultat)
+            concurrency: Antal jobb som körs samtidigt
+            job_timeout: Max sekunder per jobb (None = ingen gräns)
+            webhook_timeout: Timeout för webhook-anrop
+            retention_days: Avslutade jobb äldre än så tas bort vid start (None = behåll)
+        """
+        self.store = store
+        self.handlers: Dict[str, Handler] = dict(handlers or {})
+        self.concurrency = max(1, concurrency)
+        self.job_timeout = job_timeout
+        self.webhook_timeout = webhook_timeout
+        self.retention_days = retention_days
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._cancelled: Set[str] = set()
+
+    def register(self, kind: str, handler: Handler) -> None:
+        self.handlers[kind] = handler
+
+    @property
+    def started(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self) -> None:
+        """Startar arbetarna och köar om jobb från en tidigare körning."""
+        if self.started:
+            return
+        self._queue = asyncio.Queue()
+        if self.retention_days is not None:
+            await asyncio.to_thread(self.store.purge, self.retention_days)
+        for job_id in await asyncio.to_thread(self.store.recover):
+            self._queue.put_nowait(job_id)
+        loop = asyncio.get_running_loop()
+        self._workers = [loop.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        """Stoppar arbetarna; pågående jobb förblir `running` och köas om vid nästa start."""
+        workers, self._workers = self._workers, []
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    async def submit(self, kind: str, payload: Dict[str, Any], webhook_url: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Sparar och köar ett jobb.
+
+        Raises:
+            ValueError: Okänd jobbtyp
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"Okänd jobbtyp: {kind}")
+        job = await asyncio.to_thread(self.store.create, kind, payload, webhook_url)
+        if self._queue is not None:
+            self._queue.put_nowait(job["job_id"])
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Avbryter ett köat eller pågående jobb; avslutade jobb lämnas orörda."""
+        job = await self.get(job_id)
+        if job is None or job["status"] in FINISHED:
+            return job
+        self._cancelled.add(job_id)
+        await asyncio.to_thread(self.store.finish, job_id, CANCELLED)
+        task = self._running.get(job_id)
+        if task is not None:
+            task.cancel()
+        return await self.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": len(self._workers),
+            "queued_in_memory": self._queue.qsize() if self._queue is not None else 0,
+            "running": len(self._running),
+            "jobs": self.store.counts(),
+        }
+
+    async def _worker(self) -> None:
+        assert self._queue is not None
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception:
+                logger.exception("Jobbkörning misslyckades", extra={"job_id": job_id})
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        if job_id in self._cancelled or not await asyncio.to_thread(self.store.mark_running, job_id):
+            self._cancelled.discard(job_id)
+            return
+        job = await asyncio.to_thread(self.store.load, job_id)
+        handler = self.handlers.get(job["kind"])
+        task = asyncio.ensure_future(handler(job["payload"])) if handler else None
+        status, result, error = FAILED, None, None
+        if task is None:
+            error = f"Okänd jobbtyp: {job['kind']}"
+        else:
+            self._running[job_id] = task
+            try:
+                result = await asyncio.wait_for(task, timeout=self.job_timeout)
+                status = SUCCEEDED
+            except asyncio.TimeoutError:
+                error = "timeout"
+            except asyncio.CancelledError:
+                if job_id not in self._cancelled:
+                    raise  # Arbetaren stoppas
+                status = CANCELLED
+            except Exception as e:
+                error = str(e) or type(e).__name__
+            finally:
+                self._running.pop(job_id, None)
+        self._cancelled.discard(job_id)
+        await asyncio.to_thread(self.store.finish, job_id, status, result, error)
+        logger.info("Jobb klart", extra={"job_id": job_id, "kind": job["kind"], "status": status})
+        if job["webhook_url"]:
+            await self._notify(job["webhook_url"], job_id)
+
+    async def _notify(self, url: str, job_id: str) -> None:
+        job = await self.get(job_id)
+        try:
+            async with httpx.AsyncClient(timeout=self.webhook_timeout) as client:
+                response = await client.post(url, json=job)
+                response.raise_for_status()
+        except Exception as e:
+            logger.warning("Webhook misslyckades", extra={"job_id": job_id, "url": url, "error": str(e)})
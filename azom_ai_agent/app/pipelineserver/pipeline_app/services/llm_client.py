@@ -10,31 +10,157 @@ Environment variables:
 """
 from __future__ import annotations
 
+import asyncio
+import json
 import os
-from typing import List, Dict, Any, Optional, Protocol, runtime_checkable
+import time
+from typing import List, Dict, Any, Optional, Protocol, AsyncIterator, Tuple, runtime_checkable
 import httpx
 from app.config import get_current_config
+from app.core.deadline import DeadlineExceeded, current_deadline
 from app.core.feature_flags import llm_timeout_seconds
 from fastapi import Depends, Request
 from app.core.modes import Mode
 from app.logger import get_logger
 
-__all__ = ["LLMClient", "GroqClient", "OpenAIClient", "get_llm_client", "LLMServiceProtocol"]
+__all__ = [
+    "LLMClient",
+    "GroqClient",
+    "OpenAIClient",
+    "get_llm_client",
+    "LLMServiceProtocol",
+    "run_chat_many",
+]
 
 logger = get_logger("LLMClientFactory")
 
+# OpenAI batch statuses after which the batch no longer changes
+_BATCH_FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+def _apply_generation_params(
+    payload: Dict[str, Any],
+    max_tokens: Optional[int],
+    temperature: Optional[float],
+    stop: Optional[List[str]],
+) -> Dict[str, Any]:
+    """Add OpenAI-style generation bounds to a request payload (only those that are set)."""
+    if max_tokens is not None:
+        payload["max_tokens"] = max_tokens
+    if temperature is not None:
+        payload["temperature"] = temperature
+    if stop:
+        payload["stop"] = stop
+    return payload
+
+
+def _deadline_timeout(default_timeout: float) -> Dict[str, Any]:
+    """Per-request httpx timeout capped by the remaining request deadline.
+
+    Returns an empty dict when no deadline is active so the client's own
+    timeout applies unchanged.
+    """
+    deadline = current_deadline()
+    if deadline is None:
+        return {}
+    remaining = deadline.remaining()
+    if remaining <= 0:
+        raise DeadlineExceeded("Request deadline exceeded before LLM call")
+    return {"timeout": min(float(default_timeout), remaining)}
+
+
+def _extract_reply(data: Dict[str, Any], backend: str, max_tokens: Optional[int]) -> str:
+    """Return the assistant message and log when generation hit the token budget."""
+    choice = data["choices"][0]
+    if choice.get("finish_reason") == "length":
+        usage = data.get("usage") or {}
+        try:
+            logger.warning(
+                "LLM output truncated at max_tokens",
+                extra={
+                    "backend": backend,
+                    "max_tokens": max_tokens,
+                    "prompt_tokens": usage.get("prompt_tokens"),
+                    "completion_tokens": usage.get("completion_tokens"),
+                },
+            )
+        except Exception:
+            pass
+    return choice["message"]["content"].strip()
+
+
+async def run_chat_many(
+    client: Any,
+    message_lists: List[List[Dict[str, str]]],
+    model: Optional[str] = None,
+    concurrency: int = 4,
+    **kwargs: Any,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Run `client.chat` for every message list with bounded parallelism.
+
+    Results are yielded as soon as each call completes (not in input order).
+    Each result carries the input `index`, and either `assistant` or `error`.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def _one(index: int, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                reply = await client.chat(messages, model=model, **kwargs)
+                result: Dict[str, Any] = {"index": index, "assistant": reply}
+            except Exception as e:
+                result = {"index": index, "error": str(e)}
+            result["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            return result
+
+    tasks = [asyncio.ensure_future(_one(i, m)) for i, m in enumerate(message_lists)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Client disconnected mid-stream: don't leave calls running in the background
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
 @runtime_checkable
 class LLMServiceProtocol(Protocol):
     """Protocol for a unified LLM client interface."""
-    async def chat(self, messages: List[Dict[str, str]], model: Optional[str] = None, stream: bool = False) -> str:
+    async def chat(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        stream: bool = False,
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        stop: Optional[List[str]] = None,
+    ) -> str:
         ...
 
+    async def chat_many(
+        self,
+        message_lists: List[List[Dict[str, str]]],
+        model: Optional[str] = None,
+        concurrency: int = 4,
+        **kwargs: Any,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Complete many conversations, yielding results as they finish.
+
+        The default implementation fans out over `chat` with at most
+        `concurrency` requests in flight; backends with a native batch API
+        may override it.
+        """
+        async for result in run_chat_many(self, message_lists, model=model, concurrency=concurrency, **kwargs):
+            yield result
+
     async def aclose(self) -> None:
         ...
 
 
 
-class LLMClient:
+class LLMClient(LLMServiceProtocol):
     """Very small async client for OpenWebUI chat completion requests."""
     """Very small async client for chat completion requests."""
 
@@ -45,7 +171,15 @@ class LLMClient:
         # Reuse a single AsyncClient with keep-alive
         self._client: httpx.AsyncClient | None = None
 
-    async def chat(self, messages: List[Dict[str, str]], model: Optional[str] = None, stream: bool = False) -> str:
+    async def chat(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        stream: bool = False,
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        stop: Optional[List[str]] = None,
+    ) -> str:
         """Send an OpenAI-style chat completion request and return the assistant message string.
 
         Args:
@@ -54,10 +188,14 @@ class LLMClient:
                    whatever is configured in its backend if omitted).
             stream: if True, a streaming response is requested. Only non-streaming is returned
                     to the caller; this flag is mainly for future extension.
+            max_tokens: upper bound on generated tokens (see `feature_flags.generation_budget`).
+            temperature: sampling temperature.
+            stop: stop sequences that end generation early.
         """
         payload: Dict[str, Any] = {"messages": messages, "stream": stream}
         if model:
             payload["model"] = model
+        _apply_generation_params(payload, max_tokens, temperature, stop)
 
         headers = {"Content-Type": "application/json"}
         if self.api_key:
@@ -69,19 +207,19 @@ class LLMClient:
 
         # Ensure the URL is correct for OpenWebUI
         url = f"{self.base_url}/api/chat/completions" if not self.base_url.endswith('/api') else f"{self.base_url}/chat/completions"
-        resp = await self._client.post(url, json=payload, headers=headers)
+        resp = await self._client.post(url, json=payload, headers=headers, **_deadline_timeout(self._timeout))
         resp.raise_for_status()
         data = resp.json()
 
         # OpenAI-style return shape
-        return data["choices"][0]["message"]["content"].strip()
+        return _extract_reply(data, "openwebui", max_tokens)
 
     async def aclose(self) -> None:
         """Close underlying httpx client."""
         if self._client and not self._client.is_closed:
             await self._client.aclose()
 
-class GroqClient:
+class GroqClient(LLMServiceProtocol):
     """Client for Groq Cloud API."""
     
     def __init__(self, config: Dict[str, Any], timeout: int = 30):
@@ -92,12 +230,21 @@ class GroqClient:
         self._timeout = timeout
         self._client: httpx.AsyncClient | None = None
 
-    async def chat(self, messages: List[Dict[str, str]], model: Optional[str] = None, stream: bool = False) -> str:
+    async def chat(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        stream: bool = False,
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        stop: Optional[List[str]] = None,
+    ) -> str:
         payload: Dict[str, Any] = {
             "messages": messages, 
             "model": model or "llama3-8b-8192", # Default Groq model
             "stream": stream
         }
+        _apply_generation_params(payload, max_tokens, temperature, stop)
 
         headers = {
             "Content-Type": "application/json",
@@ -107,10 +254,15 @@ class GroqClient:
         if self._client is None or self._client.is_closed:
             self._client = httpx.AsyncClient(timeout=self._timeout)
 
-        resp = await self._client.post(f"{self.base_url}/chat/completions", json=payload, headers=headers)
+        resp = await self._client.post(
+            f"{self.base_url}/chat/completions",
+            json=payload,
+            headers=headers,
+            **_deadline_timeout(self._timeout),
+        )
         resp.raise_for_status()
         data = resp.json()
-        return data["choices"][0]["message"]["content"].strip()
+        return _extract_reply(data, "groq", max_tokens)
 
     async def aclose(self) -> None:
         if self._client and not self._client.is_closed:
@@ -119,7 +271,7 @@ class GroqClient:
 
 # --- OpenAI Client ---
 
-class OpenAIClient:
+class OpenAIClient(LLMServiceProtocol):
     """Client for OpenAI Chat Completions API."""
 
     def __init__(self, config: Dict[str, Any], timeout: int = 30):
@@ -131,12 +283,21 @@ class OpenAIClient:
         self._timeout = timeout
         self._client: httpx.AsyncClient | None = None
 
-    async def chat(self, messages: List[Dict[str, str]], model: Optional[str] = None, stream: bool = False) -> str:
+    async def chat(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        stream: bool = False,
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        stop: Optional[List[str]] = None,
+    ) -> str:
         payload: Dict[str, Any] = {
             "messages": messages,
             "model": model or self.default_model,
             "stream": stream,
         }
+        _apply_generation_params(payload, max_tokens, temperature, stop)
 
         headers = {
             "Content-Type": "application/json",
@@ -146,10 +307,131 @@ class OpenAIClient:
         if self._client is None or self._client.is_closed:
             self._client = httpx.AsyncClient(timeout=self._timeout)
 
-        resp = await self._client.post(f"{self.base_url}/chat/completions", json=payload, headers=headers)
+        resp = await self._client.post(
+            f"{self.base_url}/chat/completions",
+            json=payload,
+            headers=headers,
+            **_deadline_timeout(self._timeout),
+        )
         resp.raise_for_status()
         data = resp.json()
-        return data["choices"][0]["message"]["content"].strip()
+        return _extract_reply(data, "openai", max_tokens)
+
+    async def chat_many(
+        self,
+        message_lists: List[List[Dict[str, str]]],
+        model: Optional[str] = None,
+        concurrency: int = 4,
+        provider_batch: bool = False,
+        poll_interval: float = 10.0,
+        **kwargs: Any,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Complete many conversations.
+
+        With `provider_batch=True` the OpenAI Batch API is used (JSONL upload,
+        `/batches`, poll until done). That is cheaper for large offline jobs but
+        results only arrive once the whole batch has completed. Otherwise the
+        default bounded-concurrency fan-out over `chat` is used.
+        """
+        if not provider_batch:
+            async for result in run_chat_many(self, message_lists, model=model, concurrency=concurrency, **kwargs):
+                yield result
+            return
+
+        started = time.perf_counter()
+        replies = await self._run_provider_batch(message_lists, model, poll_interval, **kwargs)
+        latency_ms = round((time.perf_counter() - started) * 1000, 2)
+        for index in range(len(message_lists)):
+            result = dict(replies.get(index) or {"error": "Missing result in batch output"})
+            result["index"] = index
+            result["latency_ms"] = latency_ms
+            yield result
+
+    async def _run_provider_batch(
+        self,
+        message_lists: List[List[Dict[str, str]]],
+        model: Optional[str],
+        poll_interval: float,
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        stop: Optional[List[str]] = None,
+    ) -> Dict[int, Dict[str, Any]]:
+        """Submit an OpenAI batch job and wait for its output file."""
+        batch = await self.submit_batch(message_lists, model, max_tokens=max_tokens, temperature=temperature, stop=stop)
+        while batch.get("status") not in _BATCH_FINAL_STATUSES:
+            await asyncio.sleep(poll_interval)
+            batch = await self.get_batch(batch["id"])
+        if batch["status"] != "completed" or not batch.get("output_file_id"):
+            raise RuntimeError(f"OpenAI batch {batch.get('id')} ended with status {batch['status']}")
+        return await self.batch_results(batch, max_tokens=max_tokens)
+
+    def _batch_http(self) -> Tuple[httpx.AsyncClient, Dict[str, str]]:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=self._timeout)
+        return self._client, {"Authorization": f"Bearer {self.api_key}"}
+
+    async def submit_batch(
+        self,
+        message_lists: List[List[Dict[str, str]]],
+        model: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        stop: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """Upload the requests as JSONL and create an OpenAI batch; returns the batch object."""
+        client, headers = self._batch_http()
+        lines = []
+        for index, messages in enumerate(message_lists):
+            body: Dict[str, Any] = {"model": model or self.default_model, "messages": messages}
+            _apply_generation_params(body, max_tokens, temperature, stop)
+            lines.append(json.dumps(
+                {"custom_id": str(index), "method": "POST", "url": "/v1/chat/completions", "body": body},
+                ensure_ascii=False,
+            ))
+        upload = await client.post(
+            f"{self.base_url}/files",
+            files={"file": ("batch.jsonl", "\n".join(lines).encode("utf-8"), "application/jsonl")},
+            data={"purpose": "batch"},
+            headers=headers,
+        )
+        upload.raise_for_status()
+        created = await client.post(
+            f"{self.base_url}/batches",
+            json={
+                "input_file_id": upload.json()["id"],
+                "endpoint": "/v1/chat/completions",
+                "completion_window": "24h",
+            },
+            headers=headers,
+        )
+        created.raise_for_status()
+        batch = created.json()
+        logger.info("OpenAI batch submitted", extra={"batch_id": batch.get("id"), "requests": len(lines)})
+        return batch
+
+    async def get_batch(self, batch_id: str) -> Dict[str, Any]:
+        """Current state of an OpenAI batch (`status`, `output_file_id`, `request_counts`, ...)."""
+        client, headers = self._batch_http()
+        polled = await client.get(f"{self.base_url}/batches/{batch_id}", headers=headers)
+        polled.raise_for_status()
+        return polled.json()
+
+    async def batch_results(self, batch: Dict[str, Any], max_tokens: Optional[int] = None) -> Dict[int, Dict[str, Any]]:
+        """Replies of a completed batch keyed by request index (`assistant` or `error`)."""
+        client, headers = self._batch_http()
+        output = await client.get(f"{self.base_url}/files/{batch['output_file_id']}/content", headers=headers)
+        output.raise_for_status()
+        replies: Dict[int, Dict[str, Any]] = {}
+        for line in output.text.splitlines():
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            response = row.get("response") or {}
+            if row.get("error") or response.get("status_code", 200) >= 400:
+                replies[int(row["custom_id"])] = {"error": str(row.get("error") or response.get("body"))}
+            else:
+                replies[int(row["custom_id"])] = {"assistant": _extract_reply(response["body"], "openai", max_tokens)}
+        return replies
 
     async def aclose(self) -> None:
         if self._client and not self._client.is_closed:
@@ -209,14 +491,28 @@ async def get_llm_client(request: Request = None, config: Dict[str, Any] = Depen
             pass
         return _clients[backend]
 
-    if backend == 'groq':
-        client = GroqClient(config, timeout=timeout)
-    elif backend == 'openwebui':
-        client = LLMClient(config, timeout=timeout)
-    elif backend == 'openai':
-        client = OpenAIClient(config, timeout=timeout)
-    else:
-        raise ValueError(f"Unsupported LLM backend: {backend}")
-    
+    client = _build_client(backend, config, timeout)
     _clients[backend] = client
     return client
+
+
+def _build_client(backend: str, config: Dict[str, Any], timeout: float) -> LLMServiceProtocol:
+    if backend == 'groq':
+        return GroqClient(config, timeout=timeout)
+    if backend == 'openwebui':
+        return LLMClient(config, timeout=timeout)
+    if backend == 'openai':
+        return OpenAIClient(config, timeout=timeout)
+    raise ValueError(f"Unsupported LLM backend: {backend}")
+
+
+def default_llm_client() -> LLMServiceProtocol:
+    """Client for the configured backend, for services built outside request handling.
+
+    Shares the cache of `get_llm_client`, so both return the same client per backend.
+    """
+    config = get_current_config()
+    backend = config.get("LLM_BACKEND", "openwebui").lower()
+    if backend not in _clients:
+        _clients[backend] = _build_client(backend, config, llm_timeout_seconds(None))
+    return _clients[backend]
@@ -1,35 +1,144 @@
 # Memory service for pipeline server
 
-import json
+import asyncio
 import os
+import threading
 from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.core.deadline import current_deadline
+
+from ..config import settings
+from .history_compactor import HistoryCompactor
+from .session_store import SessionStore
+from .write_behind import WriteBehindQueue
+
+_DATA_DIR = os.path.join(os.path.dirname(__file__), '../../data')
+
+# En write-behind-kö per historikfil, delad mellan alla MemoryService-instanser
+_write_queues: Dict[str, WriteBehindQueue] = {}
+
+def default_store_path() -> str:
+    """SQLite-filen för historik och chattsessioner (`MEMORY_STORE_PATH` eller datakatalogen)."""
+    return settings.MEMORY_STORE_PATH or os.path.join(_DATA_DIR, 'user_history.db')
+
+def _queue_for(store: SessionStore) -> WriteBehindQueue:
+    queue = _write_queues.get(store.path)
+    if queue is None:
+        queue = WriteBehindQueue(
+            store.append_many,
+            max_batch=settings.MEMORY_FLUSH_BATCH,
+            flush_interval=settings.MEMORY_FLUSH_INTERVAL_SECONDS,
+            max_queue=settings.MEMORY_QUEUE_MAX,
+            name=f"memory:{os.path.basename(store.path)}",
+        )
+        _write_queues[store.path] = queue
+    return queue
+
+def memory_write_stats() -> Dict[str, Any]:
+    """Ködjup, skrivna och kastade poster per historikfil."""
+    return {queue.name: queue.stats() for queue in _write_queues.values()}
+
+async def flush_memory_writes() -> int:
+    """Stoppar alla write-behind-köer och skriver kvarvarande poster (vid avstängning)."""
+    written = 0
+    for queue in list(_write_queues.values()):
+        written += await queue.stop()
+    return written
 
 class MemoryService:
     """Service för hantering av minne och kontext."""
-    def __init__(self):
-        self.history_path = os.path.join(os.path.dirname(__file__), '../../data/user_history.json')
+    def __init__(self, store: Optional[SessionStore] = None, write_behind: Optional[bool] = None):
+        """
+        Args:
+            store: Historiklager (standard: SQLite-fil enligt `MEMORY_STORE_PATH`)
+            write_behind: Buffra skrivningar och skriv dem i bakgrunden
+                (standard `MEMORY_WRITE_BEHIND`)
+        """
+        # Gammal JSON-historik importeras en gång till det nya lagret
+        self.history_path = os.path.join(_DATA_DIR, 'user_history.json')
+        self._store = store
+        self._store_lock = threading.Lock()
+        self.write_behind = settings.MEMORY_WRITE_BEHIND if write_behind is None else write_behind
+
+    @property
+    def store(self) -> SessionStore:
+        """Historiklagret; skapas (med schema och JSON-import) vid första åtkomsten.
+
+        Uppsättningen är blockerande – från asynkron kod används `open_store()`.
+        """
+        if self._store is None:
+            with self._store_lock:
+                if self._store is None:
+                    store = SessionStore(
+                        default_store_path(),
+                        busy_timeout_ms=settings.SQLITE_BUSY_TIMEOUT_MS,
+                    )
+                    store.import_legacy_json(self.history_path)
+                    self._store = store
+        return self._store
+
+    async def open_store(self) -> SessionStore:
+        """Historiklagret, skapat i en arbetstråd så att event-loopen inte blockeras."""
+        if self._store is not None:
+            return self._store
+        return await asyncio.to_thread(lambda: self.store)
+
+    @property
+    def queue(self) -> WriteBehindQueue:
+        return _queue_for(self.store)
+
+    async def _queue(self) -> WriteBehindQueue:
+        return _queue_for(await self.open_store())
 
     async def save_context(self, context: dict, user_id: str = "default"):
-        # Spara historik per användare
+        # Hoppa över skrivningen om requestens tidsbudget nästan är slut
+        deadline = current_deadline()
+        if deadline is not None and deadline.nearly_expired():
+            deadline.mark_degraded("memory")
+            return {"status": "skipped", "reason": "deadline"}
+        # Spara historik per användare (en INSERT, ingen omskrivning av hela historiken)
         try:
-            if os.path.exists(self.history_path):
-                with open(self.history_path, encoding='utf-8') as f:
-                    history = json.load(f)
-            else:
-                history = {}
-            if user_id not in history:
-                history[user_id] = []
             context["timestamp"] = datetime.now().isoformat()
-            history[user_id].append(context)
-            with open(self.history_path, 'w', encoding='utf-8') as f:
-                json.dump(history, f, ensure_ascii=False, indent=2)
+            if self.write_behind:
+                # Skrivs i bakgrunden inom MEMORY_FLUSH_INTERVAL_SECONDS, utanför requesten
+                if not (await self._queue()).enqueue((user_id, context)):
+                    return {"status": "dropped", "reason": "queue full"}
+                return {"status": "context saved", "queued": True}
+            await asyncio.to_thread((await self.open_store()).append, user_id, context)
             return {"status": "context saved"}
         except Exception as e:
             return {"status": "error", "error": str(e)}
 
-    async def get_history(self, user_id: str = "default"):
-        if not os.path.exists(self.history_path):
-            return []
-        with open(self.history_path, encoding='utf-8') as f:
-            history = json.load(f)
-        return history.get(user_id, [])
+    async def get_history(self, user_id: str = "default", limit: Optional[int] = None, offset: int = 0) -> List[Dict[str, Any]]:
+        """Historik i kronologisk ordning, valfritt paginerad med `limit`/`offset`."""
+        if self.write_behind:
+            # Läs egna skrivningar: töm väntande poster först
+            await (await self._queue()).flush()
+        return await asyncio.to_thread((await self.open_store()).get_history, user_id, limit, offset)
+
+    async def get_recent(self, user_id: str = "default", limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        De senaste posterna plus sammanfattningen av äldre, komprimerade poster.
+
+        Kostnaden är konstant per användare: högst `limit` poster och en sammanfattning.
+
+        Returns:
+            Dictionary med `entries` (kronologiska) och `summary` (eller None)
+        """
+        if self.write_behind:
+            await (await self._queue()).flush()
+        limit = settings.MEMORY_RECENT_ENTRIES if limit is None else limit
+        store = await self.open_store()
+        entries = await asyncio.to_thread(store.latest, user_id, limit)
+        summary = await asyncio.to_thread(store.get_summary, user_id)
+        return {"user_id": user_id, "entries": entries, "summary": summary}
+
+    def compactor(self) -> HistoryCompactor:
+        """Bakgrundskomprimering enligt MEMORY_MAX_ENTRIES_PER_USER och MEMORY_TTL_DAYS."""
+        return HistoryCompactor(
+            self.store,
+            max_entries=settings.MEMORY_MAX_ENTRIES_PER_USER,
+            ttl_days=settings.MEMORY_TTL_DAYS,
+            interval=settings.MEMORY_COMPACT_INTERVAL_SECONDS,
+        )
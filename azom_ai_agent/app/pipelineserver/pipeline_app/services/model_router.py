@@ -0,0 +1,292 @@
+"""Cascade router that picks a small or large LLM per chat request.
+
+The router classifies query complexity with cheap local features (length,
+RAG hit confidence and a keyword-based intent guess) and sends simple lookups
+to a small, fast model. Complex troubleshooting goes straight to the large
+model. When the small model's answer fails a confidence or safety check the
+request is optionally escalated to the large model.
+
+Per-route counters (calls, latency, estimated cost and savings versus sending
+everything to the large model) are kept in memory and exposed via `stats()`.
+"""
+from __future__ import annotations
+
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from app.logger import get_logger
+
+__all__ = ["ModelRouter", "ROUTE_SMALL", "ROUTE_LARGE"]
+
+logger = get_logger(__name__)
+
+ROUTE_SMALL = "small"
+ROUTE_LARGE = "large"
+
+# Ord som tyder på felsökning/komplexa frågor
+_COMPLEX_INTENT = re.compile(
+    r"\b(felsök\w*|fungerar\s+inte|funkar\s+inte|startar\s+inte|problem\w*|felkod\w*|"
+    r"error|fel|varning\w*|kortslut\w*|säkring\w*|can-?bus|blinkar|dör|laddar\s+inte|"
+    r"varför|troubleshoot\w*)\b",
+    re.IGNORECASE,
+)
+# Ord som tyder på enkla uppslag (pris, kompatibilitet, lagerstatus)
+_SIMPLE_INTENT = re.compile(
+    r"\b(pris\w*|kostar|kompatib\w*|passar|finns|lager\w*|artikelnummer|sku|"
+    r"vilken|vilka|öppettider|leverans\w*|garanti\w*)\b",
+    re.IGNORECASE,
+)
+# Fraser som tyder på att modellen är osäker på sitt svar
+_LOW_CONFIDENCE = re.compile(
+    r"(vet\s+inte|är\s+osäker|kan\s+inte\s+svara|har\s+ingen\s+information|"
+    r"i\s+don'?t\s+know|not\s+sure)",
+    re.IGNORECASE,
+)
+
+
+def _estimate_tokens(text: str) -> int:
+    """Grov tokenuppskattning (~4 tecken per token)."""
+    return max(1, len(text) // 4) if text else 0
+
+
+class ModelRouter:
+    """Routes chat requests between a small and a large model."""
+
+    def __init__(
+        self,
+        small_model: Optional[str],
+        large_model: Optional[str] = None,
+        enabled: bool = True,
+        max_simple_words: int = 25,
+        min_rag_confidence: float = 0.6,
+        escalate: bool = True,
+        min_answer_chars: int = 20,
+        small_cost_per_1k: float = 0.0,
+        large_cost_per_1k: float = 0.0,
+        safety_service: Any = None,
+    ):
+        """
+        Args:
+            small_model: Modellnamn för enkla frågor. Om None är kaskaden avstängd.
+            large_model: Modellnamn för komplexa frågor. None = klientens standardmodell.
+            enabled: Slå av/på routing utan att ta bort konfigurationen.
+            max_simple_words: Frågor med fler ord räknas som komplexa.
+            min_rag_confidence: Lägsta RAG-likhet för att en fråga ska räknas som enkel uppslagning.
+            escalate: Eskalera till stor modell om det lilla svaret underkänns.
+            min_answer_chars: Kortare svar från liten modell räknas som lågt förtroende.
+            small_cost_per_1k: Uppskattad kostnad per 1000 tokens för liten modell.
+            large_cost_per_1k: Uppskattad kostnad per 1000 tokens för stor modell.
+            safety_service: Valfri SafetyService vars `validate_llm_output` används vid eskalering.
+        """
+        self.small_model = small_model
+        self.large_model = large_model
+        self.enabled = bool(enabled and small_model)
+        self.max_simple_words = max_simple_words
+        self.min_rag_confidence = min_rag_confidence
+        self.escalate = escalate
+        self.min_answer_chars = min_answer_chars
+        self.small_cost_per_1k = small_cost_per_1k
+        self.large_cost_per_1k = large_cost_per_1k
+        self.safety_service = safety_service
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self.reset_stats()
+
+    @classmethod
+    def from_settings(cls, settings: Any, safety_service: Any = None) -> "ModelRouter":
+        """Bygg en router från pipeline-serverns `Settings`."""
+        return cls(
+            small_model=settings.CASCADE_SMALL_MODEL,
+            large_model=settings.CASCADE_LARGE_MODEL,
+            enabled=settings.CASCADE_ENABLED,
+            max_simple_words=settings.CASCADE_MAX_SIMPLE_WORDS,
+            min_rag_confidence=settings.CASCADE_MIN_RAG_CONFIDENCE,
+            escalate=settings.CASCADE_ESCALATE,
+            small_cost_per_1k=settings.CASCADE_SMALL_COST_PER_1K,
+            large_cost_per_1k=settings.CASCADE_LARGE_COST_PER_1K,
+            safety_service=safety_service,
+        )
+
+    # ------------------------------------------------------------------
+    # Klassificering
+    # ------------------------------------------------------------------
+    def classify(self, query: str, context_items: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """
+        Klassificerar frågans komplexitet med billiga lokala features.
+
+        Args:
+            query: Användarens fråga
+            context_items: RAG-träffar (med valfri `similarity_score`)
+
+        Returns:
+            Dictionary med `route` samt de features som låg till grund för beslutet
+        """
+        text = query or ""
+        words = len(text.split())
+        scores = [
+            float(c["similarity_score"])
+            for c in (context_items or [])
+            if isinstance(c, dict) and c.get("similarity_score") is not None
+        ]
+        rag_confidence = max(scores) if scores else None
+        if _COMPLEX_INTENT.search(text):
+            intent = "troubleshooting"
+        elif _SIMPLE_INTENT.search(text):
+            intent = "lookup"
+        else:
+            intent = "general"
+
+        complexity = 0
+        if words > self.max_simple_words:
+            complexity += 1
+        if intent == "troubleshooting":
+            complexity += 2
+        elif intent == "lookup":
+            complexity -= 1
+        if rag_confidence is not None:
+            complexity += -1 if rag_confidence >= self.min_rag_confidence else 1
+
+        route = ROUTE_SMALL if self.enabled and complexity <= 0 else ROUTE_LARGE
+        return {
+            "route": route,
+            "intent": intent,
+            "words": words,
+            "rag_confidence": rag_confidence,
+            "complexity": complexity,
+        }
+
+    async def _is_low_confidence(self, answer: str) -> bool:
+        """True om svaret från den lilla modellen bör eskaleras."""
+        if not answer or len(answer.strip()) < self.min_answer_chars:
+            return True
+        if _LOW_CONFIDENCE.search(answer):
+            return True
+        if self.safety_service is not None:
+            try:
+                ok, _ = await self.safety_service.validate_llm_output(answer)
+                if not ok:
+                    return True
+            except Exception as e:
+                logger.warning(f"Säkerhetskontroll i kaskad misslyckades: {e}")
+        return False
+
+    # ------------------------------------------------------------------
+    # Körning
+    # ------------------------------------------------------------------
+    async def chat(
+        self,
+        llm_client: Any,
+        messages: List[Dict[str, str]],
+        query: str,
+        context_items: Optional[List[Dict[str, Any]]] = None,
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        """
+        Skickar `messages` till vald modell och eskalerar vid behov.
+
+        Args:
+            llm_client: Klient som följer LLMServiceProtocol
+            messages: Meddelanden i OpenAI-format
+            query: Användarens fråga (används för klassificering)
+            context_items: RAG-träffar för klassificering
+            **kwargs: Vidarebefordras till `llm_client.chat`
+
+        Returns:
+            Dictionary med `answer`, `route`, `model`, `escalated`, `latency_ms` och `features`
+        """
+        features = self.classify(query, context_items)
+        route = features["route"]
+        prompt_tokens = sum(_estimate_tokens(m.get("content", "")) for m in messages)
+
+        started = time.perf_counter()
+        if route == ROUTE_SMALL:
+            answer = await llm_client.chat(messages, model=self.small_model, **kwargs)
+            small_ms = (time.perf_counter() - started) * 1000
+            if self.escalate and await self._is_low_confidence(answer):
+                self._record(ROUTE_SMALL, small_ms, prompt_tokens, answer, escalated=True)
+                logger.info(
+                    "Cascade escalation",
+                    extra={"from_model": self.small_model, "to_model": self.large_model, "intent": features["intent"]},
+                )
+                esc_started = time.perf_counter()
+                answer = await llm_client.chat(messages, model=self.large_model, **kwargs)
+                large_ms = (time.perf_counter() - esc_started) * 1000
+                self._record(ROUTE_LARGE, large_ms, prompt_tokens, answer)
+                return {
+                    "answer": answer,
+                    "route": ROUTE_LARGE,
+                    "model": self.large_model,
+                    "escalated": True,
+                    "latency_ms": round(small_ms + large_ms, 2),
+                    "features": features,
+                }
+            self._record(ROUTE_SMALL, small_ms, prompt_tokens, answer)
+            return {
+                "answer": answer,
+                "route": ROUTE_SMALL,
+                "model": self.small_model,
+                "escalated": False,
+                "latency_ms": round(small_ms, 2),
+                "features": features,
+            }
+
+        answer = await llm_client.chat(messages, model=self.large_model, **kwargs)
+        large_ms = (time.perf_counter() - started) * 1000
+        self._record(ROUTE_LARGE, large_ms, prompt_tokens, answer)
+        return {
+            "answer": answer,
+            "route": ROUTE_LARGE,
+            "model": self.large_model,
+            "escalated": False,
+            "latency_ms": round(large_ms, 2),
+            "features": features,
+        }
+
+    # ------------------------------------------------------------------
+    # Statistik
+    # ------------------------------------------------------------------
+    def _record(self, route: str, latency_ms: float, prompt_tokens: int, answer: str, escalated: bool = False) -> None:
+        tokens = prompt_tokens + _estimate_tokens(answer or "")
+        cost_per_1k = self.small_cost_per_1k if route == ROUTE_SMALL else self.large_cost_per_1k
+        cost = tokens / 1000 * cost_per_1k
+        s = self._stats[route]
+        s["calls"] += 1
+        s["escalations"] += 1 if escalated else 0
+        s["total_latency_ms"] += latency_ms
+        s["tokens"] += tokens
+        s["cost"] += cost
+        # Besparing jämfört med att skicka samma anrop till stora modellen.
+        # Ett eskalerat anrop sparar ingenting – det är ren merkostnad.
+        if route == ROUTE_SMALL:
+            baseline = tokens / 1000 * self.large_cost_per_1k
+            s["cost_saved"] += -cost if escalated else baseline - cost
+
+    def stats(self) -> Dict[str, Any]:
+        """Returnerar ackumulerad statistik per route."""
+        out: Dict[str, Any] = {"enabled": self.enabled, "small_model": self.small_model, "large_model": self.large_model}
+        routes: Dict[str, Any] = {}
+        for route, s in self._stats.items():
+            calls = int(s["calls"])
+            routes[route] = {
+                "calls": calls,
+                "escalations": int(s["escalations"]),
+                "avg_latency_ms": round(s["total_latency_ms"] / calls, 2) if calls else 0.0,
+                "estimated_tokens": int(s["tokens"]),
+                "estimated_cost": round(s["cost"], 6),
+                "estimated_cost_saved": round(s["cost_saved"], 6),
+            }
+        small = routes[ROUTE_SMALL]
+        large = routes[ROUTE_LARGE]
+        if small["calls"] and large["calls"]:
+            routes[ROUTE_SMALL]["latency_saved_ms_per_call"] = round(
+                large["avg_latency_ms"] - small["avg_latency_ms"], 2
+            )
+        out["routes"] = routes
+        return out
+
+    def reset_stats(self) -> None:
+        """Nollställer statistiken."""
+        self._stats = {
+            route: {"calls": 0, "escalations": 0, "total_latency_ms": 0.0, "tokens": 0, "cost": 0.0, "cost_saved": 0.0}
+            for route in (ROUTE_SMALL, ROUTE_LARGE)
+        }
@@ -1,56 +1,236 @@
 # Orchestration service for AZOM Pipeline Server
 
+"""Orkestrering av installationsflödet.
+
+Flödet är uttryckt som en graf av steg (`StageGraph`): produktuppslag och
+RAG-sökning är oberoende och körs samtidigt, och minnessparningen (som behöver
+produktnamnet) startar så snart produkten hittats, parallellt med att
+RAG-sökningen slutförs. Latensen blir därmed ungefär max(steg) i stället för
+summan av stegen.
+
+Varje steg har en egen timeout (begränsad av requestens deadline) och fel
+isoleras: bara produktuppslaget är obligatoriskt. Misslyckas RAG eller minne
+blir svaret partiellt i stället för ett fel. Stegens tider i millisekunder
+returneras under `timings`.
+
+Användarens fråga kontrolleras av den delade `SafetyService` (förklassificerare
+och LLM-moderering) parallellt med övriga steg. Svaret byggs av katalogdata och
+RAG-träffar, inte av fri generering, så en flaggad fråga stoppar inte svaret
+utan rapporteras under `input_violations`.
+"""
+import asyncio
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from app.logger import get_logger
+
+from ..config import settings
+from ..pipelines.base_pipeline import Stage, StageGraph
 from .azom_knowledge_service import AZOMKnowledgeService
+from .car_model_resolver import CarModelMatch
 from .memory_service import MemoryService
-from .safety_service import SafetyService
+from .safety_service import SafetyService, get_safety_service
 from .rag_service import RAGService
 
+logger = get_logger(__name__)
+
+
 class AZOMOrchestrationService:
     """Avancerad orchestration service för AZOM pipeline med LangChain integration."""
-    def __init__(self):
+    def __init__(self, stage_timeouts: Optional[Dict[str, float]] = None,
+                 safety_service: Optional[SafetyService] = None):
+        """
+        Args:
+            stage_timeouts: Timeout i sekunder per steg (`product_lookup`, `rag`, `memory`,
+                `safety`); saknade steg får värdena från inställningarna
+            safety_service: Kontroll av användarens fråga (standard: den delade tjänsten,
+                byggd med `SafetyService.from_settings` och serverns LLM-klient)
+        """
         self.knowledge_service = AZOMKnowledgeService()
         self.memory_service = MemoryService()
-        self.safety_service = SafetyService()  # Kan byggas ut för säkerhetslogik
+        self.safety_service = safety_service or get_safety_service()
         self.rag_service = RAGService()
+        self.stage_timeouts = {
+            "product_lookup": settings.ORCHESTRATION_PRODUCT_TIMEOUT_SECONDS,
+            "rag": settings.ORCHESTRATION_RAG_TIMEOUT_SECONDS,
+            "memory": settings.ORCHESTRATION_MEMORY_TIMEOUT_SECONDS,
+            "safety": settings.ORCHESTRATION_SAFETY_TIMEOUT_SECONDS,
+            **(stage_timeouts or {}),
+        }
+        self.graph = StageGraph([
+            # 1. Produktinfo baserat på bilmodell (obligatoriskt)
+            Stage("product_lookup", self._lookup_product, inputs=("product_name", "car_model"),
+                  timeout=self.stage_timeouts["product_lookup"]),
+            # 2. Installationssteg via RAG – oberoende av produkten
+            Stage("rag", self._search_steps, inputs=("rag_query",), output="installation_steps",
+                  timeout=self.stage_timeouts["rag"], fallback=lambda error: []),
+            # 4. Spara kontext – påverkar inte svaret
+            Stage("memory", self._save_context,
+                  inputs=("user_input", "car_model", "user_experience", "product_lookup"),
+                  timeout=self.stage_timeouts["memory"], fallback=None),
+            # Kontroll av frågan – oberoende; fel eller timeout ger ingen flaggning
+            Stage("safety", self._check_input, inputs=("user_input",), output="input_violations",
+                  timeout=self.stage_timeouts["safety"], fallback=lambda error: []),
+        ])
 
-    async def orchestrate(self, user_input: str, car_model: str = None, user_experience: str = None):
-        # 1. Hämta produktinfo baserat på bilmodell
-        product_name = "AZOM DLR"
+    async def _lookup_product(self, product_name: str, car_model: Optional[str]) -> Dict[str, Any]:
+        # Hämta produkt med bilmodell för bättre träffsäkerhet
+        return await self.knowledge_service.get_product_info(product_name=product_name, car_model=car_model)
+
+    async def _search_steps(self, rag_query: str) -> List[str]:
+        installation_steps = await self.rag_service.search(rag_query, top_k=3)
+        return [item["content"] for item in installation_steps]
+
+    async def _check_input(self, user_input: str) -> List[str]:
+        is_safe, violations = await self.safety_service.validate_user_input(user_input)
+        if not is_safe:
+            logger.warning("Användarens fråga flaggades", extra={"violations": violations})
+        return [] if is_safe else violations
+
+    async def _save_context(self, user_input: str, car_model: Optional[str], user_experience: Optional[str],
+                            product_lookup: Dict[str, Any]) -> Dict[str, Any]:
+        saved = await self.memory_service.save_context({
+            "user_input": user_input,
+            "car_model": car_model,
+            "user_experience": user_experience,
+            "recommended_product": product_lookup["name"]
+        })
+        if isinstance(saved, dict) and saved.get("status") == "error":
+            raise RuntimeError(saved.get("error") or "memory error")
+        return saved
+
+    def resolve_car_model(self, car_model: Optional[str]) -> Optional[CarModelMatch]:
+        """Kanonisk bilmodell enligt katalogen, eller None (okänd modell eller ingen katalog)."""
+        if not car_model:
+            return None
+        try:
+            return self.knowledge_service.resolve_car_model(car_model)
+        except Exception:
+            return None
+
+    async def remember(self, user_input: str, car_model: Optional[str], user_experience: Optional[str],
+                       product_name: str) -> None:
+        """Sparar kontexten för ett svar som inte orkestrerades (t.ex. från resultatcachen)."""
+        try:
+            await self._save_context(user_input, car_model, user_experience, {"name": product_name})
+        except Exception as e:
+            logger.warning("Kunde inte spara kontext", extra={"error": str(e)})
+
+    @staticmethod
+    def product_name_for(car_model: Optional[str]) -> str:
+        """Produkten som rekommenderas för bilmodellen."""
         if car_model and "volvo" in car_model.lower():
-            product_name = "AZOM Volvo Special"
-            
-        print(f"Söker produkt med namn: {product_name}")
-        print(f"Bilmodell: {car_model}")
-        
+            return "AZOM Volvo Special"
+        return "AZOM DLR"
+
+    async def guide_product(self, car_model: str) -> Dict[str, Any]:
+        """Rekommenderad produkt för en bilmodell, utan att spara kontext (för förberäknade guider)."""
+        return await self._lookup_product(self.product_name_for(car_model), car_model)
+
+    async def guide_steps(self, car_model: str, query: str) -> List[str]:
+        """Installationssteg via RAG för en bilmodell och en generell fråga."""
+        return await self._search_steps(f"installation {car_model} {query}")
+
+    async def orchestrate(self, user_input: str, car_model: str = None, user_experience: str = None):
+        started = time.perf_counter()
+        product_name = self.product_name_for(car_model)
         try:
-            # Försök hämta produkt med bilmodell för bättre träffsäkerhet
-            product_info = await self.knowledge_service.get_product_info(
+            run = await self.graph.run(
+                user_input=user_input,
+                car_model=car_model,
+                user_experience=user_experience,
                 product_name=product_name,
-                car_model=car_model
+                rag_query=f"installation {car_model or ''} {user_input}",
             )
-            print(f"Hittad produkt: {product_info['name']}")
         except Exception as e:
-            print(f"Fel vid hämtning av produktinfo: {str(e)}")
+            logger.warning("Fel vid hämtning av produktinfo", extra={"product": product_name, "car_model": car_model, "error": str(e)})
             raise
+        stage_errors = run.errors
+        timings = {name: ms for name, ms in run.timings.items() if name != "total"}
+        return {
+            **self.compose(run["product_lookup"], run["installation_steps"], user_experience),
+            "timings": {**timings, "total": round((time.perf_counter() - started) * 1000, 2)},
+            **({"stage_errors": stage_errors} if stage_errors else {}),
+            **({"input_violations": run["input_violations"]} if run["input_violations"] else {}),
+        }
 
-        # 2. Hämta installationssteg via RAG (kan använda user_input och bilmodell)
-        rag_query = f"installation {car_model or ''} {user_input}"
-        installation_steps = await self.rag_service.search(rag_query, top_k=3)
-        steps = [item["content"] for item in installation_steps]
+    async def orchestrate_events(
+        self, user_input: str, car_model: str = None, user_experience: str = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Som `orchestrate`, men ger varje del som en händelse så snart den är klar.
+
+        Produkten (med varningar) kommer alltid först; installationsstegen hålls
+        tillbaka tills produkten skickats. Sist kommer `done` med tider och
+        eventuella `stage_errors` och `input_violations`. Fel i produktuppslaget kastas vidare.
+        """
+        product_name = self.product_name_for(car_model)
+        queue: "asyncio.Queue[Optional[tuple]]" = asyncio.Queue()
+        run = asyncio.ensure_future(self.graph.run(
+            on_stage=lambda key, value: queue.put_nowait((key, value)),
+            user_input=user_input,
+            car_model=car_model,
+            user_experience=user_experience,
+            product_name=product_name,
+            rag_query=f"installation {car_model or ''} {user_input}",
+        ))
+        run.add_done_callback(lambda _: queue.put_nowait(None))
+        product_sent = False
+        pending_steps = None
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                key, value = item
+                if key == "product_lookup":
+                    for event in self.compose_events(self.compose(value, [], user_experience), steps=False):
+                        yield event
+                    product_sent = True
+                    if pending_steps is not None:
+                        yield {"event": "steps", "installation_steps": pending_steps}
+                elif key == "installation_steps":
+                    if product_sent:
+                        yield {"event": "steps", "installation_steps": value}
+                    else:
+                        pending_steps = value
+            result = run.result()
+        except Exception as e:
+            logger.warning("Fel vid hämtning av produktinfo", extra={"product": product_name, "car_model": car_model, "error": str(e)})
+            raise
+        finally:
+            if not run.done():
+                run.cancel()
+        yield {
+            "event": "done",
+            "timings": dict(result.timings),
+            **({"stage_errors": result.errors} if result.errors else {}),
+            **({"input_violations": result["input_violations"]} if result["input_violations"] else {}),
+        }
+
+    @staticmethod
+    def compose_events(result: Dict[str, Any], steps: bool = True) -> List[Dict[str, Any]]:
+        """Delar upp ett färdigt svar i händelser: produkt, (steg) och varningar."""
+        events = [{
+            "event": "product",
+            "recommended_product": result["recommended_product"],
+            "alternative_products": result["alternative_products"],
+            "prioritized": result["prioritized"],
+            "product_info_details": result["product_info_details"],
+        }]
+        if steps:
+            events.append({"event": "steps", "installation_steps": result["installation_steps"]})
+        events.append({"event": "warnings", "safety_warnings": result["safety_warnings"]})
+        return events
 
+    @staticmethod
+    def compose(product_info: Dict[str, Any], steps: List[str], user_experience: Optional[str] = None) -> Dict[str, Any]:
+        """Bygger svaret av produkt, installationssteg och erfarenhetsnivå."""
         # 3. Anpassa säkerhetsvarningar efter erfarenhetsnivå
         safety_warnings = ["Utför alltid installationen med urkopplat batteri!"]
         if user_experience and user_experience.lower() in ["nybörjare", "beginner"]:
             safety_warnings.append("Läs hela manualen innan du börjar.")
 
-        # 4. Spara kontext
-        await self.memory_service.save_context({
-            "user_input": user_input,
-            "car_model": car_model,
-            "user_experience": user_experience,
-            "recommended_product": product_info["name"]
-        })
-
         # Kreativ användning av extrafält
         extra_warnings = []
         if product_info.get("price_sek") and product_info["price_sek"] > 7000:
@@ -78,5 +258,5 @@ class AZOMOrchestrationService:
                 "sku": product_info.get("sku"),
                 "barcode": product_info.get("barcode"),
                 "description": product_info.get("description")
-            }
+            },
         }
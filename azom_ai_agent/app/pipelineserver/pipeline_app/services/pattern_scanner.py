@@ -0,0 +1,109 @@
+# Pattern scanner for AZOM Pipeline Server
+
+"""Kompilerad flermönsterskanner: alla mönster i ett regex, ett svep per text.
+
+Varje mönster läggs som en namngiven grupp i en gemensam alternation. För
+detektion lindas alternationen i en lookahead (`(?=...)`), så att motorn
+provar varje position i texten en gång utan att konsumera tecken – en träff
+för en kategori kan därför inte dölja en överlappande träff för en annan.
+Delar flera kategorier startposition kontrolleras övriga kategorier med ett
+`match` på just den positionen, så resultatet blir detsamma som med ett
+`re.search` per mönster. Skanningen avbryts när alla kategorier hittats.
+
+Python-regex provar alternativen ett i taget på varje position, så en ren
+alternation är inte snabbare än separata sökningar. Börjar alla mönster med
+`\\b` (som säkerhetsmönstren gör) sätts det därför före lookaheaden, så att
+positioner mitt i ord avfärdas utan att alternativen provas.
+
+Maskering (`sub`) använder samma alternation för att avgöra om texten
+innehåller något att maskera – det vanliga fallet är att den inte gör det och
+då räcker ett svep. Annars tillämpas reglerna en i taget i prioritetsordning,
+så att en senare regel ser tidigare reglers ersättningar (t.ex. maskeras ett
+personnummer innan den generella nyckel/värde-regeln tar resten av raden).
+Resultatet blir därmed detsamma som med ett `re.sub` per regel.
+"""
+from __future__ import annotations
+
+import re
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+__all__ = ["PatternScanner"]
+
+# Ersättning: fast text eller funktion av mönstrets egna grupper (t.ex. lambda g: f"{g[0]}: [RADERAD]")
+Replacement = Union[str, Callable[[Tuple[Optional[str], ...]], str]]
+
+
+class PatternScanner:
+    """Hittar kategorier för många regex i ett svep och maskerar träffarna."""
+
+    def __init__(
+        self,
+        rules: Iterable[Tuple[str, str, Optional[Replacement]]],
+        flags: int = re.IGNORECASE,
+    ):
+        """
+        Args:
+            rules: (kategori, mönster, ersättning) i prioritetsordning; ersättning None = maskeras inte
+            flags: Regex-flaggor för alla mönster
+        """
+        self.rules: List[Tuple[str, str, Optional[Replacement]]] = list(rules)
+        self.categories: List[str] = list(dict.fromkeys(category for category, _, _ in self.rules))
+        self._group_rule: Dict[str, int] = {}
+        alternatives = []
+        for i, (_, pattern, _) in enumerate(self.rules):
+            name = f"_r{i}"
+            self._group_rule[name] = i
+            alternatives.append(f"(?P<{name}>{pattern})")
+        alternation = "|".join(alternatives)
+        # Börjar alla mönster med \b sätts det före alternationen: positioner mitt i ord avfärdas direkt
+        boundary = r"\b" if self.rules and all(p.startswith(r"\b") for _, p, _ in self.rules) else ""
+        self._detect = re.compile(f"{boundary}(?=(?:{alternation}))", flags)
+        self._by_category = {
+            category: re.compile("|".join(f"(?:{p})" for c, p, _ in self.rules if c == category), flags)
+            for category in self.categories
+        }
+        self._masks = [
+            (re.compile(pattern, flags), replacement)
+            for _, pattern, replacement in self.rules if replacement is not None
+        ]
+
+    def scan(self, text: str) -> List[str]:
+        """Kategorierna som förekommer i `text`, i regelordning."""
+        found = set()
+        total = len(self.categories)
+        for match in self._detect.finditer(text):
+            found.add(self.rules[self._group_rule[match.lastgroup]][0])
+            if len(found) == total:
+                break
+            # Andra kategorier med träff på samma startposition döljs av alternationen
+            position = match.start()
+            for category in self.categories:
+                if category not in found and self._by_category[category].match(text, position):
+                    found.add(category)
+        return [category for category in self.categories if category in found]
+
+    def sub(self, text: str) -> str:
+        """Maskerar träffar enligt reglernas ersättningar, regel för regel i prioritetsordning."""
+        if not self._masks or self._detect.search(text) is None:
+            return text
+        for pattern, replacement in self._masks:
+            if callable(replacement):
+                text = pattern.sub(lambda m, fn=replacement: fn(m.groups()), text)
+            else:
+                text = pattern.sub(lambda m, value=replacement: value, text)
+        return text
+
+    @classmethod
+    def from_categories(
+        cls,
+        patterns: Dict[str, Sequence[str]],
+        categories: Optional[Iterable[str]] = None,
+        flags: int = re.IGNORECASE,
+    ) -> "PatternScanner":
+        """Skanner för `{kategori: [mönster]}` (valfritt begränsad till `categories`)."""
+        wanted = set(categories) if categories is not None else None
+        return cls(
+            ((category, pattern, None) for category, items in patterns.items()
+             if wanted is None or category in wanted for pattern in items),
+            flags,
+        )
@@ -0,0 +1,173 @@
+# Product catalog index for AZOM Pipeline Server
+
+"""In-memory produktkatalog med förberäknade uppslagsindex.
+
+`products.json` läses en gång och hålls som en oföränderlig ögonblicksbild
+(`ProductCatalog`) med hash-index på normaliserat produktnamn och kanoniskt
+bilmodell-id (se `CarModelResolver`). `CatalogStore` laddar om filen när dess mtime
+ändras och innehållshashen skiljer sig, och byter ut ögonblicksbilden atomärt –
+pågående uppslag ser alltid antingen den gamla eller den nya katalogen.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from app.logger import get_logger
+
+from .car_model_resolver import CarModelMatch, CarModelResolver, normalize_model
+from .compatibility_matrix import CompatibilityMatrix
+
+__all__ = ["ProductCatalog", "CatalogStore", "get_catalog_store", "normalize_key"]
+
+logger = get_logger(__name__)
+
+
+def normalize_key(value: Optional[str]) -> str:
+    """Normaliserar produktnamn för uppslag: gemener och enkla mellanslag."""
+    if not value:
+        return ""
+    return " ".join(value.split()).lower()
+
+
+class ProductCatalog:
+    """Oföränderlig ögonblicksbild av produktkatalogen med uppslagsindex."""
+
+    def __init__(self, products: List[Dict[str, Any]], content_hash: str = "", mtime: float = 0.0):
+        self.products: Tuple[Dict[str, Any], ...] = tuple(products)
+        self.content_hash = content_hash
+        self.mtime = mtime
+        by_name: Dict[str, Dict[str, Any]] = {}
+        by_model: Dict[str, Dict[str, Any]] = {}
+        for product in self.products:
+            name = normalize_key(product.get("name"))
+            if name:
+                # Första förekomsten vinner, som vid den tidigare linjära sökningen
+                by_name.setdefault(name, product)
+            for model in product.get("compatible_models") or []:
+                key = normalize_model(model)
+                if key:
+                    by_model.setdefault(key, product)
+        self.by_name: Mapping[str, Dict[str, Any]] = MappingProxyType(by_name)
+        self.by_model: Mapping[str, Dict[str, Any]] = MappingProxyType(by_model)
+        self.resolver = CarModelResolver(
+            model for product in self.products for model in product.get("compatible_models") or []
+        )
+        self._matrix: Optional[CompatibilityMatrix] = None
+
+    @classmethod
+    def from_file(cls, path: str) -> "ProductCatalog":
+        """Läser och indexerar katalogen från en JSON-fil."""
+        with open(path, "rb") as f:
+            raw = f.read()
+        mtime = os.path.getmtime(path)
+        return cls(json.loads(raw.decode("utf-8")), hashlib.sha256(raw).hexdigest(), mtime)
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    @property
+    def matrix(self) -> CompatibilityMatrix:
+        """Kompatibilitetsmatris för flerkriteriefrågor, byggs vid första användning."""
+        if self._matrix is None:
+            self._matrix = CompatibilityMatrix(self.products, resolver=self.resolver)
+        return self._matrix
+
+    def find_by_name(self, name: Optional[str]) -> Optional[Dict[str, Any]]:
+        """O(1)-uppslag på normaliserat produktnamn."""
+        return self.by_name.get(normalize_key(name))
+
+    def resolve_car_model(self, car_model: Optional[str]) -> Optional[CarModelMatch]:
+        """Kanoniskt bilmodell-id med konfidens för fritext, eller None."""
+        return self.resolver.resolve(car_model)
+
+    def car_models(self) -> Dict[str, str]:
+        """Alla kanoniska bilmodeller i katalogen: id -> visningsnamn."""
+        return dict(self.resolver.names)
+
+    def find_by_car_model(self, car_model: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Första kompatibla produkt för en bilmodell (exakt id först, sedan fuzzy)."""
+        product = self.by_model.get(normalize_model(car_model))
+        if product is None:
+            match = self.resolver.resolve(car_model)
+            if match is not None:
+                product = self.by_model.get(match.canonical_id)
+        return product
+
+
+class CatalogStore:
+    """Håller aktuell `ProductCatalog` för en fil och laddar om vid ändring.
+
+    Filens mtime kontrolleras högst var `check_interval`:e sekund, så vanliga
+    uppslag gör ingen fil-I/O alls. Vid ändrad mtime jämförs innehållshashen
+    och en ny katalog byggs bara om innehållet faktiskt ändrats.
+    """
+
+    def __init__(self, path: str, check_interval: float = 2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._catalog: Optional[ProductCatalog] = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def _check_due(self) -> bool:
+        return self._catalog is None or time.monotonic() - self._last_check >= self.check_interval
+
+    @property
+    def catalog(self) -> ProductCatalog:
+        """Aktuell katalog; laddas första gången och när filen ändrats."""
+        return self._refresh() if self._check_due() else self._catalog
+
+    async def get(self) -> ProductCatalog:
+        """Som `catalog`, men mtime-kontroll och omladdning körs i en tråd så att event-loopen inte blockeras."""
+        if self._check_due():
+            return await asyncio.to_thread(self._refresh)
+        return self._catalog
+
+    def _refresh(self) -> ProductCatalog:
+        with self._lock:
+            current = self._catalog
+            now = time.monotonic()
+            if current is not None and now - self._last_check < self.check_interval:
+                return current  # En annan tråd hann ladda om
+            self._last_check = now
+            mtime = os.path.getmtime(self.path)
+            if current is not None and mtime == current.mtime:
+                return current
+            fresh = ProductCatalog.from_file(self.path)
+            if current is not None and fresh.content_hash == current.content_hash:
+                current.mtime = fresh.mtime
+                return current
+            # Atomärt byte: en enda referenstilldelning
+            self._catalog = fresh
+            self.reloads += 1
+            logger.info(
+                "Produktkatalog laddad",
+                extra={"path": self.path, "products": len(fresh), "hash": fresh.content_hash[:12]},
+            )
+            return fresh
+
+    def invalidate(self) -> None:
+        """Tvingar en kontroll av filen vid nästa uppslag."""
+        self._last_check = 0.0
+
+
+_stores: Dict[str, CatalogStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_catalog_store(path: str, check_interval: float = 2.0) -> CatalogStore:
+    """Delad `CatalogStore` per filsökväg, så alla tjänsteinstanser delar index."""
+    key = os.path.abspath(path)
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.setdefault(key, CatalogStore(key, check_interval))
+    return store
@@ -1,10 +1,16 @@
 # Retrieval-Augmented Generation (RAG) service
 
+import asyncio
 import json
 import os
 
 from functools import lru_cache
 
+from app.core.deadline import current_deadline
+
+from ..config import settings
+from .fulltext_search import FullTextIndex
+
 # Make VectorStoreService patchable from tests by exposing a module attribute
 VectorStoreService = None  # type: ignore
 
@@ -18,6 +24,8 @@ class RAGService:
         data_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../data'))
         self.products_path = os.path.join(data_dir, 'products.json')
         self.troubleshooting_path = os.path.join(data_dir, 'troubleshooting.json')
+        self._search_index = None
+        self._search_index_stamp = None
         # Ladda in alla relevanta other_*.json (support, felsökning, guider)
         self.other_data = []
         for fname in os.listdir(data_dir):
@@ -62,18 +70,112 @@ class RAGService:
         Returns:
             Lista med matchande dokument
         """
+        deadline = current_deadline()
+        if deadline is not None and deadline.expired():
+            # Ingen tid kvar – hoppa över RAG helt, svaret blir partiellt
+            deadline.mark_degraded("rag")
+            return []
+
         # 1. Prova vektorindex om tillåtet och tillgängligt
         if use_vectors:
-            vector_store = self._get_vector_store()
-            if vector_store:
-                docs = await vector_store.similarity_search(query, top_k)
-                return [{
-                    "title": f"Match {i+1}", 
-                    "content": txt,
-                    "similarity_score": score
-                } for i, (txt, score) in enumerate(docs)]
+            if deadline is not None and self._vector_store is None and deadline.nearly_expired():
+                # Uppvärmning av vektorindex hinns inte med – använd keyword-sökning
+                deadline.mark_degraded("rag:vector_warmup")
+                vector_store = None
+            else:
+                vector_store = self._get_vector_store()
+            # Vektorsökningen får högst sin stegbudget och lämnar tid åt genereringen
+            timeout = deadline.stage_timeout() if deadline is not None and vector_store else None
+            if timeout == 0.0:
+                deadline.mark_degraded("rag:vectors")
+            elif vector_store:
+                try:
+                    if timeout is not None:
+                        docs = await asyncio.wait_for(
+                            vector_store.similarity_search(query, top_k), timeout=timeout
+                        )
+                    else:
+                        docs = await vector_store.similarity_search(query, top_k)
+                    return [{
+                        "title": f"Match {i+1}", 
+                        "content": txt,
+                        "similarity_score": score
+                    } for i, (txt, score) in enumerate(docs)]
+                except asyncio.TimeoutError:
+                    deadline.mark_degraded("rag:vectors")
 
         # Fallback keyword search
+        if settings.FULLTEXT_SEARCH_ENABLED:
+            return self._fulltext_search(query, top_k)
+        return self._keyword_search(query, top_k)
+
+    def _load_json(self, path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            return []
+
+    def _get_search_index(self):
+        """FTS5-index över produkter, felsökning och other_*.json.
+
+        Byggs om när products.json eller troubleshooting.json ändras (mtime).
+        """
+        stamp = []
+        for path in (self.products_path, self.troubleshooting_path):
+            try:
+                stamp.append(os.path.getmtime(path))
+            except OSError:
+                stamp.append(None)
+        if self._search_index is not None and self._search_index_stamp == stamp:
+            return self._search_index
+        index = FullTextIndex()
+        index.add("product", (
+            {
+                "title": p.get('name'),
+                "keywords": p.get('compatible_models', []),
+                "body": p.get('description'),
+                "payload": {"title": f"Installationsguide för {p.get('name','')}", "content": p.get("description", "Se manual.")},
+            }
+            for p in self._load_json(self.products_path) if p.get('name')
+        ))
+        index.add("troubleshooting", (
+            {
+                "title": g.get('model'),
+                "keywords": g.get('issue_keywords', []),
+                "body": g.get('steps', []),
+                "payload": {"title": f"Felsökning för {g.get('model','')}", "content": " ".join(g.get('steps',[]))},
+            }
+            for g in self._load_json(self.troubleshooting_path)
+        ))
+        documents = []
+        for item in self.other_data:
+            if 'question' in item and 'answer' in item:
+                if item['question']:
+                    documents.append({
+                        "title": item['question'],
+                        "body": item['answer'],
+                        "payload": {"title": f"FAQ: {item['question']}", "content": item['answer']},
+                    })
+            elif 'steps' in item:
+                model = str(item.get('model','')).lower()
+                documents.append({
+                    "title": item.get('model'),
+                    "keywords": item.get('issue_keywords', []),
+                    "body": item.get('steps', []),
+                    "payload": {"title": f"Guide för {model}", "content": " ".join(item.get('steps',[]))},
+                })
+        index.add("other", documents)
+        self._search_index = index
+        self._search_index_stamp = stamp
+        return index
+
+    def _fulltext_search(self, query: str, top_k: int):
+        """Rankad fulltextsökning (SQLite FTS5) som ersätter den linjära keyword-sökningen."""
+        return [hit["payload"] for hit in self._get_search_index().search(query, limit=top_k)]
+
+    def _keyword_search(self, query: str, top_k: int):
+        """Linjär keyword-sökning, används när fulltextsökning är avstängd."""
         results = []
         query_lower = query.lower()
         # 1. Sök i produkter (installation)
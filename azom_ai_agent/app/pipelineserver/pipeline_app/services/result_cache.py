@@ -0,0 +1,222 @@
+# Result cache for AZOM Pipeline Server
+
+"""Resultatcache för deterministiska pipelineanrop.
+
+Nyckeln byggs av kanoniserade indata (`canonical_text`, kanoniskt
+bilmodell-id) och en dataversion: en stämpel över datakatalogens JSON-filer
+(namn, mtime, storlek), som både produktkatalogen, FTS-indexet och
+vektorindexet byggs från. Ändras någon fil byts stämpeln och hela cachen
+töms automatiskt.
+
+Identiska anrop som pågår samtidigt slås ihop: bara det första beräknar,
+övriga väntar på samma resultat (`COALESCED`). Beräkningen körs i en egen
+task, så att ett avbrutet första anrop inte avbryter de som väntar.
+
+Status för senaste uppslaget i aktuell request finns i `cache_status()` och
+skickas som `X-Cache`-header.
+"""
+from __future__ import annotations
+
+import asyncio
+import copy
+import glob
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from app.logger import get_logger
+
+__all__ = ["DataVersion", "ResultCache", "cache_status", "canonical_text", "set_cache_status"]
+
+logger = get_logger(__name__)
+
+HIT, MISS, COALESCED, BYPASS = "HIT", "MISS", "COALESCED", "BYPASS"
+
+_status: ContextVar[Optional[str]] = ContextVar("azom_result_cache_status", default=None)
+_NON_WORD = re.compile(r"[^\w]+")
+
+
+def cache_status() -> Optional[str]:
+    """Cachestatus (`HIT`, `MISS`, `COALESCED`, `BYPASS`) för senaste uppslaget i requesten."""
+    return _status.get()
+
+
+def set_cache_status(status: str) -> None:
+    """Sätter cachestatus för requesten (t.ex. `PRECOMPUTED` från guidelagret)."""
+    _status.set(status)
+
+
+def canonical_text(text: Optional[str]) -> str:
+    """Gemener, skiljetecken bort och enkla mellanslag – "Hur gör jag?" == "hur  gör jag"."""
+    return " ".join(_NON_WORD.sub(" ", (text or "").casefold()).split())
+
+
+class DataVersion:
+    """Stämpel över filerna som pipelinens resultat beror på."""
+
+    def __init__(self, pattern: str, check_interval: float = 2.0, exclude: Iterable[str] = ()):
+        """
+        Args:
+            pattern: Glob för filerna (t.ex. `data/*.json`)
+            check_interval: Sekunder mellan kontroller av filerna
+            exclude: Filnamn som inte ingår i stämpeln
+        """
+        self.pattern = pattern
+        self.exclude = frozenset(exclude)
+        self.check_interval = check_interval
+        self._stamp = ""
+        self._last_check = float("-inf")
+        self._lock = threading.Lock()
+
+    def stamp(self) -> str:
+        """Kort hash över (namn, mtime, storlek); filerna kontrolleras högst var `check_interval`:e sekund."""
+        if time.monotonic() - self._last_check < self.check_interval:
+            return self._stamp
+        with self._lock:
+            entries = []
+            for path in sorted(glob.glob(self.pattern)):
+                if os.path.basename(path) in self.exclude:
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append(f"{os.path.basename(path)}:{stat.st_mtime_ns}:{stat.st_size}")
+            self._stamp = hashlib.sha1("|".join(entries).encode("utf-8")).hexdigest()[:16]
+            self._last_check = time.monotonic()
+            return self._stamp
+
+    def invalidate(self) -> None:
+        """Tvingar en kontroll av filerna vid nästa anrop."""
+        self._last_check = float("-inf")
+
+
+class ResultCache:
+    """LRU-cache med TTL, dataversion och sammanslagning av samtidiga identiska anrop."""
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: Optional[float] = 3600.0,
+        version: Optional[Callable[[], str]] = None,
+        enabled: bool = True,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            max_entries: Max antal cachade resultat
+            ttl_seconds: Livslängd per resultat (None = tills dataversionen ändras)
+            version: Funktion som returnerar aktuell dataversion (t.ex. `DataVersion.stamp`)
+            enabled: False = alla anrop beräknas (`BYPASS`)
+            clock: Tidskälla för TTL (injiceras i tester)
+        """
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.version = version or (lambda: "")
+        self.enabled = enabled
+        self.clock = clock
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._current_version: Optional[str] = None
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "invalidations": 0, "uncacheable": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _check_version(self) -> str:
+        version = self.version()
+        if version != self._current_version:
+            if self._current_version is not None and self._entries:
+                self._stats["invalidations"] += 1
+                logger.info("Resultatcache tömd efter ändrad data", extra={"entries": len(self._entries), "version": version})
+            self._entries.clear()
+            self._current_version = version
+        return version
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def peek(self, key: str) -> Optional[Any]:
+        """Kopia av ett färskt cachat resultat för `key`, utan att beräkna något (None vid miss)."""
+        if not self.enabled:
+            return None
+        entry = self._entries.get((self._check_version(), key))
+        if entry is None or (self.ttl_seconds is not None and self.clock() - entry[0] > self.ttl_seconds):
+            return None
+        self._stats["hits"] += 1
+        return copy.deepcopy(entry[1])
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        cacheable: Callable[[Any], bool] = lambda value: True,
+    ) -> Any:
+        """
+        Returnerar cachat resultat för `key` eller beräknar det med `compute()`.
+
+        Args:
+            key: Kanoniserad nyckel (dataversionen läggs till automatiskt)
+            compute: Asynkron beräkning vid miss
+            cacheable: Avgör om ett beräknat resultat får sparas (t.ex. inte partiella svar)
+
+        Returns:
+            En kopia av resultatet, så att anroparen kan ändra det fritt
+        """
+        if not self.enabled:
+            _status.set(BYPASS)
+            return await compute()
+        full_key = (self._check_version(), key)
+        entry = self._entries.get(full_key)
+        if entry is not None:
+            stored_at, value = entry
+            if self.ttl_seconds is None or self.clock() - stored_at <= self.ttl_seconds:
+                self._entries.move_to_end(full_key)
+                self._stats["hits"] += 1
+                _status.set(HIT)
+                return copy.deepcopy(value)
+            del self._entries[full_key]
+
+        task = self._inflight.get(full_key)
+        if task is not None:
+            self._stats["coalesced"] += 1
+            _status.set(COALESCED)
+        else:
+            self._stats["misses"] += 1
+            _status.set(MISS)
+            task = asyncio.ensure_future(compute())
+            self._inflight[full_key] = task
+            task.add_done_callback(lambda done: self._store(full_key, done, cacheable))
+        # shield: ett avbrutet anrop avbryter inte beräkningen för övriga väntande
+        return copy.deepcopy(await asyncio.shield(task))
+
+    def _store(self, full_key: Tuple[str, str], task: asyncio.Future, cacheable: Callable[[Any], bool]) -> None:
+        self._inflight.pop(full_key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        value = task.result()
+        if not cacheable(value):
+            self._stats["uncacheable"] += 1
+            return
+        if full_key[0] != self._current_version:
+            return  # Datan ändrades under beräkningen
+        self._entries[full_key] = (self.clock(), value)
+        self._entries.move_to_end(full_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._stats["hits"] + self._stats["misses"] + self._stats["coalesced"]
+        return {
+            **self._stats,
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hit_rate": round((self._stats["hits"] + self._stats["coalesced"]) / lookups, 3) if lookups else 0.0,
+            "version": self._current_version,
+            "enabled": self.enabled,
+        }
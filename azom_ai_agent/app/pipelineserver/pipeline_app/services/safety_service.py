@@ -8,23 +8,51 @@ from __future__ import annotations
 import re
 from typing import Dict, List, Tuple, Optional
 import asyncio
+from app.core.deadline import current_deadline
 from app.logger import get_logger
-from .llm_client import LLMClient
+from ..config import settings
+from .llm_client import LLMClient, default_llm_client
+from .pattern_scanner import PatternScanner
+from .safety_classifier import SAFE, UNSAFE, SafetyPreClassifier
+
+# Kategorier som kontrolleras i LLM-output
+_OUTPUT_CATEGORIES = ("personuppgifter", "säkerhetskänsligt")
+
+
+def _redact_key(groups):
+    return f"{groups[0]}: [RADERAD]"
+
+
+# Maskering i prioritetsordning: (kategori, mönster, ersättning)
+_SANITIZE_RULES = (
+    ("personnummer", r"\b\d{6,8}[-\s]?\d{4}\b", "[PERSONNUMMER]"),
+    ("telefonnummer", r"\b(07\d{1}[-\s]?\d{3}[-\s]?\d{2}[-\s]?\d{2})\b", "[TELEFONNUMMER]"),
+    ("telefonnummer", r"\b(0\d{1,3}[-\s]?\d{5,8})\b", "[TELEFONNUMMER]"),
+    ("nyckel", r"\b(lösenord|password|nyckel|key|token|secret)\s*[:=]\s*\S+\b", _redact_key),
+    ("nyckel", r"\b(api[_-]?key|access[_-]?token)\s*[:=]\s*\S+\b", _redact_key),
+)
 
 
 class SafetyService:
     """Service för säkerhetskontroller och innehållsfiltrering."""
     
-    def __init__(self, llm_client: Optional[LLMClient] = None):
+    def __init__(
+        self,
+        llm_client: Optional[LLMClient] = None,
+        pre_classifier: Optional[SafetyPreClassifier] = None,
+    ):
         """
         Initialiserar SafetyService.
         
         Args:
             llm_client: LLMClient-instans för avancerade kontroller. Om None, 
                         används endast regelbaserade kontroller.
+            pre_classifier: Lokal förklassificerare; bara osäkra fall skickas
+                            då till LLM-kontrollen. Om None går allt till LLM.
         """
         self._logger = get_logger(__name__)
         self._llm_client = llm_client
+        self.pre_classifier = pre_classifier
         
         # Regelbaserade filterkategorier
         self._patterns = {
@@ -47,6 +75,18 @@ class SafetyService:
                 r"\b(krig|politik|sex|gambling|betting|casino)\b",
             ]
         }
+        # Alla mönster kompilerade i ett regex per användning: ett svep per text
+        self._input_scanner = PatternScanner.from_categories(self._patterns)
+        self._output_scanner = PatternScanner.from_categories(self._patterns, _OUTPUT_CATEGORIES)
+        self._sanitizer = PatternScanner(_SANITIZE_RULES)
+    
+    @classmethod
+    def from_settings(cls, settings, llm_client: Optional[LLMClient] = None) -> "SafetyService":
+        """Bygg tjänsten från pipeline-serverns `Settings` (förklassificerare bara med LLM)."""
+        pre_classifier = None
+        if llm_client is not None and settings.SAFETY_PRECLASSIFIER_ENABLED:
+            pre_classifier = SafetyPreClassifier.from_settings(settings)
+        return cls(llm_client, pre_classifier)
     
     async def validate_user_input(self, text: str) -> Tuple[bool, List[str]]:
         """
@@ -67,24 +107,52 @@ class SafetyService:
         elif len(text) > 500:
             violations.append("För lång input")
         
-        # 2. Kontrollera regelbaserade mönster
-        for category, patterns in self._patterns.items():
-            for pattern in patterns:
-                if re.search(pattern, text, re.IGNORECASE):
-                    violations.append(f"Innehåller {category}")
-                    break
-        
-        # 3. Avancerad kontroll med LLM (om tillgänglig)
-        if self._llm_client and not violations:
+        # 2. Kontrollera regelbaserade mönster (alla kategorier i ett svep)
+        violations.extend(f"Innehåller {category}" for category in self._input_scanner.scan(text))
+        
+        # 3. Lokal förklassificering: tydligt säkra/osäkra fall behöver ingen LLM
+        decision = probability = None
+        if self._llm_client and not violations and self.pre_classifier is not None:
+            decision, probability = self.pre_classifier.decide(text)
+            if decision == UNSAFE:
+                violations.append("Förklassificerare: sannolikt olämpligt innehåll")
+            if decision == UNSAFE or (decision == SAFE and not self.pre_classifier.should_audit(decision)):
+                self.pre_classifier.record(decision)
+                return len(violations) == 0, violations
+        
+        # 4. Avancerad kontroll med LLM (om tillgänglig och tiden räcker)
+        # Kontrollen får högst sin stegbudget och lämnar tid åt genereringen
+        deadline = current_deadline()
+        timeout = deadline.stage_timeout() if deadline is not None else None
+        if self._llm_client and not violations and deadline is not None and (
+            deadline.nearly_expired() or timeout < deadline.min_stage_seconds
+        ):
+            self._logger.warning("LLM säkerhetskontroll hoppades över: deadline nästan nådd")
+            deadline.mark_degraded("safety:llm_check")
+        elif self._llm_client and not violations:
             try:
-                llm_check = await self._advanced_validation(text)
+                if timeout is not None:
+                    llm_check = await asyncio.wait_for(self._advanced_validation(text), timeout=timeout)
+                else:
+                    llm_check = await self._advanced_validation(text)
                 if not llm_check["safe"]:
                     violations.append(f"LLM säkerhetskontroll: {llm_check['reason']}")
+                if decision is not None and "fallback" not in llm_check:
+                    self.pre_classifier.record(decision, not llm_check["safe"], probability, text)
+            except asyncio.TimeoutError:
+                self._logger.warning("LLM säkerhetskontroll avbröts: deadline nådd")
+                deadline.mark_degraded("safety:llm_check")
             except Exception as e:
                 self._logger.warning(f"LLM säkerhetskontroll misslyckades: {e}")
         
         return len(violations) == 0, violations
     
+    def stats(self) -> Dict[str, object]:
+        """Förklassificerarens beslut, undvikna LLM-anrop och överensstämmelse med LLM."""
+        if self.pre_classifier is None:
+            return {"pre_classifier": False}
+        return {"pre_classifier": True, **self.pre_classifier.stats()}
+    
     async def validate_llm_output(self, output: str) -> Tuple[bool, List[str]]:
         """
         Validerar LLM-output för olämpligt innehåll.
@@ -96,15 +164,8 @@ class SafetyService:
             En tupel med (godkänd, lista med anledningar) där godkänd är False 
             om texten innehåller olämpligt innehåll
         """
-        violations = []
-        
         # Kontrollera regelbaserade mönster
-        for category, patterns in self._patterns.items():
-            if category in ["personuppgifter", "säkerhetskänsligt"]:
-                for pattern in patterns:
-                    if re.search(pattern, output, re.IGNORECASE):
-                        violations.append(f"Innehåller {category}")
-                        break
+        violations = [f"Innehåller {category}" for category in self._output_scanner.scan(output)]
         
         return len(violations) == 0, violations
     
@@ -118,42 +179,8 @@ class SafetyService:
         Returns:
             Sanerad text
         """
-        sanitized = text
-        
-        # Maskera personnummer
-        sanitized = re.sub(
-            r"\b\d{6,8}[-\s]?\d{4}\b",
-            "[PERSONNUMMER]",
-            sanitized
-        )
-        
-        # Maskera telefonnummer
-        sanitized = re.sub(
-            r"\b(07\d{1}[-\s]?\d{3}[-\s]?\d{2}[-\s]?\d{2})\b",
-            "[TELEFONNUMMER]",
-            sanitized
-        )
-        sanitized = re.sub(
-            r"\b(0\d{1,3}[-\s]?\d{5,8})\b",
-            "[TELEFONNUMMER]",
-            sanitized
-        )
-        
-        # Maskera känslig information
-        sanitized = re.sub(
-            r"\b(lösenord|password|nyckel|key|token|secret)\s*[:=]\s*\S+\b",
-            r"\1: [RADERAD]",
-            sanitized,
-            flags=re.IGNORECASE
-        )
-        sanitized = re.sub(
-            r"\b(api[_-]?key|access[_-]?token)\s*[:=]\s*\S+\b",
-            r"\1: [RADERAD]",
-            sanitized,
-            flags=re.IGNORECASE
-        )
-        
-        return sanitized
+        # Personnummer, telefonnummer och nycklar maskeras i prioritetsordning
+        return self._sanitizer.sub(text)
     
     async def _advanced_validation(self, text: str) -> Dict[str, bool | str]:
         """
@@ -183,7 +210,8 @@ class SafetyService:
                 {"role": "user", "content": user_prompt}
             ]
             
-            result = await self._llm_client.chat(messages)
+            # Svaret är ett kort JSON-objekt – begränsa generering och slumpmässighet
+            result = await self._llm_client.chat(messages, max_tokens=64, temperature=0.0)
             
             # Extrahera JSON från svaret
             import json
@@ -194,9 +222,24 @@ class SafetyService:
                 return validation
             
             # Fallback om inget JSON hittas
-            return {"safe": True, "reason": ""}
+            return {"safe": True, "reason": "", "fallback": True}
             
         except Exception as e:
             self._logger.error(f"LLM validering misslyckades: {str(e)}")
             # Fallback vid fel
-            return {"safe": True, "reason": ""}
+            return {"safe": True, "reason": "", "fallback": True}
+
+
+_shared_service: Optional[SafetyService] = None
+
+
+def get_safety_service() -> SafetyService:
+    """Den delade tjänsten för pipeline-servern: LLM-kontroll och förklassificerare enligt inställningarna.
+
+    Orkestreringen, modellroutern och `/safety/stats` använder samma instans, så
+    att statistiken och förklassificerarens inlärning gäller all trafik.
+    """
+    global _shared_service
+    if _shared_service is None:
+        _shared_service = SafetyService.from_settings(settings, default_llm_client())
+    return _shared_service
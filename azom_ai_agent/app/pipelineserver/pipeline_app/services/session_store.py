@@ -0,0 +1,315 @@
+# Session store for AZOM Pipeline Server
+
+"""Append-only lagring av konversationshistorik i SQLite.
+
+Varje sparad kontext blir en rad i tabellen `history` med index på
+`(user_id, timestamp, id)`, så att en append är en enda INSERT (O(1)) och
+`get_history` är en indexerad intervallsökning med paginering – i stället för
+att hela `user_history.json` läses och skrivs om vid varje request.
+
+Databasen körs i WAL-läge med `busy_timeout`, vilket gör att flera
+uvicorn-arbetsprocesser kan skriva samtidigt utan att förlora rader: SQLite
+serialiserar skrivningarna och läsare blockeras inte. Varje tråd har en egen
+anslutning.
+
+Tabellen `chat_sessions` håller kontextfönstrets tillstånd per `session_id`
+(senaste turer och löpande sammanfattning, se `app.conversation_window`), så
+att en följdfråga som hamnar i en annan arbetsprocess ser samma historik.
+"""
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.logger import get_logger
+
+__all__ = ["SessionStore"]
+
+logger = get_logger(__name__)
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS history ("
+    " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+    " user_id TEXT NOT NULL,"
+    " timestamp TEXT NOT NULL,"
+    " entry TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_history_user_ts ON history (user_id, timestamp, id)",
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+    "CREATE TABLE IF NOT EXISTS summaries ("
+    " user_id TEXT PRIMARY KEY,"
+    " summary TEXT NOT NULL,"
+    " updated_at TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS chat_sessions ("
+    " session_id TEXT PRIMARY KEY,"
+    " state TEXT NOT NULL,"
+    " last_used REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_chat_sessions_last_used ON chat_sessions (last_used)",
+)
+
+# Poster som ska rullas ihop: utanför de `keep` senaste eller äldre än `cutoff`
+_COMPACT_WHERE = (
+    "user_id = ? AND (timestamp < ? OR id NOT IN ("
+    "SELECT id FROM history WHERE user_id = ? ORDER BY timestamp DESC, id DESC LIMIT ?))"
+)
+
+
+class SessionStore:
+    """Append-only historik per användare i en SQLite-fil (säker för flera processer)."""
+
+    def __init__(self, path: str, busy_timeout_ms: int = 5000):
+        """
+        Args:
+            path: SQLite-fil för historiken
+            busy_timeout_ms: Hur länge en skrivare väntar på låset innan fel
+        """
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._conn()
+        with conn:
+            for statement in _SCHEMA:
+                conn.execute(statement)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Varje anslutning används bara av sin tråd; check_same_thread=False låter close() stänga alla
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self) -> None:
+        """Stänger alla trådars anslutningar."""
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    # --- Skrivning -------------------------------------------------------
+
+    def append(self, user_id: str, entry: Dict[str, Any]) -> int:
+        """Lägger till en post (med `timestamp` om den saknas); returnerar radens id."""
+        return self.append_many([(user_id, entry)])[-1]
+
+    def append_many(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> List[int]:
+        """Lägger till flera poster i en transaktion; returnerar radernas id:n."""
+        conn = self._conn()
+        with conn:
+            return self._insert(conn, items)
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, items: Iterable[Tuple[str, Dict[str, Any]]]) -> List[int]:
+        ids: List[int] = []
+        for user_id, entry in items:
+            timestamp = entry.setdefault("timestamp", datetime.now().isoformat())
+            ids.append(conn.execute(
+                "INSERT INTO history (user_id, timestamp, entry) VALUES (?, ?, ?)",
+                (user_id, timestamp, json.dumps(entry, ensure_ascii=False)),
+            ).lastrowid)
+        return ids
+
+    # --- Läsning ---------------------------------------------------------
+
+    def count(self, user_id: str) -> int:
+        return self._conn().execute("SELECT count(*) FROM history WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    def get_history(self, user_id: str, limit: Optional[int] = None, offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        Historik i kronologisk ordning via indexet (user_id, timestamp, id).
+
+        Args:
+            user_id: Användare
+            limit: Max antal poster (None = alla)
+            offset: Antal poster att hoppa över från början
+        """
+        rows = self._conn().execute(
+            "SELECT entry FROM history WHERE user_id = ? ORDER BY timestamp, id LIMIT ? OFFSET ?",
+            (user_id, -1 if limit is None else limit, max(0, offset)),
+        ).fetchall()
+        return [json.loads(entry) for (entry,) in rows]
+
+    def latest(self, user_id: str, limit: int) -> List[Dict[str, Any]]:
+        """De `limit` senaste posterna i kronologisk ordning (baklänges över indexet)."""
+        rows = self._conn().execute(
+            "SELECT entry FROM history WHERE user_id = ? ORDER BY timestamp DESC, id DESC LIMIT ?",
+            (user_id, max(0, limit)),
+        ).fetchall()
+        return [json.loads(entry) for (entry,) in reversed(rows)]
+
+    def get_summary(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Sammanfattning av användarens komprimerade (borttagna) poster, eller None."""
+        row = self._conn().execute("SELECT summary FROM summaries WHERE user_id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # --- Retention -------------------------------------------------------
+
+    def compact(
+        self,
+        summarize: Callable[[Optional[Dict[str, Any]], List[Dict[str, Any]]], Dict[str, Any]],
+        max_entries: Optional[int] = None,
+        older_than: Optional[str] = None,
+    ) -> Dict[str, int]:
+        """
+        Rullar ihop gamla poster till en sammanfattning per användare och tar bort dem.
+
+        Args:
+            summarize: Funktion (tidigare sammanfattning, poster) -> ny sammanfattning
+            max_entries: Antal senaste poster som behålls per användare (None = alla)
+            older_than: ISO-tidsstämpel; äldre poster rullas ihop oavsett antal
+
+        Returns:
+            Antal berörda `users` och komprimerade `entries`
+        """
+        keep = -1 if max_entries is None else max(0, max_entries)
+        cutoff = older_than or ""
+        conn = self._conn()
+        users = [
+            user_id for (user_id,) in conn.execute(
+                "SELECT user_id FROM history GROUP BY user_id HAVING (? >= 0 AND count(*) > ?) OR min(timestamp) < ?",
+                (keep, keep, cutoff),
+            )
+        ]
+        result = {"users": 0, "entries": 0}
+        for user_id in users:
+            params = (user_id, cutoff, user_id, keep)
+            # Val, sammanfattning och borttagning i samma skrivtransaktion
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    f"SELECT entry FROM history WHERE {_COMPACT_WHERE} ORDER BY timestamp, id", params
+                ).fetchall()
+                if rows:
+                    previous = conn.execute("SELECT summary FROM summaries WHERE user_id = ?", (user_id,)).fetchone()
+                    summary = summarize(json.loads(previous[0]) if previous else None,
+                                        [json.loads(entry) for (entry,) in rows])
+                    conn.execute(
+                        "INSERT INTO summaries (user_id, summary, updated_at) VALUES (?, ?, ?) "
+                        "ON CONFLICT(user_id) DO UPDATE SET summary = excluded.summary, updated_at = excluded.updated_at",
+                        (user_id, json.dumps(summary, ensure_ascii=False), datetime.now().isoformat()),
+                    )
+                    conn.execute(f"DELETE FROM history WHERE {_COMPACT_WHERE}", params)
+                    result["users"] += 1
+                    result["entries"] += len(rows)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        return result
+
+    # --- Chattsessioner -------------------------------------------------
+
+    def get_chat_session(self, session_id: str, ttl_seconds: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Sessionens tillstånd, eller None om den saknas eller varit inaktiv längre än `ttl_seconds`."""
+        row = self._conn().execute(
+            "SELECT state, last_used FROM chat_sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None or (ttl_seconds is not None and time.time() - row[1] > ttl_seconds):
+            return None
+        return json.loads(row[0])
+
+    def update_chat_session(
+        self,
+        session_id: str,
+        update: Callable[[Optional[Dict[str, Any]]], Dict[str, Any]],
+        ttl_seconds: Optional[float] = None,
+        max_sessions: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Uppdaterar en sessions tillstånd atomärt och returnerar det nya tillståndet.
+
+        Läsning, `update` och skrivning sker i samma skrivtransaktion, så att två
+        processer som sparar turer i samma session inte skriver över varandra.
+
+        Args:
+            session_id: Sessionen
+            update: Funktion (nuvarande tillstånd eller None) -> nytt tillstånd
+            ttl_seconds: Sessioner inaktiva längre än så tas bort (None = aldrig)
+            max_sessions: Max antal sessioner; de minst nyligen använda tas bort
+        """
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if ttl_seconds is not None:
+                conn.execute("DELETE FROM chat_sessions WHERE last_used < ?", (now - ttl_seconds,))
+            row = conn.execute("SELECT state FROM chat_sessions WHERE session_id = ?", (session_id,)).fetchone()
+            state = update(json.loads(row[0]) if row else None)
+            conn.execute(
+                "INSERT INTO chat_sessions (session_id, state, last_used) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET state = excluded.state, last_used = excluded.last_used",
+                (session_id, json.dumps(state, ensure_ascii=False), now),
+            )
+            if max_sessions is not None:
+                conn.execute(
+                    "DELETE FROM chat_sessions WHERE session_id NOT IN ("
+                    "SELECT session_id FROM chat_sessions ORDER BY last_used DESC LIMIT ?)",
+                    (max(1, max_sessions),),
+                )
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        return state
+
+    def delete_chat_session(self, session_id: str) -> bool:
+        """Tar bort en session; True om den fanns."""
+        conn = self._conn()
+        with conn:
+            return conn.execute("DELETE FROM chat_sessions WHERE session_id = ?", (session_id,)).rowcount > 0
+
+    def count_chat_sessions(self) -> int:
+        return self._conn().execute("SELECT count(*) FROM chat_sessions").fetchone()[0]
+
+    # --- Migrering -------------------------------------------------------
+
+    def import_legacy_json(self, json_path: str) -> int:
+        """Importerar en gammal `user_history.json` en gång; returnerar antal poster.
+
+        Kontroll och import sker i samma skrivtransaktion, så att bara en av flera
+        samtidigt startande processer importerar filen. Går filen inte att läsa
+        markeras importen inte som gjord, så att den görs vid nästa start.
+        """
+        conn = self._conn()
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_json_imported'").fetchone():
+            return 0
+        legacy: Dict[str, List[Dict[str, Any]]] = {}
+        if os.path.exists(json_path):
+            try:
+                with open(json_path, encoding="utf-8") as f:
+                    legacy = json.load(f)
+                if not isinstance(legacy, dict):
+                    raise ValueError("förväntade ett objekt per användare")
+            except (OSError, ValueError) as e:
+                logger.warning("Kunde inte läsa gammal historikfil", extra={"path": json_path, "error": str(e)})
+                return 0
+        imported = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if not conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_json_imported'").fetchone():
+                imported = len(self._insert(
+                    conn, ((user_id, entry) for user_id, entries in legacy.items() for entry in entries)
+                ))
+                conn.execute("INSERT INTO meta (key, value) VALUES ('legacy_json_imported', ?)",
+                             (datetime.now().isoformat(),))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        if imported:
+            logger.info("Historik migrerad från JSON", extra={"entries": imported})
+        return imported
@@ -0,0 +1,153 @@
+# Write-behind queue for AZOM Pipeline Server
+
+"""Write-behind-kö: skrivningar buffras i minnet och skrivs i batchar i bakgrunden.
+
+`enqueue` lägger bara posten i en trådsäker deque och returnerar direkt, så
+att requesten inte väntar på disk. En bakgrundstask tömmer kön när
+`max_batch` poster väntar eller när `flush_interval` sekunder har gått sedan
+första väntande post, och anropar skrivfunktionen i en arbetstråd. Är kön
+full (`max_queue`) kastas posten och räknas som `dropped`.
+
+`flush()` tömmer kön direkt (t.ex. före läsning eller vid avstängning). Som
+sista utväg töms kön också vid normal processavslutning via `atexit`.
+"""
+from __future__ import annotations
+
+import asyncio
+import atexit
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Generic, List, Optional, TypeVar
+
+from app.logger import get_logger
+
+__all__ = ["WriteBehindQueue"]
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+
+class WriteBehindQueue(Generic[T]):
+    """Buffrar poster och skriver dem i batchar via `writer` utanför requesten."""
+
+    def __init__(
+        self,
+        writer: Callable[[List[T]], Any],
+        max_batch: int = 100,
+        flush_interval: float = 0.5,
+        max_queue: int = 10000,
+        name: str = "write_behind",
+    ):
+        """
+        Args:
+            writer: Synkron funktion som skriver en batch (körs i en arbetstråd)
+            max_batch: Antal poster som utlöser en skrivning direkt
+            flush_interval: Max tid (sekunder) en post väntar innan den skrivs
+            max_queue: Max antal väntande poster; fler kastas (`dropped`)
+            name: Namn i loggar
+        """
+        self.writer = writer
+        self.max_batch = max(1, max_batch)
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.name = name
+        self._pending: Deque[T] = deque()
+        self._write_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._full: Optional[asyncio.Event] = None
+        self._stats = {"enqueued": 0, "written": 0, "dropped": 0, "failed": 0, "flushes": 0}
+        self._last_flush_ms = 0.0
+        atexit.register(self._drain)
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def enqueue(self, item: T) -> bool:
+        """Lägger en post i kön; False om kön är full och posten kastades."""
+        if len(self._pending) >= self.max_queue:
+            self._stats["dropped"] += 1
+            logger.warning("Write-behind-kön är full, post kastad", extra={"queue": self.name})
+            return False
+        self._pending.append(item)
+        self._stats["enqueued"] += 1
+        self._ensure_worker()
+        self._wakeup.set()
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+        return True
+
+    def _ensure_worker(self) -> None:
+        # Tasken och dess events hör till en event-loop; starta om i den aktuella vid behov
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            if len(self._pending) < self.max_batch:
+                self._full.clear()
+                try:
+                    await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            await asyncio.to_thread(self._drain)
+
+    def _drain(self) -> int:
+        """Skriver alla väntande poster i batchar; returnerar antal skrivna."""
+        written = 0
+        with self._write_lock:
+            while self._pending:
+                batch: List[T] = []
+                while self._pending and len(batch) < self.max_batch:
+                    batch.append(self._pending.popleft())
+                started = time.perf_counter()
+                try:
+                    self.writer(batch)
+                except Exception:
+                    self._stats["failed"] += len(batch)
+                    logger.exception("Write-behind-skrivning misslyckades", extra={"queue": self.name, "batch": len(batch)})
+                    continue
+                self._last_flush_ms = (time.perf_counter() - started) * 1000
+                self._stats["written"] += len(batch)
+                self._stats["flushes"] += 1
+                written += len(batch)
+        return written
+
+    async def flush(self) -> int:
+        """Skriver alla väntande poster nu; returnerar antal skrivna."""
+        if not self._pending:
+            return 0
+        return await asyncio.to_thread(self._drain)
+
+    async def stop(self) -> int:
+        """Stoppar bakgrundstasken och skriver det som återstår."""
+        task, self._task = self._task, None
+        if task is not None and not task.done() and self._loop is asyncio.get_running_loop():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        return await asyncio.to_thread(self._drain)
+
+    def stats(self) -> Dict[str, Any]:
+        """Ködjup och räknare för skrivna, kastade och misslyckade poster."""
+        flushes = self._stats["flushes"]
+        return {
+            **self._stats,
+            "queue_depth": len(self._pending),
+            "max_queue": self.max_queue,
+            "avg_batch": round(self._stats["written"] / flushes, 2) if flushes else 0.0,
+            "last_flush_ms": round(self._last_flush_ms, 3),
+        }
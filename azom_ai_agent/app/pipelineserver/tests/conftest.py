@@ -78,8 +78,8 @@ def setup_test_environment(db_session, monkeypatch):
         finally:
             pass
     
-    # Apply the mock to the main module
-    monkeypatch.setattr('pipeline_app.main.get_db', mock_get_db)
+    # Apply the mock to the database module
+    monkeypatch.setattr('pipeline_app.database.get_db', mock_get_db)
     
     # Load test products data
     test_products_path = os.path.join(TEST_DATA_DIR, 'test_products.json')
@@ -20,7 +20,7 @@ from pipeline_app.services.llm_client import get_llm_client
 
 
 class DummyLLM:
-    async def chat(self, messages, model=None, stream=False):
+    async def chat(self, messages, model=None, stream=False, **kwargs):
         # Return a simple response to keep endpoint logic flowing
         return "DUMMY_RESPONSE"
 
@@ -1,131 +1,346 @@
+"""Automatisk import av alla CSV-filer i data-katalogen till JSON (och valfritt databasen).
+
+Varje fil strömmas rad för rad och skrivs direkt till sin JSON-fil, så minnet är
+begränsat oavsett filstorlek. Filer med olika måltyp (produkter, FAQ, felsökning
+...) körs parallellt i en processpool. Filerna grupperas per måltyp och en grupp
+hoppas över bara om alla dess filer är oförändrade (samma SHA-256 som vid förra
+körningen, se `.import_manifest.json`), inga filer har försvunnit ur gruppen och
+förra importen skrev till samma mål (JSON eller JSON + databas); annars importeras
+hela gruppen om. `--force` importerar allt.
+
+Flaggor: `--sqlite` (skriv även till databasen), `--force`, `--workers=N`.
+"""
 import os
+import sys
 import csv
 import json
 import re
-from collections import defaultdict
+import hashlib
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../data'))
 if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR)
 
+MANIFEST_NAME = ".import_manifest.json"
+
 # Bilmodell-lista för automatisk extraktion
 CAR_MODELS = [
     "Volvo", "BMW", "Audi", "Ford", "Toyota", "Mercedes", "Volkswagen", "Skoda", "Opel", "Renault", "Peugeot", "Citroen", "Saab", "Mazda", "Honda", "Hyundai", "Kia", "Nissan", "Mitsubishi", "Suzuki", "Subaru", "Fiat", "Jeep", "Chevrolet", "Dacia", "Seat", "Tesla"
 ]
 
+# Alla märken i en kompilerad alternation (längsta först), ett svep per text
+_CAR_MODEL_PATTERN = re.compile(
+    r"\b(?:" + "|".join(re.escape(m) for m in sorted(CAR_MODELS, key=len, reverse=True)) + r")\b",
+    re.IGNORECASE,
+)
+_CAR_MODEL_NAMES = {m.lower(): m for m in CAR_MODELS}
+
 def extract_compatible_models(text):
-    found = set()
+    """Bilmärken som nämns i texten, i förekomstordning utan dubbletter."""
     if not text:
         return []
-    for model in CAR_MODELS:
-        pattern = r'\\b' + re.escape(model) + r'\\b'
-        if re.search(pattern, text, re.IGNORECASE):
-            found.add(model)
-    return list(found)
+    return list(dict.fromkeys(_CAR_MODEL_NAMES[m.lower()] for m in _CAR_MODEL_PATTERN.findall(text)))
 
-def guess_type_and_import(filename, rows):
-    lower_keys = [k.lower() for k in rows[0].keys()]
-    # Produktdata
+def _product(row):
+    name = str(row.get("Title") or row.get("Name") or "")
+    description = str(row.get("Body (HTML)") or row.get("Description") or "")
+    if not name.strip() and not description.strip():
+        return None  # hoppa över rader utan namn och beskrivning
+    price = None
+    for price_field in ["Variant Price", "Price", "Price (SEK)"]:
+        if row.get(price_field):
+            try:
+                price = float(row[price_field].replace(",", "."))
+                break
+            except Exception:
+                pass
+    return {
+        "name": name,
+        "description": description,
+        "price_sek": price,
+        "vendor": row.get("Vendor"),
+        "product_type": row.get("Type") or row.get("Product Category"),
+        "tags": [t.strip() for t in (row.get("Tags") or "").split(",") if t.strip()],
+        "sku": row.get("Variant SKU") or row.get("SKU"),
+        "barcode": row.get("Variant Barcode") or row.get("Barcode"),
+        "compatible_models": extract_compatible_models(name + " " + description)
+    }
+
+def _troubleshooting(row):
+    return {
+        "model": row.get("Model") or row.get("Bilmodell"),
+        "issue_keywords": [k.strip() for k in (row.get("Issue Keywords") or row.get("Problem") or "").split(",") if k.strip()],
+        "steps": [s.strip() for s in (row.get("Steps") or row.get("Åtgärd") or "").split(";") if s.strip()]
+    }
+
+def _faq(row):
+    return {
+        "question": row.get("Question") or row.get("FAQ"),
+        "answer": row.get("Answer") or row.get("Svar")
+    }
+
+def _stock(row):
+    return {
+        "sku": row.get("SKU"),
+        "stock": row.get("Stock") or row.get("Lager") or row.get("Inventory"),
+        "location": row.get("Location")
+    }
+
+def _review(row):
+    return {
+        "product": row.get("Product") or row.get("Produkt"),
+        "review": row.get("Review") or row.get("Recension"),
+        "rating": row.get("Rating") or row.get("Betyg")
+    }
+
+def _as_is(row):
+    return dict(row)
+
+def detect_type(filename, fieldnames):
+    """Måltyp utifrån CSV-rubrikerna: (json-filnamn, radkonverterare)."""
+    lower_keys = [k.lower() for k in fieldnames or []]
     if "title" in lower_keys or "name" in lower_keys:
-        products = []
-        for row in rows:
-            name = str(row.get("Title") or row.get("Name") or "")
-            description = str(row.get("Body (HTML)") or row.get("Description") or "")
-            if not name.strip() and not description.strip():
-                continue  # hoppa över rader utan namn och beskrivning
-            price = None
-            for price_field in ["Variant Price", "Price", "Price (SEK)"]:
-                if row.get(price_field):
-                    try:
-                        price = float(row[price_field].replace(",", "."))
-                        break
-                    except Exception:
-                        pass
-            compatible_models = extract_compatible_models(name + " " + description)
-            product = {
-                "name": name,
-                "description": description,
-                "price_sek": price,
-                "vendor": row.get("Vendor"),
-                "product_type": row.get("Type") or row.get("Product Category"),
-                "tags": [t.strip() for t in (row.get("Tags") or "").split(",") if t.strip()],
-                "sku": row.get("Variant SKU") or row.get("SKU"),
-                "barcode": row.get("Variant Barcode") or row.get("Barcode"),
-                "compatible_models": compatible_models
-            }
-            products.append(product)
-        return ("products.json", products)
-    # Felsökning
+        return "products.json", _product
     if "issue" in lower_keys or "steps" in lower_keys or "problem" in lower_keys:
-        troubleshooting = []
-        for row in rows:
-            troubleshooting.append({
-                "model": row.get("Model") or row.get("Bilmodell"),
-                "issue_keywords": [k.strip() for k in (row.get("Issue Keywords") or row.get("Problem") or "").split(",") if k.strip()],
-                "steps": [s.strip() for s in (row.get("Steps") or row.get("Åtgärd") or "").split(";") if s.strip()]
-            })
-        return ("troubleshooting.json", troubleshooting)
-    # FAQ/support
+        return "troubleshooting.json", _troubleshooting
     if "question" in lower_keys or "faq" in lower_keys:
-        faqs = []
-        for row in rows:
-            faqs.append({
-                "question": row.get("Question") or row.get("FAQ"),
-                "answer": row.get("Answer") or row.get("Svar")
-            })
-        return ("faq.json", faqs)
-    # Lagerstatus
+        return "faq.json", _faq
     if "stock" in lower_keys or "lager" in lower_keys or "inventory" in lower_keys:
-        stock = []
-        for row in rows:
-            stock.append({
-                "sku": row.get("SKU"),
-                "stock": row.get("Stock") or row.get("Lager") or row.get("Inventory"),
-                "location": row.get("Location")
-            })
-        return ("stock.json", stock)
-    # Recensioner
+        return "stock.json", _stock
     if "review" in lower_keys or "rating" in lower_keys:
-        reviews = []
-        for row in rows:
-            reviews.append({
-                "product": row.get("Product") or row.get("Produkt"),
-                "review": row.get("Review") or row.get("Recension"),
-                "rating": row.get("Rating") or row.get("Betyg")
-            })
-        return ("reviews.json", reviews)
+        return "reviews.json", _review
     # Okänd typ – spara som "other_<filename>.json"
-    return (f"other_{os.path.splitext(os.path.basename(filename))[0]}.json", rows)
-
-def main():
-    csv_files = [f for f in os.listdir(DATA_DIR) if f.endswith('.csv')]
-    for csv_file in csv_files:
-        path = os.path.join(DATA_DIR, csv_file)
-        with open(path, encoding='utf-8-sig') as f:
-            reader = csv.DictReader(f)
-            rows = list(reader)
-            if not rows:
-                print(f"{csv_file}: Ingen data.")
-                continue
-            json_name, data = guess_type_and_import(csv_file, rows)
-            json_path = os.path.join(DATA_DIR, json_name)
-            # Om det är lager, koppla till produkter via SKU om möjligt
-            if json_name == "stock.json":
-                prod_path = os.path.join(DATA_DIR, "products.json")
-                if os.path.exists(prod_path):
-                    with open(prod_path, encoding="utf-8") as pf:
-                        products = json.load(pf)
-                    stock_dict = {s['sku']: s for s in data if s.get('sku')}
-                    for p in products:
-                        if p.get('sku') and p['sku'] in stock_dict:
-                            p['stock'] = stock_dict[p['sku']]['stock']
-                    with open(prod_path, "w", encoding="utf-8") as pf:
-                        json.dump(products, pf, ensure_ascii=False, indent=2)
-                    print(f"Lagerstatus kopplad till produkter via SKU.")
-            # Spara JSON
-            with open(json_path, "w", encoding="utf-8") as jf:
-                json.dump(data, jf, ensure_ascii=False, indent=2)
-            print(f"{csv_file} -> {json_name} ({len(data)} rader)")
+    return f"other_{os.path.splitext(os.path.basename(filename))[0]}.json", _as_is
+
+def guess_type_and_import(filename, rows):
+    """Konverterar redan inlästa rader (bakåtkompatibelt gränssnitt)."""
+    json_name, convert = detect_type(filename, rows[0].keys())
+    return json_name, [r for r in map(convert, rows) if r is not None]
+
+def read_header(path):
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        return next(csv.reader(f), None)
+
+def iter_records(path, convert):
+    """Strömmar konverterade rader ur en CSV-fil."""
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            record = convert(row)
+            if record is not None:
+                yield record
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class JsonArrayWriter:
+    """Skriver en JSON-lista post för post till en temporärfil som byts in atomärt."""
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        self.count = 0
+
+    def __enter__(self):
+        self._file = open(self.tmp_path, "w", encoding="utf-8")
+        self._file.write("[")
+        return self
+
+    def write(self, record):
+        self._file.write(",\n  " if self.count else "\n  ")
+        self._file.write(json.dumps(record, ensure_ascii=False))
+        self.count += 1
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.write("\n]\n" if self.count else "]\n")
+        self._file.close()
+        # Tomma filer och avbrutna körningar lämnar befintlig JSON orörd
+        if exc_type is None and self.count:
+            os.replace(self.tmp_path, self.path)
+        else:
+            os.remove(self.tmp_path)
+        return False
+
+def init_database():
+    """Skapar tabellerna (görs inte längre vid import av databasmodulen)."""
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+    from app.pipelineserver.pipeline_app.database import init_db
+
+    init_db()
+
+def export_to_sqlite(json_name, data):
+    """Massimporterar produkter/FAQ till pipeline-databasen (bara nya och ändrade rader)."""
+    init_database()
+    from app.pipelineserver.pipeline_app.services.catalog_import import BulkCatalogImporter
+
+    importer = BulkCatalogImporter()
+    if json_name == "products.json":
+        report = importer.import_products(data)
+    elif json_name == "faq.json":
+        report = importer.import_faq(data)
+    else:
+        return None
+    print(f"SQLite ({json_name}): {report['inserted']} nya, {report['updated']} uppdaterade, "
+          f"{report['unchanged']} oförändrade, {report['skipped']} överhoppade "
+          f"({report['rows_per_sec']:.0f} rader/s)")
+    return report
+
+def import_file(csv_file, json_name, write_sqlite=False, data_dir=DATA_DIR):
+    """Strömmar en CSV-fil till sin JSON-fil (och databasen); returnerar statistik."""
+    path = os.path.join(data_dir, csv_file)
+    _, convert = detect_type(csv_file, read_header(path))
+    started = time.perf_counter()
+    with JsonArrayWriter(os.path.join(data_dir, json_name)) as out:
+        records = iter_records(path, convert)
+        if write_sqlite and json_name in ("products.json", "faq.json"):
+            def tee():
+                for record in records:
+                    out.write(record)
+                    yield record
+            export_to_sqlite(json_name, tee())
+        else:
+            for record in records:
+                out.write(record)
+    seconds = max(time.perf_counter() - started, 1e-9)
+    return {
+        "file": csv_file,
+        "json_name": json_name,
+        "rows": out.count,
+        "seconds": seconds,
+        "rows_per_sec": out.count / seconds,
+        "mb_per_sec": os.path.getsize(path) / seconds / 1e6,
+    }
+
+def import_group(csv_files, json_name, write_sqlite=False, data_dir=DATA_DIR):
+    """Filer med samma måltyp körs i tur och ordning (sista filen vinner, som tidigare)."""
+    return [import_file(f, json_name, write_sqlite, data_dir) for f in csv_files]
+
+def link_stock_to_products(data_dir=DATA_DIR):
+    """Koppla lagerstatus till produkter via SKU."""
+    prod_path = os.path.join(data_dir, "products.json")
+    stock_path = os.path.join(data_dir, "stock.json")
+    if not (os.path.exists(prod_path) and os.path.exists(stock_path)):
+        return
+    with open(stock_path, encoding="utf-8") as sf:
+        stock_dict = {s['sku']: s for s in json.load(sf) if s.get('sku')}
+    with open(prod_path, encoding="utf-8") as pf:
+        products = json.load(pf)
+    for p in products:
+        if p.get('sku') and p['sku'] in stock_dict:
+            p['stock'] = stock_dict[p['sku']]['stock']
+    with open(prod_path, "w", encoding="utf-8") as pf:
+        json.dump(products, pf, ensure_ascii=False, indent=2)
+    print("Lagerstatus kopplad till produkter via SKU.")
+
+def _load_manifest(data_dir):
+    try:
+        with open(os.path.join(data_dir, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_manifest(data_dir, manifest):
+    with open(os.path.join(data_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+SQLITE_TARGETS = ("products.json", "faq.json")
+
+def import_targets(json_name, write_sqlite):
+    """Vad en import av gruppen skriver: "json" eller "json+sqlite"."""
+    return "json+sqlite" if write_sqlite and json_name in SQLITE_TARGETS else "json"
+
+def _manifest_entry(manifest, csv_file):
+    """Manifestpost som dict (äldre manifest sparade bara hashen)."""
+    entry = manifest.get(csv_file)
+    if isinstance(entry, str):
+        return {"sha256": entry, "json": None, "targets": "json"}
+    return entry or {}
+
+def _group_unchanged(manifest, files, hashes, json_name, targets, data_dir):
+    """Sant om ingen fil i gruppen har ändrats, tillkommit eller försvunnit och målen är desamma."""
+    if not os.path.exists(os.path.join(data_dir, json_name)):
+        return False
+    for csv_file in files:
+        entry = _manifest_entry(manifest, csv_file)
+        if entry.get("sha256") != hashes[csv_file] or entry.get("json") != json_name:
+            return False
+        # En import med databas täcker även en ren JSON-import, men inte tvärtom
+        if entry.get("targets") != targets and targets != "json":
+            return False
+    previous = {f for f in manifest if _manifest_entry(manifest, f).get("json") == json_name}
+    return previous <= set(files)
+
+def _flag_value(name, default=None):
+    for arg in sys.argv[1:]:
+        if arg.startswith(f"{name}="):
+            return arg.split("=", 1)[1]
+    return default
+
+def main(write_sqlite=None, force=None, workers=None, data_dir=DATA_DIR):
+    if write_sqlite is None:
+        write_sqlite = "--sqlite" in sys.argv or os.environ.get("CATALOG_BACKEND", "").lower() == "sqlite"
+    if force is None:
+        force = "--force" in sys.argv
+    if workers is None:
+        workers = int(_flag_value("--workers", 0)) or os.cpu_count() or 1
+
+    manifest = _load_manifest(data_dir)
+    hashes = {}
+    groups = {}
+    for csv_file in sorted(f for f in os.listdir(data_dir) if f.endswith('.csv')):
+        path = os.path.join(data_dir, csv_file)
+        hashes[csv_file] = file_hash(path)
+        header = read_header(path)
+        if not header:
+            print(f"{csv_file}: Ingen data.")
+            continue
+        json_name, _ = detect_type(csv_file, header)
+        groups.setdefault(json_name, []).append(csv_file)
+    # JSON-filen skrivs per grupp, så en ändrad fil kräver att hela gruppen importeras om
+    for json_name, files in list(groups.items()):
+        if not force and _group_unchanged(
+            manifest, files, hashes, json_name, import_targets(json_name, write_sqlite), data_dir
+        ):
+            print(f"{', '.join(files)}: oförändrad, hoppar över.")
+            del groups[json_name]
+
+    results = []
+    if write_sqlite and groups:
+        # En gång före poolen, så att arbetsprocesserna inte skapar tabeller samtidigt
+        init_database()
+    if len(groups) > 1 and workers > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(groups))) as pool:
+            futures = [pool.submit(import_group, files, name, write_sqlite, data_dir) for name, files in groups.items()]
+            for future in futures:
+                results.extend(future.result())
+    else:
+        for name, files in groups.items():
+            results.extend(import_group(files, name, write_sqlite, data_dir))
+
+    for stats in results:
+        if not stats["rows"]:
+            print(f"{stats['file']}: Ingen data.")
+        else:
+            print(f"{stats['file']} -> {stats['json_name']} ({stats['rows']} rader, "
+                  f"{stats['rows_per_sec']:.0f} rader/s, {stats['mb_per_sec']:.1f} MB/s)")
+        manifest[stats["file"]] = {
+            "sha256": hashes[stats["file"]],
+            "json": stats["json_name"],
+            "targets": import_targets(stats["json_name"], write_sqlite),
+        }
+    # Borttagna CSV-filer ska inte längre räknas till sina grupper
+    for csv_file in [f for f in manifest if f not in hashes]:
+        del manifest[csv_file]
+    # Koppla lagerstatus till produkter via SKU om någon av dem importerats om
+    if "stock.json" in groups or "products.json" in groups:
+        link_stock_to_products(data_dir)
+    _save_manifest(data_dir, manifest)
+    return results
 
 if __name__ == "__main__":
     main()
@@ -2,6 +2,7 @@ import csv
 import json
 import re
 import os
+import sys
 
 # Lista över bilmodeller (kan byggas ut eller hämtas från externt API)
 CAR_MODELS = [
@@ -12,53 +13,86 @@ CAR_MODELS = [
 CSV_PATH = os.path.join(os.path.dirname(__file__), '../../data/products_export.csv')
 JSON_PATH = os.path.join(os.path.dirname(__file__), '../../data/products.json')
 
+# Alla märken i en kompilerad alternation (längsta först), ett svep per text
+_CAR_MODEL_PATTERN = re.compile(
+    r"\b(?:" + "|".join(re.escape(m) for m in sorted(CAR_MODELS, key=len, reverse=True)) + r")\b",
+    re.IGNORECASE,
+)
+_CAR_MODEL_NAMES = {m.lower(): m for m in CAR_MODELS}
+
 def extract_compatible_models(text):
     """Försök hitta bilmodeller i text (namn, beskrivning etc)."""
-    found = set()
     if not text:
         return []
-    for model in CAR_MODELS:
-        pattern = r'\\b' + re.escape(model) + r'\\b'
-        if re.search(pattern, text, re.IGNORECASE):
-            found.add(model)
-    return list(found)
+    return list(dict.fromkeys(_CAR_MODEL_NAMES[m.lower()] for m in _CAR_MODEL_PATTERN.findall(text)))
+
+def product_from_row(row):
+    """En rad i Shopify-exporten i katalogformat."""
+    name = row.get("Title") or row.get("Name")
+    description = row.get("Body (HTML)") or row.get("Description") or ""
+    price = None
+    for price_field in ["Variant Price", "Price", "Price (SEK)"]:
+        if row.get(price_field):
+            try:
+                price = float(row[price_field].replace(",", "."))
+                break
+            except Exception:
+                pass
+    compatible_models = extract_compatible_models((name or "") + " " + description)
+    # Exempel på extrafält: vendor, product_type, tags, sku, barcode
+    return {
+        "name": name,
+        "description": description,
+        "price_sek": price,
+        "vendor": row.get("Vendor"),
+        "product_type": row.get("Type") or row.get("Product Category"),
+        "tags": [t.strip() for t in (row.get("Tags") or "").split(",") if t.strip()],
+        "sku": row.get("Variant SKU") or row.get("SKU"),
+        "barcode": row.get("Variant Barcode") or row.get("Barcode"),
+        "compatible_models": compatible_models,
+        # Fält för framtida användning:
+        # "success_rate": None,
+        # "installation_time": None,
+        # "canbus_required": None
+    }
+
+def iter_products(csv_path=CSV_PATH):
+    """Strömmar produkter ur CSV-filen en rad i taget."""
+    with open(csv_path, encoding="utf-8-sig") as csvfile:
+        for row in csv.DictReader(csvfile):
+            yield product_from_row(row)
+
+def export_to_sqlite(products):
+    """Massimporterar produkter (iterable, gärna strömmad) till pipeline-databasen.
+
+    Endast nya och ändrade rader skrivs; oförändrade känns igen på innehållshash.
+    """
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+    from app.pipelineserver.pipeline_app.database import init_db
+    from app.pipelineserver.pipeline_app.services.catalog_import import BulkCatalogImporter
+
+    # Tabellerna skapas inte längre vid import av databasmodulen
+    init_db()
+    report = BulkCatalogImporter().import_products(products)
+    print(f"SQLite-katalog uppdaterad: {report['inserted']} nya, {report['updated']} uppdaterade, "
+          f"{report['unchanged']} oförändrade, {report['skipped']} överhoppade "
+          f"({report['rows_per_sec']:.0f} rader/s)")
+    return report
 
-def main():
-    products = []
-    with open(CSV_PATH, encoding="utf-8-sig") as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            name = row.get("Title") or row.get("Name")
-            description = row.get("Body (HTML)") or row.get("Description") or ""
-            price = None
-            for price_field in ["Variant Price", "Price", "Price (SEK)"]:
-                if row.get(price_field):
-                    try:
-                        price = float(row[price_field].replace(",", "."))
-                        break
-                    except Exception:
-                        pass
-            compatible_models = extract_compatible_models(name + " " + description)
-            # Exempel på extrafält: vendor, product_type, tags, sku, barcode
-            product = {
-                "name": name,
-                "description": description,
-                "price_sek": price,
-                "vendor": row.get("Vendor"),
-                "product_type": row.get("Type") or row.get("Product Category"),
-                "tags": [t.strip() for t in (row.get("Tags") or "").split(",") if t.strip()],
-                "sku": row.get("Variant SKU") or row.get("SKU"),
-                "barcode": row.get("Variant Barcode") or row.get("Barcode"),
-                "compatible_models": compatible_models,
-                # Fält för framtida användning:
-                # "success_rate": None,
-                # "installation_time": None,
-                # "canbus_required": None
-            }
-            products.append(product)
+def main(write_sqlite=None, write_json=None):
+    if write_sqlite is None:
+        write_sqlite = "--sqlite" in sys.argv or os.environ.get("CATALOG_BACKEND", "").lower() == "sqlite"
+    if write_json is None:
+        write_json = "--no-json" not in sys.argv
+    if not write_json:
+        # Endast databas: raderna strömmas direkt in utan att hela filen hålls i minnet
+        return export_to_sqlite(iter_products(CSV_PATH))
+    products = list(iter_products(CSV_PATH))
     with open(JSON_PATH, "w", encoding="utf-8") as f:
         json.dump(products, f, ensure_ascii=False, indent=2)
     print(f"{len(products)} produkter exporterade till {JSON_PATH}")
+    if write_sqlite:
+        export_to_sqlite(products)
     print("Exempelfält i varje produkt:")
     print(json.dumps(products[0], indent=2, ensure_ascii=False))
 
@@ -0,0 +1,27 @@
+"""Förberäknar installationsguider per kanonisk bilmodell (inkrementellt).
+
+Kör efter import av ny katalog eller kunskapsbas:
+
+    python -m app.pipelineserver.tools.precompute_install_guides [--force]
+
+Bara modeller vars produkt eller RAG-källor ändrats byggs om; `--force` bygger om alla.
+"""
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+
+from app.pipelineserver.pipeline_app.pipelines.azom_installation_pipeline import AZOMInstallationPipeline  # noqa: E402
+
+
+def main(force=None):
+    if force is None:
+        force = "--force" in sys.argv
+    report = asyncio.run(AZOMInstallationPipeline().guide_builder().rebuild(force=force))
+    print(json.dumps(report, ensure_ascii=False))
+    return report
+
+if __name__ == "__main__":
+    main()
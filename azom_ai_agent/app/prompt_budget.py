@@ -0,0 +1,162 @@
+"""Token-medveten budgetering av prompter innan de skickas till LLM.
+
+Prompten delas upp i sektioner (systemprompt, promptfiler, minne, RAG-kontext,
+användarfråga) med prioritet. Om summan överstiger modellens kontextbudget
+trimmas sektioner med lägst prioritet först – listsektioner (t.ex. RAG-träffar)
+kortas från svansen, övriga valfria sektioner tas bort helt.
+
+Tokenräkning: med beroendena i `requirements.txt` räknas tokens som
+`ceil(len(text) / 4)` – en uppskattning som ligger nära BPE-tokenizers för
+svensk och engelsk löptext men kan avvika för kod, siffror och upprepade
+tecken, så budgeten bör ha marginal. `tiktoken` ingår inte i beroendena;
+installeras det används modellens riktiga tokenizer i stället. Går
+tokenizern inte att ladda (t.ex. ingen nätåtkomst för BPE-filerna) används
+uppskattningen.
+"""
+from __future__ import annotations
+
+import math
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.logger import get_logger
+
+__all__ = ["PromptBudget", "MODEL_CONTEXT_TOKENS", "DEFAULT_CONTEXT_TOKENS"]
+
+logger = get_logger(__name__)
+
+# Kontextfönster per känd modell (tokens)
+MODEL_CONTEXT_TOKENS: Dict[str, int] = {
+    "gpt-4o": 128_000,
+    "gpt-4o-mini": 128_000,
+    "llama3-8b-8192": 8_192,
+    "llama3-70b-8192": 8_192,
+}
+DEFAULT_CONTEXT_TOKENS = 8_192
+
+# Ungefärlig overhead per chattmeddelande (roll, avgränsare)
+_TOKENS_PER_MESSAGE = 4
+
+
+@lru_cache(maxsize=16)
+def _get_encoder(model: Optional[str]) -> Any:
+    """Returnerar en tiktoken-encoder för modellen, eller None (uppskattning används)."""
+    try:
+        import tiktoken  # type: ignore
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model or "")
+    except KeyError:
+        pass  # Okänd modell – använd standardkodningen
+    except Exception as e:
+        logger.warning("tiktoken kunde inte laddas, räknar ~4 tecken per token: %s", e)
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning("tiktoken kunde inte laddas, räknar ~4 tecken per token: %s", e)
+        return None
+
+
+class PromptBudget:
+    """Räknar tokens per promptsektion och trimmar till en modellbudget."""
+
+    def __init__(self, max_prompt_tokens: int, model: Optional[str] = None):
+        """
+        Args:
+            max_prompt_tokens: Max antal tokens för hela prompten (exkl. svar)
+            model: Modellnamn, används för att välja tokenizer
+        """
+        self.max_prompt_tokens = max(1, int(max_prompt_tokens))
+        self.model = model
+
+    @classmethod
+    def for_model(
+        cls,
+        model: Optional[str],
+        reserve_output_tokens: int = 0,
+        max_prompt_tokens: Optional[int] = None,
+    ) -> "PromptBudget":
+        """
+        Skapar en budget utifrån modellens kontextfönster.
+
+        Args:
+            model: Modellnamn (okända modeller får DEFAULT_CONTEXT_TOKENS)
+            reserve_output_tokens: Tokens som reserveras för modellens svar
+            max_prompt_tokens: Explicit tak som ersätter modellens kontextstorlek
+        """
+        context = max_prompt_tokens or MODEL_CONTEXT_TOKENS.get(model or "", DEFAULT_CONTEXT_TOKENS)
+        return cls(context - reserve_output_tokens, model=model)
+
+    def count(self, text: str) -> int:
+        """Antal tokens i `text`."""
+        if not text:
+            return 0
+        encoder = _get_encoder(self.model)
+        if encoder is not None:
+            return len(encoder.encode(text))
+        # Standardfallet (tiktoken ingår inte i requirements.txt)
+        return math.ceil(len(text) / 4)
+
+    def count_messages(self, messages: List[Dict[str, str]]) -> int:
+        """Antal tokens för en lista chattmeddelanden inklusive overhead per meddelande."""
+        return sum(self.count(m.get("content", "")) + _TOKENS_PER_MESSAGE for m in messages)
+
+    def _section_tokens(self, section: Dict[str, Any]) -> int:
+        if "items" in section:
+            return sum(self.count(item) + 1 for item in section["items"])
+        return self.count(section.get("content", ""))
+
+    def fit(self, sections: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Trimmar sektioner med lägst prioritet tills prompten ryms i budgeten.
+
+        Varje sektion är ett dictionary med `name`, `priority` (högre behålls längre),
+        `required` (tas aldrig bort) och antingen `content` (str) eller `items` (lista
+        med str som trimmas bakifrån).
+
+        Returns:
+            Tupel med (behållna sektioner i ursprunglig ordning, rapport)
+        """
+        kept = [dict(s, items=list(s["items"])) if "items" in s else dict(s) for s in sections]
+        tokens = [self._section_tokens(s) for s in kept]
+        total = sum(tokens)
+        trimmed: List[str] = []
+
+        while total > self.max_prompt_tokens:
+            candidates = [
+                i for i, s in enumerate(kept)
+                if not s.get("required") and (s.get("items") or s.get("content"))
+            ]
+            if not candidates:
+                break
+            idx = min(candidates, key=lambda i: (kept[i].get("priority", 0), -i))
+            section = kept[idx]
+            if section.get("items"):
+                section["items"].pop()
+                trimmed.append(f"{section['name']}[-1]")
+            else:
+                section["content"] = ""
+                trimmed.append(section["name"])
+            new_tokens = self._section_tokens(section)
+            total -= tokens[idx] - new_tokens
+            tokens[idx] = new_tokens
+
+        result = [s for s in kept if s.get("items") or s.get("content")]
+        report = {
+            "model": self.model,
+            "budget_tokens": self.max_prompt_tokens,
+            "total_tokens": total,
+            "sections": {s["name"]: t for s, t in zip(kept, tokens, strict=True) if t},
+            "trimmed": trimmed,
+            "over_budget": total > self.max_prompt_tokens,
+        }
+        try:
+            if report["over_budget"]:
+                logger.warning("Prompt exceeds token budget after trimming", extra=report)
+            else:
+                logger.info("Prompt budget applied", extra=report)
+        except Exception:
+            pass
+        return result, report
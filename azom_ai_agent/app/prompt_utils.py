@@ -3,7 +3,10 @@ import re
 import aiofiles
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Any, Union, Optional
+from typing import Dict, List, Any, Union, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from app.prompt_budget import PromptBudget
 
 async def inject_prompt_vars(prompt: str, context: Dict[str, Any]) -> str:
     """
@@ -53,18 +56,31 @@ async def select_prompts(context: Dict[str, Any]) -> List[Path]:
         
     return paths
 
-async def compose_full_prompt(user_prompt: str, context: Dict[str, Any]) -> str:
+# Prioritet per promptfil vid token-budgetering (högre behålls längre).
+# Filer som saknas här räknas som obligatoriska.
+PROMPT_PRIORITIES: Dict[str, int] = {
+    'azom_safetyfilter_v1': 50,
+    'azom_memoryinject_v1': 20,
+}
+
+async def compose_full_prompt(
+    user_prompt: str,
+    context: Dict[str, Any],
+    budget: Optional["PromptBudget"] = None,
+) -> str:
     """
     Sammanställer en komplett prompt med system- och användarprompt.
     
     Args:
         user_prompt: Användarens fråga eller direktiv
         context: Dictionary med context-information
+        budget: Valfri PromptBudget; valfria promptfiler med lägst prioritet
+                tas bort om prompten inte ryms
         
     Returns:
         Komplett prompt för LLM
     """
-    texts: List[str] = []
+    sections: List[Dict[str, Any]] = []
     prompt_paths = await select_prompts(context)
     
     for path in prompt_paths:
@@ -72,16 +88,39 @@ async def compose_full_prompt(user_prompt: str, context: Dict[str, Any]) -> str:
             # Asynkron filöppning för att minimera blockering av event-loop
             async with aiofiles.open(path, mode='r', encoding='utf-8') as f:
                 content = await f.read()
-                texts.append(await inject_prompt_vars(content, context))
+                name = path.stem
+                priority = PROMPT_PRIORITIES.get(name)
+                sections.append({
+                    'name': name,
+                    'content': await inject_prompt_vars(content, context),
+                    'priority': priority or 100,
+                    'required': priority is None,
+                })
         except FileNotFoundError:
             # Skip missing prompt file in test/dev environments
             continue
     
     # Fallback defaults if no prompt files were found
-    if not texts:
-        texts.append("AZOM Systemprompt: Du är en hjälpsam AI-assistent från AZOM.")
+    if not sections:
+        sections.append({
+            'name': 'fallback_system',
+            'content': "AZOM Systemprompt: Du är en hjälpsam AI-assistent från AZOM.",
+            'priority': 100,
+            'required': True,
+        })
         
+    texts = [s['content'] for s in sections]
     if context.get('safety_flag') and not any('säkerhet' in t.lower() or 'restriktiv' in t.lower() for t in texts):
-        texts.append("Säkerhetsfilter: Var restriktiv och fokusera på säkerhet.")
+        sections.append({
+            'name': 'fallback_safety',
+            'content': "Säkerhetsfilter: Var restriktiv och fokusera på säkerhet.",
+            'priority': 50,
+            'required': False,
+        })
+
+    if budget is not None:
+        user_section = {'name': 'user_prompt', 'content': user_prompt, 'priority': 1000, 'required': True}
+        fitted, _ = budget.fit(sections + [user_section])
+        sections = [s for s in fitted if s['name'] != 'user_prompt']
         
-    return '\n\n'.join(texts) + '\n\n' + user_prompt
+    return '\n\n'.join(s['content'] for s in sections) + '\n\n' + user_prompt
@@ -1,13 +1,26 @@
-from typing import Dict, Any
+import asyncio
+from typing import Dict, Any, Optional
+from app.logger import get_logger
 from app.prompt_utils import compose_full_prompt
+from app.prompt_budget import PromptBudget
+from app.conversation_window import ConversationWindow
 from app.services.protocols import LLMClientProtocol
+from app.core.feature_flags import generation_budget
+from app.core.modes import Mode
 from fastapi import Depends, HTTPException, status
 
+logger = get_logger(__name__)
+
 class AIService:
     """Service layer for handling AI-related business logic."""
 
-    def __init__(self, llm_client: LLMClientProtocol):
+    # Token count of the prompt sent by the most recent `query` call
+    last_prompt_tokens: Optional[int] = None
+
+    def __init__(self, llm_client: LLMClientProtocol, conversations: Optional[ConversationWindow] = None):
         self.llm_client = llm_client
+        # Server-side history for requests carrying a session_id; None keeps queries stateless
+        self.conversations = conversations
 
     def update_config(self, **kwargs: Any) -> None:
         """Placeholder for dynamic configuration updates."""
@@ -26,30 +39,52 @@ class AIService:
             )
         
         context = context or {}
+        session_id = context.get("session_id") if self.conversations is not None else None
         mode_val = str(context.get("azom_mode", "")).lower() if context else ""
         use_light_mode = mode_val == "light"
 
+        budget_kwargs = generation_budget(Mode.LIGHT if use_light_mode else Mode.FULL)
+        model_name = getattr(self.llm_client, "default_model", None)
+        prompt_budget = PromptBudget.for_model(
+            model_name if isinstance(model_name, str) else None,
+            reserve_output_tokens=budget_kwargs["max_tokens"],
+        )
+
         if use_light_mode:
             # Compose system prompt content from prompt templates only (no retrieval)
-            full_prompt = await compose_full_prompt(user_prompt, context)
+            full_prompt = await compose_full_prompt(user_prompt, context, budget=prompt_budget)
             # compose_full_prompt appends the user_prompt at the end; strip it for system-only content
             system_content = full_prompt
             if full_prompt.endswith(user_prompt):
                 system_content = full_prompt[: -len(user_prompt)].rstrip()
+        else:
+            # Default behavior: no system prompt; backends manage it
+            system_content = None
+
+        if session_id:
+            # Earlier turns (verbatim + rolling summary) fitted into the same token budget
+            messages, _ = await asyncio.to_thread(
+                self.conversations.build_messages, session_id, prompt_budget, user=user_prompt, system=system_content
+            )
+        elif system_content is not None:
             messages = [
                 {"role": "system", "content": system_content},
                 {"role": "user", "content": user_prompt},
             ]
         else:
-            # Default behavior: send only the user message; backends manage system prompt
             messages = [
                 {"role": "user", "content": user_prompt}
             ]
-        
+
+        self.last_prompt_tokens = prompt_budget.count_messages(messages)
+        logger.info(
+            "Final prompt size",
+            extra={"prompt_tokens": self.last_prompt_tokens, "budget_tokens": prompt_budget.max_prompt_tokens},
+        )
+
         try:
             # The model is now selected based on the backend configuration
-            response = await self.llm_client.chat(messages=messages)
-            return response
+            response = await self.llm_client.chat(messages=messages, **budget_kwargs)
         except Exception as e:
             # Log the exception properly in a real app
             print(f"Error querying LLM: {e}")
@@ -57,3 +92,6 @@ class AIService:
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail="The AI service is currently unavailable. Please try again later."
             )
+        if session_id and isinstance(response, str):
+            await asyncio.to_thread(self.conversations.record, session_id, user_prompt, response)
+        return response
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark för kompatibilitetsmatrisen i pipeline-servern.
+
+Genererar en syntetisk katalog (standard 100 000 produkter) och jämför
+flerkriteriefrågor mot `CompatibilityMatrix` med en linjär genomsökning.
+
+Användning:
+    python scripts/benchmark_compatibility_matrix.py --products 100000 --queries 200
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.pipelineserver.pipeline_app.services.compatibility_matrix import CompatibilityMatrix  # noqa: E402
+
+MAKES = ["Volvo", "Audi", "BMW", "VW", "Toyota", "Ford", "Kia", "Skoda", "Tesla", "Mercedes"]
+TAGS = ["premium", "dlr", "canbus", "carplay", "android auto", "kamera", "budget", "nyhet"]
+VENDORS = ["AZOM", "Other", "Nordic Parts", "CarTech"]
+
+
+def build_catalog(size: int, models: int, seed: int) -> List[Dict[str, Any]]:
+    """Skapar en syntetisk produktkatalog."""
+    rng = random.Random(seed)
+    model_names = [f"{rng.choice(MAKES)} M{i}" for i in range(models)]
+    return [
+        {
+            "name": f"Produkt {i}",
+            "price_sek": rng.randint(500, 15000),
+            "vendor": rng.choice(VENDORS),
+            "tags": rng.sample(TAGS, rng.randint(1, 3)),
+            "compatible_models": rng.sample(model_names, rng.randint(1, 8)),
+        }
+        for i in range(size)
+    ]
+
+
+def linear_query(products, car_model, tag, max_price, limit=20):
+    """Referens: samma fråga som en linjär genomsökning med sortering."""
+    car = car_model.lower()
+    hits = [
+        p for p in products
+        if car in (m.lower() for m in p["compatible_models"])
+        and tag in p["tags"]
+        and p["price_sek"] <= max_price
+    ]
+    hits.sort(key=lambda p: (p["vendor"].lower() != "azom", p["price_sek"]))
+    return hits[:limit]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--models", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    products = build_catalog(args.products, args.models, args.seed)
+    start = time.perf_counter()
+    matrix = CompatibilityMatrix(products)
+    build_s = time.perf_counter() - start
+    print(f"Katalog: {len(products)} produkter, {len(matrix.models)} bilmodeller")
+    print(f"Bygge av matris: {build_s * 1000:.1f} ms")
+
+    rng = random.Random(args.seed + 1)
+    queries = [
+        (rng.choice(products)["compatible_models"][0], rng.choice(TAGS), rng.randint(2000, 10000))
+        for _ in range(args.queries)
+    ]
+
+    start = time.perf_counter()
+    for car_model, tag, max_price in queries:
+        matrix.query(car_model=car_model, tags=[tag], max_price=max_price)
+    matrix_s = (time.perf_counter() - start) / len(queries)
+
+    linear_runs = queries[: max(1, len(queries) // 10)]
+    start = time.perf_counter()
+    for car_model, tag, max_price in linear_runs:
+        linear_query(products, car_model, tag, max_price)
+    linear_s = (time.perf_counter() - start) / len(linear_runs)
+
+    # Kontrollera att båda ger samma ordning (leverantör, pris); lika priser kan byta plats
+    def order_key(p):
+        return (p["vendor"].lower() != "azom", p["price_sek"])
+
+    for car_model, tag, max_price in linear_runs[:20]:
+        expected = [order_key(p) for p in linear_query(products, car_model, tag, max_price)]
+        result = matrix.query(car_model=car_model, tags=[tag], max_price=max_price)
+        assert [order_key(p) for p in result["products"]] == expected, (car_model, tag, max_price)
+
+    print(f"Matrisfråga:  {matrix_s * 1e6:10.1f} µs/fråga")
+    print(f"Linjär sökning: {linear_s * 1e6:8.1f} µs/fråga")
+    print(f"Uppsnabbning: {linear_s / matrix_s:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
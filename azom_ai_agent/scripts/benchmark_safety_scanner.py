@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark för SafetyService regelbaserade kontroller.
+
+Jämför den kompilerade flermönsterskannern (`PatternScanner`, ett svep per
+text) med den tidigare varianten – ett `re.search` per mönster och kategori –
+på långa syntetiska texter, och kontrollerar att båda hittar samma kategorier.
+
+Användning:
+    python scripts/benchmark_safety_scanner.py --texts 200 --length 20000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.pipelineserver.pipeline_app.services.safety_service import SafetyService  # noqa: E402
+
+WORDS = [
+    "hur", "installerar", "jag", "AZOM", "DLR", "i", "min", "Volvo", "XC60", "kabeln", "säkringen",
+    "CAN-bus", "modul", "steg", "2019", "bakom", "panelen", "reläet", "12V", "jord", "mellan",
+]
+SPICE = [
+    "070-123 45 67", "19900101-1234", "08-1234567", "helvete", "password: hunter2",
+    "api_key=abc123", "politik", "token = xyz", "lösenord:abc",
+]
+
+
+def build_texts(count: int, length: int, spice_rate: float, seed: int) -> List[str]:
+    """Långa texter av vanliga ord med enstaka känsliga inslag."""
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(count):
+        parts: List[str] = []
+        size = 0
+        while size < length:
+            word = rng.choice(SPICE) if rng.random() < spice_rate else rng.choice(WORDS)
+            parts.append(word)
+            size += len(word) + 1
+        texts.append(" ".join(parts))
+    return texts
+
+
+def legacy_scan(patterns: Dict[str, List[str]], text: str) -> List[str]:
+    """Referens: ett `re.search` per mönster och kategori (tidigare implementation)."""
+    found = []
+    for category, items in patterns.items():
+        for pattern in items:
+            if re.search(pattern, text, re.IGNORECASE):
+                found.append(category)
+                break
+    return found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=200)
+    parser.add_argument("--length", type=int, default=20_000, help="Ungefärligt antal tecken per text")
+    parser.add_argument("--spice-rate", type=float, default=0.0005, help="Andel ord som är känsliga")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    service = SafetyService()
+    texts = build_texts(args.texts, args.length, args.spice_rate, args.seed)
+    # Rena texter: värsta fallet för båda varianterna (inget tidigt avbrott)
+    texts += build_texts(max(1, args.texts // 4), args.length, 0.0, args.seed + 1)
+
+    for text in texts:
+        assert service._input_scanner.scan(text) == legacy_scan(service._patterns, text), text[:80]
+
+    start = time.perf_counter()
+    for text in texts:
+        legacy_scan(service._patterns, text)
+    legacy_s = (time.perf_counter() - start) / len(texts)
+
+    start = time.perf_counter()
+    for text in texts:
+        service._input_scanner.scan(text)
+    scanner_s = (time.perf_counter() - start) / len(texts)
+
+    print(f"Texter: {len(texts)} à ~{args.length} tecken")
+    print(f"re.search per mönster: {legacy_s * 1e3:8.3f} ms/text")
+    print(f"PatternScanner:        {scanner_s * 1e3:8.3f} ms/text")
+    print(f"Uppsnabbning: {legacy_s / scanner_s:.1f}x (identiska kategorier för alla texter)")
+
+
+if __name__ == "__main__":
+    main()
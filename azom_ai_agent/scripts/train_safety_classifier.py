@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tränar och utvärderar SafetyService förklassificerare.
+
+Indata är JSONL med en rad per bedömd text, t.ex. insamlade utslag från
+LLM-moderatorn: {"text": "...", "unsafe": false}. En del hålls utanför
+träningen och rapporteras: hur stor andel som avgörs lokalt (undvikna
+LLM-anrop), överensstämmelse med etiketterna för de lokala besluten och
+totalt, samt tid per klassificering.
+
+Användning:
+    python scripts/train_safety_classifier.py data/moderation_labels.jsonl \\
+        --save data/safety_classifier.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import List, Tuple
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.pipelineserver.pipeline_app.services.safety_classifier import (  # noqa: E402
+    UNCERTAIN,
+    UNSAFE,
+    SafetyPreClassifier,
+)
+
+
+def load_examples(path: str) -> List[Tuple[str, bool]]:
+    examples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                examples.append((row["text"], bool(row["unsafe"])))
+    return examples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("labels", help="JSONL med text och unsafe")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Andel som används för utvärdering")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--safe-below", type=float, default=0.25)
+    parser.add_argument("--unsafe-above", type=float, default=0.9)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save", help="Spara vikterna till denna JSON-fil")
+    args = parser.parse_args()
+
+    examples = load_examples(args.labels)
+    random.Random(args.seed).shuffle(examples)
+    split = int(len(examples) * (1 - args.holdout))
+    train, test = examples[:split], examples[split:]
+
+    classifier = SafetyPreClassifier(safe_below=args.safe_below, unsafe_above=args.unsafe_above)
+    classifier.fit(train, epochs=args.epochs, seed=args.seed)
+
+    local = local_agreed = agreed = 0
+    start = time.perf_counter()
+    for text, unsafe in test:
+        decision, probability = classifier.decide(text)
+        agreed += (probability >= 0.5) == unsafe
+        if decision != UNCERTAIN:
+            local += 1
+            local_agreed += (decision == UNSAFE) == unsafe
+    elapsed = time.perf_counter() - start
+
+    print(f"Träning: {len(train)}  Utvärdering: {len(test)}")
+    if test:
+        print(f"Undvikna LLM-anrop:           {local / len(test):6.1%}")
+        print(f"Överensstämmelse, lokala:     {local_agreed / local:6.1%}" if local else "Inga lokala beslut")
+        print(f"Överensstämmelse, totalt:     {agreed / len(test):6.1%}")
+        print(f"Tid per klassificering:       {elapsed / len(test) * 1e6:6.1f} µs")
+    if args.save:
+        classifier.save(args.save)
+        print(f"Sparade modellen till {args.save}")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,7 +13,7 @@ from app.pipelineserver.pipeline_app.services.llm_client import get_llm_client,
 # --- Mocking Dependencies ---
 
 class DummyLLM(LLMServiceProtocol):
-    async def chat(self, messages, model=None, stream=False):
+    async def chat(self, messages, model=None, stream=False, **kwargs):
         return "Detta är ett testsvar från mocken."
 
     async def aclose(self):
@@ -0,0 +1,100 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.deadline import (
+    Deadline,
+    DeadlineExceeded,
+    current_deadline,
+    mark_degraded,
+    remaining_seconds,
+    reset_deadline,
+    set_deadline,
+)
+from app.core.feature_flags import deadline_exempt
+from app.core.modes import Mode
+from app.middlewares.mode import ModeMiddleware, _deadline_seconds
+from app.pipelineserver.pipeline_app.services.llm_client import _deadline_timeout
+from app.pipelineserver.pipeline_app.services.memory_service import MemoryService
+from app.pipelineserver.pipeline_app.services.rag_service import RAGService
+
+
+@pytest.fixture
+def expired_deadline():
+    deadline = Deadline(0)
+    token = set_deadline(deadline)
+    yield deadline
+    reset_deadline(token)
+
+
+def test_deadline_tracks_remaining_and_degraded_stages():
+    deadline = Deadline(5, min_stage_seconds=1.0)
+    assert 0 < deadline.remaining() <= 5
+    assert not deadline.expired()
+    assert not deadline.nearly_expired()
+    assert deadline.nearly_expired(min_seconds=10)
+    deadline.mark_degraded("rag")
+    deadline.mark_degraded("rag")
+    assert deadline.partial
+    assert deadline.degraded == ["rag"]
+
+
+def test_helpers_are_noops_without_deadline():
+    assert current_deadline() is None
+    assert remaining_seconds(3.0) == 3.0
+    mark_degraded("rag")
+    assert _deadline_timeout(30.0) == {}
+
+
+def test_client_header_can_only_shorten_mode_budget():
+    assert _deadline_seconds(Mode.LIGHT, None) == 10.0
+    assert _deadline_seconds(Mode.LIGHT, "2500") == 2.5
+    assert _deadline_seconds(Mode.LIGHT, "600000") == 10.0
+    assert _deadline_seconds(Mode.FULL, "not-a-number") == 60.0
+
+
+def test_stage_timeout_is_capped_and_leaves_room_for_generation():
+    deadline = Deadline(60, max_stage_seconds=10, generation_reserve_seconds=30)
+    assert 9.9 < deadline.stage_timeout() <= 10
+    assert deadline.stage_timeout(3) <= 3
+    short = Deadline(12, max_stage_seconds=10, generation_reserve_seconds=8)
+    assert short.stage_timeout() <= 4
+    assert Deadline(5, generation_reserve_seconds=8).stage_timeout() == 0.0
+
+
+def test_batch_and_job_endpoints_run_without_deadline():
+    assert deadline_exempt("/chat/batch") and deadline_exempt("/jobs/abc")
+    assert not deadline_exempt("/chat/azom") and not deadline_exempt("/jobsearch")
+
+    app = FastAPI()
+    app.add_middleware(ModeMiddleware)
+
+    @app.post("/chat/batch")
+    @app.post("/chat/azom")
+    def probe():
+        return {"deadline": current_deadline() is not None}
+
+    client = TestClient(app)
+    assert client.post("/chat/batch").json() == {"deadline": False}
+    assert client.post("/chat/azom").json() == {"deadline": True}
+
+
+def test_llm_timeout_is_clamped_to_remaining_budget():
+    token = set_deadline(Deadline(2))
+    try:
+        assert _deadline_timeout(30.0)["timeout"] <= 2
+    finally:
+        reset_deadline(token)
+
+
+def test_llm_call_refused_when_deadline_expired(expired_deadline):
+    with pytest.raises(DeadlineExceeded):
+        _deadline_timeout(30.0)
+
+
+@pytest.mark.asyncio
+async def test_rag_and_memory_are_skipped_when_deadline_expired(expired_deadline):
+    assert await RAGService().search("AZOM DLR Volvo") == []
+    result = await MemoryService().save_context({"query": "x"}, user_id="deadline-test")
+    assert result["status"] == "skipped"
+    assert expired_deadline.degraded == ["rag", "memory"]
@@ -7,6 +7,7 @@ from app.core.feature_flags import (
     rag_enabled,
     llm_timeout_seconds,
     payload_cap_bytes,
+    generation_budget,
 )
 
 
@@ -34,3 +35,13 @@ def test_payload_cap_bytes():
     assert payload_cap_bytes(Mode.LIGHT) == 8000
     assert payload_cap_bytes(Mode.FULL) == 32000
     assert payload_cap_bytes(None) == 32000
+
+
+def test_generation_budget_is_shorter_in_light_mode():
+    light = generation_budget(Mode.LIGHT)
+    full = generation_budget(Mode.FULL)
+    assert light["max_tokens"] == 256
+    assert full["max_tokens"] == 1024
+    assert light["temperature"] <= full["temperature"]
+    assert light["stop"] and full["stop"]
+    assert generation_budget(None) == full
@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core.deadline import Deadline, reset_deadline, set_deadline
+from app.pipelineserver.pipeline_app.pipelines.base_pipeline import BasePipeline, PipelineResult, Stage, StageGraph
+
+
+@pytest.mark.asyncio
+async def test_independent_stages_run_concurrently():
+    """Oberoende steg körs samtidigt och beroende steg får sina indata."""
+    async def slow_x(x):
+        await asyncio.sleep(0.2)
+        return x
+
+    async def slow_y(y):
+        await asyncio.sleep(0.2)
+        return y
+
+    graph = StageGraph([
+        Stage("combine", lambda a, b: a + b, inputs=("a", "b")),
+        Stage("a", slow_x, inputs=("x",)),
+        Stage("b", slow_y, inputs=("y",)),
+    ])
+    started = time.perf_counter()
+    result = await graph.run(x=1, y=2)
+    assert time.perf_counter() - started < 0.35
+    assert result["combine"] == 3
+    assert set(result.timings) == {"a", "b", "combine", "total"}
+    assert result.slowest in ("a", "b")
+
+
+def test_graph_rejects_cycles_and_duplicate_outputs():
+    with pytest.raises(ValueError, match="Cykliskt"):
+        StageGraph([Stage("a", lambda b: b, inputs=("b",)), Stage("b", lambda a: a, inputs=("a",))])
+    with pytest.raises(ValueError, match="Dubbelt"):
+        StageGraph([Stage("a", lambda: 1), Stage("b", lambda: 2, output="a")])
+
+
+@pytest.mark.asyncio
+async def test_missing_external_input_raises():
+    graph = StageGraph([Stage("a", lambda x: x, inputs=("x",))])
+    with pytest.raises(ValueError, match="x"):
+        await graph.run()
+
+
+@pytest.mark.asyncio
+async def test_timeout_uses_fallback_and_marks_degraded():
+    async def hang():
+        await asyncio.sleep(5)
+
+    graph = StageGraph([
+        Stage("slow", hang, timeout=0.05, fallback=lambda error: "reserv"),
+        Stage("use", lambda slow: slow.upper(), inputs=("slow",)),
+    ])
+    deadline = Deadline(30)
+    token = set_deadline(deadline)
+    try:
+        result = await graph.run()
+    finally:
+        reset_deadline(token)
+    assert result["use"] == "RESERV"
+    assert result.errors == {"slow": "timeout"}
+    assert deadline.degraded == ["slow"]
+
+
+@pytest.mark.asyncio
+async def test_required_stage_failure_cancels_other_stages():
+    cancelled = []
+
+    async def long_running():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise KeyError("saknas")
+
+    graph = StageGraph([Stage("long", long_running), Stage("fail", fail)])
+    with pytest.raises(KeyError):
+        await graph.run()
+    assert cancelled == [True]
+
+
+@pytest.mark.asyncio
+async def test_memoized_stage_runs_once_per_input():
+    calls = []
+
+    def lookup(query):
+        calls.append(query)
+        return query.upper()
+
+    graph = StageGraph([Stage("lookup", lookup, inputs=("query",), memoize=True)], memo_size=2)
+    for query in ["a", "a", "b", "a"]:
+        assert (await graph.run(query=query))["lookup"] == query.upper()
+    assert calls == ["a", "b"]
+    graph.clear_memo()
+    await graph.run(query="a")
+    assert calls == ["a", "b", "a"]
+
+
+@pytest.mark.asyncio
+async def test_subclass_declares_stages():
+    class Double(BasePipeline):
+        def build_stages(self):
+            return [Stage("double", lambda n: n * 2, inputs=("n",))]
+
+    result = await Double().execute(n=21)
+    assert isinstance(result, PipelineResult)
+    assert result["double"] == 42
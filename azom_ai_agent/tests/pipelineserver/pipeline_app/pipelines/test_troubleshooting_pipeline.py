@@ -116,3 +116,28 @@ async def test_run_troubleshooting_deduplicates_steps():
     result = await pipeline.run_troubleshooting("no power", "Test CR-V")
     # Order is preserved from the first appearance
     assert result == {"steps": ["Check fuse", "Check battery", "Call support"]}
+
+@pytest.mark.asyncio
+async def test_run_troubleshooting_matches_car_model_variants():
+    """Test that spelling variants of a car model resolve to the same guide."""
+    pipeline = TroubleshootingPipeline()
+    pipeline.troubleshooting_data = [{
+        "model": "Volvo V70",
+        "issue_keywords": ["no power"],
+        "steps": ["Check CAN-bus adapter"]
+    }]
+    for variant in ("Volvo V-70", "V70 II", "volvo v70"):
+        result = await pipeline.run_troubleshooting("screen flickers", variant)
+        assert result == {"steps": ["Check CAN-bus adapter"]}
+
+@pytest.mark.asyncio
+async def test_run_troubleshooting_make_only_matches_all_models_of_the_make():
+    """Test that an ambiguous car model such as only the make still finds the make's guides."""
+    pipeline = TroubleshootingPipeline()
+    pipeline.troubleshooting_data = [
+        {"model": "Volvo V70", "issue_keywords": ["no power"], "steps": ["Check CAN-bus adapter"]},
+        {"model": "Volvo XC60", "issue_keywords": ["no sound"], "steps": ["Check speaker cable"]},
+        {"model": "Audi A4", "issue_keywords": ["no power"], "steps": ["Check fuse"]},
+    ]
+    result = await pipeline.run_troubleshooting("screen flickers", "Volvo")
+    assert result == {"steps": ["Check CAN-bus adapter", "Check speaker cable"]}
@@ -0,0 +1,52 @@
+import pytest
+
+from app.pipelineserver.pipeline_app.services.car_model_resolver import CarModelResolver, normalize_model
+
+MODELS = ["Volvo V70", "Volvo XC60", "Audi A4", "VW Golf", "BMW X5"]
+
+
+@pytest.fixture
+def resolver():
+    return CarModelResolver(MODELS, aliases={"Kombi 70": "Volvo V70"})
+
+
+def test_normalize_model_joins_hyphens_and_expands_make_aliases():
+    assert normalize_model("Volvo V-70") == "volvo v70"
+    assert normalize_model("  vw   GOLF ") == "volkswagen golf"
+
+
+@pytest.mark.parametrize("text", ["volvo v70", "Volvo V-70", "V70", "V70 II", "Volvo V70 2004", "kombi 70"])
+def test_variants_resolve_to_same_canonical_id(resolver, text):
+    assert resolver.canonical_id(text) == "volvo v70"
+
+
+def test_exact_match_has_full_confidence(resolver):
+    match = resolver.resolve("VOLVO XC60")
+    assert match.confidence == 1.0
+    assert match.method == "exact"
+    assert match.name == "Volvo XC60"
+
+
+def test_typo_is_resolved_with_lower_confidence(resolver):
+    match = resolver.resolve("Volvo XC6O")
+    assert match.canonical_id == "volvo xc60"
+    assert match.method == "fuzzy"
+    assert 0.6 <= match.confidence < 1.0
+
+
+def test_unknown_model_returns_none(resolver):
+    assert resolver.resolve("Lada Niva") is None
+    assert resolver.resolve("") is None
+
+
+def test_ambiguous_fuzzy_match_is_rejected():
+    resolver = CarModelResolver(["Audi A4", "Audi A6", "Volvo XC60", "Volvo XC90"])
+    assert resolver.resolve("audi") is None
+    assert resolver.resolve("Volvo XC6O").canonical_id == "volvo xc60"
+
+
+def test_short_queries_allow_fewer_edits():
+    resolver = CarModelResolver(["Audi A4", "Volvo XC60"], max_edit_distance=2)
+    # Fyra tecken ger en redigering: "aua4" ligger två från "audia4"
+    assert resolver.resolve("aud a4").canonical_id == "audi a4"
+    assert resolver.resolve("au a4") is None
@@ -0,0 +1,98 @@
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.pipelineserver.pipeline_app.models.database_models import FAQ, Base, Product, ProductCarModel
+from app.pipelineserver.pipeline_app.services.catalog_import import BulkCatalogImporter
+from app.pipelineserver.pipeline_app.services.catalog_repository import SQLCatalogRepository
+
+
+def _products():
+    return [
+        {"name": "AZOM DLR", "price_sek": 4990, "vendor": "AZOM", "tags": ["dlr"], "sku": "DLR-1",
+         "compatible_models": ["Volvo XC60", "Audi A4"]},
+        {"name": "Budget DLR", "price_sek": 1990, "sku": "B-1", "compatible_models": ["Volvo XC-60"]},
+        {"name": "AZOM DLR", "sku": "DLR-1"},  # dubblett i samma import
+        {"name": "", "sku": "EMPTY"},
+    ]
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def test_reimport_writes_only_changed_rows(session_factory):
+    importer = BulkCatalogImporter(session_factory, batch_size=1)
+    first = importer.import_products(_products())
+    assert {k: first[k] for k in ("inserted", "updated", "unchanged", "skipped")} == {
+        "inserted": 2, "updated": 0, "unchanged": 0, "skipped": 2}
+    assert first["rows"] == 4 and first["rows_per_sec"] > 0
+
+    again = importer.import_products(_products())
+    assert (again["inserted"], again["updated"], again["unchanged"]) == (0, 0, 2)
+
+    changed = _products()
+    changed[1]["price_sek"] = 1490
+    changed[1]["compatible_models"] = ["Saab 9-3"]
+    changed.append({"name": "AZOM Kamera", "sku": "CAM-1", "compatible_models": ["Volvo V70"]})
+    report = importer.import_products(changed)
+    assert (report["inserted"], report["updated"], report["unchanged"]) == (1, 1, 1)
+
+    with session_factory() as session:
+        assert session.scalar(select(func.count(Product.id))) == 3
+        budget = session.scalars(select(Product).where(Product.sku == "B-1")).one()
+        assert budget.price == 1490
+        assert [m.car_model_id for m in budget.car_models] == ["saab 93"]
+        assert session.scalar(select(func.count(ProductCarModel.id))) == 4
+
+    # Importerade rader är direkt sökbara via katalogrepositoryt
+    repo = SQLCatalogRepository(session_factory, resolver_ttl=0)
+    assert repo.find_by_car_model("volvo xc60")["name"] == "AZOM DLR"
+
+
+def test_faq_import_is_incremental(session_factory):
+    importer = BulkCatalogImporter(session_factory)
+    items = [{"question": "Hur installerar jag?", "answer": "Se manualen."}, {"question": "Tom", "answer": ""}]
+    assert importer.import_faq(items)["inserted"] == 1
+    items[0]["answer"] = "Se manualen, steg 3."
+    report = importer.import_faq(items)
+    assert (report["updated"], report["skipped"]) == (1, 1)
+    with session_factory() as session:
+        assert session.scalars(select(FAQ.answer)).one() == "Se manualen, steg 3."
+
+
+@pytest.mark.parametrize("batch_size", [1, 100])
+def test_names_and_skus_can_be_swapped_between_products(session_factory, batch_size):
+    importer = BulkCatalogImporter(session_factory, batch_size=batch_size)
+    importer.import_products([
+        {"name": "AZOM DLR", "sku": "DLR-1", "tags": ["dlr"]},
+        {"name": "AZOM Kamera", "sku": "CAM-1"},
+        {"name": "Budget DLR"},
+    ])
+    with session_factory() as session:
+        ids = dict(session.execute(select(Product.sku, Product.id)).all())
+
+    report = importer.import_products([
+        # Namnen byts via SKU, och en ny produkt tar ett namn som en annan släpper
+        {"name": "AZOM Kamera", "sku": "DLR-1", "tags": ["dlr"]},
+        {"name": "AZOM DLR", "sku": "CAM-1"},
+        {"name": "Budget DLR", "sku": "B-1"},
+    ])
+    assert (report["inserted"], report["updated"], report["unchanged"]) == (0, 3, 0)
+    report = importer.import_products([
+        {"name": "Budget DLR v2", "sku": "B-1"},
+        {"name": "Budget DLR", "sku": "B-2"},
+    ])
+    assert (report["inserted"], report["updated"]) == (1, 1)
+
+    with session_factory() as session:
+        rows = {sku: (pid, name) for pid, sku, name in session.execute(select(Product.id, Product.sku, Product.name))}
+    assert rows["DLR-1"] == (ids["DLR-1"], "AZOM Kamera")
+    assert rows["CAM-1"] == (ids["CAM-1"], "AZOM DLR")
+    assert rows["B-1"][1] == "Budget DLR v2" and rows["B-2"][1] == "Budget DLR"
+    assert not any(name.startswith("__catalog_import_pending") for _, name in rows.values())
@@ -0,0 +1,77 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.pipelineserver.pipeline_app.models.database_models import Base
+from app.pipelineserver.pipeline_app.services.azom_knowledge_service import AZOMKnowledgeService
+from app.pipelineserver.pipeline_app.services.catalog_repository import SQLCatalogRepository
+
+PRODUCTS = [
+    {"name": "AZOM DLR", "price_sek": 4990, "vendor": "AZOM", "tags": ["dlr", "premium"], "sku": "DLR-1",
+     "compatible_models": ["Volvo XC60", "Audi A4"], "canbus_required": True},
+    {"name": "Budget DLR", "price_sek": 1990, "vendor": "Other", "tags": ["dlr"], "sku": "B-1",
+     "compatible_models": ["Volvo XC-60"]},
+    {"name": "", "sku": "EMPTY"},
+]
+
+
+@pytest.fixture
+def repository():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    repo = SQLCatalogRepository(sessionmaker(bind=engine), resolver_ttl=0)
+    assert repo.upsert_products(PRODUCTS) == {"inserted": 2, "updated": 0, "skipped": 1}
+    yield repo
+    engine.dispose()
+
+
+def test_lookups_use_name_sku_and_car_model_indexes(repository):
+    assert repository.find_by_name("  azom dlr")["sku"] == "DLR-1"
+    assert repository.find_by_sku("B-1")["name"] == "Budget DLR"
+    product = repository.find_by_car_model("volvo xc60")
+    assert product["name"] == "AZOM DLR"
+    assert product["canbus_required"] is True
+    assert repository.find_by_car_model("Audi A-4 2012")["name"] == "AZOM DLR"
+    assert repository.find_by_car_model("Lada") is None
+
+
+def test_upsert_updates_existing_rows_by_sku(repository):
+    changed = dict(PRODUCTS[1], price_sek=2490, compatible_models=["BMW X5"])
+    assert repository.upsert_products([changed]) == {"inserted": 0, "updated": 1, "skipped": 0}
+    assert repository.count() == 2
+    assert repository.find_by_sku("B-1")["price_sek"] == 2490
+    assert repository.find_by_car_model("bmw x5")["name"] == "Budget DLR"
+
+
+def test_query_matches_matrix_semantics(repository):
+    result = repository.query(car_model="Volvo XC60", tags=["dlr"], max_price=5000)
+    assert result["car_model_id"] == "volvo xc60"
+    assert result["total"] == 2
+    assert [p["name"] for p in result["products"]] == ["AZOM DLR", "Budget DLR"]
+    assert repository.query(tags=["premium"], vendors=["other"])["total"] == 0
+
+
+@pytest.mark.asyncio
+async def test_knowledge_service_sqlite_backend(repository):
+    service = AZOMKnowledgeService(backend="sqlite", repository=repository)
+    info = await service.get_product_info(product_name="okänd", car_model="Volvo XC 60")
+    assert info["name"] == "AZOM DLR"
+    found = await service.find_products(car_model="Volvo XC60", prefer_vendor="other")
+    assert [p["name"] for p in found["products"]] == ["Budget DLR", "AZOM DLR"]
+
+
+def test_upsert_sets_content_hash_recognised_by_bulk_import(repository):
+    from app.pipelineserver.pipeline_app.services.catalog_import import BulkCatalogImporter
+
+    report = BulkCatalogImporter(repository._session_factory).import_products(PRODUCTS)
+    assert (report["unchanged"], report["updated"], report["inserted"]) == (2, 0, 0)
+
+
+def test_tag_filter_uses_link_table(repository):
+    assert repository.query(tags=["PREMIUM"])["total"] == 1
+    repository.upsert_products([dict(PRODUCTS[0], tags=["dlr"])])
+    assert repository.query(tags=["premium"])["total"] == 0
+    assert repository.query(tags=["dlr", "DLR"])["total"] == 2
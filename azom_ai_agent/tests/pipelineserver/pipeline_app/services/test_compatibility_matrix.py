@@ -0,0 +1,44 @@
+from app.pipelineserver.pipeline_app.services.compatibility_matrix import CompatibilityMatrix
+
+PRODUCTS = [
+    {"name": "AZOM Pro+", "price_sek": 8990, "vendor": "AZOM", "tags": ["premium"], "compatible_models": ["Volvo XC60"]},
+    {"name": "Budget DLR", "price_sek": 1990, "vendor": "Other", "tags": ["dlr"], "compatible_models": ["Volvo XC60", "Audi A4"]},
+    {"name": "AZOM DLR", "price_sek": 4990, "vendor": "AZOM", "tags": ["dlr", "premium"], "compatible_models": ["Volvo XC60"]},
+    {"name": "Premium Other", "price_sek": 3990, "vendor": "Other", "tags": ["premium"], "compatible_models": ["Volvo XC-60"]},
+    {"name": "No price", "vendor": "AZOM", "tags": ["premium"], "compatible_models": ["Volvo XC60"]},
+]
+
+
+def _names(result):
+    return [p["name"] for p in result["products"]]
+
+
+def test_multi_criteria_query_prefers_vendor_then_price():
+    matrix = CompatibilityMatrix(PRODUCTS)
+    result = matrix.query(car_model="volvo xc60", tags=["premium"], max_price=5000)
+    assert result["car_model_id"] == "volvo xc60"
+    assert result["total"] == 2
+    assert _names(result) == ["AZOM DLR", "Premium Other"]
+
+
+def test_query_without_filters_sorts_by_price_and_puts_unpriced_last():
+    matrix = CompatibilityMatrix(PRODUCTS)
+    result = matrix.query(prefer_vendor=None, limit=None)
+    assert _names(result) == ["Budget DLR", "Premium Other", "AZOM DLR", "AZOM Pro+", "No price"]
+
+
+def test_vendor_and_price_range_filters():
+    matrix = CompatibilityMatrix(PRODUCTS)
+    assert _names(matrix.query(vendors=["azom"], min_price=5000)) == ["AZOM Pro+"]
+    assert matrix.query(min_price=9000, max_price=1000)["total"] == 0
+
+
+def test_unknown_car_model_matches_nothing():
+    matrix = CompatibilityMatrix(PRODUCTS)
+    result = matrix.query(car_model="Lada Niva")
+    assert result == {"car_model_id": None, "total": 0, "products": []}
+
+
+def test_limit_spans_preferred_and_other_vendors():
+    matrix = CompatibilityMatrix(PRODUCTS)
+    assert _names(matrix.query(car_model="Volvo XC60", limit=4)) == ["AZOM DLR", "AZOM Pro+", "No price", "Budget DLR"]
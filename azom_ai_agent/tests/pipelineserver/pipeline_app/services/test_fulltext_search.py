@@ -0,0 +1,118 @@
+import json
+import sqlite3
+
+import pytest
+
+from app.pipelineserver.pipeline_app.pipelines.support_pipeline import SupportPipeline
+from app.pipelineserver.pipeline_app.pipelines.troubleshooting_pipeline import TroubleshootingPipeline
+from app.pipelineserver.pipeline_app.services.fulltext_search import FullTextIndex, build_match_query, query_contains
+from app.pipelineserver.pipeline_app.services.rag_service import RAGService
+
+FAQ = [
+    {"question": "Hur lång är garantin?", "answer": "Garantin är 3 år."},
+    {"question": "Hur länge tar leveransen?", "answer": "Leveranstiden är 1-3 arbetsdagar."},
+]
+
+
+@pytest.fixture
+def index():
+    idx = FullTextIndex()
+    idx.add_faq(FAQ)
+    idx.add_troubleshooting([
+        {"model": "Volvo V70", "issue_keywords": ["ingen ström"], "steps": ["Kontrollera säkringsdosan"]},
+    ])
+    idx.add_products([
+        {"name": "AZOM DLR", "description": "Dagsljus för Volvo", "compatible_models": ["Volvo XC60"]},
+    ])
+    yield idx
+    idx.close()
+
+
+def test_match_query_drops_stopwords_and_adds_prefixes():
+    assert build_match_query("Hur lång är garantin?") == '"lång"* OR "garanti"*'
+    assert build_match_query("Hur lång är garantin?", match_all=True) == '"lång"* AND "garanti"*'
+    assert build_match_query("strömmen") == '"ström"*'
+    assert build_match_query("och det är") == ""
+
+
+def test_query_contains_requires_every_word_of_the_phrase():
+    assert query_contains("sakringen har gått", "säkring")
+    assert query_contains("ingen ström alls", "ingen ström")
+    assert not query_contains("ingen bild", "ingen ström")
+    assert not query_contains("något", "och")
+
+
+def test_prefix_and_diacritic_insensitive_search(index):
+    assert index.search("säkring")[0]["kind"] == "troubleshooting"
+    assert index.search("sakring")[0]["kind"] == "troubleshooting"
+    assert index.search("leverans")[0]["payload"]["answer"].startswith("Leveranstiden")
+
+
+def test_search_filters_on_kind_and_column(index):
+    assert [h["kind"] for h in index.search("volvo", kinds=["product"])] == ["product"]
+    assert index.search("volvo", columns=["keywords"], kinds=["troubleshooting"]) == []
+    assert index.search("något helt annat") == []
+
+
+def test_match_all_requires_every_term(index):
+    assert index.search("garantin leverans", kinds=["faq"])
+    assert index.search("garantin leverans", kinds=["faq"], match_all=True) == []
+    assert index.search("lång garantin", kinds=["faq"], match_all=True)[0]["payload"] == FAQ[0]
+
+
+def test_only_match_syntax_errors_are_swallowed(index, monkeypatch):
+    import app.pipelineserver.pipeline_app.services.fulltext_search as fts
+
+    monkeypatch.setattr(fts, "build_match_query", lambda query, match_all=False: '"x" AND')
+    assert index.search("x") == []
+    with pytest.raises(sqlite3.OperationalError):
+        index.search("x", columns=["saknas"])
+
+
+@pytest.mark.asyncio
+async def test_support_pipeline_uses_fulltext_index(tmp_path):
+    faq_file = tmp_path / "faq.json"
+    faq_file.write_text(json.dumps(FAQ, ensure_ascii=False), encoding="utf-8")
+    pipeline = SupportPipeline(faq_path=str(faq_file))
+    assert await pipeline.run_support("Hur lång är garantin?") == {"answer": "Garantin är 3 år."}
+    assert (await pipeline.run_support("Jag undrar om garantin"))["answer"] == "Garantin är 3 år."
+    assert "support@azom.se" in (await pipeline.run_support("Något helt annat"))["answer"]
+    # Ett gemensamt ord ("lång") räcker inte för en FAQ-träff
+    assert "support@azom.se" in (await pipeline.run_support("Hur lång är kabeln?"))["answer"]
+
+
+@pytest.mark.asyncio
+async def test_troubleshooting_requires_a_whole_keyword_in_the_question(monkeypatch):
+    monkeypatch.setattr(
+        "app.pipelineserver.pipeline_app.pipelines.troubleshooting_pipeline.AZOMOrchestrationService", lambda: None
+    )
+    pipeline = TroubleshootingPipeline()
+    pipeline.troubleshooting_data = [
+        {"model": "Volvo V70", "issue_keywords": ["ingen ström"], "steps": ["Kontrollera säkringen"]},
+        {"model": "Audi A4", "issue_keywords": ["ingen bild"], "steps": ["Kontrollera kabeln"]},
+        {"model": "BMW X5", "issue_keywords": ["säkring"], "steps": ["Byt säkringen"]},
+    ]
+    result = await pipeline.run_troubleshooting("Skärmen har ingen ström", "Kia Ceed")
+    assert result == {"steps": ["Kontrollera säkringen"]}
+    result = await pipeline.run_troubleshooting("Säkringen har gått", "Kia Ceed")
+    assert result == {"steps": ["Byt säkringen"]}
+
+
+@pytest.mark.asyncio
+async def test_rag_keyword_fallback_uses_fulltext_index(tmp_path):
+    products = tmp_path / "products.json"
+    products.write_text(json.dumps([
+        {"name": "AZOM-123", "compatible_models": ["C-Class"], "description": "Install guide for AZOM-123"}
+    ]), encoding="utf-8")
+    guides = tmp_path / "troubleshooting.json"
+    guides.write_text(json.dumps([
+        {"model": "E-Class", "issue_keywords": ["bluetooth"], "steps": ["Restart system"]}
+    ]), encoding="utf-8")
+    svc = RAGService()
+    svc.products_path, svc.troubleshooting_path, svc.other_data = str(products), str(guides), []
+
+    assert await svc.search("AZOM-123", use_vectors=False) == [
+        {"title": "Installationsguide för AZOM-123", "content": "Install guide for AZOM-123"}
+    ]
+    assert (await svc.search("bluetooth problem", use_vectors=False))[0]["title"] == "Felsökning för E-Class"
+    assert await svc.search("nonexistent query", use_vectors=False) == []
@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.pipelineserver.pipeline_app.services.history_compactor import HistoryCompactor, summarize_entries
+from app.pipelineserver.pipeline_app.services.memory_service import MemoryService
+from app.pipelineserver.pipeline_app.services.session_store import SessionStore
+
+
+def _entry(i, days_ago=0, car_model="Volvo XC60"):
+    ts = (datetime.now() - timedelta(days=days_ago, minutes=100 - i)).isoformat()
+    return {"user_input": f"fråga {i}", "car_model": car_model, "recommended_product": "AZOM DLR", "timestamp": ts}
+
+
+def test_max_entries_rolls_old_entries_into_summary(tmp_path):
+    store = SessionStore(str(tmp_path / "history.db"))
+    store.append_many(("anna", _entry(i)) for i in range(10))
+    store.append("bertil", _entry(0))
+
+    compactor = HistoryCompactor(store, max_entries=3)
+    assert compactor.run_once() == {"users": 1, "entries": 7}
+    assert [e["user_input"] for e in store.get_history("anna")] == ["fråga 7", "fråga 8", "fråga 9"]
+    summary = store.get_summary("anna")
+    assert summary["entries"] == 7
+    assert summary["car_models"] == {"Volvo XC60": 7}
+    assert summary["recent_queries"][-1] == "fråga 6"
+    assert store.get_summary("bertil") is None
+
+    # Nästa omgång slår ihop med den befintliga sammanfattningen
+    store.append_many(("anna", _entry(i, car_model="Audi A4")) for i in range(20, 22))
+    assert compactor.run_once()["entries"] == 2
+    summary = store.get_summary("anna")
+    assert summary["entries"] == 9
+    assert summary["car_models"] == {"Volvo XC60": 9}
+    assert [e["user_input"] for e in store.get_history("anna")] == ["fråga 9", "fråga 20", "fråga 21"]
+
+
+def test_ttl_compacts_old_entries_regardless_of_count(tmp_path):
+    store = SessionStore(str(tmp_path / "history.db"))
+    store.append_many([("anna", _entry(0, days_ago=40)), ("anna", _entry(1))])
+    assert HistoryCompactor(store, max_entries=None, ttl_days=30).run_once()["entries"] == 1
+    assert [e["user_input"] for e in store.get_history("anna")] == ["fråga 1"]
+
+
+def test_summary_size_is_bounded():
+    entries = [{"car_model": f"Modell {i}", "user_input": f"q{i}"} for i in range(100)]
+    summary = summarize_entries(None, entries)
+    assert summary["entries"] == 100
+    assert len(summary["car_models"]) == 10
+    assert summary["recent_queries"] == ["q95", "q96", "q97", "q98", "q99"]
+
+
+@pytest.mark.asyncio
+async def test_get_recent_returns_last_entries_and_summary(tmp_path):
+    memory = MemoryService(store=SessionStore(str(tmp_path / "history.db")), write_behind=False)
+    for i in range(6):
+        await memory.save_context({"user_input": f"fråga {i}"}, user_id="anna")
+    HistoryCompactor(memory.store, max_entries=4).run_once()
+
+    recent = await memory.get_recent("anna", limit=2)
+    assert [e["user_input"] for e in recent["entries"]] == ["fråga 4", "fråga 5"]
+    assert recent["summary"]["entries"] == 2
+
+
+def test_history_endpoint_requires_admin_credentials(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app.pipelineserver.pipeline_app import main
+
+    memory = MemoryService(store=SessionStore(str(tmp_path / "history.db")), write_behind=False)
+    monkeypatch.setattr(main, "memory_service", memory)
+    client = TestClient(main.app)
+    assert client.get("/memory/history/anna").status_code == 401
+    assert client.get("/memory/history/anna", auth=("admin", "fel")).status_code == 401
+    auth = (main.settings.ADMIN_USERNAME, main.settings.ADMIN_PASSWORD)
+    assert client.get("/memory/history/anna", auth=auth).json()["entries"] == []
@@ -0,0 +1,132 @@
+import pytest
+
+from app.pipelineserver.pipeline_app.pipelines.azom_installation_pipeline import AZOMInstallationPipeline
+from app.pipelineserver.pipeline_app.services.car_model_resolver import CarModelMatch, normalize_model
+from app.pipelineserver.pipeline_app.services.install_guides import GuideBuilder, GuideStore, is_generic_question
+from app.pipelineserver.pipeline_app.services.orchestration_service import AZOMOrchestrationService
+from app.pipelineserver.pipeline_app.services.result_cache import ResultCache, cache_status
+
+
+class FakeKnowledge:
+    def __init__(self, models):
+        self.models = models
+
+    def car_models(self):
+        return {normalize_model(name): name for name in self.models}
+
+
+class FakeOrchestration:
+    compose = staticmethod(AZOMOrchestrationService.compose)
+
+    def __init__(self, models=("Volvo V70", "Audi A4")):
+        self.knowledge_service = FakeKnowledge(list(models))
+        self.prices = {}
+        self.step_calls = []
+        self.orchestrated = 0
+        self.remembered = []
+
+    async def guide_product(self, car_model):
+        if car_model == "Saknas X1":
+            raise ValueError("ingen produkt")
+        return {"name": "AZOM DLR", "vendor": "AZOM", "tags": [], "price_sek": self.prices.get(car_model, 4990)}
+
+    async def guide_steps(self, car_model, query):
+        self.step_calls.append(car_model)
+        return [f"Steg 1 för {car_model}"]
+
+    def resolve_car_model(self, car_model):
+        key = normalize_model(car_model)
+        models = self.knowledge_service.car_models()
+        return CarModelMatch(key, models[key], 1.0, "exact") if key in models else None
+
+    async def orchestrate(self, user_input, car_model=None, user_experience=None):
+        self.orchestrated += 1
+        return {"recommended_product": {"name": "AZOM DLR"}, "installation_steps": ["live"]}
+
+    async def remember(self, user_input, car_model, user_experience, product_name):
+        self.remembered.append((car_model, product_name))
+
+
+def _builder(tmp_path, orchestration, sources=lambda: "s1", version=lambda: "v1"):
+    store = GuideStore(str(tmp_path / "guides.db"), check_interval=0)
+    return GuideBuilder(orchestration, store, data_version=version, sources_version=sources)
+
+
+def test_generic_questions():
+    assert is_generic_question("Hur installerar jag?", "Volvo V70")
+    assert is_generic_question("installation volvo v70", "Volvo V70")
+    assert not is_generic_question("Hur installerar jag backkameran?", "Volvo V70")
+
+
+@pytest.mark.asyncio
+async def test_rebuild_is_incremental(tmp_path):
+    orchestration = FakeOrchestration(models=("Volvo V70", "Audi A4", "Saknas X1"))
+    builder = _builder(tmp_path, orchestration)
+
+    report = await builder.rebuild()
+    assert {k: report[k] for k in ("built", "unchanged", "removed", "skipped")} == {
+        "built": 2, "unchanged": 0, "removed": 0, "skipped": 1,
+    }
+    assert builder.store.get("volvo v70")["installation_steps"] == ["Steg 1 för Volvo V70"]
+    assert builder.store.version == "v1"
+
+    report = await builder.rebuild()
+    assert (report["built"], report["unchanged"]) == (0, 2)
+
+    # Ändrad produkt för en modell: bara den modellen söks om
+    orchestration.prices["Audi A4"] = 9990
+    orchestration.knowledge_service.models.remove("Volvo V70")
+    orchestration.step_calls.clear()
+    report = await builder.rebuild()
+    assert (report["built"], report["removed"]) == (1, 1)
+    assert orchestration.step_calls == ["Audi A4"]
+    assert builder.store.get("volvo v70") is None
+
+    # Ändrade RAG-källor påverkar alla guider
+    builder.sources_version = lambda: "s2"
+    assert (await builder.rebuild())["built"] == 1
+
+    # Ett nytt lager mot samma fil läser in guiderna
+    assert len(GuideStore(builder.store.path)) == 1
+
+
+@pytest.mark.asyncio
+async def test_pipeline_serves_precomputed_guides(tmp_path):
+    orchestration = FakeOrchestration()
+    version = ["v1"]
+    builder = _builder(tmp_path, orchestration, version=lambda: version[0])
+    await builder.rebuild()
+
+    pipeline = AZOMInstallationPipeline(result_cache=ResultCache(), guide_store=builder.store,
+                                        data_version=lambda: version[0])
+    pipeline.orchestration_service = orchestration
+
+    result = await pipeline.run_installation("Hur installerar jag?", "volvo v-70", "nybörjare")
+    assert cache_status() == "PRECOMPUTED"
+    assert result["installation_steps"] == ["Steg 1 för Volvo V70"]
+    assert "Läs hela manualen innan du börjar." in result["safety_warnings"]
+    assert orchestration.orchestrated == 0
+    assert orchestration.remembered == [("volvo v-70", "AZOM DLR")]
+
+    # Specifik fråga, okänd modell eller inaktuellt lager: live-orkestrering
+    await pipeline.run_installation("Hur kopplar jag backkameran?", "Volvo V70")
+    await pipeline.run_installation("Hur installerar jag?", "Saab 9-5")
+    version[0] = "v2"
+    await pipeline.run_installation("Hur installerar jag?", "Volvo V70", "van")
+    assert cache_status() == "MISS"
+    assert orchestration.orchestrated == 3
+
+
+@pytest.mark.asyncio
+async def test_stream_from_precomputed_guide(tmp_path):
+    orchestration = FakeOrchestration()
+    orchestration.compose_events = AZOMOrchestrationService.compose_events
+    builder = _builder(tmp_path, orchestration)
+    await builder.rebuild()
+    pipeline = AZOMInstallationPipeline(result_cache=ResultCache(), guide_store=builder.store, data_version=lambda: "v1")
+    pipeline.orchestration_service = orchestration
+
+    events = [e async for e in pipeline.stream_installation("Hur installerar jag?", "Audi A4")]
+    assert [e["event"] for e in events] == ["product", "steps", "warnings", "done"]
+    assert events[-1] == {"event": "done", "source": "PRECOMPUTED"}
+    assert orchestration.orchestrated == 0
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from app.pipelineserver.pipeline_app.services.job_queue import JobQueue, JobStore
+
+
+async def _wait_for(queue, job_id, statuses=("succeeded", "failed", "cancelled")):
+    for _ in range(200):
+        job = await queue.get(job_id)
+        if job["status"] in statuses:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"jobbet blev aldrig klart: {job}")
+
+
+@pytest.mark.asyncio
+async def test_jobs_run_in_background_with_timings(tmp_path):
+    async def double(payload):
+        await asyncio.sleep(0.02)
+        return {"value": payload["n"] * 2}
+
+    async def fail(payload):
+        raise RuntimeError("trasig")
+
+    queue = JobQueue(JobStore(str(tmp_path / "jobs.db")), {"double": double, "fail": fail}, concurrency=2)
+    await queue.start()
+    try:
+        job = await queue.submit("double", {"n": 21})
+        assert job["status"] == "queued"
+        done = await _wait_for(queue, job["job_id"])
+        assert done["status"] == "succeeded" and done["result"] == {"value": 42}
+        assert done["timings"]["run_ms"] >= 15 and "queued_ms" in done["timings"]
+
+        failed = await _wait_for(queue, (await queue.submit("fail", {}))["job_id"])
+        assert (failed["status"], failed["error"]) == ("failed", "trasig")
+        assert queue.stats()["jobs"] == {"succeeded": 1, "failed": 1}
+
+        with pytest.raises(ValueError):
+            await queue.submit("okänd", {})
+    finally:
+        await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_cancel_running_job_and_timeout(tmp_path):
+    started = asyncio.Event()
+
+    async def slow(payload):
+        started.set()
+        await asyncio.sleep(10)
+
+    queue = JobQueue(JobStore(str(tmp_path / "jobs.db")), {"slow": slow}, concurrency=1, job_timeout=None)
+    await queue.start()
+    try:
+        job = await queue.submit("slow", {})
+        await started.wait()
+        cancelled = await queue.cancel(job["job_id"])
+        assert cancelled["status"] == "cancelled"
+        await asyncio.sleep(0.01)
+        assert queue.stats()["running"] == 0
+
+        queue.job_timeout = 0.05
+        timed_out = await _wait_for(queue, (await queue.submit("slow", {}))["job_id"])
+        assert (timed_out["status"], timed_out["error"]) == ("failed", "timeout")
+    finally:
+        await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_state_survives_restart_and_interrupted_jobs_are_requeued(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    runs = []
+    block = asyncio.Event()
+
+    async def work(payload):
+        runs.append(payload["n"])
+        if payload["n"] == 1 and len(runs) == 1:
+            await block.wait()  # avbryts av omstarten
+        return payload["n"]
+
+    first = JobQueue(JobStore(path), {"work": work}, concurrency=1)
+    await first.start()
+    interrupted = await first.submit("work", {"n": 1})
+    waiting = await first.submit("work", {"n": 2})
+    await asyncio.sleep(0.05)
+    await first.stop()
+    assert (await first.get(interrupted["job_id"]))["status"] == "running"
+
+    second = JobQueue(JobStore(path), {"work": work}, concurrency=1)
+    await second.start()
+    try:
+        assert (await _wait_for(second, interrupted["job_id"]))["result"] == 1
+        assert (await _wait_for(second, waiting["job_id"]))["result"] == 2
+    finally:
+        await second.stop()
@@ -0,0 +1,106 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.pipelineserver.pipeline_app.services.llm_client import (
+    LLMServiceProtocol,
+    OpenAIClient,
+    run_chat_many,
+)
+
+
+class SlowLLM(LLMServiceProtocol):
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def chat(self, messages, model=None, stream=False, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        if messages[0]["content"] == "boom":
+            raise RuntimeError("backend error")
+        return messages[0]["content"].upper()
+
+    async def aclose(self):
+        return None
+
+
+@pytest.mark.asyncio
+async def test_run_chat_many_bounds_concurrency_and_reports_errors():
+    llm = SlowLLM()
+    message_lists = [[{"role": "user", "content": c}] for c in ["a", "b", "boom", "c", "d"]]
+    results = [r async for r in run_chat_many(llm, message_lists, concurrency=2)]
+
+    assert llm.max_in_flight <= 2
+    by_index = {r["index"]: r for r in results}
+    assert sorted(by_index) == [0, 1, 2, 3, 4]
+    assert by_index[0]["assistant"] == "A"
+    assert by_index[2]["error"] == "backend error"
+    assert all("latency_ms" in r for r in results)
+
+
+@pytest.mark.asyncio
+async def test_protocol_default_chat_many_uses_chat():
+    llm = SlowLLM()
+    results = [r async for r in llm.chat_many([[{"role": "user", "content": "x"}]])]
+    assert results == [{"index": 0, "assistant": "X", "latency_ms": results[0]["latency_ms"]}]
+
+
+class FakeResponse:
+    def __init__(self, json_data=None, text=""):
+        self._json = json_data
+        self.text = text
+
+    def json(self):
+        return self._json
+
+    def raise_for_status(self):
+        return None
+
+
+class FakeBatchHTTP:
+    def __init__(self):
+        self.is_closed = False
+        self.uploaded = None
+        self.polls = 0
+
+    async def post(self, url, json=None, headers=None, files=None, data=None):
+        if url.endswith("/files"):
+            self.uploaded = files["file"][1].decode("utf-8")
+            return FakeResponse({"id": "file-in"})
+        return FakeResponse({"id": "batch-1", "status": "validating"})
+
+    async def get(self, url, headers=None):
+        if url.endswith("/batches/batch-1"):
+            self.polls += 1
+            return FakeResponse({"id": "batch-1", "status": "completed", "output_file_id": "file-out"})
+        lines = [
+            {"custom_id": "1", "response": {"status_code": 200, "body": {"choices": [{"message": {"content": " två "}}]}}},
+            {"custom_id": "0", "response": {"status_code": 200, "body": {"choices": [{"message": {"content": "ett"}}]}}},
+        ]
+        return FakeResponse(text="\n".join(json.dumps(line) for line in lines))
+
+    async def aclose(self):
+        self.is_closed = True
+
+
+@pytest.mark.asyncio
+async def test_openai_chat_many_uses_batch_api(monkeypatch):
+    fake = FakeBatchHTTP()
+    monkeypatch.setattr(httpx, "AsyncClient", lambda timeout=None: fake)
+    client = OpenAIClient(config={"OPENAI_API_KEY": "sk-test"}, timeout=5)
+
+    message_lists = [[{"role": "user", "content": "1"}], [{"role": "user", "content": "2"}]]
+    results = [
+        r async for r in client.chat_many(message_lists, provider_batch=True, poll_interval=0, max_tokens=50)
+    ]
+
+    assert [r["assistant"] for r in results] == ["ett", "två"]
+    assert fake.polls == 1
+    first_line = json.loads(fake.uploaded.splitlines()[0])
+    assert first_line["url"] == "/v1/chat/completions"
+    assert first_line["body"]["max_tokens"] == 50
@@ -0,0 +1,79 @@
+import pytest
+
+from app.pipelineserver.pipeline_app.services.model_router import (
+    ModelRouter,
+    ROUTE_LARGE,
+    ROUTE_SMALL,
+)
+
+
+class RecordingLLM:
+    def __init__(self, answers):
+        self.answers = dict(answers)
+        self.calls = []
+
+    async def chat(self, messages, model=None, stream=False, **kwargs):
+        self.calls.append(model)
+        return self.answers.get(model, "")
+
+    async def aclose(self):
+        return None
+
+
+def _router(**kwargs):
+    defaults = dict(small_model="small", large_model="large", small_cost_per_1k=0.1, large_cost_per_1k=1.0)
+    defaults.update(kwargs)
+    return ModelRouter(**defaults)
+
+
+def test_classify_lookup_goes_to_small_model():
+    router = _router()
+    features = router.classify("Vad kostar AZOM DLR?", [{"content": "x", "similarity_score": 0.9}])
+    assert features["intent"] == "lookup"
+    assert features["route"] == ROUTE_SMALL
+
+
+def test_classify_troubleshooting_goes_to_large_model():
+    router = _router()
+    features = router.classify("Min skärm startar inte efter installationen, felkod E12")
+    assert features["intent"] == "troubleshooting"
+    assert features["route"] == ROUTE_LARGE
+
+
+def test_disabled_without_small_model():
+    router = ModelRouter(small_model=None)
+    assert router.enabled is False
+    assert router.classify("Vad kostar den?")["route"] == ROUTE_LARGE
+
+
+@pytest.mark.asyncio
+async def test_small_route_answer_is_returned_without_escalation():
+    llm = RecordingLLM({"small": "AZOM DLR kostar 4990 kr inklusive moms."})
+    router = _router()
+    result = await router.chat(llm, [{"role": "user", "content": "Vad kostar den?"}], query="Vad kostar den?")
+    assert result["route"] == ROUTE_SMALL
+    assert result["escalated"] is False
+    assert llm.calls == ["small"]
+    stats = router.stats()["routes"]
+    assert stats[ROUTE_SMALL]["calls"] == 1
+    assert stats[ROUTE_SMALL]["estimated_cost_saved"] > 0
+
+
+@pytest.mark.asyncio
+async def test_low_confidence_answer_escalates_to_large_model():
+    llm = RecordingLLM({"small": "Jag vet inte.", "large": "Kontrollera säkringen och CAN-bus-kabeln."})
+    router = _router()
+    result = await router.chat(llm, [{"role": "user", "content": "Vilken passar?"}], query="Vilken passar?")
+    assert result["escalated"] is True
+    assert result["route"] == ROUTE_LARGE
+    assert result["answer"].startswith("Kontrollera")
+    assert llm.calls == ["small", "large"]
+    stats = router.stats()["routes"]
+    assert stats[ROUTE_SMALL]["escalations"] == 1
+    assert stats[ROUTE_LARGE]["calls"] == 1
+
+
+def test_server_router_uses_the_shared_safety_service():
+    from app.pipelineserver.pipeline_app import main
+
+    assert main.model_router.safety_service is main.safety_service
@@ -0,0 +1,79 @@
+import random
+import re
+
+import pytest
+
+from app.pipelineserver.pipeline_app.services.pattern_scanner import PatternScanner
+from app.pipelineserver.pipeline_app.services.safety_service import SafetyService
+
+
+def _per_pattern(patterns, text):
+    return [
+        category for category, items in patterns.items()
+        if any(re.search(p, text, re.IGNORECASE) for p in items)
+    ]
+
+
+@pytest.mark.parametrize("text", [
+    "Hur installerar jag AZOM DLR i min Volvo XC60?",
+    "Ring 070-123 45 67 eller 08-1234567, personnummer 19900101-1234",
+    "password: hunter2 och api_key=abc123",
+    "Vad tycker du om politik? Helvete vad kabeln är kort",
+    "LÖSENORD:abc TOKEN = xyz",
+    "",
+])
+def test_scan_matches_per_pattern_search(text):
+    service = SafetyService()
+    assert service._input_scanner.scan(text) == _per_pattern(service._patterns, text)
+
+
+def test_overlapping_categories_at_same_position_are_all_found():
+    scanner = PatternScanner([("nummer", r"\d{4}", None), ("år", r"\b19\d{2}\b", None)])
+    assert scanner.scan("född 1990") == ["nummer", "år"]
+    assert scanner.scan("kod 12345") == ["nummer"]
+
+
+def test_shared_word_boundary_is_hoisted_only_when_all_patterns_have_it():
+    assert PatternScanner([("a", r"\bbil\b", None), ("b", r"\bkabel", None)])._detect.pattern.startswith(r"\b(?=")
+    scanner = PatternScanner([("nummer", r"\d{4}", None), ("ord", r"\bbil\b", None)])
+    assert scanner._detect.pattern.startswith("(?=")
+    assert scanner.scan("kod123456") == ["nummer"]
+
+
+def test_sub_masks_with_group_replacements():
+    scanner = PatternScanner([
+        ("nyckel", r"\b(password|token)\s*[:=]\s*\S+", lambda g: f"{g[0]}: [RADERAD]"),
+        ("telefon", r"\b07\d-\d{3} \d{2} \d{2}\b", "[TELEFONNUMMER]"),
+        ("bara_detektion", r"\bvolvo\b", None),
+    ])
+    text = "Volvo: token=abc, ring 070-123 45 67"
+    assert scanner.sub(text) == "Volvo: token: [RADERAD] ring [TELEFONNUMMER]"
+    assert PatternScanner([("ord", r"\bbil\b", None)]).sub("bil") == "bil"
+
+
+def _baseline_sanitize(text):
+    """Saneringen före PatternScanner: ett re.sub per regel i tur och ordning."""
+    text = re.sub(r"\b\d{6,8}[-\s]?\d{4}\b", "[PERSONNUMMER]", text)
+    text = re.sub(r"\b(07\d{1}[-\s]?\d{3}[-\s]?\d{2}[-\s]?\d{2})\b", "[TELEFONNUMMER]", text)
+    text = re.sub(r"\b(0\d{1,3}[-\s]?\d{5,8})\b", "[TELEFONNUMMER]", text)
+    text = re.sub(r"\b(lösenord|password|nyckel|key|token|secret)\s*[:=]\s*\S+\b", r"\1: [RADERAD]", text,
+                  flags=re.IGNORECASE)
+    return re.sub(r"\b(api[_-]?key|access[_-]?token)\s*[:=]\s*\S+\b", r"\1: [RADERAD]", text, flags=re.IGNORECASE)
+
+
+@pytest.mark.asyncio
+async def test_sanitize_masks_personnummer_before_key_values():
+    service = SafetyService()
+    assert await service.sanitize_text("=Key:900101 1234") == _baseline_sanitize("=Key:900101 1234")
+    assert "1234" not in await service.sanitize_text("=Key:900101 1234")
+
+
+@pytest.mark.asyncio
+async def test_sanitize_matches_baseline_on_fuzzed_input():
+    service = SafetyService()
+    rng = random.Random(0)
+    pieces = ["key", "Key", "token", "api_key", "password", "lösenord", ":", "=", " ", "-", "070", "08",
+              "900101", "19900101", "1234", "12345678", "123 45 67", "abc", "[x]", ",", "\n"]
+    for _ in range(5000):
+        text = "".join(rng.choice(pieces) for _ in range(rng.randint(1, 10)))
+        assert await service.sanitize_text(text) == _baseline_sanitize(text), text
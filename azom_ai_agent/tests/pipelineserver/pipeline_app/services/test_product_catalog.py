@@ -0,0 +1,87 @@
+import json
+import os
+
+import pytest
+
+from app.pipelineserver.pipeline_app.services.azom_knowledge_service import AZOMKnowledgeService
+from app.pipelineserver.pipeline_app.services.product_catalog import CatalogStore, ProductCatalog
+
+PRODUCTS = [
+    {"name": "AZOM DLR", "price_sek": 4990, "compatible_models": [" Volvo XC60 ", "Audi A4"]},
+    {"name": "AZOM Volvo Special", "price_sek": 7990, "compatible_models": ["Volvo XC60", "Volvo V70"]},
+]
+
+
+def _write(path, products):
+    path.write_text(json.dumps(products), encoding="utf-8")
+
+
+def test_catalog_indexes_normalized_names_and_models():
+    catalog = ProductCatalog(PRODUCTS)
+    assert catalog.find_by_name("  azom   dlr ")["price_sek"] == 4990
+    # Första produkten i filen vinner för en delad bilmodell
+    assert catalog.find_by_car_model("VOLVO xc60")["name"] == "AZOM DLR"
+    assert catalog.find_by_car_model("volvo v70")["name"] == "AZOM Volvo Special"
+    assert catalog.find_by_car_model("Lada") is None
+
+
+def test_store_reloads_only_when_content_changes(tmp_path):
+    path = tmp_path / "products.json"
+    _write(path, PRODUCTS)
+    store = CatalogStore(str(path), check_interval=0)
+    first = store.catalog
+    assert store.catalog is first
+
+    # Samma innehåll med ny mtime ger ingen ny katalog
+    os.utime(path, (first.mtime + 10, first.mtime + 10))
+    assert store.catalog is first
+
+    _write(path, PRODUCTS + [{"name": "AZOM Pro+", "compatible_models": ["BMW X5"]}])
+    os.utime(path, (first.mtime + 20, first.mtime + 20))
+    second = store.catalog
+    assert second is not first
+    assert second.find_by_car_model("bmw x5")["name"] == "AZOM Pro+"
+    assert store.reloads == 2
+
+
+def test_store_does_no_file_io_between_checks(tmp_path, monkeypatch):
+    path = tmp_path / "products.json"
+    _write(path, PRODUCTS)
+    store = CatalogStore(str(path), check_interval=3600)
+    catalog = store.catalog
+
+    def fail(*args, **kwargs):
+        raise AssertionError("unexpected file I/O")
+
+    monkeypatch.setattr("builtins.open", fail)
+    monkeypatch.setattr(os.path, "getmtime", fail)
+    assert store.catalog is catalog
+
+
+@pytest.mark.asyncio
+async def test_async_get_reloads_in_a_worker_thread(tmp_path, monkeypatch):
+    import threading
+
+    path = tmp_path / "products.json"
+    _write(path, PRODUCTS)
+    store = CatalogStore(str(path), check_interval=3600)
+    threads = []
+    refresh = store._refresh
+    monkeypatch.setattr(store, "_refresh", lambda: threads.append(threading.current_thread()) or refresh())
+
+    catalog = await store.get()
+    assert threads and threads[0] is not threading.main_thread()
+    assert await store.get() is catalog
+    assert len(threads) == 1
+
+
+@pytest.mark.asyncio
+async def test_knowledge_service_uses_catalog(tmp_path):
+    path = tmp_path / "products.json"
+    _write(path, PRODUCTS)
+    service = AZOMKnowledgeService()
+    service.products_path = str(path)
+    assert (await service.get_product_info(product_name="AZOM Volvo Special"))["price_sek"] == 7990
+    assert (await service.get_product_info(product_name="okänd", car_model="audi a4"))["name"] == "AZOM DLR"
+    with pytest.raises(ValueError, match="Ingen produkt hittades"):
+        await service.get_product_info(car_model="Lada")
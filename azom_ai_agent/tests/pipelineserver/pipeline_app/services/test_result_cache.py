@@ -0,0 +1,159 @@
+import asyncio
+import os
+
+import pytest
+
+from app.pipelineserver.pipeline_app.pipelines.azom_installation_pipeline import AZOMInstallationPipeline
+from app.pipelineserver.pipeline_app.services.car_model_resolver import CarModelMatch
+from app.pipelineserver.pipeline_app.services.result_cache import (
+    DataVersion,
+    ResultCache,
+    cache_status,
+    canonical_text,
+)
+
+
+def _counting(value):
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return dict(value)
+
+    return compute, calls
+
+
+def test_canonical_text():
+    assert canonical_text("  Hur installerar jag DLR?? ") == canonical_text("hur installerar jag dlr")
+    assert canonical_text(None) == ""
+
+
+@pytest.mark.asyncio
+async def test_miss_then_hit_returns_copies():
+    cache = ResultCache()
+    compute, calls = _counting({"steps": ["a"]})
+
+    first = await cache.get_or_compute("k", compute)
+    assert cache_status() == "MISS"
+    first["steps"].append("ändrad av anroparen")
+
+    second = await cache.get_or_compute("k", compute)
+    assert cache_status() == "HIT"
+    assert second == {"steps": ["a"]}
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_identical_inflight_requests_are_coalesced():
+    cache = ResultCache()
+    compute, calls = _counting({"ok": True})
+
+    async def lookup():
+        value = await cache.get_or_compute("k", compute)
+        return value, cache_status()
+
+    results = await asyncio.gather(*(asyncio.ensure_future(lookup()) for _ in range(5)))
+    assert len(calls) == 1
+    assert sorted(status for _, status in results) == ["COALESCED"] * 4 + ["MISS"]
+    assert all(value == {"ok": True} for value, _ in results)
+
+
+@pytest.mark.asyncio
+async def test_data_change_invalidates(tmp_path):
+    data = tmp_path / "products.json"
+    data.write_text("[]", encoding="utf-8")
+    version = DataVersion(str(tmp_path / "*.json"), check_interval=0)
+    cache = ResultCache(version=version.stamp)
+    compute, calls = _counting({"v": 1})
+
+    await cache.get_or_compute("k", compute)
+    await cache.get_or_compute("k", compute)
+    assert len(calls) == 1
+
+    data.write_text('[{"name": "AZOM DLR"}]', encoding="utf-8")
+    os.utime(data, ns=(1, 1))
+    await cache.get_or_compute("k", compute)
+    assert cache_status() == "MISS"
+    assert len(calls) == 2
+    assert cache.stats()["invalidations"] == 1
+
+
+@pytest.mark.asyncio
+async def test_uncacheable_results_and_errors_are_not_stored():
+    cache = ResultCache()
+    compute, calls = _counting({"stage_errors": {"rag": "timeout"}})
+    for _ in range(2):
+        await cache.get_or_compute("k", compute, cacheable=lambda r: not r.get("stage_errors"))
+    assert len(calls) == 2
+
+    async def fail():
+        raise RuntimeError("nere")
+
+    with pytest.raises(RuntimeError):
+        await cache.get_or_compute("fel", fail)
+    assert len(cache) == 0 and cache.stats()["inflight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_lru_and_ttl_bounds():
+    now = [0.0]
+    cache = ResultCache(max_entries=2, ttl_seconds=10, clock=lambda: now[0])
+    compute, calls = _counting({})
+    for key in ("a", "b", "c"):
+        await cache.get_or_compute(key, compute)
+    assert len(cache) == 2
+
+    await cache.get_or_compute("a", compute)
+    assert cache_status() == "MISS"
+
+    now[0] += 60
+    await cache.get_or_compute("c", compute)
+    assert cache_status() == "MISS"
+
+
+class FakeOrchestration:
+    def __init__(self):
+        self.calls = 0
+        self.remembered = []
+
+    def resolve_car_model(self, car_model):
+        return None
+
+    async def orchestrate(self, user_input, car_model=None, user_experience=None):
+        self.calls += 1
+        return {"recommended_product": {"name": "AZOM DLR"}, "installation_steps": ["Steg 1"]}
+
+    async def remember(self, user_input, car_model, user_experience, product_name):
+        self.remembered.append((user_input, car_model, product_name))
+
+
+@pytest.mark.asyncio
+async def test_install_pipeline_caches_on_canonical_inputs():
+    pipeline = AZOMInstallationPipeline(result_cache=ResultCache())
+    pipeline.orchestration_service = FakeOrchestration()
+
+    first = await pipeline.run_installation("Hur installerar jag DLR?", "Volvo V-70", "Nybörjare")
+    second = await pipeline.run_installation("hur installerar jag dlr", "volvo v70", "beginner")
+    assert cache_status() == "HIT"
+    assert first == second
+    assert pipeline.orchestration_service.calls == 1
+    # Kontexten sparas även när svaret kom från cachen
+    assert pipeline.orchestration_service.remembered == [("hur installerar jag dlr", "volvo v70", "AZOM DLR")]
+
+    await pipeline.run_installation("Hur installerar jag DLR?", "Audi A4", "nybörjare")
+    assert pipeline.orchestration_service.calls == 2
+
+    with pytest.raises(ValueError):
+        await pipeline.run_installation("", "Volvo V70")
+
+
+def test_cache_key_ignores_fuzzy_model_matches():
+    pipeline = AZOMInstallationPipeline(result_cache=ResultCache())
+    pipeline.orchestration_service = FakeOrchestration()
+    pipeline.orchestration_service.resolve_car_model = lambda m: CarModelMatch("audi a4", "Audi A4", 0.7, "fuzzy")
+    assert pipeline.cache_key("installera", "Audi") != pipeline.cache_key("installera", "Audi A4")
+
+    pipeline.orchestration_service.resolve_car_model = lambda m: CarModelMatch("volkswagen golf", "VW Golf", 0.95, "alias")
+    assert pipeline.cache_key("installera", "Folkvagn Golf") == pipeline.cache_key("installera", "VW Golf")
@@ -0,0 +1,88 @@
+import json
+import multiprocessing
+
+import pytest
+
+from app.pipelineserver.pipeline_app.services.memory_service import MemoryService
+from app.pipelineserver.pipeline_app.services.session_store import SessionStore
+
+
+def _write_many(path, worker, count):
+    store = SessionStore(path)
+    for i in range(count):
+        store.append("shared", {"worker": worker, "i": i})
+    store.close()
+
+
+def test_append_and_paginated_history(tmp_path):
+    store = SessionStore(str(tmp_path / "history.db"))
+    for i in range(5):
+        store.append("anna", {"i": i, "timestamp": f"2024-01-0{i + 1}T00:00:00"})
+    store.append("bertil", {"i": 99})
+
+    assert store.count("anna") == 5
+    assert [e["i"] for e in store.get_history("anna")] == [0, 1, 2, 3, 4]
+    assert [e["i"] for e in store.get_history("anna", limit=2, offset=2)] == [2, 3]
+    assert store.get_history("okänd") == []
+
+
+def test_concurrent_writers_from_several_processes(tmp_path):
+    path = str(tmp_path / "history.db")
+    SessionStore(path).close()
+    ctx = multiprocessing.get_context("spawn")
+    workers = [ctx.Process(target=_write_many, args=(path, w, 50)) for w in range(4)]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join(60)
+        assert p.exitcode == 0
+    assert SessionStore(path).count("shared") == 200
+
+
+@pytest.mark.asyncio
+async def test_memory_service_imports_legacy_json_once(tmp_path):
+    legacy = tmp_path / "user_history.json"
+    legacy.write_text(json.dumps({"anna": [{"query": "gammal", "timestamp": "2023-01-01T00:00:00"}]}), encoding="utf-8")
+    memory = MemoryService(store=SessionStore(str(tmp_path / "history.db")))
+    memory.history_path = str(legacy)
+    assert memory.store.import_legacy_json(str(legacy)) == 1
+    assert memory.store.import_legacy_json(str(legacy)) == 0
+
+    assert (await memory.save_context({"query": "ny"}, user_id="anna"))["status"] == "context saved"
+    history = await memory.get_history("anna")
+    assert [e["query"] for e in history] == ["gammal", "ny"]
+    assert [e["query"] for e in await memory.get_history("anna", limit=1, offset=1)] == ["ny"]
+
+
+def test_unreadable_legacy_json_is_retried(tmp_path):
+    legacy = tmp_path / "user_history.json"
+    legacy.write_text('{"anna": [', encoding="utf-8")
+    store = SessionStore(str(tmp_path / "history.db"))
+    assert store.import_legacy_json(str(legacy)) == 0
+
+    legacy.write_text(json.dumps({"anna": [{"query": "gammal"}]}), encoding="utf-8")
+    assert store.import_legacy_json(str(legacy)) == 1
+    assert store.import_legacy_json(str(legacy)) == 0
+
+
+@pytest.mark.asyncio
+async def test_memory_service_opens_store_in_worker_thread(tmp_path, monkeypatch):
+    import threading
+
+    from app.pipelineserver.pipeline_app.services import memory_service
+
+    threads = []
+
+    class RecordingStore(SessionStore):
+        def __init__(self, *args, **kwargs):
+            threads.append(threading.current_thread())
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(memory_service, "SessionStore", RecordingStore)
+    monkeypatch.setattr(memory_service, "default_store_path", lambda: str(tmp_path / "history.db"))
+    memory = MemoryService(write_behind=False)
+    memory.history_path = str(tmp_path / "saknas.json")
+
+    assert (await memory.save_context({"query": "q"}, user_id="anna"))["status"] == "context saved"
+    assert await memory.open_store() is memory.store
+    assert len(threads) == 1 and threads[0] is not threading.main_thread()
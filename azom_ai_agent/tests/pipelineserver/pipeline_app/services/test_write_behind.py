@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from app.pipelineserver.pipeline_app.services.memory_service import MemoryService
+from app.pipelineserver.pipeline_app.services.session_store import SessionStore
+from app.pipelineserver.pipeline_app.services.write_behind import WriteBehindQueue
+
+
+@pytest.mark.asyncio
+async def test_flushes_on_batch_size_and_interval():
+    batches = []
+    queue = WriteBehindQueue(batches.append, max_batch=3, flush_interval=0.05)
+    for i in range(3):
+        assert queue.enqueue(i)
+    for _ in range(50):
+        if batches:
+            break
+        await asyncio.sleep(0.01)
+    assert batches == [[0, 1, 2]]
+
+    queue.enqueue(3)
+    await asyncio.sleep(0.2)
+    assert batches == [[0, 1, 2], [3]]
+    stats = queue.stats()
+    assert (stats["written"], stats["flushes"], stats["queue_depth"]) == (4, 2, 0)
+    await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_full_queue_drops_and_stop_drains():
+    written = []
+    queue = WriteBehindQueue(written.extend, max_batch=100, flush_interval=60, max_queue=2)
+    assert queue.enqueue("a") and queue.enqueue("b")
+    assert not queue.enqueue("c")
+    assert queue.stats()["dropped"] == 1
+    assert await queue.stop() == 2
+    assert written == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_memory_service_writes_behind_and_reads_own_writes(tmp_path):
+    store = SessionStore(str(tmp_path / "history.db"))
+    memory = MemoryService(store=store, write_behind=True)
+    result = await memory.save_context({"query": "hej"}, user_id="anna")
+    assert result == {"status": "context saved", "queued": True}
+    assert store.count("anna") == 0  # inte skrivet ännu, ligger i kön
+    assert [e["query"] for e in await memory.get_history("anna")] == ["hej"]
+    await memory.queue.stop()
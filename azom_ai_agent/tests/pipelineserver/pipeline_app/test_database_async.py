@@ -0,0 +1,114 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import func, select, text
+
+from app.pipelineserver.pipeline_app import database
+from app.pipelineserver.pipeline_app.models.database_models import Base, Product
+
+pytest.importorskip("aiosqlite")
+
+
+def test_async_database_url_maps_drivers():
+    assert database.async_database_url("sqlite:///./a.db") == "sqlite+aiosqlite:///./a.db"
+    assert database.async_database_url("sqlite:///:memory:") == "sqlite+aiosqlite:///:memory:"
+    assert database.async_database_url("postgresql://u:p@db/azom") == "postgresql+asyncpg://u:p@db/azom"
+    assert database.async_database_url("postgresql+psycopg2://db/azom") == "postgresql+asyncpg://db/azom"
+
+
+def test_file_database_uses_wal_and_pragmas(tmp_path):
+    engine = database.make_engine(f"sqlite:///{tmp_path / 'azom.db'}")
+    try:
+        with engine.connect() as conn:
+            assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+            assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+            assert conn.execute(text("PRAGMA foreign_keys")).scalar() == 1
+            assert conn.execute(text("PRAGMA busy_timeout")).scalar() == database.settings.SQLITE_BUSY_TIMEOUT_MS
+        assert engine.pool.size() == database.settings.DB_POOL_SIZE
+    finally:
+        engine.dispose()
+
+
+def test_import_does_not_create_tables(tmp_path):
+    path = tmp_path / "fresh.db"
+    engine = database.make_engine(f"sqlite:///{path}")
+    try:
+        with engine.connect():
+            pass
+        tables = sqlite3.connect(path).execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()
+        assert tables == []
+    finally:
+        engine.dispose()
+
+
+async def test_async_session_round_trip(tmp_path):
+    engine = database.make_async_engine(f"sqlite:///{tmp_path / 'async.db'}")
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            assert (await conn.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+            session.add(Product(name="AZOM DLR", normalized_name="azom dlr", price=4990))
+            await session.commit()
+            assert await session.scalar(select(func.count(Product.id))) == 1
+    finally:
+        await engine.dispose()
+
+
+async def test_get_async_db_dependency(monkeypatch):
+    monkeypatch.setattr(database, "SQLALCHEMY_DATABASE_URL", "sqlite:///:memory:")
+    monkeypatch.setattr(database, "_async_engine", None)
+    monkeypatch.setattr(database, "_async_sessionmaker", None)
+    await database.init_async_db()
+    try:
+        generator = database.get_async_db()
+        session = await generator.__anext__()
+        assert await session.scalar(select(func.count(Product.id))) == 0
+        with pytest.raises(StopAsyncIteration):
+            await generator.__anext__()
+    finally:
+        await database.dispose_engines()
+
+
+def test_upgrade_schema_migrates_old_products_table(tmp_path):
+    path = tmp_path / "old.db"
+    old = sqlite3.connect(path)
+    old.execute(
+        "CREATE TABLE products (id INTEGER PRIMARY KEY, name VARCHAR(255) NOT NULL UNIQUE, description TEXT, "
+        "price FLOAT, category VARCHAR(100), sku VARCHAR(100) UNIQUE, stock_quantity INTEGER, "
+        "created_at DATETIME, updated_at DATETIME)"
+    )
+    old.execute("INSERT INTO products (name, price) VALUES ('AZOM  DLR', 4990)")
+    old.commit()
+    old.close()
+
+    engine = database.make_engine(f"sqlite:///{path}")
+    try:
+        with engine.begin() as conn:
+            applied = database.upgrade_schema(conn)
+        assert "products.content_hash" in applied and "faqs" not in applied
+        with engine.connect() as conn:
+            assert conn.execute(select(Product.normalized_name)).scalar() == "azom dlr"
+            assert conn.execute(text("SELECT count(*) FROM product_tags")).scalar() == 0
+            indexes = {row[1] for row in conn.execute(text("PRAGMA index_list(products)"))}
+            assert "ix_products_normalized_name" in indexes
+        with engine.begin() as conn:
+            assert database.upgrade_schema(conn) == []
+    finally:
+        engine.dispose()
+
+
+def test_health_db_endpoint_uses_async_session(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app.pipelineserver.pipeline_app.main import app
+
+    monkeypatch.setattr(database, "SQLALCHEMY_DATABASE_URL", "sqlite:///:memory:")
+    monkeypatch.setattr(database, "_async_engine", None)
+    monkeypatch.setattr(database, "_async_sessionmaker", None)
+    with TestClient(app) as client:
+        resp = client.get("/health/db")
+    assert resp.status_code == 200
+    assert resp.json() == {"status": "healthy", "products": 0}
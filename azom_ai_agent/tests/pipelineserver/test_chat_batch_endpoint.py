@@ -0,0 +1,117 @@
+import json
+import os
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from app.pipelineserver.pipeline_app.main import app  # noqa: E402
+from app.pipelineserver.pipeline_app.services.llm_client import (  # noqa: E402
+    get_llm_client,
+    LLMServiceProtocol,
+    OpenAIClient,
+)
+
+
+class EchoLLM(LLMServiceProtocol):
+    async def chat(self, messages, model=None, stream=False, **kwargs):
+        return f"svar: {messages[-1]['content']}"
+
+    async def aclose(self):
+        return None
+
+
+@pytest.fixture
+def client():
+    previous = app.dependency_overrides.get(get_llm_client)
+    app.dependency_overrides[get_llm_client] = lambda: EchoLLM()
+    try:
+        with TestClient(app) as test_client:
+            yield test_client
+    finally:
+        if previous is None:
+            app.dependency_overrides.pop(get_llm_client, None)
+        else:
+            app.dependency_overrides[get_llm_client] = previous
+
+
+def test_chat_batch_streams_ndjson(client):
+    payload = {
+        "requests": [
+            [{"role": "user", "content": "Volvo V70"}],
+            [{"role": "user", "content": "BMW X5"}],
+        ],
+        "concurrency": 2,
+    }
+    resp = client.post("/chat/batch", json=payload)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in resp.text.splitlines() if line]
+    assert sorted(r["index"] for r in rows) == [0, 1]
+    assert {r["assistant"] for r in rows} == {"svar: Volvo V70", "svar: BMW X5"}
+
+
+def test_chat_batch_rejects_empty_and_unsupported_provider_batch(client):
+    assert client.post("/chat/batch", json={"requests": []}).status_code == 422
+    resp = client.post(
+        "/chat/batch",
+        json={"requests": [[{"role": "user", "content": "x"}]], "provider_batch": True},
+    )
+    assert resp.status_code == 400
+
+
+class FakeBatchClient(OpenAIClient):
+    def __init__(self):
+        super().__init__(config={"OPENAI_API_KEY": "sk-test"}, timeout=5)
+        self.polls = 0
+
+    async def submit_batch(self, message_lists, model=None, **kwargs):
+        self.submitted = message_lists
+        return {"id": "batch-1", "status": "validating"}
+
+    async def get_batch(self, batch_id):
+        self.polls += 1
+        if self.polls == 1:
+            return {"id": batch_id, "status": "in_progress"}
+        return {"id": batch_id, "status": "completed", "output_file_id": "file-out", "request_counts": {"total": 2}}
+
+    async def batch_results(self, batch, max_tokens=None):
+        return {1: {"assistant": "två"}}
+
+
+def _override(llm):
+    app.dependency_overrides[get_llm_client] = lambda: llm
+
+
+def test_provider_batch_returns_id_and_is_polled_separately(client):
+    llm = FakeBatchClient()
+    _override(llm)
+    resp = client.post(
+        "/chat/batch",
+        json={"requests": [[{"role": "user", "content": "1"}], [{"role": "user", "content": "2"}]], "provider_batch": True},
+    )
+    assert resp.status_code == 202
+    assert resp.json()["batch_id"] == "batch-1"
+    link = resp.json()["links"]["self"]
+
+    pending = client.get(link).json()
+    assert pending["status"] == "in_progress" and "results" not in pending
+    done = client.get(link).json()
+    assert done["results"] == [
+        {"index": 0, "error": "Missing result in batch output"},
+        {"index": 1, "assistant": "två"},
+    ]
+
+
+def test_batch_failure_ends_stream_with_error_line(client):
+    class BrokenLLM(EchoLLM):
+        async def chat_many(self, message_lists, **kwargs):
+            yield {"index": 0, "assistant": "ok"}
+            raise RuntimeError("backend nere")
+
+    _override(BrokenLLM())
+    resp = client.post("/chat/batch", json={"requests": [[{"role": "user", "content": "x"}]] * 2})
+    rows = [json.loads(line) for line in resp.text.splitlines() if line]
+    assert rows[-1] == {"error": "backend nere"}
@@ -14,7 +14,7 @@ from app.pipelineserver.pipeline_app.services.llm_client import (  # noqa: E402
 )
 
 class DummyLLM(LLMServiceProtocol):
-    async def chat(self, messages, model=None, stream=False):
+    async def chat(self, messages, model=None, stream=False, **kwargs):
         return "Detta är ett testsvar från mocken."
 
     async def aclose(self):
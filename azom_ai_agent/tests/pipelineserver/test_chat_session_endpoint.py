@@ -0,0 +1,78 @@
+import sys
+import os
+import pytest
+from fastapi.testclient import TestClient
+
+# Ensure project root on path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from app.pipelineserver.pipeline_app import main  # noqa: E402
+from app.pipelineserver.pipeline_app.main import app  # noqa: E402
+from app.pipelineserver.pipeline_app.services.llm_client import (  # noqa: E402
+    get_llm_client,
+    LLMServiceProtocol,
+)
+
+
+class RecordingLLM(LLMServiceProtocol):
+    def __init__(self):
+        self.calls = []
+
+    async def chat(self, messages, model=None, stream=False, **kwargs):
+        self.calls.append(messages)
+        return f"Svar {len(self.calls)}"
+
+    async def aclose(self):
+        return None
+
+
+@pytest.fixture
+def llm():
+    return RecordingLLM()
+
+
+@pytest.fixture
+def client(llm, monkeypatch):
+    monkeypatch.setattr(main.model_router, "enabled", False)
+    monkeypatch.setattr(main, "conversation_window", main.ConversationWindow(recent_turns=2))
+    previous = app.dependency_overrides.get(get_llm_client)
+    app.dependency_overrides[get_llm_client] = lambda: llm
+    try:
+        with TestClient(app) as test_client:
+            yield test_client
+    finally:
+        if previous is None:
+            app.dependency_overrides.pop(get_llm_client, None)
+        else:
+            app.dependency_overrides[get_llm_client] = previous
+
+
+def test_follow_up_includes_previous_turns(client, llm):
+    headers = {"X-AZOM-Mode": "LIGHT"}
+    first = client.post("/chat/azom", json={"message": "Passar DLR i XC60?", "session_id": "s1"}, headers=headers)
+    assert first.status_code == 200
+    assert first.json()["session"] == {"session_id": "s1", "turns": 1, "summarized_turns": 0}
+
+    client.post("/chat/azom", json={"message": "Och i V70?", "session_id": "s1"}, headers=headers)
+    roles = [m["role"] for m in llm.calls[-1]]
+    assert roles == ["system", "user", "assistant", "user"]
+    assert llm.calls[-1][1]["content"] == "Passar DLR i XC60?"
+    assert llm.calls[-1][2]["content"] == "Svar 1"
+
+
+def test_older_turns_are_summarized_and_prompt_stays_bounded(client, llm):
+    headers = {"X-AZOM-Mode": "LIGHT"}
+    tokens = []
+    for i in range(8):
+        resp = client.post("/chat/azom", json={"message": f"Följdfråga nummer {i}", "session_id": "s2"}, headers=headers)
+        tokens.append(resp.json()["prompt_tokens"])
+    assert resp.json()["session"]["summarized_turns"] == 6
+    assert "Sammanfattning av tidigare konversation" in llm.calls[-1][0]["content"]
+    # Två ordagranna turer + begränsad sammanfattning: ingen linjär tillväxt
+    assert tokens[-1] - tokens[4] < tokens[4] - tokens[0]
+
+
+def test_without_session_id_request_is_stateless(client, llm):
+    resp = client.post("/chat/azom", json={"message": "Hej"}, headers={"X-AZOM-Mode": "LIGHT"})
+    assert "session" not in resp.json()
+    assert [m["role"] for m in llm.calls[-1]] == ["system", "user"]
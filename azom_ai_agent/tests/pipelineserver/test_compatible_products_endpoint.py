@@ -0,0 +1,30 @@
+import os
+import sys
+
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from app.pipelineserver.pipeline_app import main  # noqa: E402
+from app.pipelineserver.pipeline_app.services.product_catalog import ProductCatalog  # noqa: E402
+
+PRODUCTS = [
+    {"name": "AZOM DLR", "price_sek": 4990, "vendor": "AZOM", "tags": ["premium"], "compatible_models": ["Volvo XC60"]},
+    {"name": "Other DLR", "price_sek": 2990, "vendor": "Other", "tags": ["premium"], "compatible_models": ["Volvo XC60"]},
+]
+
+
+def test_compatible_products_endpoint(monkeypatch):
+    catalog = ProductCatalog(PRODUCTS)
+    monkeypatch.setattr(type(main.knowledge_service), "catalog", property(lambda self: catalog))
+    client = TestClient(main.app)
+    resp = client.get(
+        "/products/compatible",
+        params={"car_model": "Volvo XC-60", "tag": "premium", "max_price": 5000},
+    )
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["car_model_id"] == "volvo xc60"
+    assert [p["name"] for p in data["products"]] == ["AZOM DLR", "Other DLR"]
+
+    assert client.get("/products/compatible", params={"limit": 0}).status_code == 422
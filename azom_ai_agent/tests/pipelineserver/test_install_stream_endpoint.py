@@ -0,0 +1,103 @@
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from app.pipelineserver.pipeline_app import main  # noqa: E402
+from app.pipelineserver.pipeline_app.main import app  # noqa: E402
+from app.pipelineserver.pipeline_app.pipelines.azom_installation_pipeline import AZOMInstallationPipeline  # noqa: E402
+from app.pipelineserver.pipeline_app.services.install_guides import GuideStore  # noqa: E402
+from app.pipelineserver.pipeline_app.services.llm_client import (  # noqa: E402
+    get_llm_client,
+    LLMServiceProtocol,
+)
+from app.pipelineserver.pipeline_app.services.result_cache import ResultCache  # noqa: E402
+
+
+class FakeKnowledge:
+    def __init__(self, delay=0.0, error=None):
+        self.delay, self.error = delay, error
+
+    async def get_product_info(self, product_name, car_model=None):
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return {"name": product_name, "vendor": "AZOM", "tags": [], "price_sek": 4990}
+
+    def resolve_car_model(self, car_model):
+        return None
+
+
+class FakeRAG:
+    async def search(self, query, top_k=3):
+        return [{"content": "Steg 1: koppla ur batteriet"}]
+
+
+class FakeMemory:
+    async def save_context(self, context):
+        return {"status": "context saved"}
+
+
+class NarrativeLLM(LLMServiceProtocol):
+    async def chat(self, messages, model=None, stream=False, **kwargs):
+        return "Så här går det till."
+
+    async def aclose(self):
+        return None
+
+
+def _pipeline(tmp_path, knowledge):
+    pipeline = AZOMInstallationPipeline(
+        result_cache=ResultCache(), guide_store=GuideStore(str(tmp_path / "guides.db")), data_version=lambda: "v1"
+    )
+    service = pipeline.orchestration_service
+    service.knowledge_service, service.rag_service, service.memory_service = knowledge, FakeRAG(), FakeMemory()
+    return pipeline
+
+
+@pytest.fixture
+def client():
+    previous = app.dependency_overrides.get(get_llm_client)
+    app.dependency_overrides[get_llm_client] = lambda: NarrativeLLM()
+    try:
+        with TestClient(app) as test_client:
+            yield test_client
+    finally:
+        if previous is None:
+            app.dependency_overrides.pop(get_llm_client, None)
+        else:
+            app.dependency_overrides[get_llm_client] = previous
+
+
+def _events(resp):
+    return [json.loads(line) for line in resp.text.splitlines() if line]
+
+
+def test_stream_sends_product_before_faster_steps(client, tmp_path, monkeypatch):
+    # RAG-sökningen blir klar före produktuppslaget, men produkten skickas ändå först
+    monkeypatch.setattr(main, "pipeline", _pipeline(tmp_path, FakeKnowledge(delay=0.05)))
+    resp = client.post(
+        "/pipeline/install/stream",
+        json={"user_input": "Hur installerar jag backkameran?", "car_model": "Volvo XC60", "narrative": True},
+    )
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    events = _events(resp)
+    assert [e["event"] for e in events] == ["product", "warnings", "steps", "narrative", "done"]
+    assert events[0]["recommended_product"]["name"] == "AZOM Volvo Special"
+    assert events[2]["installation_steps"] == ["Steg 1: koppla ur batteriet"]
+    assert events[3]["text"] == "Så här går det till."
+    assert events[-1]["source"] == "LIVE" and "product_lookup" in events[-1]["timings"]
+
+
+def test_stream_reports_failures_as_error_line(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "pipeline", _pipeline(tmp_path, FakeKnowledge(error=ValueError("okänd produkt"))))
+    resp = client.post("/pipeline/install/stream", json={"user_input": "installera", "car_model": "Audi A4"})
+    assert _events(resp) == [{"event": "error", "status": 400, "detail": "okänd produkt"}]
+
+    assert client.post("/pipeline/install/stream", json={"user_input": " ", "car_model": "Audi A4"}).status_code == 400
@@ -0,0 +1,87 @@
+import os
+import sys
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from app.pipelineserver.pipeline_app import main  # noqa: E402
+from app.pipelineserver.pipeline_app.main import app  # noqa: E402
+from app.pipelineserver.pipeline_app.services.llm_client import LLMServiceProtocol  # noqa: E402
+
+
+class EchoLLM(LLMServiceProtocol):
+    async def chat(self, messages, model=None, stream=False, **kwargs):
+        return f"svar: {messages[-1]['content']}"
+
+    async def aclose(self):
+        return None
+
+
+class FakePipeline:
+    async def run_installation(self, user_input, car_model=None, user_experience=None):
+        return {"recommended_product": {"name": "AZOM DLR"}, "car_model": car_model}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(main.settings, "JOB_STORE_PATH", str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(main, "pipeline", FakePipeline())
+
+    async def llm():
+        return EchoLLM()
+
+    monkeypatch.setattr(main, "_job_llm_client", llm)
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def _poll(client, job_id):
+    for _ in range(200):
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(job)
+
+
+def test_submit_and_poll_install_job(client):
+    resp = client.post("/jobs", json={"kind": "install", "payload": {"user_input": "installera", "car_model": "Volvo V70"}})
+    assert resp.status_code == 202
+    job = resp.json()
+    assert job["links"]["self"] == f"/jobs/{job['job_id']}"
+    done = _poll(client, job["job_id"])
+    assert done["status"] == "succeeded"
+    assert done["result"]["car_model"] == "Volvo V70"
+
+
+def test_chat_batch_job_returns_ordered_results(client):
+    payload = {"requests": [[{"role": "user", "content": "a"}], [{"role": "user", "content": "b"}]]}
+    job = client.post("/jobs", json={"kind": "chat_batch", "payload": payload}).json()
+    done = _poll(client, job["job_id"])
+    assert [r["assistant"] for r in done["result"]] == ["svar: a", "svar: b"]
+
+
+def test_invalid_jobs_are_rejected(client):
+    assert client.post("/jobs", json={"kind": "okänd", "payload": {}}).status_code == 422
+    assert client.post("/jobs", json={"kind": "install", "payload": {"car_model": "V70"}}).status_code == 422
+    assert client.get("/jobs/saknas").status_code == 404
+    assert client.delete("/jobs/saknas").status_code == 404
+
+
+def test_provider_batch_job_needs_openai_backend(client):
+    payload = {"requests": [[{"role": "user", "content": "a"}]], "provider_batch": True}
+    resp = client.post("/jobs", json={"kind": "chat_batch", "payload": payload})
+    assert resp.status_code == 422
+    assert "batch API" in resp.json()["detail"]
+
+
+def test_webhook_url_must_be_http_to_an_allowed_host(client, monkeypatch):
+    monkeypatch.setattr(main.settings, "JOB_WEBHOOK_ALLOWED_HOSTS", ["hooks.example.com"])
+    job = {"kind": "install", "payload": {"user_input": "installera"}}
+    for url in ("http://169.254.169.254/latest/meta-data", "file:///etc/passwd", "gopher://hooks.example.com/"):
+        assert client.post("/jobs", json={**job, "webhook_url": url}).status_code == 422
+    resp = client.post("/jobs", json={**job, "webhook_url": "https://hooks.example.com/azom"})
+    assert resp.status_code == 202
@@ -0,0 +1,72 @@
+import json
+
+from app.pipelineserver.tools import auto_import_csv_data as auto_import
+
+
+def test_extract_compatible_models_matches_word_boundaries():
+    text = "AZOM DLR för Volvo XC60 och VOLVO V70, passar även bmw. Inte för Kiabil."
+    assert auto_import.extract_compatible_models(text) == ["Volvo", "BMW"]
+    assert auto_import.extract_compatible_models("") == []
+
+
+def test_main_streams_files_in_parallel_and_skips_unchanged(tmp_path, capsys):
+    (tmp_path / "products.csv").write_text(
+        "Title,Body (HTML),Variant Price,Variant SKU\n"
+        "AZOM DLR,Passar Volvo XC60,\"4990,00\",DLR-1\n"
+        ",,,\n",
+        encoding="utf-8",
+    )
+    (tmp_path / "faq.csv").write_text("Question,Answer\nHur?,Så här.\n", encoding="utf-8")
+    (tmp_path / "stock.csv").write_text("SKU,Stock\nDLR-1,7\n", encoding="utf-8")
+
+    results = auto_import.main(write_sqlite=False, force=False, workers=3, data_dir=str(tmp_path))
+    assert {r["file"]: r["rows"] for r in results} == {"faq.csv": 1, "products.csv": 1, "stock.csv": 1}
+    assert all(r["rows_per_sec"] > 0 for r in results)
+    products = json.loads((tmp_path / "products.json").read_text(encoding="utf-8"))
+    assert products[0]["compatible_models"] == ["Volvo"]
+    assert products[0]["price_sek"] == 4990.0
+    assert products[0]["stock"] == "7"
+
+    assert auto_import.main(write_sqlite=False, force=False, workers=3, data_dir=str(tmp_path)) == []
+    assert "oförändrad" in capsys.readouterr().out
+
+    (tmp_path / "faq.csv").write_text("Question,Answer\nHur?,Annorlunda.\n", encoding="utf-8")
+    rerun = auto_import.main(write_sqlite=False, force=False, workers=3, data_dir=str(tmp_path))
+    assert [r["file"] for r in rerun] == ["faq.csv"]
+
+
+def test_changed_file_reimports_whole_group(tmp_path):
+    (tmp_path / "a.csv").write_text("Question,Answer\nA?,a\n", encoding="utf-8")
+    (tmp_path / "b.csv").write_text("Question,Answer\nB?,b\n", encoding="utf-8")
+    auto_import.main(write_sqlite=False, force=False, workers=1, data_dir=str(tmp_path))
+
+    (tmp_path / "a.csv").write_text("Question,Answer\nA?,ny\n", encoding="utf-8")
+    rerun = auto_import.main(write_sqlite=False, force=False, workers=1, data_dir=str(tmp_path))
+    assert [r["file"] for r in rerun] == ["a.csv", "b.csv"]
+
+    (tmp_path / "b.csv").unlink()
+    assert [r["file"] for r in auto_import.main(write_sqlite=False, force=False, workers=1, data_dir=str(tmp_path))] == ["a.csv"]
+
+
+def test_manifest_records_targets_and_sqlite_run_is_not_skipped(tmp_path, monkeypatch):
+    exported = []
+    monkeypatch.setattr(auto_import, "init_database", lambda: None)
+    monkeypatch.setattr(auto_import, "export_to_sqlite", lambda name, data: exported.append((name, list(data))))
+    (tmp_path / "faq.csv").write_text("Question,Answer\nHur?,Så här.\n", encoding="utf-8")
+
+    auto_import.main(write_sqlite=False, force=False, workers=1, data_dir=str(tmp_path))
+    manifest = json.loads((tmp_path / auto_import.MANIFEST_NAME).read_text(encoding="utf-8"))
+    assert manifest["faq.csv"]["targets"] == "json"
+
+    assert [r["file"] for r in auto_import.main(write_sqlite=True, force=False, workers=1, data_dir=str(tmp_path))] == ["faq.csv"]
+    assert exported[0][0] == "faq.json" and len(exported[0][1]) == 1
+    assert auto_import.main(write_sqlite=True, force=False, workers=1, data_dir=str(tmp_path)) == []
+    assert auto_import.main(write_sqlite=False, force=False, workers=1, data_dir=str(tmp_path)) == []
+
+
+def test_legacy_manifest_with_plain_hashes_triggers_reimport(tmp_path):
+    (tmp_path / "faq.csv").write_text("Question,Answer\nHur?,Så här.\n", encoding="utf-8")
+    auto_import.main(write_sqlite=False, force=False, workers=1, data_dir=str(tmp_path))
+    digest = auto_import.file_hash(str(tmp_path / "faq.csv"))
+    (tmp_path / auto_import.MANIFEST_NAME).write_text(json.dumps({"faq.csv": digest}), encoding="utf-8")
+    assert [r["file"] for r in auto_import.main(write_sqlite=False, force=False, workers=1, data_dir=str(tmp_path))] == ["faq.csv"]
@@ -4,6 +4,8 @@ from fastapi import HTTPException
 
 from app.services.ai_service import AIService
 from app.services.protocols import LLMClientProtocol
+from app.core.feature_flags import generation_budget
+from app.core.modes import Mode
 
 # --- Fixtures ---
 
@@ -36,7 +38,9 @@ async def test_ai_service_query_success(ai_service, mock_llm_client):
 
     # Verify that the llm_client's chat method was called correctly
     expected_messages = [{"role": "user", "content": user_prompt}]
-    mock_llm_client.chat.assert_awaited_once_with(messages=expected_messages)
+    mock_llm_client.chat.assert_awaited_once_with(
+        messages=expected_messages, **generation_budget(Mode.FULL)
+    )
     
     # Verify the final output
     assert response == "Mocked LLM response."
@@ -5,7 +5,7 @@ from app.services.ai_service import AIService
 class DummyLLM:
     def __init__(self):
         self.last_messages = None
-    async def chat(self, messages, model=None, stream: bool = False):
+    async def chat(self, messages, model=None, stream: bool = False, **kwargs):
         self.last_messages = messages
         return "ok"
     async def aclose(self):
@@ -14,7 +14,7 @@ class DummyLLM:
 @pytest.mark.asyncio
 async def test_ai_service_light_mode_uses_system_and_user(monkeypatch):
     # Stub compose_full_prompt to a deterministic output
-    async def fake_compose_full_prompt(user_prompt: str, context: dict) -> str:
+    async def fake_compose_full_prompt(user_prompt: str, context: dict, **kwargs) -> str:
         return f"SYS-PROMPT\n\n{user_prompt}"
     monkeypatch.setattr(
         'app.services.ai_service.compose_full_prompt',
@@ -110,3 +110,37 @@ async def test_openai_client_propagates_http_errors(monkeypatch):
 
     await client.aclose()
     assert fake.is_closed is True
+
+
+@pytest.mark.asyncio
+async def test_openai_client_sends_generation_budget_and_logs_truncation(monkeypatch, caplog):
+    fake = FakeAsyncClient(timeout=5)
+    fake.next_response = FakeResponse({
+        "choices": [{"message": {"content": "avkortat"}, "finish_reason": "length"}],
+        "usage": {"prompt_tokens": 12, "completion_tokens": 256},
+    })
+    monkeypatch.setattr(httpx, "AsyncClient", lambda timeout=None: fake)
+
+    client = OpenAIClient(config={"OPENAI_API_KEY": "sk-test"}, timeout=5)
+    with caplog.at_level("WARNING"):
+        text = await client.chat(
+            [{"role": "user", "content": "Hej"}], max_tokens=256, temperature=0.2, stop=["\nUser:"]
+        )
+    assert text == "avkortat"
+
+    sent = fake.calls[0]["json"]
+    assert sent["max_tokens"] == 256
+    assert sent["temperature"] == 0.2
+    assert sent["stop"] == ["\nUser:"]
+    assert any("truncated" in r.getMessage() for r in caplog.records)
+
+
+@pytest.mark.asyncio
+async def test_openai_client_omits_unset_generation_params(monkeypatch):
+    fake = FakeAsyncClient(timeout=5)
+    monkeypatch.setattr(httpx, "AsyncClient", lambda timeout=None: fake)
+
+    client = OpenAIClient(config={"OPENAI_API_KEY": "sk-test"}, timeout=5)
+    await client.chat([{"role": "user", "content": "Hej"}])
+    sent = fake.calls[0]["json"]
+    assert "max_tokens" not in sent and "temperature" not in sent and "stop" not in sent
@@ -0,0 +1,149 @@
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.conversation_window import ConversationWindow, Turn, summarize_turns
+from app.prompt_budget import PromptBudget
+from app.services.ai_service import AIService
+from app.services.protocols import LLMClientProtocol
+
+
+def _chat(window, session_id, turns, budget):
+    """Kör `turns` följdfrågor och returnerar promptstorleken per tur."""
+    sizes = []
+    for i in range(turns):
+        question = f"Fråga {i}: hur kopplar jag in CAN-bus på Volvo XC60 årsmodell 2018?"
+        messages, _ = window.build_messages(session_id, budget, user=question, system="System")
+        sizes.append(budget.count_messages(messages))
+        window.record(session_id, question, "Svar: " + "koppla kabeln till OBD-uttaget. " * 8)
+    return sizes
+
+
+def test_without_session_prompt_is_system_and_user_only():
+    window = ConversationWindow()
+    messages, report = window.build_messages(
+        None, PromptBudget(10_000), user="Hej", system="System", context_items=["- a", "- b"]
+    )
+    assert messages == [
+        {"role": "system", "content": "System\n\nRelevant kontext:\n- a\n- b"},
+        {"role": "user", "content": "Hej"},
+    ]
+    assert report["context_items"] == 2 and report["history_turns"] == 0
+
+
+def test_recent_turns_are_verbatim_and_older_turns_summarized():
+    window = ConversationWindow(recent_turns=2)
+    for i in range(5):
+        window.record("s1", f"fråga {i}", f"svar {i}")
+
+    summary, turns = window.history("s1")
+    assert turns == [Turn("fråga 3", "svar 3"), Turn("fråga 4", "svar 4")]
+    assert "fråga 0" in summary and "fråga 2" in summary
+    assert window.stats("s1") == {"session_id": "s1", "turns": 2, "summarized_turns": 3}
+
+    messages, report = window.build_messages("s1", PromptBudget(10_000), user="fråga 5", system="System")
+    assert [m["role"] for m in messages] == ["system", "user", "assistant", "user", "assistant", "user"]
+    assert "Sammanfattning av tidigare konversation" in messages[0]["content"]
+    assert messages[1]["content"] == "fråga 3" and messages[-1]["content"] == "fråga 5"
+    assert report["history_turns"] == 2
+
+
+def test_prompt_size_is_bounded_over_many_turns():
+    window = ConversationWindow(recent_turns=3, summary_max_chars=400)
+    budget = PromptBudget(100_000)
+    sizes = _chat(window, "long", 60, budget)
+    # Efter att fönstret fyllts växer prompten inte längre med antalet turer
+    assert max(sizes[10:]) <= sizes[10] + 5
+    assert len(window.history("long")[0]) <= 400
+
+
+def test_budget_trims_oldest_turns_first():
+    window = ConversationWindow(recent_turns=5)
+    for i in range(5):
+        window.record("s", f"fråga {i} " + "x" * 200, f"svar {i}")
+    budget = PromptBudget(180)
+    messages, report = window.build_messages("s", budget, user="ny fråga", system="System")
+    assert 0 < report["history_turns"] < 5
+    users = [m["content"] for m in messages if m["role"] == "user"]
+    # Nyaste turerna behålls, äldsta tas bort
+    assert users[-2].startswith("fråga 4")
+    assert not any(u.startswith("fråga 0") for u in users)
+    assert budget.count_messages(messages) <= 180 + 4 * len(messages)
+
+
+def test_summary_is_bounded():
+    summary = ""
+    for i in range(100):
+        summary = summarize_turns(summary, [Turn(f"fråga {i} " + "y" * 300, "svar")], max_chars=500)
+    assert len(summary) <= 500
+    assert "fråga 99" in summary and "fråga 0 " not in summary
+
+
+def test_sessions_are_lru_and_ttl_bounded(monkeypatch):
+    window = ConversationWindow(max_sessions=2, ttl_seconds=10)
+    window.record("a", "q", "a")
+    window.record("b", "q", "a")
+    window.history("a")
+    window.record("c", "q", "a")
+    assert len(window) == 2
+    assert window.history("b") == ("", [])
+
+    import app.conversation_window as module
+    now = module.time.monotonic()
+    monkeypatch.setattr(module.time, "monotonic", lambda: now + 60)
+    assert window.history("a") == ("", [])
+
+
+@pytest.mark.asyncio
+async def test_ai_service_sends_session_history():
+    llm = AsyncMock(spec=LLMClientProtocol)
+    llm.chat = AsyncMock(side_effect=["svar 1", "svar 2"])
+    service = AIService(llm_client=llm, conversations=ConversationWindow())
+
+    await service.query("första frågan", context={"session_id": "abc"})
+    await service.query("följdfråga", context={"session_id": "abc"})
+
+    messages = llm.chat.await_args.kwargs["messages"]
+    assert messages == [
+        {"role": "user", "content": "första frågan"},
+        {"role": "assistant", "content": "svar 1"},
+        {"role": "user", "content": "följdfråga"},
+    ]
+
+
+def test_sessions_persist_in_session_store_across_windows(tmp_path):
+    from app.pipelineserver.pipeline_app.services.session_store import SessionStore
+
+    path = str(tmp_path / "sessions.db")
+    first = ConversationWindow(recent_turns=2, store=SessionStore(path))
+    for i in range(4):
+        first.record("s1", f"fråga {i}", f"svar {i}")
+
+    # Ett nytt fönster (t.ex. en annan arbetsprocess) ser samma session
+    opened = []
+    second = ConversationWindow(recent_turns=2, store_factory=lambda: opened.append(1) or SessionStore(path))
+    assert not opened
+    summary, turns = second.history("s1")
+    assert turns == [Turn("fråga 2", "svar 2"), Turn("fråga 3", "svar 3")]
+    assert "fråga 1" in summary
+    assert second.stats("s1") == {"session_id": "s1", "turns": 2, "summarized_turns": 2}
+    assert len(second) == 1 and opened == [1]
+
+    assert second.clear("s1") and first.history("s1") == ("", [])
+
+
+def test_stored_sessions_are_lru_and_ttl_bounded(tmp_path, monkeypatch):
+    from app.pipelineserver.pipeline_app.services import session_store
+    from app.pipelineserver.pipeline_app.services.session_store import SessionStore
+
+    clock = [1000.0]
+    monkeypatch.setattr(session_store.time, "time", lambda: clock[0])
+    window = ConversationWindow(max_sessions=2, ttl_seconds=10, store=SessionStore(str(tmp_path / "s.db")))
+    for session_id in ("a", "b", "c"):
+        clock[0] += 1
+        window.record(session_id, "q", "a")
+    assert len(window) == 2
+    assert window.history("a") == ("", [])
+
+    clock[0] += 60
+    assert window.history("c") == ("", [])
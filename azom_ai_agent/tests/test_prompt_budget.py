@@ -0,0 +1,76 @@
+import pytest
+
+from app import prompt_utils
+from app.prompt_budget import PromptBudget, DEFAULT_CONTEXT_TOKENS, MODEL_CONTEXT_TOKENS
+
+
+def test_for_model_reserves_output_tokens():
+    budget = PromptBudget.for_model("gpt-4o-mini", reserve_output_tokens=1024)
+    assert budget.max_prompt_tokens == MODEL_CONTEXT_TOKENS["gpt-4o-mini"] - 1024
+    unknown = PromptBudget.for_model("azom-se-general")
+    assert unknown.max_prompt_tokens == DEFAULT_CONTEXT_TOKENS
+    override = PromptBudget.for_model("gpt-4o-mini", reserve_output_tokens=100, max_prompt_tokens=500)
+    assert override.max_prompt_tokens == 400
+
+
+def test_fit_keeps_everything_within_budget():
+    budget = PromptBudget(10_000)
+    sections = [
+        {"name": "system", "content": "System", "required": True},
+        {"name": "rag", "items": ["a", "b"], "priority": 10},
+    ]
+    kept, report = budget.fit(sections)
+    assert kept[1]["items"] == ["a", "b"]
+    assert report["trimmed"] == []
+    assert report["over_budget"] is False
+
+
+def test_fit_trims_rag_tail_before_higher_priority_sections():
+    budget = PromptBudget(35)
+    sections = [
+        {"name": "system", "content": "s" * 80, "priority": 100, "required": True},
+        {"name": "memory", "content": "m" * 40, "priority": 20},
+        {"name": "rag", "items": ["r" * 40, "x" * 40, "y" * 40], "priority": 10},
+    ]
+    kept, report = budget.fit(sections)
+    names = [s["name"] for s in kept]
+    # Alla RAG-träffar tas bort innan minnessektionen rörs
+    assert names == ["system", "memory"]
+    assert report["trimmed"] == ["rag[-1]", "rag[-1]", "rag[-1]"]
+    assert report["total_tokens"] <= 35
+    # Originalsektionerna muteras inte
+    assert len(sections[2]["items"]) == 3
+
+
+def test_fit_never_drops_required_sections():
+    budget = PromptBudget(5)
+    kept, report = budget.fit([{"name": "system", "content": "s" * 100, "required": True}])
+    assert [s["name"] for s in kept] == ["system"]
+    assert report["over_budget"] is True
+
+
+@pytest.mark.asyncio
+async def test_compose_full_prompt_drops_optional_prompt_file_over_budget(tmp_path, monkeypatch):
+    base_dir = tmp_path / "data" / "prompts"
+    base_dir.mkdir(parents=True)
+    (base_dir / "azom_iexpertpro_v3.md").write_text("Bas", encoding="utf-8")
+    (base_dir / "azom_memoryinject_v1.md").write_text("minne " * 200, encoding="utf-8")
+    original_path_class = prompt_utils.Path
+    monkeypatch.setattr(prompt_utils, "Path", lambda p: tmp_path / original_path_class(p))
+
+    context = {"session_memory": "x"}
+    unbounded = await prompt_utils.compose_full_prompt("Fråga", context)
+    bounded = await prompt_utils.compose_full_prompt("Fråga", context, budget=PromptBudget(50))
+    assert "minne" in unbounded
+    assert "minne" not in bounded
+    assert bounded.startswith("Bas") and bounded.endswith("Fråga")
+
+
+def test_count_uses_four_chars_per_token_without_tiktoken(monkeypatch):
+    from app import prompt_budget
+
+    monkeypatch.setattr(prompt_budget, "_get_encoder", lambda model: None)
+    budget = PromptBudget(100, model="gpt-4o-mini")
+    assert budget.count("") == 0
+    assert budget.count("abcde") == 2
+    assert budget.count_messages([{"role": "user", "content": "abcd"}]) == 1 + 4